@@ -0,0 +1,217 @@
+"""
+Análisis de características de los modelos: importancia por permutación y contribuciones.
+
+- Importancia por permutación: cuánto empeora la métrica del modelo en un conjunto de prueba al
+  desordenar cada característica. Sirve para cualquier modelo con predict (sklearn, LightGBM,
+  modelos exportados a NumPy) y cada característica se evalúa en paralelo (hilos: el modelo no
+  se copia).
+- Contribuciones de LightGBM (pred_contrib): aporte de cada característica a cada predicción,
+  calculado por lotes y resumido por característica.
+
+El análisis es costoso, así que se calcula fuera del dashboard (train_models.py) y se guarda en
+disco por versión del modelo: el dashboard solo lee el JSON.
+"""
+
+import hashlib
+import json
+import os
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed, parallel_config
+
+# Filas de prueba para la permutación y repeticiones por característica
+PERMUTATION_ROWS = 5000
+PERMUTATION_REPEATS = 3
+
+# Filas y tamaño de lote para las contribuciones de LightGBM
+CONTRIB_ROWS = 100_000
+CONTRIB_BATCH_ROWS = 10_000
+
+
+def model_version(paths):
+    """
+    Identificador de la versión de un modelo (nombre, tamaño y fecha de sus archivos).
+
+    Args:
+        paths: Archivos o directorios del modelo
+
+    Returns:
+        str: Hash corto; cambia si se reentrena o se vuelve a exportar
+    """
+    digest = hashlib.sha1()
+    for path in paths:
+        files = [os.path.join(path, f) for f in sorted(os.listdir(path))] if os.path.isdir(path) else [path]
+        for file_path in files:
+            if os.path.exists(file_path):
+                stat = os.stat(file_path)
+                digest.update(f"{os.path.basename(file_path)}:{stat.st_size}:{int(stat.st_mtime)}".encode())
+    return digest.hexdigest()[:12]
+
+
+def _loss(task, y_true, y_pred):
+    """RMSE en regresión y tasa de error en clasificación (menor es mejor)."""
+    if task == 'classification':
+        return float(np.mean(np.asarray(y_pred) != y_true))
+    return float(np.sqrt(np.mean((np.asarray(y_pred, dtype=float) - y_true) ** 2)))
+
+
+def _permuted_losses(model, X, y, task, column, repeats, seed):
+    rng = np.random.default_rng(seed)
+    losses = []
+    X_permuted = X.copy()
+    for _ in range(repeats):
+        X_permuted[column] = rng.permutation(X[column].to_numpy())
+        losses.append(_loss(task, y, model.predict(X_permuted)))
+    return losses
+
+
+def permutation_importance(model, X, y, task, repeats=PERMUTATION_REPEATS, n_jobs=1, seed=0):
+    """
+    Importancia por permutación de cada característica, en paralelo por característica.
+
+    Args:
+        model: Modelo con predict
+        X: DataFrame de prueba con las columnas del modelo
+        y: Valores reales
+        task: 'regression' o 'classification'
+        repeats: Permutaciones por característica
+        n_jobs: Hilos
+        seed: Semilla (cada característica usa la suya, así el resultado no depende de n_jobs)
+
+    Returns:
+        dict: baseline_loss y features: característica -> {mean, std} del aumento de la pérdida
+    """
+    y = np.asarray(y)
+    baseline = _loss(task, y, model.predict(X))
+    with parallel_config(backend='threading', n_jobs=n_jobs):
+        losses = Parallel()(delayed(_permuted_losses)(model, X, y, task, column, repeats, seed + i)
+                            for i, column in enumerate(X.columns))
+    features = {}
+    for column, column_losses in zip(X.columns, losses):
+        increase = np.asarray(column_losses) - baseline
+        features[column] = {'mean': float(increase.mean()), 'std': float(increase.std())}
+    return {'baseline_loss': baseline, 'features': features}
+
+
+def lightgbm_booster(model):
+    """Booster de LightGBM de un modelo (LGBMRegressor/Classifier, Booster o BoosterModel) o None."""
+    booster = getattr(model, 'booster_', None) or getattr(model, 'booster', None)
+    if booster is None and hasattr(model, 'dump_model'):
+        booster = model
+    return booster if hasattr(booster, 'dump_model') else None
+
+
+def lightgbm_contributions(booster, X, batch_rows=CONTRIB_BATCH_ROWS):
+    """
+    Contribuciones de LightGBM (pred_contrib) resumidas por característica, calculadas por lotes.
+
+    Returns:
+        dict: expected_value y features: característica -> {mean_abs, mean} (en unidades del
+              margen: USD en regresión, log-odds en clasificación)
+    """
+    n_features = X.shape[1]
+    abs_total = np.zeros(n_features + 1)
+    total = np.zeros(n_features + 1)
+    for start in range(0, len(X), batch_rows):
+        contrib = booster.predict(X.iloc[start:start + batch_rows], pred_contrib=True)
+        abs_total += np.abs(contrib).sum(axis=0)
+        total += contrib.sum(axis=0)
+    rows = max(len(X), 1)
+    return {
+        'expected_value': float(total[-1] / rows),
+        'features': {column: {'mean_abs': float(abs_total[i] / rows), 'mean': float(total[i] / rows)}
+                     for i, column in enumerate(X.columns)},
+    }
+
+
+def analyze_model(model, X, y, task, n_jobs=1, seed=0):
+    """
+    Análisis completo de un modelo sobre un conjunto de prueba.
+
+    Args:
+        model: Modelo con predict
+        X: DataFrame de prueba (se usan las columnas con que se entrenó el modelo)
+        y: Valores reales
+        task: 'regression' o 'classification'
+        n_jobs: Hilos para la permutación
+
+    Returns:
+        dict: feature_names, permutation, contributions (None si no es LightGBM), rows y seconds
+    """
+    start = time.perf_counter()
+    names = getattr(model, 'feature_names_in_', None)
+    feature_names = [str(name) for name in names] if names is not None else list(X.columns)
+    X = X[feature_names]
+    y = np.asarray(y)
+
+    rows = np.random.default_rng(seed).permutation(len(X))[:PERMUTATION_ROWS]
+    X_sample = X.iloc[np.sort(rows)].reset_index(drop=True)
+    permutation = permutation_importance(model, X_sample, y[np.sort(rows)], task, n_jobs=n_jobs, seed=seed)
+
+    booster = lightgbm_booster(model)
+    contributions = lightgbm_contributions(booster, X.iloc[:CONTRIB_ROWS]) if booster is not None else None
+
+    return {
+        'feature_names': feature_names,
+        'task': task,
+        'permutation': permutation,
+        'permutation_rows': int(len(X_sample)),
+        'contributions': contributions,
+        'contribution_rows': int(min(len(X), CONTRIB_ROWS)) if booster is not None else 0,
+        'seconds': time.perf_counter() - start,
+        'computed_at': datetime.now().isoformat(timespec='seconds'),
+    }
+
+
+def analysis_path(directory, model_name):
+    return os.path.join(directory, f"{model_name}_analysis.json")
+
+
+def save_analysis(directory, model_name, version, analysis):
+    """Guarda el análisis de un modelo junto con la versión del modelo analizado."""
+    os.makedirs(directory, exist_ok=True)
+    path = analysis_path(directory, model_name)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump({**analysis, 'model': model_name, 'version': version}, f, indent=2)
+    os.replace(tmp_path, path)
+    return path
+
+
+def load_analysis(directory, model_name, version):
+    """
+    Lee el análisis guardado de un modelo.
+
+    Returns:
+        dict o None si no existe o corresponde a otra versión del modelo
+    """
+    path = analysis_path(directory, model_name)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        analysis = json.load(f)
+    return analysis if analysis.get('version') == version else None
+
+
+def importance_frame(analysis):
+    """
+    Tabla de importancias de un análisis: una fila por característica.
+
+    Returns:
+        DataFrame: feature, permutation_mean, permutation_std y, si hay, contrib_mean_abs y
+                   contrib_mean; ordenada por importancia de permutación
+    """
+    permutation = analysis['permutation']['features']
+    contributions = (analysis.get('contributions') or {}).get('features', {})
+    rows = []
+    for name in analysis['feature_names']:
+        row = {'feature': name, 'permutation_mean': permutation[name]['mean'],
+               'permutation_std': permutation[name]['std']}
+        if name in contributions:
+            row['contrib_mean_abs'] = contributions[name]['mean_abs']
+            row['contrib_mean'] = contributions[name]['mean']
+        rows.append(row)
+    return pd.DataFrame(rows).sort_values('permutation_mean', ascending=False).reset_index(drop=True)
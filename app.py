@@ -6,12 +6,30 @@ import os
 import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
-import folium
-from streamlit_folium import folium_static
-import pydeck as pdk
 from datetime import datetime
-import lightgbm as lgb
 import warnings
+import metrics_utils
+import backend_utils
+import perf_utils
+import sketch_utils
+import od_utils
+import operator_utils
+import display_utils
+import geo_utils
+import quality_utils
+import query_utils
+import raster_utils
+
+# Módulos pesados: se importan al usarlos por primera vez (mapas y modelos)
+folium = perf_utils.lazy_import("folium")
+streamlit_folium = perf_utils.lazy_import("streamlit_folium")
+pdk = perf_utils.lazy_import("pydeck")
+
+# Tiempos por etapa de esta ejecución del script (ver benchmark.py startup)
+perf_utils.start_run()
+
+# Exportación de métricas para Prometheus (solo si NYC_METRICS_PORT está definido)
+metrics_utils.start_http_server()
 
 # Configuración para eliminar warnings
 warnings.filterwarnings('ignore')
@@ -316,18 +334,18 @@ DATA_FOLDER = "data_sampled"
 REQUIRED_COLS = ["pickup_datetime", "hvfhs_license_num", "PULocationID", "DOLocationID", "tips", "driver_pay"]
 
 # Configuración de datos con caching
-@st.cache_data
+@perf_utils.tracked_cache(st.cache_data)
 def load_zone_data():
     """Carga datos de zonas con caching para mejor rendimiento"""
     try:
-        zones_df = pd.read_csv("data/taxi_zone_lookup.csv")
+        zones_df = backend_utils.read_csv("data/taxi_zone_lookup.csv")
         # Aeropuertos: JFK (132), LaGuardia (138), Newark EWR (1)
         airport_zones = [1, 132, 138]
         airport_names = {1: "Newark (EWR)", 132: "JFK", 138: "LaGuardia (LGA)"}
         
         # Cargar coordenadas de centroides para zonas
         try:
-            centroids_df = pd.read_csv("data/taxi_zone_centroids.csv")
+            centroids_df = backend_utils.read_csv("data/taxi_zone_centroids.csv")
             # Combinar datos de zonas con coordenadas
             zones_with_coords = zones_df.merge(centroids_df, on="LocationID", how="left")
             return zones_df, zones_with_coords, airport_zones, airport_names, True
@@ -340,7 +358,8 @@ def load_zone_data():
 zones_df, zones_with_coords, AIRPORT_ZONES, AIRPORT_NAMES, coords_loaded = load_zone_data()
 
 # Mostrar estado de carga solo en modo debug
-if st.sidebar.checkbox("🔧 Modo Debug", value=False):
+debug_mode = st.sidebar.checkbox("🔧 Modo Debug", value=False)
+if debug_mode:
     if zones_df is not None:
         if coords_loaded:
             st.sidebar.success("✅ Datos de zonas y coordenadas cargados")
@@ -350,7 +369,7 @@ if st.sidebar.checkbox("🔧 Modo Debug", value=False):
         st.sidebar.warning("⚠️ Datos de zonas no disponibles")
 
 # Carga optimizada de archivos con caching
-@st.cache_data
+@perf_utils.tracked_cache(st.cache_data)
 def get_available_files():
     """Obtiene lista de archivos disponibles con caching"""
     files = sorted(glob.glob(f"{DATA_FOLDER}/*_reduced.parquet"))
@@ -385,13 +404,15 @@ with st.sidebar:
     </div>
     """, unsafe_allow_html=True)
 
+perf_utils.checkpoint("setup")
+
 # Carga y procesamiento optimizado de datos
-@st.cache_data
+@perf_utils.tracked_cache(st.cache_data)
 def load_and_process_data(file_path):
     """Carga y procesa datos con caching para mejor rendimiento"""
     try:
         # Cargar datos
-        df = pd.read_parquet(file_path)
+        df = backend_utils.read_parquet(file_path)
         
         # Validar columnas requeridas
         missing = [col for col in REQUIRED_COLS if col not in df.columns]
@@ -432,15 +453,25 @@ with st.spinner("🔄 Cargando y procesando datos..."):
     if st.sidebar.checkbox("📊 Info Dataset", value=False):
         st.sidebar.success(f"✅ Dataset cargado: {len(df):,} registros")
         st.sidebar.info(f"📅 Período: {selected_month}")
+        st.sidebar.info(f"🧮 Memoria: {backend_utils.frame_mb(df):.1f} MB (tipos {backend_utils.DTYPE_BACKEND})")
+        st.sidebar.info(f"⚙️ Agregaciones: {query_utils.QUERY_BACKEND}")
+        quality_report = quality_utils.load_report(file_path)
+        if quality_report:
+            st.sidebar.info(f"🧹 Calidad: {quality_report['quarantined_rows']:,} de {quality_report['rows']:,} "
+                            "viajes del mes en cuarentena")
+
+perf_utils.checkpoint("load")
 
 # Unir con zonas si existen
 if zones_df is not None:
-    df = df.merge(zones_df, left_on="PULocationID", right_on="LocationID", how="left")
-    df.rename(columns={"Zone": "pickup_zone", "Borough": "pickup_borough"}, inplace=True)
+    with perf_utils.timer("merge zonas origen", "section"):
+        df = df.merge(zones_df, left_on="PULocationID", right_on="LocationID", how="left")
+        df.rename(columns={"Zone": "pickup_zone", "Borough": "pickup_borough"}, inplace=True)
     
     # Merge para zonas de destino
-    df = df.merge(zones_df, left_on="DOLocationID", right_on="LocationID", how="left", suffixes=("", "_dropoff"))
-    df.rename(columns={"Zone": "dropoff_zone", "Borough": "dropoff_borough"}, inplace=True)
+    with perf_utils.timer("merge zonas destino", "section"):
+        df = df.merge(zones_df, left_on="DOLocationID", right_on="LocationID", how="left", suffixes=("", "_dropoff"))
+        df.rename(columns={"Zone": "dropoff_zone", "Borough": "dropoff_borough"}, inplace=True)
     
     # Asegurarse de que no haya columnas duplicadas
     df = df.loc[:, ~df.columns.duplicated()]
@@ -449,6 +480,75 @@ if zones_df is not None:
     df["from_airport"] = df["PULocationID"].isin(AIRPORT_ZONES)
     df["to_airport"] = df["DOLocationID"].isin(AIRPORT_ZONES)
 
+# Sketches de distribuciones por celda (generados en la ingesta o construidos una vez por archivo)
+@perf_utils.tracked_cache(st.cache_resource)
+def load_partition_sketches(file_path, _df):
+    """Carga los sketches de la partición o los construye si no existen"""
+    path = sketch_utils.sketch_path(file_path)
+    if os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(file_path):
+        try:
+            loaded = sketch_utils.load_sketches(path)
+            if getattr(loaded, "version", None) == sketch_utils.SKETCH_VERSION:
+                return loaded
+        except Exception:
+            pass
+    return sketch_utils.build_sketches(_df)
+
+def sketch_histogram_figure(metric, masks, title, xaxis_title, scale=1.0):
+    """Histograma superpuesto por grupo a partir de los histogramas fijos de los sketches"""
+    fig = go.Figure()
+    for name, mask in masks.items():
+        hist = sketches.histogram(metric, mask).to_frame(scale)
+        fig.add_trace(go.Bar(
+            x=hist["bin_center"],
+            y=hist["count"],
+            width=(hist["bin_right"] - hist["bin_left"]) * 0.9,
+            name=str(name),
+            opacity=0.7
+        ))
+    fig.update_layout(
+        title=title,
+        barmode="overlay",
+        xaxis_title=xaxis_title,
+        yaxis_title="Número de viajes",
+        legend_title_text="Empresa"
+    )
+    return fig
+
+# Matrices origen-destino dispersas (una agregación por archivo, consultas por filtros)
+@perf_utils.tracked_cache(st.cache_resource)
+def load_od_matrix(file_path, _df):
+    """Construye las matrices OD por operador, hora y día de la semana"""
+    return od_utils.build_od_matrix(_df)
+
+# Malla de densidad de recogidas (generada en la ingesta o construida una vez por archivo)
+@perf_utils.tracked_cache(st.cache_resource)
+def load_density_grid(file_path, _df):
+    """Carga la malla de densidad de la partición o la construye si no existe"""
+    path = geo_utils.density_path(file_path)
+    if os.path.isdir(path) and os.path.getmtime(path) >= os.path.getmtime(file_path):
+        try:
+            loaded = geo_utils.DensityGrid.load(path)
+            if loaded.version == geo_utils.DENSITY_VERSION:
+                return loaded
+        except Exception:
+            pass
+    return geo_utils.build_density_grid(_df, geo_utils.zone_coordinates(zones_with_coords))
+
+# Polígonos de las zonas simplificados (se leen y simplifican una vez; después solo la caché)
+@perf_utils.tracked_cache(st.cache_resource)
+def load_zone_geometries():
+    """Carga las geometrías simplificadas de las zonas por nivel de detalle (None si no hay)"""
+    try:
+        names = dict(zip(zones_df["LocationID"], zones_df["Zone"])) if zones_df is not None else None
+        return geo_utils.zone_geometries(names=names)
+    except Exception:
+        return None
+
+sketches = load_partition_sketches(file_path, df)
+od_matrix = load_od_matrix(file_path, df)
+perf_utils.checkpoint("enrichment")
+
 # Filtros disponibles
 operadores = df["hvfhs_license_num"].dropna().unique()
 # Usar una forma más explícita para obtener valores únicos
@@ -512,7 +612,7 @@ with st.sidebar:
         airport_filter = pd.Series([True] * len(df))
 
 # Aplicar filtros de manera optimizada
-@st.cache_data
+@perf_utils.tracked_cache(st.cache_data)
 def apply_filters(df, selected_ops, selected_hours, borough_filter, airport_filter):
     """Aplica filtros de manera optimizada con caching"""
     try:
@@ -529,6 +629,36 @@ def apply_filters(df, selected_ops, selected_hours, borough_filter, airport_filt
 
 # Aplicar filtros
 df_filtered = apply_filters(df, selected_ops, selected_hours, borough_filter, airport_filter)
+metrics_utils.ROWS_SCANNED.inc(len(df), stage="filter")
+metrics_utils.ROWS_SCANNED.inc(len(df_filtered), stage="tabs")
+
+# Misma selección sobre las celdas de los sketches
+sketch_mask = sketches.mask(
+    operators=selected_ops,
+    hours=selected_hours,
+    boroughs=selected_boroughs if len(boroughs) > 0 else None,
+    airport_only=show_airport_only and "from_airport" in df.columns
+)
+
+# Misma selección para el backend de consultas (pandas sobre df_filtered o Polars sobre el Parquet)
+query_filters = query_utils.filter_spec(
+    selected_ops,
+    selected_hours,
+    boroughs=selected_boroughs if len(boroughs) > 0 else None,
+    airport_only=show_airport_only and "from_airport" in df.columns
+)
+
+@perf_utils.tracked_cache(st.cache_data)
+def load_polars_aggregate(file_path, keys, aggs, filters, _zones_df):
+    """Agregación como consulta lazy de Polars sobre el Parquet del mes (con caching por filtros)"""
+    return query_utils.polars_aggregate(file_path, keys, aggs, _zones_df, AIRPORT_ZONES, filters)
+
+def trip_aggregate(keys, aggs):
+    """Agrega los viajes filtrados con el backend de consultas configurado (NYC_QUERY_BACKEND)"""
+    with perf_utils.timer(f"agregación {'/'.join(keys)}", "section"):
+        if query_utils.QUERY_BACKEND == "polars":
+            return load_polars_aggregate(file_path, tuple(keys), aggs, query_filters, zones_df)
+        return query_utils.pandas_aggregate(df_filtered, keys, aggs)
 
 # Validación de datos filtrados
 if len(df_filtered) == 0:
@@ -559,6 +689,8 @@ with st.sidebar:
     if filtered_records < total_records:
         st.info(f"🔍 Filtrado: {total_records - filtered_records:,} registros ocultos")
 
+perf_utils.checkpoint("filter")
+
 # Tabs principales
 tab1, tab2, tab3, tab4, tab5, tab6, tab7 = st.tabs([
     "📊 Resumen", 
@@ -576,7 +708,9 @@ with tab1:
     # KPIs principales con colores consistentes
     col1, col2, col3, col4 = st.columns(4)
     total_trips = len(df_filtered)
-    unique_days = df_filtered["pickup_datetime"].dt.date.nunique()
+    # Conteos de distintos a partir de la unión de los sketches por celda
+    unique_days = sketches.distinct_count("days", sketch_mask)
+    unique_operators = len(sketches.operators(sketch_mask))
     
     # Métrica de Viajes - Azul
     col1.markdown(f"""
@@ -598,7 +732,7 @@ with tab1:
     col3.markdown(f"""
     <div class="metric-container metric-trips">
         <div style="font-size: 0.9rem; color: var(--text-secondary); margin-bottom: 0.5rem;">🏢 Operadores</div>
-        <div class="metric-value">{df_filtered["hvfhs_license_num"].nunique()}</div>
+        <div class="metric-value">{unique_operators}</div>
     </div>
     """, unsafe_allow_html=True)
     
@@ -656,7 +790,7 @@ with tab1:
             xaxis_title="Hora del día",
             yaxis_title="Número de viajes"
         )
-        st.plotly_chart(fig1, width='stretch')
+        display_utils.plotly_chart(fig1, width='stretch')
     
     with col2:
         if "day_name" in df_filtered:
@@ -670,7 +804,7 @@ with tab1:
             xaxis_title="Día de la semana",
             yaxis_title="Número de viajes"
         )
-        st.plotly_chart(fig2, width='stretch')
+        display_utils.plotly_chart(fig2, width='stretch')
     
     # Mapa de calor por hora y día
     st.subheader("🔥 Patrón de viajes por hora y día")
@@ -683,7 +817,7 @@ with tab1:
         day_col = "pickup_weekday"
         day_order = list(range(7))
         
-    heatmap_data = df_filtered.groupby(["pickup_hour", day_col]).size().reset_index(name="trips")
+    heatmap_data = trip_aggregate(["pickup_hour", day_col], {"trips": (None, "size")})
     heatmap_pivot = heatmap_data.pivot(index="pickup_hour", columns=day_col, values="trips").fillna(0)
     
     if day_col == "day_name":
@@ -697,64 +831,59 @@ with tab1:
         title="Mapa de calor: Viajes por hora y día"
     )
     fig_heatmap.update_layout(height=450)
-    st.plotly_chart(fig_heatmap, width='stretch')
+    display_utils.plotly_chart(fig_heatmap, width='stretch')
     
     # Gráfico de tendencia temporal (si hay suficientes días)
     if unique_days > 3:
         st.subheader("📈 Tendencia temporal")
-        # Agrupar por fecha
-        df_filtered["pickup_date"] = df_filtered["pickup_datetime"].dt.date
-        daily_trend = df_filtered.groupby(["pickup_date", "hvfhs_license_num"]).size().reset_index(name="trips")
-        
-        fig_trend = px.line(
-            daily_trend,
-            x="pickup_date",
-            y="trips",
-            color="hvfhs_license_num",
-            markers=True,
-            title="Evolución diaria del número de viajes",
-            labels={"pickup_date": "Fecha", "trips": "Número de viajes", "hvfhs_license_num": "Operador"}
+        # Agregar por intervalo y reducir cada operador a un presupuesto de puntos (LTTB)
+        display_utils.render_timeseries(
+            df_filtered,
+            "pickup_datetime",
+            key="trend_trips",
+            group_col="hvfhs_license_num",
+            title="Evolución del número de viajes",
+            labels={"pickup_datetime": "Fecha", "value": "Número de viajes", "hvfhs_license_num": "Operador"}
         )
-        st.plotly_chart(fig_trend, width='stretch')
     
     # Resumen por operador
     st.subheader("📊 Resumen por operador")
-    op_summary = df_filtered.groupby("hvfhs_license_num").agg({
-        "pickup_datetime": "count",
-        "driver_pay": "sum",
-        "tips": "sum"
-    }).reset_index()
-    op_summary.columns = ["Operador", "Viajes", "Ingresos", "Propinas"]
+    op_summary = trip_aggregate(["hvfhs_license_num"], {
+        "Viajes": ("pickup_datetime", "count"),
+        "Ingresos": ("driver_pay", "sum"),
+        "Propinas": ("tips", "sum"),
+        # Promedios de distancia y duración si están disponibles
+        **{col: (col, "mean") for col in ["trip_miles", "trip_time"] if col in df_filtered.columns}
+    }).rename(columns={"hvfhs_license_num": "Operador"})
     op_summary["Propina Promedio"] = op_summary["Propinas"] / op_summary["Viajes"]
     op_summary["% Propina"] = (op_summary["Propinas"] / op_summary["Ingresos"]) * 100
     
-    # Añadir métricas de distancia y duración si están disponibles
-    if "trip_miles" in df_filtered.columns:
-        op_summary["Distancia Promedio (millas)"] = df_filtered.groupby("hvfhs_license_num")["trip_miles"].mean().values
-    
-    if "trip_time" in df_filtered.columns:
-        op_summary["Duración Promedio (min)"] = df_filtered.groupby("hvfhs_license_num")["trip_time"].mean().values / 60
-    
-    # Formatear valores monetarios y numéricos
-    op_summary["Ingresos"] = op_summary["Ingresos"].apply(lambda x: f"${x:,.2f}")
-    op_summary["Propinas"] = op_summary["Propinas"].apply(lambda x: f"${x:,.2f}")
-    op_summary["Propina Promedio"] = op_summary["Propina Promedio"].apply(lambda x: f"${x:.2f}")
-    op_summary["% Propina"] = op_summary["% Propina"].apply(lambda x: f"{x:.1f}%")
-    
-    if "Distancia Promedio (millas)" in op_summary.columns:
-        op_summary["Distancia Promedio (millas)"] = op_summary["Distancia Promedio (millas)"].apply(lambda x: f"{x:.2f}")
-    
-    if "Duración Promedio (min)" in op_summary.columns:
-        op_summary["Duración Promedio (min)"] = op_summary["Duración Promedio (min)"].apply(lambda x: f"{x:.1f}")
+    # Añadir métricas de distancia y duración al final de la tabla
+    if "trip_miles" in op_summary.columns:
+        op_summary["Distancia Promedio (millas)"] = op_summary.pop("trip_miles")
+    
+    if "trip_time" in op_summary.columns:
+        op_summary["Duración Promedio (min)"] = op_summary.pop("trip_time") / 60
+    
+    # Formato declarativo por columna (se aplica al renderizar, la tabla sigue siendo numérica)
+    op_summary_formats = {
+        "Viajes": display_utils.INTEGER,
+        "Ingresos": display_utils.MONEY,
+        "Propinas": display_utils.MONEY,
+        "Propina Promedio": display_utils.MONEY_UNIT,
+        "% Propina": display_utils.PERCENT,
+        "Distancia Promedio (millas)": display_utils.DECIMAL,
+        "Duración Promedio (min)": display_utils.DECIMAL_1,
+    }
     
-    st.dataframe(op_summary, width='stretch')
+    display_utils.render_table(op_summary, op_summary_formats)
     
     # Distribución geográfica resumida (si hay datos de zonas)
     if "pickup_borough" in df_filtered.columns:
         st.subheader("🗺️ Distribución geográfica")
         
         # Agrupar por distrito (borough)
-        borough_dist = df_filtered.groupby("pickup_borough").size().reset_index(name="trips")
+        borough_dist = trip_aggregate(["pickup_borough"], {"trips": (None, "size")})
         borough_dist = borough_dist.sort_values("trips", ascending=False)
         
         # Calcular porcentajes
@@ -770,9 +899,11 @@ with tab1:
             labels={"pickup_borough": "Distrito", "trips": "Viajes", "Porcentaje": "% del total"}
         )
         fig_geo.update_traces(textposition='inside', textinfo='percent+label')
-        st.plotly_chart(fig_geo, width='stretch')
+        display_utils.plotly_chart(fig_geo, width='stretch')
     
-    st.dataframe(op_summary, width='stretch')
+    display_utils.render_table(op_summary, op_summary_formats)
+
+perf_utils.checkpoint("tab1")
 
 with tab2:
     st.subheader("🕐 Análisis de Horas Pico")
@@ -800,13 +931,11 @@ with tab2:
     
     # Visualización según la vista seleccionada
     if view_by == "Hora del día":
+        # Resumen por hora y operador (alimenta el heatmap y la gráfica de línea)
+        hour_summary = trip_aggregate(["pickup_hour", "hvfhs_license_num"], {value_col: (value_col, agg_func)})
+        
         # Heatmap de horas del día por operador
-        hour_data = df_filtered.pivot_table(
-            index="pickup_hour",
-            columns="hvfhs_license_num",
-            values=value_col,
-            aggfunc=agg_func
-        ).fillna(0)
+        hour_data = hour_summary.pivot(index="pickup_hour", columns="hvfhs_license_num", values=value_col).fillna(0)
         
         fig = px.imshow(
             hour_data,
@@ -814,10 +943,9 @@ with tab2:
             labels=dict(x="Operador", y="Hora del día", color=title_prefix)
         )
         fig.update_layout(title=f"Mapa de calor: {title_prefix} por hora y operador")
-        st.plotly_chart(fig, width='stretch')
+        display_utils.plotly_chart(fig, width='stretch')
         
         # Gráfica de línea por hora
-        hour_summary = df_filtered.groupby(["pickup_hour", "hvfhs_license_num"]).agg({value_col: agg_func}).reset_index()
         fig2 = px.line(
             hour_summary, 
             x="pickup_hour", 
@@ -826,7 +954,7 @@ with tab2:
             markers=True,
             title=f"{title_prefix} por hora del día"
         )
-        st.plotly_chart(fig2, width='stretch')
+        display_utils.plotly_chart(fig2, width='stretch')
         
     elif view_by == "Día de la semana":
         # Heatmap de días de la semana por operador
@@ -855,7 +983,7 @@ with tab2:
             labels=dict(x="Operador", y="Día de la semana", color=title_prefix)
         )
         fig.update_layout(title=f"Mapa de calor: {title_prefix} por día de semana y operador")
-        st.plotly_chart(fig, width='stretch')
+        display_utils.plotly_chart(fig, width='stretch')
         
     else:  # Por zonas
         if "pickup_zone" in df_filtered.columns:
@@ -879,7 +1007,7 @@ with tab2:
                 title=f"Mapa de calor: {title_prefix} por zona y operador (Top 15)",
                 height=800
             )
-            st.plotly_chart(fig, width='stretch')
+            display_utils.plotly_chart(fig, width='stretch')
             
             # Barras por zona
             zone_totals = zone_data.groupby(["pickup_zone", "hvfhs_license_num"]).agg({value_col: agg_func}).reset_index()
@@ -891,7 +1019,7 @@ with tab2:
                 title=f"Top 15 zonas por {title_prefix.lower()}"
             )
             fig2.update_layout(xaxis_tickangle=-45)
-            st.plotly_chart(fig2, width='stretch')
+            display_utils.plotly_chart(fig2, width='stretch')
         else:
             st.warning("No hay datos de zonas disponibles para este análisis.")
     
@@ -918,7 +1046,9 @@ with tab2:
         labels=dict(x="Día de la semana", y="Hora del día", color=title_prefix)
     )
     fig.update_layout(title=f"Mapa de calor: {title_prefix} por hora y día")
-    st.plotly_chart(fig, width='stretch')
+    display_utils.plotly_chart(fig, width='stretch')
+
+perf_utils.checkpoint("tab2")
 
 with tab3:
     st.subheader("🗺️ Visualización Geoespacial")
@@ -930,11 +1060,15 @@ with tab3:
         
         if map_type == "Heatmap de zonas":
             # Contar viajes por zona
-            zone_counts = df_filtered.groupby(["pickup_zone", "pickup_borough"]).size().reset_index(name="trip_count")
+            zone_counts = trip_aggregate(["pickup_zone", "pickup_borough"], {"trip_count": (None, "size")})
             zone_counts = zone_counts.sort_values("trip_count", ascending=False)
             
             # Mostrar tabla de resultados
-            st.dataframe(zone_counts, width='stretch')
+            display_utils.render_table(
+                zone_counts,
+                {"trip_count": display_utils.INTEGER},
+                labels={"pickup_zone": "Zona", "pickup_borough": "Distrito", "trip_count": "Viajes"}
+            )
             
             # Crear gráfico de barras para top zonas
             top_n = st.slider("Mostrar top N zonas:", 5, 30, 15)
@@ -949,166 +1083,192 @@ with tab3:
                 labels={"pickup_zone": "Zona", "trip_count": "Cantidad de Viajes", "pickup_borough": "Distrito"}
             )
             fig.update_layout(xaxis_tickangle=-45)
-            st.plotly_chart(fig, width='stretch')
-              # Crear mapa de burbujas si hay datos de coordenadas disponibles
-            try:
-                if zones_with_coords is not None and "Lat" in zones_with_coords.columns and "Lon" in zones_with_coords.columns:
-                    # Crear mapa base
-                    ny_map = folium.Map(location=[40.7128, -74.0060], zoom_start=11)
-                    
-                    # Normalizar para el tamaño de círculos
-                    max_count = zone_counts["trip_count"].max()
-                    
-                    # Añadir círculos para cada zona
-                    for _, row in zone_counts.iterrows():
-                        # Buscar las coordenadas de la zona
-                        zone_info = zones_with_coords[zones_with_coords["Zone"] == row["pickup_zone"]]
-                        if not zone_info.empty:
-                            zone_info = zone_info.iloc[0]
-                            # Verificar que las coordenadas sean válidas
-                            if zone_info["Lat"] != 0 and zone_info["Lon"] != 0:
-                                folium.Circle(
-                                    location=[zone_info["Lat"], zone_info["Lon"]],
-                                    radius=100 * (row["trip_count"] / max_count) * 2,  # Ajustar tamaño
-                                    color='crimson',
-                                    fill=True,
-                                    fill_color='crimson',
-                                    fill_opacity=0.6,
-                                    tooltip=f"{row['pickup_zone']} ({row['pickup_borough']}): {row['trip_count']} viajes"
-                                ).add_to(ny_map)
-                    
-                    st.subheader("Mapa de concentración de viajes por zona")
-                    folium_static(ny_map)
-                else:
-                    st.info("No hay coordenadas disponibles para crear el mapa. Asegúrate de que el archivo de zonas incluya columnas Lat y Lon.")
-            except Exception as e:
-                st.error(f"Error al crear el mapa: {e}")
-                st.exception(e)  # Mostrar detalles del error
-        
-        else:  # Mapa de densidad
-            st.info("Preparando mapa de densidad...")
-            
-            # Verificar si tenemos datos de lat/lon
-            if "pickup_latitude" in df_filtered.columns and "pickup_longitude" in df_filtered.columns:
-                # Crear muestra si hay muchos datos
-                if len(df_filtered) > 10000:
-                    map_data = df_filtered.sample(10000)
-                else:
-                    map_data = df_filtered
-                
-                # Crear mapa PyDeck
-                layer = pdk.Layer(
-                    "HeatmapLayer",
-                    data=map_data,
-                    get_position=["pickup_longitude", "pickup_latitude"],
-                    opacity=0.9,
-                    get_weight="1",
-                    threshold=0.05,
-                    radius_pixels=50,
-                )
-                
-                # Set the viewport
-                view_state = pdk.ViewState(
-                    longitude=-74.0060,
-                    latitude=40.7128,
-                    zoom=10,
-                    min_zoom=5,
-                    max_zoom=15,
-                    pitch=0,
-                    bearing=0
-                )
-                
-                # Render
-                st.pydeck_chart(pdk.Deck(
-                    map_style="mapbox://styles/mapbox/dark-v10",
-                    initial_view_state=view_state,
-                    layers=[layer],
-                ))
+            display_utils.plotly_chart(fig, width='stretch')
+            # Coropleta de polígonos si hay geometrías de zonas (caché simplificada en disco)
+            zone_geometries = load_zone_geometries()
+            if zone_geometries:
+                st.subheader("Mapa de concentración de viajes por zona")
+                detail = st.select_slider("Detalle de los polígonos:", options=list(zone_geometries), value="Medio", key="zone_detail")
+                trips_by_zone = geo_utils.zone_vector(df_filtered["PULocationID"].to_numpy())
+                fig = geo_utils.choropleth_figure(zone_geometries[detail], trips_by_zone)
+                display_utils.plotly_chart(fig, width='stretch')
+                st.caption(f"{geo_utils.count_vertices(zone_geometries[detail]):,} vértices en "
+                           f"{len(zone_geometries[detail]['features']):,} zonas")
             else:
-                # Intentar usar centroides de zona si no hay datos lat/lon directos
+                # Sin polígonos: círculos en los centroides de zona
                 try:
                     if zones_with_coords is not None and "Lat" in zones_with_coords.columns and "Lon" in zones_with_coords.columns:
-                        # Preparar datos para el mapa
-                        pickup_counts = df_filtered.groupby("PULocationID").size().reset_index(name="count")
+                        # Crear mapa base
+                        ny_map = folium.Map(location=[40.7128, -74.0060], zoom_start=11)
                         
-                        # Unir con las coordenadas
-                        map_data = pickup_counts.merge(zones_with_coords[["LocationID", "Lat", "Lon"]], 
-                                                      left_on="PULocationID", 
-                                                      right_on="LocationID", 
-                                                      how="left")
+                        # Normalizar para el tamaño de círculos
+                        max_count = zone_counts["trip_count"].max()
                         
-                        # Filtrar zonas sin coordenadas válidas
-                        map_data = map_data[(map_data["Lat"] != 0) & (map_data["Lon"] != 0)]
+                        # Añadir círculos para cada zona
+                        for _, row in zone_counts.iterrows():
+                            # Buscar las coordenadas de la zona
+                            zone_info = zones_with_coords[zones_with_coords["Zone"] == row["pickup_zone"]]
+                            if not zone_info.empty:
+                                zone_info = zone_info.iloc[0]
+                                # Verificar que las coordenadas sean válidas
+                                if zone_info["Lat"] != 0 and zone_info["Lon"] != 0:
+                                    folium.Circle(
+                                        location=[zone_info["Lat"], zone_info["Lon"]],
+                                        radius=100 * (row["trip_count"] / max_count) * 2,  # Ajustar tamaño
+                                        color='crimson',
+                                        fill=True,
+                                        fill_color='crimson',
+                                        fill_opacity=0.6,
+                                        tooltip=f"{row['pickup_zone']} ({row['pickup_borough']}): {row['trip_count']} viajes"
+                                    ).add_to(ny_map)
                         
-                        if not map_data.empty:
-                            # Crear capa de mapa
-                            layer = pdk.Layer(
-                                "HeatmapLayer",
-                                data=map_data,
-                                get_position=["Lon", "Lat"],
-                                opacity=0.9,
-                                get_weight="count",
-                                threshold=0.05,
-                                radius_pixels=50,
-                            )
-                            
-                            # Set the viewport
-                            view_state = pdk.ViewState(
-                                longitude=-74.0060,
-                                latitude=40.7128,
-                                zoom=10,
-                                min_zoom=5,
-                                max_zoom=15,
-                                pitch=0,
-                                bearing=0
-                            )
-                            
-                            # Render
-                            st.pydeck_chart(pdk.Deck(
-                                map_style="mapbox://styles/mapbox/dark-v10",
-                                initial_view_state=view_state,
-                                layers=[layer],
-                            ))
-                        else:
-                            st.warning("No hay suficientes datos con coordenadas válidas para crear el mapa de calor.")
+                        st.subheader("Mapa de concentración de viajes por zona")
+                        streamlit_folium.folium_static(ny_map)
                     else:
-                        st.warning("No hay coordenadas disponibles para las zonas.")
+                        st.info("No hay coordenadas disponibles para crear el mapa. Asegúrate de que el archivo de zonas incluya columnas Lat y Lon.")
                 except Exception as e:
-                    st.error(f"Error al crear el mapa de calor: {e}")
+                    st.error(f"Error al crear el mapa: {e}")
                     st.exception(e)  # Mostrar detalles del error
+        
+        else:  # Mapa de densidad
+            # Malla de recogidas precalculada: se suman las porciones de la selección (sin muestreo)
+            density_grid = load_density_grid(file_path, df)
+            if density_grid is None:
+                st.warning("No hay coordenadas disponibles para las zonas.")
+            else:
+                with perf_utils.timer("celdas de densidad", "section"):
+                    map_data = density_grid.cells(density_grid.mask(
+                        operators=selected_ops,
+                        hours=selected_hours,
+                        boroughs=selected_boroughs if len(boroughs) > 0 else None,
+                        airport_only=show_airport_only and "from_airport" in df.columns
+                    ))
+                
+                if not map_data.empty:
+                    weight = st.radio("Ponderar por:", ["Viajes", "Ingresos"], horizontal=True, key="density_weight")
+                    
+                    # Crear capa de mapa
+                    layer = pdk.Layer(
+                        "HeatmapLayer",
+                        data=map_data[["lon", "lat", "count", "revenue"]],
+                        get_position=["lon", "lat"],
+                        opacity=0.9,
+                        get_weight="count" if weight == "Viajes" else "revenue",
+                        threshold=0.05,
+                        radius_pixels=50,
+                    )
+                    
+                    # Set the viewport
+                    view_state = pdk.ViewState(
+                        longitude=-74.0060,
+                        latitude=40.7128,
+                        zoom=10,
+                        min_zoom=5,
+                        max_zoom=15,
+                        pitch=0,
+                        bearing=0
+                    )
+                    
+                    # Render
+                    st.pydeck_chart(pdk.Deck(
+                        map_style="mapbox://styles/mapbox/dark-v10",
+                        initial_view_state=view_state,
+                        layers=[layer],
+                    ))
+                    source = "coordenadas de recogida" if density_grid.meta["source"] == "coordinates" else "centroides de zona"
+                    st.caption(f"{int(map_data['count'].sum()):,} viajes en {len(map_data):,} celdas de "
+                               f"~{density_grid.meta['cell_size'] * 111_000:,.0f} m ({source}).")
+                else:
+                    st.warning("No hay suficientes datos con coordenadas válidas para crear el mapa de calor.")
     
     # Mostrar flujos entre zonas
     st.subheader("🔄 Flujos de viajes entre zonas")
     if "pickup_zone" in df_filtered.columns and "dropoff_zone" in df_filtered.columns:
-        # Calcular los flujos más comunes
-        flows = df_filtered.groupby(["pickup_zone", "dropoff_zone"]).size().reset_index(name="trip_count")
-        flows = flows.sort_values("trip_count", ascending=False)
+        # Cardinalidad de rutas y zonas (unión de sketches, sin recorrer filas)
+        col1, col2 = st.columns(2)
+        col1.metric(
+            "Rutas únicas (PU→DO)",
+            f"{sketches.distinct_count('routes', sketch_mask):,}",
+            help=f"Estimación HyperLogLog, error estándar ±{sketches.distinct_error('routes'):.1%}"
+        )
+        col2.metric("Zonas de recogida únicas", f"{sketches.distinct_count('zones', sketch_mask):,}")
+        
+        # Matrices OD de la selección actual (filtros como máscaras de filas/columnas)
+        od_selection = dict(
+            operators=selected_ops,
+            hours=selected_hours,
+            pickup_zones=(zones_df.loc[zones_df["Borough"].isin(selected_boroughs), "LocationID"]
+                          if len(boroughs) > 0 and selected_boroughs else None),
+            airport_zones=AIRPORT_ZONES if show_airport_only and "from_airport" in df.columns else None
+        )
+        od_counts = od_matrix.select(**od_selection)
+        od_revenue = od_matrix.select(value="revenue", **od_selection)
+        zone_names = zones_df.set_index("LocationID")["Zone"]
+        
+        # Top flujos con argpartition sobre las entradas no nulas
+        flows = od_utils.top_flows(od_counts, 20, revenue=od_revenue)
+        flows.insert(0, "pickup_zone", flows["PULocationID"].map(zone_names))
+        flows.insert(1, "dropoff_zone", flows["DOLocationID"].map(zone_names))
+        flows = flows.drop(columns=["PULocationID", "DOLocationID"])
         
         # Mostrar top flujos
-        st.dataframe(flows.head(20), width='stretch')
+        display_utils.render_table(
+            flows,
+            {"trip_count": display_utils.INTEGER, "revenue": display_utils.MONEY},
+            labels={"pickup_zone": "Origen", "dropoff_zone": "Destino", "trip_count": "Viajes", "revenue": "Ingresos"}
+        )
         
         # Crear gráfico de sankey o red para top flujos
         top_flows = flows.head(15)
+        node_labels, link_source, link_target = od_utils.sankey_links(
+            top_flows["pickup_zone"], top_flows["dropoff_zone"]
+        )
         fig = go.Figure(data=[go.Sankey(
             node=dict(
               pad=15,
               thickness=20,
               line=dict(color="black", width=0.5),
-              label=list(set(top_flows["pickup_zone"].tolist() + top_flows["dropoff_zone"].tolist())),
+              label=node_labels,
             ),
             link=dict(
-              source=[list(set(top_flows["pickup_zone"].tolist() + top_flows["dropoff_zone"].tolist())
-                      ).index(x) for x in top_flows["pickup_zone"]],
-              target=[list(set(top_flows["pickup_zone"].tolist() + top_flows["dropoff_zone"].tolist())
-                      ).index(x) for x in top_flows["dropoff_zone"]],
+              source=link_source,
+              target=link_target,
               value=top_flows["trip_count"],
           ))])
         
         fig.update_layout(title_text="Top 15 Flujos de Viajes entre Zonas", font_size=12)
-        st.plotly_chart(fig, width='stretch')
+        display_utils.plotly_chart(fig, width='stretch')
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            # Agregación a distritos: B^T · M · B sobre la matriz dispersa
+            borough_flows = od_utils.borough_rollup(od_counts, zones_df)
+            borough_flows = borough_flows.loc[borough_flows.sum(axis=1) > 0, borough_flows.sum(axis=0) > 0]
+            fig = px.imshow(
+                borough_flows,
+                labels=dict(x="Distrito de destino", y="Distrito de origen", color="Viajes"),
+                color_continuous_scale="Blues",
+                text_auto=True,
+                title="Flujos entre distritos"
+            )
+            display_utils.plotly_chart(fig, width='stretch')
+        with col2:
+            # Pares con mayor desequilibrio ida/vuelta
+            st.markdown("**Flujos asimétricos (ida − vuelta)**")
+            asymmetric = od_utils.asymmetric_flows(od_counts, 10)
+            asymmetric.insert(0, "pickup_zone", asymmetric["PULocationID"].map(zone_names))
+            asymmetric.insert(1, "dropoff_zone", asymmetric["DOLocationID"].map(zone_names))
+            display_utils.render_table(
+                asymmetric.drop(columns=["PULocationID", "DOLocationID"]),
+                {"forward": display_utils.INTEGER, "backward": display_utils.INTEGER, "net": display_utils.INTEGER},
+                labels={"pickup_zone": "Origen", "dropoff_zone": "Destino", "forward": "Ida",
+                        "backward": "Vuelta", "net": "Neto"}
+            )
     else:
         st.warning("No hay suficiente información de zonas para mostrar flujos de viajes.")
         
+perf_utils.checkpoint("tab3")
+
 with tab4:
     st.subheader("💼 Comparativa Uber vs Lyft")
     
@@ -1149,74 +1309,44 @@ with tab4:
                 font_size=12,
                 legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="center", x=0.5)
             )
-            st.plotly_chart(fig, width='stretch')
+            display_utils.plotly_chart(fig, width='stretch')
             
             # Métricas detalladas en Uber vs Lyft
             st.subheader("⚖️ Comparativa de Métricas Principales")
             
-            metrics_data = []
-            
-            # Recopilar todas las métricas disponibles
-            metrics_to_calculate = {
-                "driver_pay": {"name": "Tarifa Promedio", "format": "${:.2f}", "agg": "mean", "available": False},
-                "tips": {"name": "Propina Promedio", "format": "${:.2f}", "agg": "mean", "available": False},
-                "trip_miles": {"name": "Distancia Promedio", "format": "{:.2f} mi", "agg": "mean", "available": False},
-                "trip_time": {"name": "Duración Promedio", "format": "{:.1f} min", "agg": "mean", "available": False, "divisor": 60},
-                "pickup_datetime": {"name": "Viajes Totales", "format": "{:,.0f}", "agg": "count", "available": False},
-            }
+            # Sumas por empresa en una sola agregación (celdas de los sketches)
+            operator_metrics = operator_utils.compare_operators(
+                uber_lyft, sketches=sketches, mask=sketch_mask, operators=["Uber", "Lyft"]
+            ).set_index("hvfhs_license_num")
             
-            # Verificar qué métricas están disponibles
-            for col, config in metrics_to_calculate.items():
-                if col in uber_lyft.columns:
-                    metrics_to_calculate[col]["available"] = True
-            
-            # Calcular las métricas disponibles
-            for operator in ["Uber", "Lyft"]:
-                operator_data = {"Empresa": operator}
-                operator_subset = uber_lyft[uber_lyft["hvfhs_license_num"] == operator]
-                
-                for col, config in metrics_to_calculate.items():
-                    if config["available"]:
-                        if config["agg"] == "mean":
-                            if "divisor" in config:
-                                value = operator_subset[col].mean() / config["divisor"]
-                            else:
-                                value = operator_subset[col].mean()
-                        elif config["agg"] == "count":
-                            value = len(operator_subset)
-                        else:
-                            value = operator_subset[col].sum()
-                            
-                        operator_data[config["name"]] = config["format"].format(value)
-                
-                metrics_data.append(operator_data)
-            
-            # Crear dataframe para visualizar
-            metrics_df = pd.DataFrame(metrics_data)
-            st.dataframe(metrics_df, width='stretch')
+            # Métricas a mostrar a partir de los promedios por empresa
+            metrics_df = operator_metrics.reindex(
+                columns=["driver_pay_mean", "tips_mean", "trip_miles_mean", "trip_time_mean", "trips"]
+            ).reset_index()
+            metrics_df["trip_time_mean"] = metrics_df["trip_time_mean"] / 60
+            metrics_df.columns = ["Empresa", "Tarifa Promedio", "Propina Promedio", "Distancia Promedio",
+                                  "Duración Promedio", "Viajes Totales"]
+            display_utils.render_table(metrics_df.dropna(axis=1, how="all"), {
+                "Tarifa Promedio": display_utils.MONEY_UNIT,
+                "Propina Promedio": display_utils.MONEY_UNIT,
+                "Distancia Promedio": display_utils.MILES,
+                "Duración Promedio": display_utils.MINUTES,
+                "Viajes Totales": display_utils.INTEGER,
+            })
             
             # Si hay datos de propinas y tarifas, calcular la tasa de propinas
             if "tips" in uber_lyft.columns and "driver_pay" in uber_lyft.columns:
                 st.subheader("💸 Análisis de Propinas")
                 
-                tip_analysis = uber_lyft.groupby("hvfhs_license_num").agg({
-                    "tips": ["mean", "sum", lambda x: (x > 0).mean() * 100],
-                    "driver_pay": "sum"
-                }).reset_index()
-                
-                tip_analysis.columns = ["Empresa", "Propina Promedio", "Propinas Totales", "% Viajes con Propina", "Ingresos Totales"]
-                tip_analysis["% sobre Ingresos"] = (tip_analysis["Propinas Totales"] / tip_analysis["Ingresos Totales"] * 100).round(2)
-                
-                # Formatear columnas
-                tip_analysis["Propina Promedio"] = tip_analysis["Propina Promedio"].apply(lambda x: f"${x:.2f}")
-                tip_analysis["Propinas Totales"] = tip_analysis["Propinas Totales"].apply(lambda x: f"${x:,.2f}")
-                tip_analysis["% Viajes con Propina"] = tip_analysis["% Viajes con Propina"].apply(lambda x: f"{x:.1f}%")
-                tip_analysis["% sobre Ingresos"] = tip_analysis["% sobre Ingresos"].apply(lambda x: f"{x:.2f}%")
-                tip_analysis["Ingresos Totales"] = tip_analysis["Ingresos Totales"].apply(lambda x: f"${x:,.2f}")
+                tip_analysis = operator_metrics[["tips_mean", "tip_rate", "tip_share"]].reset_index()
+                tip_analysis.columns = ["Empresa", "Propina Promedio", "% Viajes con Propina", "% sobre Ingresos"]
                 
                 # Mostrar tabla de análisis de propinas
-                st.dataframe(tip_analysis[["Empresa", "Propina Promedio", "% Viajes con Propina", "% sobre Ingresos"]], 
-                            width='stretch')
+                display_utils.render_table(tip_analysis, {
+                    "Propina Promedio": display_utils.MONEY_UNIT,
+                    "% Viajes con Propina": display_utils.PERCENT,
+                    "% sobre Ingresos": display_utils.PERCENT_2,
+                })
                 
                 # Histograma de distribución de propinas
                 uber_lyft_with_tips = uber_lyft[uber_lyft["tips"] > 0].copy()
@@ -1237,7 +1367,7 @@ with tab4:
                         color_discrete_map={"Uber": "#276EF1", "Lyft": "#FF00BF"}
                     )
                     fig_hist.update_layout(legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="center", x=0.5))
-                    st.plotly_chart(fig_hist, width='stretch')
+                    display_utils.plotly_chart(fig_hist, width='stretch')
         
         # --- SEGUNDA COLUMNA: PATRONES DE VIAJE ---
         with col2:
@@ -1261,32 +1391,26 @@ with tab4:
                     font_size=12,
                     legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="center", x=0.5)
                 )
-                st.plotly_chart(fig, width='stretch')
+                display_utils.plotly_chart(fig, width='stretch')
             
             # Comparativa por precio/milla y precio/minuto
             if all(col in uber_lyft.columns for col in ["driver_pay", "trip_miles", "trip_time"]):
                 st.subheader("📊 Eficiencia por Distancia y Tiempo")
                 
                 # Calcular métricas de eficiencia
-                efficiency = uber_lyft.groupby("hvfhs_license_num").apply(
-                    lambda x: pd.Series({
-                        "price_per_mile": x["driver_pay"].sum() / x["trip_miles"].sum(),
-                        "price_per_minute": x["driver_pay"].sum() / (x["trip_time"].sum() / 60),
-                        "miles_per_minute": (x["trip_miles"].sum() / (x["trip_time"].sum() / 60)),
-                    })
-                ).reset_index()
-                
-                # Crear dataframe para mostrar
-                efficiency_formatted = efficiency.copy()
-                efficiency_formatted["price_per_mile"] = efficiency_formatted["price_per_mile"].apply(lambda x: f"${x:.2f}/mi")
-                efficiency_formatted["price_per_minute"] = efficiency_formatted["price_per_minute"].apply(lambda x: f"${x:.2f}/min")
-                efficiency_formatted["miles_per_minute"] = efficiency_formatted["miles_per_minute"].apply(lambda x: f"{x:.2f} mi/min")
-                
-                # Cambiar nombres de columnas
-                efficiency_formatted.columns = ["Empresa", "Precio por Milla", "Precio por Minuto", "Velocidad Promedio"]
-                
-                # Mostrar tabla de eficiencia
-                st.dataframe(efficiency_formatted, width='stretch')
+                efficiency = operator_metrics[["price_per_mile", "price_per_minute", "miles_per_minute"]].reset_index()
+                
+                # Mostrar tabla de eficiencia (valores numéricos, formato por columna)
+                display_utils.render_table(
+                    efficiency,
+                    {
+                        "price_per_mile": display_utils.PER_MILE,
+                        "price_per_minute": display_utils.PER_MINUTE,
+                        "miles_per_minute": display_utils.MILES_PER_MINUTE,
+                    },
+                    labels={"hvfhs_license_num": "Empresa", "price_per_mile": "Precio por Milla",
+                            "price_per_minute": "Precio por Minuto", "miles_per_minute": "Velocidad Promedio"}
+                )
                 
                 # Gráfica comparativa de barras
                 fig_bar = go.Figure()
@@ -1310,7 +1434,7 @@ with tab4:
                     uniformtext_minsize=8,
                     uniformtext_mode="hide"
                 )
-                st.plotly_chart(fig_bar, width='stretch')
+                display_utils.plotly_chart(fig_bar, width='stretch')
     
     # Análisis por zona geográfica
     st.subheader("🌆 Concentración por Zonas")
@@ -1342,7 +1466,7 @@ with tab4:
             xaxis_tickangle=-45,
             legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="center", x=0.5)
         )
-        st.plotly_chart(fig_zones, width='stretch')
+        display_utils.plotly_chart(fig_zones, width='stretch')
         
         # Calcular dominancia por zona (qué empresa domina en cada zona)
         zone_dominance = zone_distribution.pivot(index="pickup_zone", columns="hvfhs_license_num", values="viajes").fillna(0)
@@ -1372,7 +1496,7 @@ with tab4:
                 aspect="auto"
             )
             fig_heatmap.update_layout(height=500)
-            st.plotly_chart(fig_heatmap, width='stretch')
+            display_utils.plotly_chart(fig_heatmap, width='stretch')
     else:
         st.warning("No hay datos de zonas disponibles para realizar este análisis.")
      
@@ -1399,7 +1523,7 @@ with tab4:
         legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="center", x=0.5)
     )
     
-    st.plotly_chart(fig_hourly, width='stretch')
+    display_utils.plotly_chart(fig_hourly, width='stretch')
     
     # Análisis de cuotas de mercado por hora
     hourly_pivot = hourly_trips.pivot_table(index="pickup_hour", columns="hvfhs_license_num", values="viajes").fillna(0)
@@ -1443,7 +1567,7 @@ with tab4:
         legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="center", x=0.5)
     )
     
-    st.plotly_chart(fig_share, width='stretch')
+    display_utils.plotly_chart(fig_share, width='stretch')
     
     # Comparativa por día de la semana
     st.subheader("📅 Patrones por Día de la Semana")
@@ -1477,7 +1601,7 @@ with tab4:
         legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="center", x=0.5)
     )
     
-    st.plotly_chart(fig_daily, width='stretch')
+    display_utils.plotly_chart(fig_daily, width='stretch')
     
     # Si hay datos de aeropuertos, analizar las diferencias en viajes desde/hacia aeropuertos
     if "to_airport" in uber_lyft.columns and "from_airport" in uber_lyft.columns:
@@ -1515,7 +1639,7 @@ with tab4:
             legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="center", x=0.5)
         )
         
-        st.plotly_chart(fig_airport, width='stretch')
+        display_utils.plotly_chart(fig_airport, width='stretch')
         
         # Calcular participación de mercado en viajes a/desde aeropuertos
         airport_share = uber_lyft[uber_lyft[airport_col] == 1].groupby("hvfhs_license_num").size().reset_index(name="viajes")
@@ -1539,7 +1663,9 @@ with tab4:
                 pull=[0.03, 0.03]
             )
             
-            st.plotly_chart(fig_airport_share, width='stretch')
+            display_utils.plotly_chart(fig_airport_share, width='stretch')
+
+perf_utils.checkpoint("tab4")
 
 with tab5:
     st.subheader("💰 Análisis de Ingresos e Impuestos")
@@ -1609,13 +1735,13 @@ with tab5:
             title="Distribución de Ingresos y Cargos",
             hole=0.4
         )
-        st.plotly_chart(fig1, width='stretch')
+        display_utils.plotly_chart(fig1, width='stretch')
         
         # Análisis por empresa
         st.subheader("Análisis por Empresa")
         
         # Agrupar por empresa
-        income_by_company = df_filtered.groupby("hvfhs_license_num")[available_cols].sum().reset_index()
+        income_by_company = trip_aggregate(["hvfhs_license_num"], {col: (col, "sum") for col in available_cols})
         
         # Crear gráfico de barras apiladas para ver la composición por empresa
         fig2 = px.bar(
@@ -1625,27 +1751,23 @@ with tab5:
             title="Composición de Ingresos por Empresa",
             labels={"hvfhs_license_num": "Empresa", "value": "Monto ($)", "variable": "Concepto"}
         )
-        st.plotly_chart(fig2, width='stretch')
+        display_utils.plotly_chart(fig2, width='stretch')
         
         # Análisis temporal si hay muchos días
-        if df_filtered["pickup_datetime"].dt.date.nunique() > 3:
+        if unique_days > 3:
             st.subheader("Análisis Temporal de Ingresos")
             
-            # Agrupar por fecha
-            df_filtered["pickup_date"] = df_filtered["pickup_datetime"].dt.date
-            daily_income = df_filtered.groupby(["pickup_date", "hvfhs_license_num"])["driver_pay"].sum().reset_index()
-            
-            # Gráfico de tendencia
-            fig3 = px.line(
-                daily_income,
-                x="pickup_date",
-                y="driver_pay",
-                color="hvfhs_license_num",
-                markers=True,
-                title="Evolución de Ingresos Diarios",
-                labels={"pickup_date": "Fecha", "driver_pay": "Ingresos ($)", "hvfhs_license_num": "Empresa"}
+            # Gráfico de tendencia (agregado por intervalo y reducido con LTTB)
+            display_utils.render_timeseries(
+                df_filtered,
+                "pickup_datetime",
+                key="trend_income",
+                value_col="driver_pay",
+                how="sum",
+                group_col="hvfhs_license_num",
+                title="Evolución de Ingresos",
+                labels={"pickup_datetime": "Fecha", "value": "Ingresos ($)", "hvfhs_license_num": "Empresa"}
             )
-            st.plotly_chart(fig3, width='stretch')
         
         # Análisis de relación entre variables
         if {"driver_pay", "tips"}.issubset(available_cols):
@@ -1657,32 +1779,92 @@ with tab5:
             # Filtrar datos válidos
             valid_tips = df_filtered[(df_filtered["tip_percent"] <= 100) & (df_filtered["tip_percent"] >= 0)]
             
-            # Scatter plot
-            fig4 = px.scatter(
-                valid_tips,
-                x="driver_pay",
-                y="tips",
-                color="hvfhs_license_num",
-                opacity=0.6,
-                trendline="ols",
-                title="Relación entre Tarifa y Propina",
-                labels={"driver_pay": "Tarifa ($)", "tips": "Propina ($)", "hvfhs_license_num": "Empresa"}
+            # Densidad rasterizada en el servidor: O(filas) aquí y tamaño constante en el navegador
+            relations = {"tips": ("driver_pay", "tips", "Tarifa ($)", "Propina ($)", "Relación entre Tarifa y Propina")}
+            if "trip_miles" in df_filtered.columns:
+                relations["trip_miles"] = ("trip_miles", "driver_pay", "Distancia (millas)", "Tarifa ($)",
+                                           "Relación entre Distancia y Tarifa")
+            col1, col2 = st.columns(2)
+            relation = col1.radio("Relación", list(relations), horizontal=True,
+                                  format_func=lambda r: "Tarifa vs. propina" if r == "tips" else "Distancia vs. tarifa")
+            x_col, y_col, x_title, y_title, density_title = relations[relation]
+            density_rows = valid_tips if relation == "tips" else df_filtered
+            
+            with perf_utils.timer("densidad 2D", "section", rows=len(density_rows)):
+                x_values = density_rows[x_col].to_numpy(dtype=float)
+                y_values = density_rows[y_col].to_numpy(dtype=float)
+                operators = density_rows["hvfhs_license_num"].to_numpy()
+                grid = raster_utils.density_grid(x_values, y_values, operators)
+                trendlines = {}
+                for operator in grid["channels"][1:]:
+                    fit = raster_utils.linear_fit(x_values[operators == operator], y_values[operators == operator])
+                    if fit is not None:
+                        trendlines[operator] = fit
+            
+            channel = col2.selectbox("Operador", grid["channels"], key="density_channel")
+            fig4 = raster_utils.density_figure(
+                grid,
+                channel,
+                title=density_title,
+                x_title=x_title,
+                y_title=y_title,
+                trendlines=trendlines if channel == "Total" else {k: v for k, v in trendlines.items() if k == channel}
             )
-            st.plotly_chart(fig4, width='stretch')
+            display_utils.plotly_chart(fig4, width='stretch')
+            st.caption(f"{grid['rows']:,} viajes en una malla de {grid['counts'].shape[1]}×{grid['counts'].shape[2]} celdas "
+                       f"(escala logarítmica); {grid['outside']:,} quedan fuera del rango mostrado (percentil "
+                       f"{raster_utils.RANGE_QUANTILE * 100:.1f}).")
             
-            # Distribución del porcentaje de propina
-            fig5 = px.histogram(
-                valid_tips,
-                x="tip_percent",
-                color="hvfhs_license_num",
-                nbins=50,
-                opacity=0.7,
-                barmode="overlay",
-                title="Distribución del Porcentaje de Propina",
-                labels={"tip_percent": "Porcentaje de Propina (%)", "hvfhs_license_num": "Empresa"}
+            # Distribución del porcentaje de propina (histogramas fijos de los sketches)
+            fig5 = sketch_histogram_figure(
+                "tip_percent",
+                sketches.by("hvfhs_license_num", sketch_mask),
+                "Distribución del Porcentaje de Propina",
+                "Porcentaje de Propina (%)"
             )
-            fig5.update_layout(bargap=0.1)
-            st.plotly_chart(fig5, width='stretch')
+            display_utils.plotly_chart(fig5, width='stretch')
+        
+        # Distribuciones y percentiles a partir de los sketches
+        metric_labels = {
+            "driver_pay": ("Pago al Conductor ($)", 1),
+            "tips": ("Propinas ($)", 1),
+            "trip_miles": ("Distancia (millas)", 1),
+            "trip_time": ("Duración (min)", 60)
+        }
+        sketch_metrics = [m for m in metric_labels if m in sketches.metrics]
+        
+        if sketch_metrics:
+            st.subheader("Distribución de Métricas por Empresa")
+            
+            dist_metric = st.selectbox(
+                "Métrica:",
+                sketch_metrics,
+                format_func=lambda m: metric_labels[m][0]
+            )
+            label, scale = metric_labels[dist_metric]
+            operator_masks = sketches.by("hvfhs_license_num", sketch_mask)
+            
+            fig6 = sketch_histogram_figure(dist_metric, operator_masks, f"Distribución de {label}", label, scale)
+            display_utils.plotly_chart(fig6, width='stretch')
+            
+            # Tabla de percentiles por empresa
+            percentiles = [0.1, 0.25, 0.5, 0.75, 0.9, 0.99]
+            percentile_rows = []
+            for operator, op_mask in operator_masks.items():
+                op_sketch = sketches.quantile_sketch(dist_metric, op_mask)
+                row = {"Empresa": operator, "Viajes": op_sketch.count, "Promedio": op_sketch.mean / scale}
+                for p, value in zip(percentiles, op_sketch.quantile(percentiles)):
+                    row[f"P{int(p * 100)}"] = value / scale
+                percentile_rows.append(row)
+            
+            percentile_df = pd.DataFrame(percentile_rows)
+            display_utils.render_table(percentile_df, {
+                column: display_utils.INTEGER if column == "Viajes" else display_utils.DECIMAL
+                for column in percentile_df.columns if column != "Empresa"
+            })
+            st.caption(f"Percentiles estimados con sketches mergeables (error relativo ≤ {sketches.relative_accuracy:.0%}).")
+
+perf_utils.checkpoint("tab5")
 
 with tab6:
     st.subheader("✈️ Análisis de Viajes a Aeropuertos")
@@ -1803,7 +1985,7 @@ with tab6:
                 )
                 
                 fig1.update_traces(textinfo="percent+label")
-                st.plotly_chart(fig1, width='stretch')
+                display_utils.plotly_chart(fig1, width='stretch')
                 
                 # Distribución por hora del día
                 st.subheader("Distribución por Hora del Día")
@@ -1849,7 +2031,7 @@ with tab6:
                 fig2.update_yaxes(title_text="Número de Viajes", secondary_y=False)
                 fig2.update_yaxes(title_text="% del Total de Viajes", secondary_y=True)
                 
-                st.plotly_chart(fig2, width='stretch')
+                display_utils.plotly_chart(fig2, width='stretch')
                 
                 # Si hay datos de aeropuertos específicos
                 if "DOLocationID" in df_filtered.columns and AIRPORT_ZONES:
@@ -1877,7 +2059,7 @@ with tab6:
                         )
                         
                         fig3.update_traces(textposition='inside', textinfo='percent+label')
-                        st.plotly_chart(fig3, width='stretch')
+                        display_utils.plotly_chart(fig3, width='stretch')
         
         # TAB 2: VIAJES DESDE AEROPUERTOS
         with airport_tabs[1]:
@@ -1938,7 +2120,7 @@ with tab6:
                 )
                 
                 fig1.update_traces(textinfo="percent+label")
-                st.plotly_chart(fig1, width='stretch')
+                display_utils.plotly_chart(fig1, width='stretch')
                 
                 # Distribución por hora del día
                 st.subheader("Distribución por Hora del Día")
@@ -1984,7 +2166,7 @@ with tab6:
                 fig2.update_yaxes(title_text="Número de Viajes", secondary_y=False)
                 fig2.update_yaxes(title_text="% del Total de Viajes", secondary_y=True)
                 
-                st.plotly_chart(fig2, width='stretch')
+                display_utils.plotly_chart(fig2, width='stretch')
                 
                 # Si hay datos de aeropuertos específicos
                 if "PULocationID" in df_filtered.columns and AIRPORT_ZONES:
@@ -2012,7 +2194,7 @@ with tab6:
                         )
                         
                         fig3.update_traces(textposition='inside', textinfo='percent+label')
-                        st.plotly_chart(fig3, width='stretch')
+                        display_utils.plotly_chart(fig3, width='stretch')
         
         # TAB 3: ANÁLISIS COMBINADO
         with airport_tabs[2]:
@@ -2041,38 +2223,55 @@ with tab6:
                 )
                 
                 fig1.update_traces(texttemplate='%{text:,}', textposition='outside')
-                st.plotly_chart(fig1, width='stretch')
+                display_utils.plotly_chart(fig1, width='stretch')
                 
                 # Comparación de tarifas
                 if "driver_pay" in df_filtered.columns:
                     st.subheader("Comparación de Tarifas")
                     
-                    # Crear DataFrame para comparación
-                    fare_comparison = pd.DataFrame({
-                        "Tipo": ["Hacia Aeropuertos"] * len(to_airport_trips) + ["Desde Aeropuertos"] * len(from_airport_trips),
-                        "Tarifa": list(to_airport_trips["driver_pay"]) + list(from_airport_trips["driver_pay"])
-                    })
+                    # Sketches de tarifas por dirección (sin copiar filas)
+                    fare_sketches = {
+                        "Hacia Aeropuertos": sketches.quantile_sketch("driver_pay", sketch_mask & sketches.airport_mask("to")),
+                        "Desde Aeropuertos": sketches.quantile_sketch("driver_pay", sketch_mask & sketches.airport_mask("from"))
+                    }
                     
                     # Mostrar estadísticas
                     col1, col2 = st.columns(2)
                     
                     with col1:
-                        st.dataframe(
-                            fare_comparison.groupby("Tipo")["Tarifa"].describe().round(2),
-                            use_container_width=True
+                        fare_stats = sketch_utils.describe_sketches(fare_sketches)
+                        fare_stats.index.name = "Tipo"
+                        display_utils.render_table(
+                            fare_stats,
+                            {column: display_utils.INTEGER if column == "count" else display_utils.MONEY_UNIT
+                             for column in fare_stats.columns},
+                            hide_index=False
                         )
                     
                     with col2:
-                        fig2 = px.box(
-                            fare_comparison,
-                            x="Tipo",
-                            y="Tarifa",
+                        fig2 = go.Figure()
+                        for (fare_type, fare_sketch), color in zip(fare_sketches.items(), ["#FF9800", "#4CAF50"]):
+                            if fare_sketch.count == 0:
+                                continue
+                            box = fare_sketch.box_stats()
+                            fig2.add_trace(go.Box(
+                                x=[fare_type],
+                                q1=[box["q1"]],
+                                median=[box["median"]],
+                                q3=[box["q3"]],
+                                lowerfence=[box["lowerfence"]],
+                                upperfence=[box["upperfence"]],
+                                mean=[box["mean"]],
+                                name=fare_type,
+                                marker_color=color
+                            ))
+                        
+                        fig2.update_layout(
                             title="Distribución de Tarifas por Tipo de Viaje",
-                            color="Tipo",
-                            color_discrete_sequence=["#FF9800", "#4CAF50"]
+                            xaxis_title="Tipo",
+                            yaxis_title="Tarifa"
                         )
-                        
-                        st.plotly_chart(fig2, width='stretch')
+                        display_utils.plotly_chart(fig2, width='stretch')
                 
                 # Análisis temporal
                 if "day_name" in df_filtered.columns:
@@ -2116,7 +2315,9 @@ with tab6:
                         legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="center", x=0.5)
                     )
                     
-                    st.plotly_chart(fig3, width='stretch')
+                    display_utils.plotly_chart(fig3, width='stretch')
+
+perf_utils.checkpoint("tab6")
 
 with tab7:
     st.subheader("🤖 Modelos Predictivos y de Clasificación")
@@ -2134,6 +2335,8 @@ with tab7:
     # Verificar si los modelos están disponibles
     try:
         import model_utils
+        import surface_utils
+        import analysis_utils
         available_models = model_utils.get_available_models()
         
         if available_models:
@@ -2142,16 +2345,41 @@ with tab7:
             
             # Información de modelos en expander
             with st.expander("Ver detalles de modelos disponibles"):
-                for model_name, model_info in available_models.items():
-                    col1, col2, col3 = st.columns(3)
-                    with col1:
-                        st.write(f"**{model_name.replace('_', ' ').title()}**")
-                    with col2:
-                        model_type = "Red Neuronal" if model_info['type'] == 'neural_network' else "Modelo Tradicional"
-                        st.write(f"Tipo: {model_type}")
-                    with col3:
-                        if 'performance' in model_info:
-                            st.write(f"Performance: {model_info['performance']:.3f}")
+                measure = st.checkbox("⏱️ Medir carga y latencia en este servidor", value=False,
+                                      help="Carga cada modelo una vez para medir su tiempo de carga y su latencia")
+                models_info = model_utils.get_model_info(profile=measure)['models']
+                info_df = pd.DataFrame([
+                    {"model": name, "tech": info['tech'], "rmse": info['rmse'], "accuracy": info['accuracy'],
+                     "size_mb": info['size_mb'], "load_ms": info['load_ms'], "p99_ms": info['p99_ms'],
+                     "shared": "Sí" if info['shared'] else "No", "resident_mb": info['resident_mb'],
+                     "shared_mb": info['shared_mb']}
+                    for name, info in models_info.items()
+                ]).sort_values("model")
+                numeric = ["rmse", "accuracy", "size_mb", "load_ms", "p99_ms", "resident_mb", "shared_mb"]
+                info_df[numeric] = info_df[numeric].apply(pd.to_numeric, errors="coerce")
+                info_df["accuracy"] = info_df["accuracy"] * 100
+                display_utils.render_table(
+                    info_df,
+                    {"rmse": display_utils.DECIMAL, "accuracy": display_utils.PERCENT_2,
+                     "size_mb": "%.2f MB", "load_ms": "%.1f ms", "p99_ms": "%.2f ms",
+                     "resident_mb": "%.2f MB", "shared_mb": "%.2f MB"},
+                    labels={"model": "Modelo", "tech": "Tecnología", "rmse": "RMSE", "accuracy": "Precisión",
+                            "size_mb": "Tamaño", "load_ms": "Carga", "p99_ms": "Latencia p99 (1 fila)",
+                            "shared": "Mapeado (compartible)", "resident_mb": "Memoria residente",
+                            "shared_mb": "Memoria compartida"},
+                )
+                if measure:
+                    st.caption("Los modelos mapeados solo ocupan las páginas leídas; la memoria compartida "
+                               "es la que también usan otros procesos del servidor.")
+                
+                # Modelo más rápido dentro de una tolerancia de error respecto al mejor
+                # (los formularios lo usan como modelo por defecto)
+                tolerance = st.slider("Tolerancia de error frente al mejor modelo (%)", 0, 20, 5) / 100
+                fastest_fare_model = model_utils.select_fastest_model('driver_pay', tolerance, profile=measure)
+                fastest_airport_model = model_utils.select_fastest_model('airport', tolerance, profile=measure)
+                col1, col2 = st.columns(2)
+                col1.metric("Tarifa: modelo recomendado", fastest_fare_model or "—")
+                col2.metric("Aeropuertos: modelo recomendado", fastest_airport_model or "—")
             
             # Crear tabs para diferentes funcionalidades
             pred_tabs = st.tabs(["Predicción de Tarifa", "Clasificación de Aeropuertos", "Análisis de Features"])
@@ -2166,6 +2394,9 @@ with tab7:
                 El modelo considera factores como distancia, duración, hora del día, y empresa.
                 """)
                 
+                # Superficie precalculada (si existe): interpolación en lugar de predecir
+                fare_surface = model_utils.load_fare_surface()
+                
                 # Formulario para ingresar datos
                 with st.form("fare_prediction_form"):
                     col1, col2 = st.columns(2)
@@ -2176,7 +2407,6 @@ with tab7:
                         pickup_hour = st.slider("Hora de recogida", min_value=0, max_value=23, value=12)
                         
                     with col2:
-                        company = st.selectbox("Empresa", options=["Uber", "Lyft", "Via", "Juno"], index=0)
                         pickup_weekday = st.selectbox("Día de la semana", 
                                                     options=["Lunes", "Martes", "Miércoles", "Jueves", "Viernes", "Sábado", "Domingo"],
                                                     index=0)
@@ -2185,28 +2415,29 @@ with tab7:
                         weekday_map = {"Lunes": 0, "Martes": 1, "Miércoles": 2, "Jueves": 3, 
                                      "Viernes": 4, "Sábado": 5, "Domingo": 6}
                         weekday_num = weekday_map[pickup_weekday]
+                        
+                        # Borough de recogida (solo si la superficie distingue boroughs)
+                        pickup_borough = None
+                        if fare_surface is not None and fare_surface.boroughs != [surface_utils.ALL_BOROUGHS]:
+                            pickup_borough = st.selectbox("Borough de recogida", options=fare_surface.boroughs)
                     
-                    # Selector de modelo
-                    fare_models = [name for name, info in available_models.items() if 'fare' in name.lower()]
+                    # Selector de modelo (por defecto el de la superficie precalculada o el más rápido
+                    # dentro de la tolerancia)
+                    fare_models = sorted(name for name in available_models if name.startswith('driver_pay'))
                     if fare_models:
-                        selected_model = st.selectbox("Modelo a usar", options=fare_models, 
+                        default_model = fare_surface.model_name if fare_surface is not None else fastest_fare_model
+                        selected_model = st.selectbox("Modelo a usar", options=fare_models,
+                                                    index=fare_models.index(default_model) if default_model in fare_models else 0,
                                                     format_func=lambda x: x.replace('_', ' ').title())
                     
                     submitted = st.form_submit_button("Predecir Tarifa")
                 
                 if submitted and fare_models:
-                    # Crear DataFrame con las características
-                    predict_df = pd.DataFrame({
-                        'trip_miles': [trip_distance],
-                        'trip_time': [trip_duration * 60],  # convertir a segundos
-                        'pickup_hour': [pickup_hour],
-                        'pickup_weekday': [weekday_num],
-                        'hvfhs_license_num': [company],
-                    })
-                    
                     # Realizar predicción
                     try:
-                        predicted_fare = model_utils.predict_fare(predict_df, selected_model)
+                        estimate = model_utils.estimate_fare(trip_distance, trip_duration, pickup_hour, weekday_num,
+                                                             pickup_borough, selected_model)
+                        predicted_fare = estimate['fare'] if estimate is not None else None
                         
                         if predicted_fare is not None:
                             # Mostrar predicción
@@ -2216,6 +2447,11 @@ with tab7:
                             model_info = available_models[selected_model]
                             model_type = "Red Neuronal" if model_info['type'] == 'neural_network' else "Modelo Tradicional"
                             st.info(f"Predicción realizada con: {selected_model.replace('_', ' ').title()} ({model_type})")
+                            if estimate['source'] == 'surface':
+                                st.caption(f"⚡ Interpolada en la superficie precalculada en {estimate['elapsed_ms'] * 1000:.0f} µs "
+                                           f"(error máximo de interpolación medido: ${estimate['max_error']:.2f})")
+                            else:
+                                st.caption(f"🤖 Calculada con el modelo en {estimate['elapsed_ms']:.1f} ms")
                             
                             # Visualizar con un medidor
                             if predicted_fare <= 100:
@@ -2239,7 +2475,7 @@ with tab7:
                                         }
                                     }
                                 ))
-                                st.plotly_chart(fig, use_container_width=True)
+                                display_utils.plotly_chart(fig, use_container_width=True)
                             else:
                                 st.warning(f"La tarifa estimada (${predicted_fare:.2f}) es muy alta. Verifica los datos ingresados.")
                         else:
@@ -2251,131 +2487,203 @@ with tab7:
                 elif submitted:
                     st.error("No hay modelos de predicción de tarifas disponibles.")
         
-        # Tab 2: Clasificación de Aeropuertos
-        with pred_tabs[1]:
-            st.subheader("Clasificador de Viajes a Aeropuertos")
+            # Tab 2: Clasificación de Aeropuertos
+            with pred_tabs[1]:
+                st.subheader("Clasificador de Viajes a Aeropuertos")
             
-            # Explicación
-            st.info("""
-            Este modelo clasifica si un viaje tiene como destino un aeropuerto en función de sus características.
-            Ingresa los detalles del viaje para obtener una clasificación y la probabilidad asociada.
-            """)
+                # Explicación
+                st.info("""
+                Este modelo clasifica si un viaje tiene como destino un aeropuerto en función de sus características.
+                Ingresa los detalles del viaje para obtener una clasificación y la probabilidad asociada.
+                """)
             
-            # Formulario para ingresar características
-            with st.form("airport_classification_form"):
-                col1, col2 = st.columns(2)
+                # Formulario para ingresar características
+                with st.form("airport_classification_form"):
+                    col1, col2 = st.columns(2)
                 
-                with col1:
-                    trip_distance = st.number_input("Distancia del viaje (millas)", min_value=0.1, max_value=50.0, value=10.0, step=0.5, key="airport_dist")
-                    pickup_hour = st.slider("Hora de recogida", min_value=0, max_value=23, value=8, key="airport_hour")
+                    with col1:
+                        trip_distance = st.number_input("Distancia del viaje (millas)", min_value=0.1, max_value=50.0, value=10.0, step=0.5, key="airport_dist")
+                        pickup_hour = st.slider("Hora de recogida", min_value=0, max_value=23, value=8, key="airport_hour")
                     
-                with col2:
-                    trip_duration = st.number_input("Duración del viaje (minutos)", min_value=1, max_value=120, value=25, step=1, key="airport_duration")
-                    company = st.selectbox("Empresa", options=["Uber", "Lyft", "Via", "Juno"], index=0, key="airport_company")
-                
-                submitted = st.form_submit_button("Clasificar Viaje")
+                    with col2:
+                        trip_duration = st.number_input("Duración del viaje (minutos)", min_value=1, max_value=120, value=25, step=1, key="airport_duration")
+                        company = st.selectbox("Empresa", options=["Uber", "Lyft", "Via", "Juno"], index=0, key="airport_company")
+                    
+                    # Selector de modelo (por defecto el más rápido dentro de la tolerancia)
+                    airport_models = sorted(name for name in available_models if name.startswith('airport'))
+                    airport_model = None
+                    if airport_models:
+                        airport_model = st.selectbox("Modelo a usar", options=airport_models,
+                                                     index=airport_models.index(fastest_airport_model) if fastest_airport_model in airport_models else 0,
+                                                     format_func=lambda x: x.replace('_', ' ').title(),
+                                                     key="airport_model")
+                
+                    submitted = st.form_submit_button("Clasificar Viaje")
             
-            if submitted:
-                # Crear un DataFrame con las características ingresadas
-                predict_df = pd.DataFrame({
-                    'trip_miles': [trip_distance],
-                    'trip_time': [trip_duration * 60],  # convertir a segundos
-                    'pickup_hour': [pickup_hour],
-                    'hvfhs_license_num': [company],
-                })
+                if submitted:
+                    # Crear un DataFrame con las características ingresadas
+                    predict_df = pd.DataFrame({
+                        'trip_miles': [trip_distance],
+                        'trip_time': [trip_duration * 60],  # convertir a segundos
+                        'pickup_hour': [pickup_hour],
+                        'hvfhs_license_num': [company],
+                    })
                 
-                # Agregar características adicionales que podrían requerir los modelos
-                predict_df['pickup_weekday'] = 1  # podríamos ajustar esto
+                    # Agregar características adicionales que podrían requerir los modelos
+                    predict_df['pickup_weekday'] = 1  # podríamos ajustar esto
                 
-                # Intentar predecir
-                try:
-                    predictions, probabilities = model_utils.predict_airport(predict_df)
+                    # Intentar predecir
+                    try:
+                        predictions, probabilities = model_utils.predict_airport(predict_df, model_name=airport_model)
                     
-                    if predictions is not None:
-                        # Mostrar predicción
-                        result = "Viaje a Aeropuerto" if predictions[0] == 1 else "Viaje Normal (No a Aeropuerto)"
+                        if predictions is not None:
+                            # Mostrar predicción
+                            result = "Viaje a Aeropuerto" if predictions[0] == 1 else "Viaje Normal (No a Aeropuerto)"
                         
-                        # Color según la predicción
-                        result_color = "green" if predictions[0] == 1 else "blue"
+                            # Color según la predicción
+                            result_color = "green" if predictions[0] == 1 else "blue"
                         
-                        st.markdown(f"<h3 style='color:{result_color};'>Resultado: {result}</h3>", unsafe_allow_html=True)
+                            st.markdown(f"<h3 style='color:{result_color};'>Resultado: {result}</h3>", unsafe_allow_html=True)
                         
-                        # Mostrar probabilidad
-                        if probabilities is not None:
-                            prob_value = probabilities[0] if predictions[0] == 1 else 1 - probabilities[0]
-                            st.metric(
-                                label="Confianza de la predicción",
-                                value=f"{prob_value*100:.1f}%"
-                            )
+                            # Mostrar probabilidad
+                            if probabilities is not None:
+                                prob_value = probabilities[0] if predictions[0] == 1 else 1 - probabilities[0]
+                                st.metric(
+                                    label="Confianza de la predicción",
+                                    value=f"{prob_value*100:.1f}%"
+                                )
                             
-                            # Visualizar probabilidad
-                            fig = go.Figure(go.Indicator(
-                                mode = "gauge+number",
-                                value = prob_value*100,
-                                domain = {'x': [0, 1], 'y': [0, 1]},
-                                title = {'text': "Confianza (%)"},
-                                gauge = {
-                                    'axis': {'range': [None, 100]},
-                                    'steps': [
-                                        {'range': [0, 30], 'color': "lightgray"},
-                                        {'range': [30, 70], 'color': "gray"},
-                                        {'range': [70, 100], 'color': result_color}
-                                    ],
-                                    'threshold': {
-                                        'line': {'color': "red", 'width': 4},
-                                        'thickness': 0.75,
-                                        'value': prob_value*100
+                                # Visualizar probabilidad
+                                fig = go.Figure(go.Indicator(
+                                    mode = "gauge+number",
+                                    value = prob_value*100,
+                                    domain = {'x': [0, 1], 'y': [0, 1]},
+                                    title = {'text': "Confianza (%)"},
+                                    gauge = {
+                                        'axis': {'range': [None, 100]},
+                                        'steps': [
+                                            {'range': [0, 30], 'color': "lightgray"},
+                                            {'range': [30, 70], 'color': "gray"},
+                                            {'range': [70, 100], 'color': result_color}
+                                        ],
+                                        'threshold': {
+                                            'line': {'color': "red", 'width': 4},
+                                            'thickness': 0.75,
+                                            'value': prob_value*100
+                                        }
                                     }
-                                }
-                            ))
-                            st.plotly_chart(fig)
-                    else:
-                        st.error("No se pudo generar una clasificación con los datos proporcionados.")
-                except Exception as e:
-                    st.error(f"Error al clasificar: {e}")
+                                ))
+                                display_utils.plotly_chart(fig)
+                        else:
+                            st.error("No se pudo generar una clasificación con los datos proporcionados.")
+                    except Exception as e:
+                        st.error(f"Error al clasificar: {e}")
         
             # Tab 3: Análisis de Features
             with pred_tabs[2]:
                 st.subheader("Importancia de Variables")
                 
-                # Seleccionar modelo para analizar
+                # Seleccionar modelo para analizar (las redes se analizan en su versión NumPy)
                 model_for_analysis = st.selectbox(
                     "Seleccionar modelo para analizar",
-                    options=[name for name, info in available_models.items() if 'nn' not in name],
-                    format_func=lambda x: available_models[x]['type'] if x in available_models else x
+                    options=sorted(name for name, info in available_models.items() if info['type'] != 'neural_network'),
+                    format_func=lambda x: x.replace('_', ' ').title()
                 )
                 
                 if model_for_analysis:
-                    # Obtener importancia de features
                     try:
-                        importances = model_utils.get_feature_importance(model_for_analysis)
+                        # Análisis precalculado por train_models.py para esta versión del modelo
+                        analysis = model_utils.get_feature_analysis(model_for_analysis)
                         
-                        if importances:
-                            # Convertir a DataFrame para visualización
-                            imp_df = pd.DataFrame(
-                                {'Feature': list(importances.keys()), 'Importance': list(importances.values())}
-                            ).sort_values('Importance', ascending=False).head(15)
+                        if analysis:
+                            imp_df = analysis_utils.importance_frame(analysis)
+                            loss_label = "Aumento del RMSE ($)" if analysis['task'] == 'regression' else "Aumento de la tasa de error"
                             
-                            # Gráfico de barras horizontales
+                            # Importancia por permutación con su dispersión entre repeticiones
                             fig = px.bar(
                                 imp_df,
-                                x='Importance',
-                                y='Feature',
+                                x='permutation_mean',
+                                y='feature',
+                                error_x='permutation_std',
                                 orientation='h',
-                                title=f"Top 15 Variables más Importantes para {available_models[model_for_analysis]['type']}",
-                                labels={'Importance': 'Importancia Relativa', 'Feature': 'Variable'},
-                                color='Importance',
+                                title=f"Importancia por Permutación: {model_for_analysis.replace('_', ' ').title()}",
+                                labels={'permutation_mean': loss_label, 'feature': 'Variable'},
+                                color='permutation_mean',
                                 color_continuous_scale='Viridis'
                             )
+                            fig.update_layout(yaxis={'categoryorder': 'total ascending'}, coloraxis_showscale=False)
+                            display_utils.plotly_chart(fig, width='stretch')
                             
-                            fig.update_layout(yaxis={'categoryorder': 'total ascending'})
-                            st.plotly_chart(fig, width='stretch')
+                            # Contribuciones de LightGBM: magnitud media y signo medio por variable
+                            if 'contrib_mean_abs' in imp_df.columns:
+                                contrib_df = imp_df.sort_values('contrib_mean_abs', ascending=False)
+                                fig = px.bar(
+                                    contrib_df,
+                                    x='contrib_mean_abs',
+                                    y='feature',
+                                    orientation='h',
+                                    title="Contribución Media por Variable (LightGBM)",
+                                    labels={'contrib_mean_abs': 'Contribución media absoluta', 'feature': 'Variable',
+                                            'contrib_mean': 'Contribución media'},
+                                    color='contrib_mean',
+                                    color_continuous_scale='RdBu'
+                                )
+                                fig.update_layout(yaxis={'categoryorder': 'total ascending'})
+                                display_utils.plotly_chart(fig, width='stretch')
+                                st.caption(f"Valor base del modelo: {analysis['contributions']['expected_value']:.2f}. "
+                                           f"Calculado sobre {analysis['contribution_rows']:,} filas de prueba.")
+                            
+                            st.caption(f"Permutación sobre {analysis['permutation_rows']:,} filas de prueba "
+                                       f"(calculado el {analysis['computed_at']}, versión {analysis['version']}).")
                             
                             # Mostrar tabla con importancias
                             with st.expander("Ver tabla de importancias"):
-                                st.table(imp_df)
+                                display_utils.render_table(
+                                    imp_df,
+                                    {"permutation_mean": "%.4f", "permutation_std": "%.4f",
+                                     "contrib_mean_abs": "%.4f", "contrib_mean": "%.4f"},
+                                    labels={"feature": "Variable", "permutation_mean": loss_label,
+                                            "permutation_std": "Desviación", "contrib_mean_abs": "Contribución absoluta",
+                                            "contrib_mean": "Contribución media"},
+                                )
+                        else:
+                            st.info("No hay análisis precalculado para esta versión del modelo. "
+                                    "Ejecuta `python train_models.py --analyze` para calcularlo; "
+                                    "mientras tanto se muestra la importancia propia del modelo.")
+                            importances = model_utils.get_feature_importance(model_for_analysis)
+                            
+                            if importances:
+                                # Convertir a DataFrame para visualización
+                                imp_df = pd.DataFrame(
+                                    {'Feature': list(importances.keys()), 'Importance': list(importances.values())}
+                                ).sort_values('Importance', ascending=False).head(15)
+                                
+                                # Gráfico de barras horizontales
+                                fig = px.bar(
+                                    imp_df,
+                                    x='Importance',
+                                    y='Feature',
+                                    orientation='h',
+                                    title=f"Top 15 Variables más Importantes: {model_for_analysis.replace('_', ' ').title()}",
+                                    labels={'Importance': 'Importancia Relativa', 'Feature': 'Variable'},
+                                    color='Importance',
+                                    color_continuous_scale='Viridis'
+                                )
+                                
+                                fig.update_layout(yaxis={'categoryorder': 'total ascending'})
+                                display_utils.plotly_chart(fig, width='stretch')
+                                
+                                # Mostrar tabla con importancias
+                                with st.expander("Ver tabla de importancias"):
+                                    st.table(imp_df)
                     except Exception as e:
                         st.error(f"Error al obtener importancia de features: {str(e)}")
+        else:
+            st.warning("⚠️ No hay modelos entrenados disponibles. Ejecuta `python train_models.py` para generarlos.")
+    except Exception as e:
+        st.error(f"Error al cargar los modelos: {e}")
+
+perf_utils.checkpoint("tab7")
 
 # Footer profesional - Updated to fix deployment cache
 st.markdown("---")
@@ -2416,3 +2724,11 @@ with st.sidebar:
     # Botón de reset
     if st.button("🔄 Reset Dashboard", help="Reinicia todos los filtros"):
         st.experimental_rerun()
+
+perf_utils.checkpoint("footer")
+perf_run = perf_utils.finish_run()
+metrics_utils.write_textfile()
+
+# Panel de rendimiento de la ejecución (etapas, secciones, cachés)
+if debug_mode:
+    display_utils.render_perf_panel(perf_run)
@@ -0,0 +1,72 @@
+"""
+Backend de tipos de pandas para la ruta carga → enriquecimiento → filtro → agregación.
+
+Con NYC_DTYPE_BACKEND=pyarrow los Parquet y CSV se leen con dtype_backend="pyarrow": las
+columnas quedan como arrays de Arrow dentro de pandas (ArrowDtype), sin copiar los textos
+(operador, bases, banderas, zonas) a objetos de Python. Las columnas numéricas sin nulos se
+entregan a NumPy sin copia (Series.to_numpy devuelve una vista de solo lectura del buffer de
+Arrow), así que los kernels numéricos (sketches, mallas, modelos) no cambian.
+
+Sin la variable (o con NYC_DTYPE_BACKEND=numpy) se mantiene la conversión clásica a NumPy.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+DTYPE_BACKENDS = ("numpy", "pyarrow")
+
+# Backend del proceso (se fija al importar; el benchmark lo elige por subproceso)
+DTYPE_BACKEND = os.environ.get("NYC_DTYPE_BACKEND", "numpy").lower()
+if DTYPE_BACKEND not in DTYPE_BACKENDS:
+    raise ValueError(f"NYC_DTYPE_BACKEND debe ser uno de {DTYPE_BACKENDS}, no '{DTYPE_BACKEND}'")
+
+
+def arrow_enabled(backend=None):
+    """Indica si el backend (por defecto el del proceso) es Arrow."""
+    return (backend or DTYPE_BACKEND) == "pyarrow"
+
+
+def read_parquet(path, columns=None, backend=None):
+    """
+    pd.read_parquet con el backend de tipos configurado.
+
+    En modo Arrow los fragmentos de cada columna (uno por grupo de filas) se unen una vez al
+    cargar: con un solo fragmento, Series.to_numpy no necesita concatenar en cada llamada.
+    """
+    if arrow_enabled(backend):
+        table = pq.read_table(path, columns=columns).combine_chunks()
+        return table.to_pandas(types_mapper=pd.ArrowDtype)
+    return pd.read_parquet(path, columns=columns)
+
+
+def read_csv(path, backend=None, **kwargs):
+    """pd.read_csv con el backend de tipos configurado (lector de pyarrow en modo Arrow)."""
+    if arrow_enabled(backend):
+        return pd.read_csv(path, engine="pyarrow", dtype_backend="pyarrow", **kwargs)
+    return pd.read_csv(path, **kwargs)
+
+
+def batch_to_pandas(batch, backend=None):
+    """Convierte un RecordBatch/Table de pyarrow a pandas con el backend configurado."""
+    if arrow_enabled(backend):
+        return batch.to_pandas(types_mapper=pd.ArrowDtype)
+    return batch.to_pandas()
+
+
+def is_zero_copy(series):
+    """Indica si Series.to_numpy(float) comparte memoria con el buffer de Arrow de la columna."""
+    if not isinstance(series.dtype, pd.ArrowDtype):
+        return False
+    chunked = series.array.__arrow_array__()
+    if chunked.num_chunks != 1 or chunked.null_count or not pa.types.is_floating(chunked.type):
+        return False
+    return np.shares_memory(series.to_numpy(dtype=float, na_value=np.nan), chunked.chunk(0).to_numpy(zero_copy_only=True))
+
+
+def frame_mb(df):
+    """Memoria de un DataFrame en MB (incluye textos y buffers de Arrow)."""
+    return df.memory_usage(deep=True).sum() / 1024**2
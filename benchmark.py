@@ -0,0 +1,701 @@
+#!/usr/bin/env python3
+"""
+Benchmarks de rendimiento del dashboard.
+
+Uso:
+    python benchmark.py operators                      # mes completo de raw-data/ o datos sintéticos
+    python benchmark.py operators --file raw-data/2024-01.parquet
+    python benchmark.py operators --rows 5000000
+    python benchmark.py imports                        # perfil de importación (ms y MB por módulo)
+    python benchmark.py startup                        # app.py en frío/caliente a 100k, 1M y 10M filas
+    python benchmark.py startup --sizes 100000 --baseline benchmark_results/base.json
+    python benchmark.py choropleth                     # coropleta de polígonos vs. círculos de folium
+    python benchmark.py choropleth --shapes data/taxi_zones.geojson
+    python benchmark.py dtypes --rows 5000000          # tipos NumPy vs. Arrow (un proceso por backend)
+    python benchmark.py queries --rows 5000000         # agregaciones de las pestañas: pandas vs. Polars lazy
+"""
+
+import argparse
+import glob
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import backend_utils
+import extract_data
+import geo_utils
+import operator_utils
+import perf_utils
+import query_utils
+import sketch_utils
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_PATH = os.path.join(REPO_DIR, "app.py")
+RESULTS_DIR = "benchmark_results"
+
+OPERATORS = ["Uber", "Lyft"]
+STARTUP_SIZES = [100_000, 1_000_000, 10_000_000]
+
+# Métricas comparadas contra la línea base (mayor = peor)
+REGRESSION_METRICS = ["cold_total_ms", "warm_total_ms", "peak_rss_mb"]
+
+# Agregaciones de las pestañas 1, 2, 3 y 5 (claves, columnas de salida) y filtros del benchmark
+TAB_QUERIES = [
+    (["pickup_hour", "day_name"], {"trips": (None, "size")}),
+    (["hvfhs_license_num"], {"Viajes": ("pickup_datetime", "count"), "Ingresos": ("driver_pay", "sum"),
+                             "Propinas": ("tips", "sum"), "trip_miles": ("trip_miles", "mean"),
+                             "trip_time": ("trip_time", "mean")}),
+    (["pickup_borough"], {"trips": (None, "size")}),
+    (["pickup_hour", "hvfhs_license_num"], {"driver_pay": ("driver_pay", "sum")}),
+    (["pickup_zone", "pickup_borough"], {"trip_count": (None, "size")}),
+    (["hvfhs_license_num"], {col: (col, "sum") for col in ["driver_pay", "tips", "base_passenger_fare", "tolls"]}),
+]
+QUERY_FILTERS = query_utils.filter_spec(["HV0003", "HV0005"], (7, 19))
+AIRPORT_ZONES = [1, 132, 138]
+COLUMNS = ["hvfhs_license_num", "pickup_datetime", "PULocationID", "DOLocationID",
+           "trip_miles", "trip_time", "driver_pay", "tips"]
+
+def make_trips(n_rows, seed=42, zones_df=None):
+    """
+    Genera un mes sintético con el generador de extract_data y nombres de operador del dashboard.
+
+    Args:
+        n_rows: Número de viajes
+        seed: Semilla aleatoria
+        zones_df: Tabla de zonas (opcional)
+
+    Returns:
+        DataFrame: Viajes sintéticos con el esquema FHVHV
+    """
+    df = extract_data.generate_synthetic_month(2024, 1, n_rows, seed, zones_df)
+    df["hvfhs_license_num"] = df["hvfhs_license_num"].map(extract_data.LICENSE_NAMES).astype(object)
+    return df
+
+
+def load_month(path):
+    """Carga un mes completo con las columnas de los benchmarks."""
+    df = pd.read_parquet(path, columns=COLUMNS)
+    df["hvfhs_license_num"] = df["hvfhs_license_num"].replace(extract_data.LICENSE_NAMES)
+    return df
+
+
+def load_benchmark_data(file_path=None, n_rows=None):
+    """Mes indicado, primer mes de raw-data/ o datos sintéticos (en ese orden)."""
+    if n_rows is None:
+        candidates = [file_path] if file_path else sorted(glob.glob(os.path.join("raw-data", "*.parquet")))
+        if candidates and os.path.exists(candidates[0]):
+            print(f"📂 Cargando {candidates[0]}...")
+            return load_month(candidates[0])
+        n_rows = 2_000_000
+    print(f"🧪 Generando {n_rows:,} viajes sintéticos...")
+    return make_trips(n_rows)
+
+
+def best_of(func, repeat=3):
+    """Mejor tiempo (s) de varias ejecuciones y el último resultado."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def efficiency_groupby_apply(df, by=None):
+    """Implementación anterior de la pestaña Uber vs Lyft (referencia)."""
+    keys = ["hvfhs_license_num"] + ([by] if by else [])
+    return df.groupby(keys)[["driver_pay", "trip_miles", "trip_time"]].apply(
+        lambda x: pd.Series({
+            "price_per_mile": x["driver_pay"].sum() / x["trip_miles"].sum(),
+            "price_per_minute": x["driver_pay"].sum() / (x["trip_time"].sum() / 60),
+            "miles_per_minute": (x["trip_miles"].sum() / (x["trip_time"].sum() / 60)),
+        })
+    )
+
+
+def benchmark_operators(df, repeat=3):
+    """
+    Compara groupby.apply con las sumas por fila y con las sumas de las celdas de los sketches,
+    por operador y por operador x hora.
+
+    Returns:
+        DataFrame: Tiempos por método y aceleración respecto a groupby.apply
+    """
+    ratios = ["price_per_mile", "price_per_minute", "miles_per_minute"]
+    if "pickup_hour" not in df.columns:
+        df["pickup_hour"] = df["pickup_datetime"].dt.hour
+    uber_lyft = df[df["hvfhs_license_num"].isin(OPERATORS)]
+
+    build_start = time.perf_counter()
+    sketches = sketch_utils.build_sketches(df)
+    build_time = time.perf_counter() - build_start
+    print(f"🧊 Construcción de sketches (una vez en la ingesta): {build_time:.2f}s")
+    mask = sketches.mask(operators=OPERATORS)
+
+    rows = []
+    for by in [None, "pickup_hour"]:
+        keys = ["hvfhs_license_num"] + ([by] if by else [])
+        baseline_time, baseline = best_of(lambda: efficiency_groupby_apply(uber_lyft, by), repeat)
+        rows_time, from_rows = best_of(lambda: operator_utils.compare_operators(uber_lyft, by=by), repeat)
+        sketch_time, from_sketches = best_of(
+            lambda: operator_utils.compare_operators(sketches=sketches, mask=mask, by=by), repeat
+        )
+
+        # Los tres métodos deben coincidir
+        expected = baseline[ratios].sort_index().to_numpy()
+        for name, result in [("sumas por fila", from_rows), ("sketches", from_sketches)]:
+            values = result.set_index(keys)[ratios].sort_index().to_numpy()
+            if not np.allclose(values, expected, rtol=1e-9):
+                print(f"⚠️ Resultados distintos en {name} ({by or 'operador'})")
+
+        for name, seconds in [("groupby.apply", baseline_time), ("sumas por fila", rows_time),
+                              ("sketches", sketch_time)]:
+            rows.append({"agrupación": by or "operador", "método": name, "segundos": seconds,
+                         "aceleración": baseline_time / seconds})
+    return pd.DataFrame(rows)
+
+
+def benchmark_imports():
+    """
+    Perfil de importación de los módulos pesados y de model_utils.
+
+    Cada módulo se mide en un proceso aislado con streamlit/pandas/numpy ya cargados: es el
+    costo que la carga diferida evita en el arranque de cada worker.
+
+    Returns:
+        DataFrame: ms y MB de memoria residente añadidos por módulo
+    """
+    results = pd.DataFrame(perf_utils.import_profile(perf_utils.HEAVY_MODULES + ["model_utils"]))
+    total = results[["ms", "rss_mb"]].sum(min_count=1)
+    print(f"⏱️ Suma de costos aislados: {total['ms']:.0f} ms, {total['rss_mb']:.0f} MB")
+    return results
+
+
+def prepare_startup_data(workdir, n_rows):
+    """
+    Crea en workdir la estructura que espera app.py: data/ (zonas) y data_sampled/ (partición
+    sintética con sus sketches, como en la ingesta).
+
+    Returns:
+        str: Ruta del archivo Parquet generado
+    """
+    os.makedirs(os.path.join(workdir, "data"), exist_ok=True)
+    os.makedirs(os.path.join(workdir, "data_sampled"), exist_ok=True)
+    parquet_path = os.path.join(workdir, "data_sampled", "2024-01_reduced.parquet")
+
+    previous_dir = os.getcwd()
+    os.chdir(workdir)
+    try:
+        extract_data.create_zone_files()
+        df = make_trips(n_rows, zones_df=pd.read_csv(os.path.join("data", "taxi_zone_lookup.csv")))
+        df.to_parquet(parquet_path, index=False)
+        extract_data.create_partition_sketches(df, parquet_path)
+        extract_data.create_partition_density(df, parquet_path)
+    finally:
+        os.chdir(previous_dir)
+    return parquet_path
+
+
+def run_app(workdir, reruns=2, timeout=1800):
+    """
+    Ejecuta app.py sin interfaz (streamlit.testing) en workdir: una ejecución en frío y
+    `reruns` en caliente (con las cachés de Streamlit ya llenas).
+
+    Returns:
+        dict: Etapas y totales de cada ejecución, pico de RSS y excepciones de la app
+    """
+    from streamlit.testing.v1 import AppTest
+
+    os.chdir(workdir)
+    base_rss = perf_utils.rss_mb()
+    app = AppTest.from_file(APP_PATH, default_timeout=timeout)
+
+    runs = []
+    for _ in range(reruns + 1):
+        start = time.perf_counter()
+        app.run()
+        wall_ms = (time.perf_counter() - start) * 1000
+        run = perf_utils.RUN_HISTORY[-1] if perf_utils.RUN_HISTORY else {"stages": {}, "total_ms": None}
+        runs.append({**run, "wall_ms": wall_ms})
+        perf_utils.RUN_HISTORY.clear()
+
+    return {
+        "cold": runs[0],
+        "warm": runs[1:],
+        "base_rss_mb": base_rss,
+        "peak_rss_mb": perf_utils.peak_rss_mb(),
+        "exceptions": [str(exception.message) for exception in app.exception],
+    }
+
+
+def benchmark_startup(sizes, reruns=2, workdir=None):
+    """
+    Benchmark de arranque de app.py para varios tamaños de datos sintéticos.
+
+    Cada tamaño se ejecuta en un proceso nuevo (cachés y memoria limpias).
+
+    Returns:
+        dict: Metadatos y un resultado por tamaño
+    """
+    workdir = workdir or tempfile.mkdtemp(prefix="nyc_benchmark_")
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [REPO_DIR, os.environ.get("PYTHONPATH")]))}
+    scenarios = []
+
+    for n_rows in sizes:
+        scenario_dir = os.path.join(workdir, f"rows_{n_rows}")
+        print(f"\n🧪 Preparando {n_rows:,} viajes en {scenario_dir}...")
+        prepare_startup_data(scenario_dir, n_rows)
+
+        print(f"🚀 Ejecutando app.py ({reruns} reruns en caliente)...")
+        result = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "_run-app", "--workdir", scenario_dir,
+             "--reruns", str(reruns)],
+            capture_output=True, text=True, env=env
+        )
+        try:
+            measured = json.loads(result.stdout.strip().splitlines()[-1])
+        except (IndexError, ValueError):
+            print(f"❌ Falló la ejecución con {n_rows:,} filas:\n{result.stderr[-2000:]}")
+            continue
+
+        warm_totals = [run["total_ms"] for run in measured["warm"] if run["total_ms"] is not None]
+        scenario = {
+            "rows": n_rows,
+            "cold_total_ms": measured["cold"]["total_ms"],
+            "warm_total_ms": min(warm_totals) if warm_totals else None,
+            **measured,
+        }
+        scenarios.append(scenario)
+        print(f"   ❄️ Frío: {scenario['cold_total_ms']:.0f} ms | 🔥 Caliente: {scenario['warm_total_ms']:.0f} ms"
+              f" | 💾 Pico RSS: {scenario['peak_rss_mb']:.0f} MB")
+        if measured["exceptions"]:
+            print(f"   ⚠️ Excepciones en la app: {measured['exceptions']}")
+
+    return {
+        "benchmark": "startup",
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "platform": platform.platform(),
+        "scenarios": scenarios,
+    }
+
+
+def synthetic_zone_shapes(path, vertices_per_zone=400, seed=42):
+    """
+    Escribe un GeoJSON con 265 zonas sintéticas (cuadrados de bordes irregulares sobre NYC).
+
+    Sirve para medir sin el archivo de la TLC: el número de vértices se aproxima al de los
+    polígonos reales (~100k).
+    """
+    rng = np.random.default_rng(seed)
+    west, south, east, north = geo_utils.GRID_BOUNDS
+    n_cols, n_rows = 17, 16
+    width, height = (east - west) / n_cols, (north - south) / n_rows
+    side = vertices_per_zone // 4
+    features = []
+    for zone_id in range(1, 266):
+        row, col = divmod(zone_id - 1, n_cols)
+        x0, y0 = west + col * width, south + row * height
+        t = np.linspace(0, 1, side, endpoint=False)
+        corners = [(x0, y0), (x0 + width, y0), (x0 + width, y0 + height), (x0, y0 + height), (x0, y0)]
+        edges = [np.column_stack([a[0] + (b[0] - a[0]) * t, a[1] + (b[1] - a[1]) * t])
+                 for a, b in zip(corners[:-1], corners[1:])]
+        ring = np.vstack(edges)
+        # Borde irregular: paseo aleatorio suave (como una costa), nulo en las esquinas
+        wobble = np.cumsum(rng.normal(0, width * 0.01, (len(ring), 2)), axis=0)
+        wobble -= np.linspace(0, 1, len(ring))[:, None] * wobble[-1]
+        ring = np.vstack([ring + wobble, ring[:1] + wobble[:1]])
+        features.append({"type": "Feature", "properties": {"LocationID": zone_id},
+                         "geometry": {"type": "Polygon", "coordinates": [ring.round(6).tolist()]}})
+    with open(path, "w") as f:
+        json.dump({"type": "FeatureCollection", "features": features}, f)
+    return path
+
+
+def folium_circle_html(zone_counts, zones_with_coords):
+    """Mapa de círculos por zona como lo arma la pestaña 3 (HTML que se envía al navegador)."""
+    import folium
+
+    ny_map = folium.Map(location=[40.7128, -74.0060], zoom_start=11)
+    max_count = zone_counts["trip_count"].max()
+    for _, row in zone_counts.iterrows():
+        zone_info = zones_with_coords[zones_with_coords["Zone"] == row["pickup_zone"]]
+        if not zone_info.empty:
+            zone_info = zone_info.iloc[0]
+            folium.Circle(
+                location=[zone_info["Lat"], zone_info["Lon"]],
+                radius=100 * (row["trip_count"] / max_count) * 2,
+                color='crimson', fill=True, fill_color='crimson', fill_opacity=0.6,
+                tooltip=f"{row['pickup_zone']} ({row['pickup_borough']}): {row['trip_count']} viajes"
+            ).add_to(ny_map)
+    return ny_map.get_root().render()
+
+
+def benchmark_choropleth(df, shapes_path=None, repeat=3):
+    """
+    Compara el mapa de círculos de folium con la coropleta de polígonos por nivel de detalle.
+
+    Por cada variante mide lo que cuesta en cada ejecución (armar el mapa y serializarlo) y los
+    bytes enviados al navegador; para los polígonos, además, la simplificación única.
+
+    Returns:
+        DataFrame: vértices, KB enviados, ms por ejecución y ms de preparación única
+    """
+    workdir = tempfile.mkdtemp(prefix="nyc_zones_")
+    if shapes_path is None or not os.path.exists(shapes_path):
+        print("🧪 Sin GeoJSON de zonas: usando polígonos sintéticos")
+        shapes_path = synthetic_zone_shapes(os.path.join(workdir, "taxi_zones.geojson"))
+
+    load_start = time.perf_counter()
+    shapes = geo_utils.load_zone_shapes(shapes_path)
+    load_ms = (time.perf_counter() - load_start) * 1000
+
+    # Conteos por zona (como la pestaña 3) y centroides para los círculos
+    names = {zone_id: f"Zone_{zone_id}" for zone_id in shapes}
+    centroids = pd.DataFrame([{"LocationID": zone_id, "Zone": names[zone_id],
+                               "Lon": polygons[0][0][:, 0].mean(), "Lat": polygons[0][0][:, 1].mean()}
+                              for zone_id, polygons in shapes.items()])
+    zone_counts = (df["PULocationID"].map(names).value_counts()
+                   .rename_axis("pickup_zone").reset_index(name="trip_count"))
+    zone_counts["pickup_borough"] = "-"
+    vector = geo_utils.zone_vector(df["PULocationID"].to_numpy())
+
+    rows = []
+    seconds, html = best_of(lambda: folium_circle_html(zone_counts, centroids), repeat)
+    rows.append({"variante": "Círculos (folium)", "vértices": len(zone_counts), "KB": len(html) / 1024,
+                 "ms_por_ejecución": seconds * 1000, "ms_preparación": 0.0})
+
+    for level, tolerance in [("Original", 0.0), *geo_utils.SIMPLIFY_TOLERANCES.items()]:
+        start = time.perf_counter()
+        geojson = geo_utils.simplify_zones(shapes, tolerance, names=names)
+        prepare_ms = load_ms + (time.perf_counter() - start) * 1000
+        seconds, payload = best_of(lambda: geo_utils.choropleth_figure(geojson, vector).to_json(), repeat)
+        rows.append({"variante": f"Polígonos {level} ({tolerance}°)", "vértices": geo_utils.count_vertices(geojson),
+                     "KB": len(payload) / 1024, "ms_por_ejecución": seconds * 1000, "ms_preparación": prepare_ms})
+    return pd.DataFrame(rows)
+
+
+def prepare_dtype_data(file_path=None, n_rows=None, workdir=None):
+    """Parquet de los benchmarks de tipos y consultas: el indicado, el primer mes de raw-data/ o uno sintético."""
+    if n_rows is None:
+        candidates = [file_path] if file_path else sorted(glob.glob(os.path.join("raw-data", "*.parquet")))
+        if candidates and os.path.exists(candidates[0]):
+            return candidates[0]
+        n_rows = 2_000_000
+    path = os.path.join(workdir or tempfile.mkdtemp(prefix="nyc_dtypes_"), "2024-01.parquet")
+    print(f"🧪 Generando {n_rows:,} viajes sintéticos (esquema FHVHV completo) en {path}...")
+    df = extract_data.generate_synthetic_month(2024, 1, n_rows)
+    # Textos planos, como en los archivos de la TLC (no diccionarios de categorías)
+    categories = df.select_dtypes("category").columns
+    df[categories] = df[categories].astype(str)
+    df.to_parquet(path, index=False)
+    return path
+
+
+def load_benchmark_zones():
+    """Tabla de zonas de data/ o una sintética con las 265 zonas."""
+    lookup_path = os.path.join("data", "taxi_zone_lookup.csv")
+    if os.path.exists(lookup_path):
+        zones_df = backend_utils.read_csv(lookup_path)
+    else:
+        zones_df = pd.DataFrame({"LocationID": np.arange(1, 266), "Borough": "-",
+                                 "Zone": [f"Zone_{i}" for i in range(1, 266)]})
+    return zones_df[["LocationID", "Borough", "Zone"]]
+
+
+def run_dtype_pipeline(path, repeat=3):
+    """
+    Carga → enriquecimiento → filtro → agregación con el backend de tipos del proceso
+    (NYC_DTYPE_BACKEND), como la carga de app.py y las pestañas de zonas y operadores.
+
+    Returns:
+        dict: ms por etapa, MB del DataFrame, pico de RSS y si la entrega a NumPy es sin copia
+    """
+    zones_df = load_benchmark_zones()
+
+    load_seconds, df = best_of(lambda: backend_utils.read_parquet(path), repeat)
+    frame_mb = backend_utils.frame_mb(df)
+
+    def enrich():
+        out = df.assign(pickup_hour=df["pickup_datetime"].dt.hour,
+                        pickup_weekday=df["pickup_datetime"].dt.weekday,
+                        airport_trip=df["PULocationID"].isin([1, 132, 138]) | df["DOLocationID"].isin([1, 132, 138]))
+        return out.merge(zones_df.rename(columns={"LocationID": "PULocationID", "Borough": "pickup_borough",
+                                                  "Zone": "pickup_zone"}), on="PULocationID", how="left")
+
+    enrich_seconds, enriched = best_of(enrich, repeat)
+    filter_seconds, filtered = best_of(lambda: enriched[
+        enriched["hvfhs_license_num"].isin(["HV0003", "HV0005"])
+        & enriched["pickup_hour"].between(7, 19) & (enriched["trip_miles"] > 0)
+    ], repeat)
+    aggregate_seconds, _ = best_of(lambda: filtered.groupby(["hvfhs_license_num", "pickup_borough"], observed=True).agg(
+        trips=("driver_pay", "size"), driver_pay=("driver_pay", "sum"),
+        trip_miles=("trip_miles", "sum"), tips=("tips", "mean")), repeat)
+    numpy_seconds, _ = best_of(lambda: [filtered[column].to_numpy(dtype=float, na_value=np.nan)
+                                        for column in ["trip_miles", "trip_time", "driver_pay", "tips"]], repeat)
+
+    return {
+        "backend": backend_utils.DTYPE_BACKEND,
+        "rows": len(df),
+        "frame_mb": frame_mb,
+        "load_ms": load_seconds * 1000,
+        "enrich_ms": enrich_seconds * 1000,
+        "filter_ms": filter_seconds * 1000,
+        "aggregate_ms": aggregate_seconds * 1000,
+        "to_numpy_ms": numpy_seconds * 1000,
+        "zero_copy": bool(backend_utils.is_zero_copy(df["driver_pay"])),
+        "peak_rss_mb": perf_utils.peak_rss_mb(),
+    }
+
+
+def benchmark_dtypes(path, repeat=3):
+    """
+    Compara la ruta de datos con tipos NumPy y con tipos Arrow.
+
+    Cada backend corre en un proceso nuevo para que el pico de RSS sea solo suyo.
+
+    Returns:
+        DataFrame: Una fila por backend con ms por etapa, MB y pico de RSS
+    """
+    rows = []
+    for backend in backend_utils.DTYPE_BACKENDS:
+        print(f"🚀 Backend {backend}...")
+        env = {**os.environ, "NYC_DTYPE_BACKEND": backend,
+               "PYTHONPATH": os.pathsep.join(filter(None, [REPO_DIR, os.environ.get("PYTHONPATH")]))}
+        result = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "_run-dtypes", "--file", path, "--repeat", str(repeat)],
+            capture_output=True, text=True, env=env
+        )
+        try:
+            rows.append(json.loads(result.stdout.strip().splitlines()[-1]))
+        except (IndexError, ValueError):
+            print(f"❌ Falló el backend {backend}:\n{result.stderr[-2000:]}")
+    return pd.DataFrame(rows)
+
+
+def _checksums(frames):
+    # Filas y suma de las columnas numéricas de cada resultado (para comparar los backends)
+    return [[len(frame), float(frame.select_dtypes("number").to_numpy(dtype=float).sum())] for frame in frames]
+
+
+def run_query_pipeline(path, repeat=3):
+    """
+    Agregaciones de las pestañas con el backend de consultas del proceso (NYC_QUERY_BACKEND).
+
+    Con pandas: carga, enriquecimiento (hora, día, zonas, aeropuertos), filtro y una agregación
+    por consulta sobre el DataFrame en memoria. Con Polars: las mismas consultas lazy sobre el
+    Parquet, una por una (como las llama app.py) y todas juntas con collect_all.
+
+    Returns:
+        dict: ms por etapa, pico de RSS y sumas de control de los resultados
+    """
+    zones_df = load_benchmark_zones()
+    operators, hours, _, _ = QUERY_FILTERS
+    result = {"backend": query_utils.QUERY_BACKEND}
+
+    if query_utils.QUERY_BACKEND == "polars":
+        per_query_seconds, frames = best_of(lambda: [
+            query_utils.polars_aggregate(path, keys, aggs, zones_df, AIRPORT_ZONES, QUERY_FILTERS)
+            for keys, aggs in TAB_QUERIES], repeat)
+        single_pass_seconds, _ = best_of(lambda: query_utils.polars_aggregate_all(
+            path, TAB_QUERIES, zones_df, AIRPORT_ZONES, QUERY_FILTERS), repeat)
+        result.update({"aggregate_ms": per_query_seconds * 1000, "single_pass_ms": single_pass_seconds * 1000,
+                       "total_ms": per_query_seconds * 1000})
+    else:
+        def prepare():
+            df = backend_utils.read_parquet(path)
+            df["pickup_hour"] = df["pickup_datetime"].dt.hour
+            df["pickup_weekday"] = df["pickup_datetime"].dt.weekday
+            df["day_name"] = df["pickup_weekday"].map(query_utils.DAY_NAMES)
+            df = df.merge(zones_df.rename(columns={"LocationID": "PULocationID", "Borough": "pickup_borough",
+                                                   "Zone": "pickup_zone"}), on="PULocationID", how="left")
+            df["from_airport"] = df["PULocationID"].isin(AIRPORT_ZONES)
+            df["to_airport"] = df["DOLocationID"].isin(AIRPORT_ZONES)
+            return df
+
+        prepare_seconds, df = best_of(prepare, 1)
+        filter_seconds, filtered = best_of(lambda: df[df["hvfhs_license_num"].isin(operators)
+                                                      & df["pickup_hour"].between(*hours)], repeat)
+        per_query_seconds, frames = best_of(lambda: [query_utils.pandas_aggregate(filtered, keys, aggs)
+                                                     for keys, aggs in TAB_QUERIES], repeat)
+        result.update({"load_enrich_ms": prepare_seconds * 1000, "filter_ms": filter_seconds * 1000,
+                       "aggregate_ms": per_query_seconds * 1000,
+                       "total_ms": (prepare_seconds + filter_seconds + per_query_seconds) * 1000})
+
+    result.update({"peak_rss_mb": perf_utils.peak_rss_mb(), "checksums": _checksums(frames)})
+    return result
+
+
+def benchmark_queries(path, repeat=3):
+    """
+    Compara las agregaciones de las pestañas con pandas y con Polars lazy.
+
+    Cada backend corre en un proceso nuevo; las sumas de control de los resultados deben
+    coincidir.
+
+    Returns:
+        DataFrame: Una fila por backend con ms por etapa y pico de RSS
+    """
+    if not query_utils.HAS_POLARS:
+        print("⚠️ Polars no está instalado: solo se mide pandas")
+    rows = []
+    for backend in query_utils.QUERY_BACKENDS if query_utils.HAS_POLARS else ["pandas"]:
+        print(f"🚀 Backend {backend}...")
+        env = {**os.environ, "NYC_QUERY_BACKEND": backend,
+               "PYTHONPATH": os.pathsep.join(filter(None, [REPO_DIR, os.environ.get("PYTHONPATH")]))}
+        result = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "_run-queries", "--file", path, "--repeat", str(repeat)],
+            capture_output=True, text=True, env=env
+        )
+        try:
+            rows.append(json.loads(result.stdout.strip().splitlines()[-1]))
+        except (IndexError, ValueError):
+            print(f"❌ Falló el backend {backend}:\n{result.stderr[-2000:]}")
+
+    if len(rows) == 2 and not np.allclose(rows[0]["checksums"], rows[1]["checksums"], rtol=1e-9):
+        print("⚠️ Resultados distintos entre pandas y Polars")
+    return pd.DataFrame(rows).drop(columns="checksums")
+
+
+def stage_table(results):
+    """Tabla de tiempos por etapa (ms) en frío y en caliente para cada tamaño."""
+    rows = []
+    for scenario in results["scenarios"]:
+        warm = min(scenario["warm"], key=lambda run: run["total_ms"]) if scenario["warm"] else {"stages": {}}
+        for stage, cold_ms in scenario["cold"]["stages"].items():
+            rows.append({"filas": scenario["rows"], "etapa": stage, "frío_ms": cold_ms,
+                         "caliente_ms": warm["stages"].get(stage)})
+    return pd.DataFrame(rows)
+
+
+def check_regressions(results, baseline, tolerance=0.25):
+    """
+    Compara los resultados con una línea base guardada.
+
+    Args:
+        results: Resultado de benchmark_startup
+        baseline: Resultado anterior (mismo formato)
+        tolerance: Aumento relativo permitido (0.25 = 25%)
+
+    Returns:
+        list: Mensajes de las regresiones encontradas
+    """
+    baseline_by_rows = {scenario["rows"]: scenario for scenario in baseline.get("scenarios", [])}
+    regressions = []
+    for scenario in results["scenarios"]:
+        previous = baseline_by_rows.get(scenario["rows"])
+        if previous is None:
+            continue
+        for metric in REGRESSION_METRICS:
+            current, reference = scenario.get(metric), previous.get(metric)
+            if current is None or not reference:
+                continue
+            if current > reference * (1 + tolerance):
+                regressions.append(
+                    f"{scenario['rows']:,} filas - {metric}: {current:.0f} vs {reference:.0f} "
+                    f"(+{(current / reference - 1) * 100:.0f}%)"
+                )
+    return regressions
+
+
+def main():
+    """Ejecuta el benchmark seleccionado"""
+    parser = argparse.ArgumentParser(description="Benchmarks del dashboard NYC Ride-Hailing")
+    parser.add_argument("benchmark", choices=["operators", "imports", "startup", "choropleth", "dtypes",
+                                                  "queries", "_run-app", "_run-dtypes", "_run-queries"])
+    parser.add_argument("--file", help="Archivo parquet de un mes completo")
+    parser.add_argument("--rows", type=int, help="Usar N viajes sintéticos")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--sizes", type=int, nargs="+", default=STARTUP_SIZES, help="Tamaños (filas) del benchmark de arranque")
+    parser.add_argument("--reruns", type=int, default=2, help="Ejecuciones en caliente tras la ejecución en frío")
+    parser.add_argument("--workdir", help="Directorio de trabajo para los datos sintéticos")
+    parser.add_argument("--shapes", default=geo_utils.ZONES_GEOJSON, help="GeoJSON de las zonas de taxi (coropleta)")
+    parser.add_argument("--output", help="Archivo JSON de resultados")
+    parser.add_argument("--baseline", help="JSON de una ejecución anterior para detectar regresiones")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Aumento relativo permitido frente a la línea base")
+    args = parser.parse_args()
+
+    if args.benchmark == "_run-app":
+        # Proceso hijo de 'startup': la última línea de stdout es el JSON de resultados
+        result = run_app(args.workdir, args.reruns)
+        print(json.dumps(result))
+        return
+
+    if args.benchmark == "_run-dtypes":
+        # Proceso hijo de 'dtypes': la última línea de stdout es el JSON de resultados
+        print(json.dumps(run_dtype_pipeline(args.file, args.repeat)))
+        return
+
+    if args.benchmark == "dtypes":
+        path = prepare_dtype_data(args.file, args.rows, args.workdir)
+        results = benchmark_dtypes(path, args.repeat)
+        print(results.to_string(index=False, float_format="{:.0f}".format))
+        return
+
+    if args.benchmark == "_run-queries":
+        # Proceso hijo de 'queries': la última línea de stdout es el JSON de resultados
+        print(json.dumps(run_query_pipeline(args.file, args.repeat)))
+        return
+
+    if args.benchmark == "queries":
+        path = prepare_dtype_data(args.file, args.rows, args.workdir)
+        results = benchmark_queries(path, args.repeat)
+        print(results.to_string(index=False, na_rep="-", float_format="{:.0f}".format))
+        return
+
+    if args.benchmark == "startup":
+        results = benchmark_startup(args.sizes, args.reruns, args.workdir)
+        print()
+        print(stage_table(results).to_string(index=False, float_format="{:.0f}".format))
+
+        output = args.output or os.path.join(RESULTS_DIR, f"startup_{datetime.now():%Y%m%d-%H%M%S}.json")
+        os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+        with open(output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n💾 Resultados guardados en {output}")
+
+        if args.baseline:
+            with open(args.baseline) as f:
+                regressions = check_regressions(results, json.load(f), args.tolerance)
+            if regressions:
+                print("❌ Regresiones de rendimiento:")
+                for message in regressions:
+                    print(f"   - {message}")
+                sys.exit(1)
+            print("✅ Sin regresiones frente a la línea base")
+        return
+
+    if args.benchmark == "imports":
+        results = benchmark_imports()
+        print(results.to_string(index=False, na_rep="-", formatters={
+            "ms": "{:.0f}".format, "rss_mb": "{:.1f}".format, "base_rss_mb": "{:.1f}".format
+        }))
+        return
+
+    df = load_benchmark_data(args.file, args.rows)
+    print(f"📊 {len(df):,} viajes")
+
+    if args.benchmark == "operators":
+        results = benchmark_operators(df, args.repeat)
+        print(results.to_string(index=False, formatters={
+            "segundos": "{:.4f}".format, "aceleración": "{:.1f}x".format
+        }))
+
+    if args.benchmark == "choropleth":
+        results = benchmark_choropleth(df, args.shapes, args.repeat)
+        print(results.to_string(index=False, formatters={
+            "KB": "{:,.0f}".format, "ms_por_ejecución": "{:.1f}".format, "ms_preparación": "{:.0f}".format
+        }))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+"""
+Capa de presentación de tablas del dashboard.
+
+Las tablas se mantienen numéricas y el formato se declara por columna: Streamlit lo aplica
+al renderizar (column_config), así que ordenar por columna sigue funcionando y no se formatea
+celda por celda en Python ni se copian las tablas a texto.
+
+También incluye el envoltorio medido de st.plotly_chart, los gráficos de series temporales con
+reducción LTTB y el panel de rendimiento del modo debug.
+"""
+
+import pandas as pd
+import plotly.express as px
+import streamlit as st
+
+import metrics_utils
+import perf_utils
+import timeseries_utils
+
+# Formatos de columna (presets de Streamlit o cadenas printf)
+MONEY = "dollar"             # $1,234.57
+MONEY_UNIT = "$%.2f"         # $12.34
+PERCENT = "%.1f%%"           # 12.3%
+PERCENT_2 = "%.2f%%"         # 12.34%
+INTEGER = "localized"        # 1,234
+DECIMAL = "%.2f"
+DECIMAL_1 = "%.1f"
+MILES = "%.2f mi"
+MINUTES = "%.1f min"
+PER_MILE = "$%.2f/mi"
+PER_MINUTE = "$%.2f/min"
+MILES_PER_MINUTE = "%.2f mi/min"
+
+
+def column_config(formats, labels=None):
+    """
+    Construye el column_config de st.dataframe a partir de formatos declarativos.
+
+    Args:
+        formats: dict columna -> formato (preset de Streamlit o cadena printf)
+        labels: dict columna -> etiqueta visible (opcional)
+
+    Returns:
+        dict: columna -> st.column_config.NumberColumn / Column
+    """
+    labels = labels or {}
+    config = {
+        column: st.column_config.NumberColumn(labels.get(column), format=fmt)
+        for column, fmt in formats.items()
+    }
+    for column, label in labels.items():
+        if column not in config:
+            config[column] = st.column_config.Column(label)
+    return config
+
+
+def render_table(df, formats=None, labels=None, hide_index=True, **kwargs):
+    """
+    Muestra una tabla numérica aplicando el formato solo en el navegador.
+
+    Args:
+        df: DataFrame con columnas numéricas sin formatear
+        formats: dict columna -> formato (ver constantes del módulo)
+        labels: dict columna -> etiqueta visible (opcional)
+        hide_index: Ocultar el índice
+        **kwargs: Argumentos adicionales para st.dataframe
+    """
+    formats = {column: fmt for column, fmt in (formats or {}).items() if column in df.columns}
+    kwargs.setdefault("width", "stretch")
+    return st.dataframe(
+        df,
+        column_config=column_config(formats, labels),
+        hide_index=hide_index,
+        **kwargs
+    )
+
+
+def plotly_chart(fig, **kwargs):
+    """
+    st.plotly_chart medido: el tiempo incluye serializar la figura y enviarla al navegador.
+
+    Args:
+        fig: Figura de Plotly
+        **kwargs: Argumentos de st.plotly_chart
+    """
+    title = fig.layout.title.text if fig.layout.title and fig.layout.title.text else "figura"
+    if metrics_utils.exporting():
+        # Serializar de nuevo cuesta lo mismo que el envío: solo si se exportan métricas
+        chart_type = fig.data[0].type if fig.data else "vacía"
+        metrics_utils.CHART_BYTES.observe(len(fig.to_json()), chart=chart_type)
+    with perf_utils.timer(f"chart:{title}", "chart", traces=len(fig.data)):
+        return st.plotly_chart(fig, **kwargs)
+
+
+def render_timeseries(df, time_col, key, value_col=None, how='sum', group_col=None, title=None,
+                      labels=None, max_points=timeseries_utils.DEFAULT_MAX_POINTS):
+    """
+    Gráfico de línea de una serie temporal con intervalo seleccionable y reducción LTTB.
+
+    La serie se agrega al intervalo elegido y cada traza se reduce a max_points puntos. Al
+    seleccionar un rango con la herramienta de caja, el gráfico se acota a esa ventana y se
+    vuelve a agregar solo con sus registros (el zoom de Plotly ocurre en el navegador y no
+    llega a Python, así que la selección hace de zoom).
+
+    Args:
+        df: DataFrame con registros individuales
+        time_col: Columna datetime
+        key: Clave única del gráfico (estado de intervalo y ventana)
+        value_col: Columna a agregar (None: contar registros)
+        how: Agregación de value_col
+        group_col: Columna de las trazas (p. ej. operador)
+        title: Título del gráfico
+        labels: Etiquetas de px.line (la serie agregada se llama 'value')
+        max_points: Puntos por traza enviados al navegador
+    """
+    window_key = f"{key}_window"
+    col1, col2 = st.columns([3, 1])
+    freq = col1.radio("Intervalo", list(timeseries_utils.RESOLUTIONS), horizontal=True,
+                      format_func=timeseries_utils.RESOLUTIONS.get, key=f"{key}_freq")
+    if st.session_state.get(window_key) is not None and col2.button("🔍 Restablecer zoom", key=f"{key}_reset"):
+        st.session_state[window_key] = None
+    window = st.session_state.get(window_key)
+
+    with perf_utils.timer(f"timeseries:{key}", "section", freq=freq) as section:
+        series, info = timeseries_utils.timeseries(df, time_col, freq, value_col, how, group_col, window, max_points)
+        section.args.update(info)
+
+    traces = series[group_col].nunique() if group_col is not None else 1
+    fig = px.line(
+        series,
+        x=time_col,
+        y="value",
+        color=group_col,
+        markers=len(series) <= 60 * max(traces, 1),
+        title=title,
+        labels=labels,
+    )
+
+    def zoom_to_selection():
+        boxes = st.session_state[key]["selection"].get("box") or []
+        if boxes:
+            start, end = sorted(pd.to_datetime(boxes[0]["x"]))
+            st.session_state[window_key] = (start, end)
+
+    plotly_chart(fig, width="stretch", key=key, on_select=zoom_to_selection, selection_mode="box")
+    window_label = f" entre {window[0]:%Y-%m-%d %H:%M} y {window[1]:%Y-%m-%d %H:%M}" if window else ""
+    st.caption(f"{info['shown_points']:,} de {info['aggregated_points']:,} puntos "
+               f"(intervalo: {timeseries_utils.RESOLUTIONS[freq].lower()}{window_label}). "
+               "Selecciona un rango con la herramienta de caja para ampliarlo.")
+
+
+# Colores de la cascada por categoría de sección
+PERF_COLORS = {
+    "stage": "#9aa5b1",
+    "cache": "#1f77b4",
+    "section": "#2ca02c",
+    "chart": "#ff7f0e",
+    "model": "#d62728",
+}
+
+
+def render_perf_panel(run):
+    """
+    Panel de rendimiento de la ejecución actual (modo debug).
+
+    Muestra la cascada de etapas y secciones, la memoria residente, los aciertos de caché
+    y permite descargar la ejecución como JSON o Chrome Trace.
+
+    Args:
+        run: Resultado de perf_utils.finish_run()
+    """
+    import plotly.graph_objects as go
+
+    if not run:
+        return
+    with st.expander("⏱️ Rendimiento de esta ejecución", expanded=True):
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Tiempo total", f"{run['total_ms']:,.0f} ms")
+        col2.metric("Memoria residente", f"{run['rss_mb']:,.0f} MB")
+        col3.metric("Pico de memoria", f"{run['peak_rss_mb']:,.0f} MB")
+
+        spans = pd.DataFrame(run["spans"])
+        if not spans.empty:
+            # Etapas arriba y secciones anidadas debajo, en orden de inicio
+            spans = spans.sort_values(["start_ms", "depth"]).reset_index(drop=True)
+            spans["label"] = [f"{i:02d} {name}" for i, name in enumerate(spans["name"])]
+            fig = go.Figure()
+            for category, group in spans.groupby("category", sort=False):
+                fig.add_trace(go.Bar(
+                    y=group["label"], x=group["duration_ms"], base=group["start_ms"],
+                    orientation="h", name=category,
+                    marker_color=PERF_COLORS.get(category, "#7f7f7f"),
+                    customdata=group[["rss_delta_mb"]],
+                    hovertemplate="%{y}<br>%{x:.1f} ms<br>Δ memoria: %{customdata[0]:+.1f} MB<extra></extra>",
+                ))
+            fig.update_layout(
+                title="Cascada de la ejecución",
+                xaxis_title="ms desde el inicio",
+                yaxis=dict(autorange="reversed", categoryorder="array", categoryarray=spans["label"]),
+                height=max(300, 22 * len(spans)),
+                barmode="overlay",
+            )
+            # Se muestra con st.plotly_chart directamente para no medir el propio panel
+            st.plotly_chart(fig, width="stretch")
+
+        cache = pd.DataFrame([
+            {"function": name, "run_hits": run["cache"].get(name, {}).get("hits", 0),
+             "run_misses": run["cache"].get(name, {}).get("misses", 0),
+             "hits": stats["hits"], "misses": stats["misses"]}
+            for name, stats in perf_utils.CACHE_STATS.items()
+        ])
+        if not cache.empty:
+            cache["hit_rate"] = cache["hits"] / (cache["hits"] + cache["misses"]) * 100
+            st.write("**Cachés**")
+            render_table(cache, {"run_hits": INTEGER, "run_misses": INTEGER, "hits": INTEGER,
+                                 "misses": INTEGER, "hit_rate": PERCENT},
+                         labels={"function": "Función", "run_hits": "Aciertos (ejecución)",
+                                 "run_misses": "Fallos (ejecución)", "hits": "Aciertos (total)",
+                                 "misses": "Fallos (total)", "hit_rate": "Tasa de acierto"})
+
+        col1, col2 = st.columns(2)
+        col1.download_button("📥 Descargar JSON", perf_utils.run_to_json(run),
+                             file_name="perf_run.json", mime="application/json")
+        col2.download_button("📥 Descargar Chrome Trace", perf_utils.run_to_chrome_trace(run),
+                             file_name="perf_trace.json", mime="application/json")
@@ -11,6 +11,35 @@ import os
 import sys
 from datetime import datetime
 import time
+import calendar
+import backend_utils
+import sketch_utils
+import geo_utils
+import quality_utils
+
+# Códigos de licencia FHVHV de la TLC
+LICENSE_NAMES = {"HV0002": "Juno", "HV0003": "Uber", "HV0004": "Via", "HV0005": "Lyft"}
+
+# Parámetros del generador sintético (aproximan los patrones publicados por la TLC)
+SYNTHETIC_OPERATORS = {
+    # licencia: (cuota, base de despacho, banderazo, $/milla, $/minuto, % viajes con propina)
+    "HV0003": (0.73, "B03404", 2.55, 1.18, 0.52, 0.17),
+    "HV0005": (0.27, "B03406", 2.40, 1.15, 0.50, 0.22),
+}
+SYNTHETIC_HOUR_WEIGHTS = {
+    "weekday": [2.2, 1.3, 0.9, 0.8, 1.0, 1.6, 2.9, 4.2, 4.9, 4.4, 4.0, 4.1,
+                4.4, 4.6, 4.9, 5.4, 5.8, 6.2, 6.5, 6.2, 5.7, 5.3, 4.8, 3.6],
+    "weekend": [4.6, 3.9, 3.1, 2.3, 1.5, 1.2, 1.4, 1.9, 2.6, 3.4, 4.1, 4.6,
+                4.9, 5.0, 5.1, 5.2, 5.3, 5.4, 5.5, 5.4, 5.2, 5.3, 5.6, 5.5],
+}
+SYNTHETIC_WEEKDAY_WEIGHTS = [0.87, 0.92, 0.97, 1.02, 1.14, 1.16, 0.98]  # lunes..domingo
+SYNTHETIC_AIRPORT_SHARE = 0.07
+SYNTHETIC_AIRPORTS = {
+    # zona: (probabilidad, mediana de millas, dispersión log)
+    132: (0.50, 16.0, 0.35),  # JFK
+    138: (0.42, 9.5, 0.40),   # LaGuardia
+    1: (0.08, 18.0, 0.30),    # Newark
+}
 
 def create_directories():
     """Crear directorios necesarios"""
@@ -85,6 +114,242 @@ def download_multiple_months(months_data):
     
     return downloaded_files
 
+def _zone_popularity(rng, zones_df=None):
+    """Pesos de popularidad de las zonas de recogida/destino (Zipf, Manhattan más denso)."""
+    zone_ids = np.array([z for z in range(1, 266) if z not in SYNTHETIC_AIRPORTS])
+    weights = 1.0 / np.arange(1, len(zone_ids) + 1) ** 0.9
+    weights = weights[rng.permutation(len(zone_ids))]
+    if zones_df is not None and "Borough" in zones_df.columns:
+        manhattan = zones_df.loc[zones_df["Borough"] == "Manhattan", "LocationID"]
+        weights[np.isin(zone_ids, manhattan)] *= 3
+    weights[np.isin(zone_ids, [264, 265])] = weights.min()  # zonas desconocidas
+    return zone_ids, weights / weights.sum()
+
+
+def generate_synthetic_month(year, month, n_rows, seed=42, zones_df=None):
+    """
+    Generar viajes FHVHV sintéticos de un mes con el esquema de los archivos de la TLC
+    Args:
+        year (int): Año
+        month (int): Mes
+        n_rows (int): Número de viajes
+        seed (int | SeedSequence): Semilla aleatoria
+        zones_df (DataFrame): Tabla de zonas (opcional, para densidad y recargo de Manhattan)
+    Returns:
+        DataFrame: Viajes con las columnas y tipos de fhvhv_tripdata
+    """
+    rng = np.random.default_rng(seed)
+    zone_ids, zone_weights = _zone_popularity(np.random.default_rng(year * 100 + month), zones_df)
+
+    # Operador
+    licenses = list(SYNTHETIC_OPERATORS)
+    params = np.array([SYNTHETIC_OPERATORS[l][2:] for l in licenses])
+    op = rng.choice(len(licenses), n_rows, p=[SYNTHETIC_OPERATORS[l][0] for l in licenses])
+    base_fare, per_mile, per_minute, tip_share = params[op].T
+
+    # Día (ponderado por día de la semana), hora (perfil laboral / fin de semana) y segundos
+    n_days = calendar.monthrange(year, month)[1]
+    first_weekday = calendar.weekday(year, month, 1)
+    day_weekday = (first_weekday + np.arange(n_days)) % 7
+    day_weights = np.array(SYNTHETIC_WEEKDAY_WEIGHTS)[day_weekday]
+    day = rng.choice(n_days, n_rows, p=day_weights / day_weights.sum())
+    weekend = day_weekday[day] >= 5
+    hour_u = rng.random(n_rows)
+    hour = np.where(
+        weekend,
+        np.searchsorted(np.cumsum(SYNTHETIC_HOUR_WEIGHTS["weekend"]) / sum(SYNTHETIC_HOUR_WEIGHTS["weekend"]), hour_u),
+        np.searchsorted(np.cumsum(SYNTHETIC_HOUR_WEIGHTS["weekday"]) / sum(SYNTHETIC_HOUR_WEIGHTS["weekday"]), hour_u),
+    )
+    month_start = np.datetime64(f"{year}-{month:02d}-01T00:00:00", "us")
+    pickup_seconds = day * 86400 + hour * 3600 + rng.integers(0, 3600, n_rows)
+    pickup = month_start + (pickup_seconds * 1_000_000).astype("timedelta64[us]")
+
+    # Zonas: popularidad + viajes dentro de la misma zona + flujos de aeropuerto
+    pu = zone_ids[rng.choice(len(zone_ids), n_rows, p=zone_weights)].astype(np.int32)
+    do = zone_ids[rng.choice(len(zone_ids), n_rows, p=zone_weights)].astype(np.int32)
+    same_zone = rng.random(n_rows) < 0.06
+    do[same_zone] = pu[same_zone]
+    miles = rng.lognormal(np.log(2.8), 0.75, n_rows)
+    miles[same_zone] = rng.lognormal(np.log(0.9), 0.5, same_zone.sum())
+
+    airport_trip = rng.random(n_rows) < SYNTHETIC_AIRPORT_SHARE
+    airport_ids = np.array(list(SYNTHETIC_AIRPORTS))
+    airport = airport_ids[rng.choice(len(airport_ids), n_rows, p=[a[0] for a in SYNTHETIC_AIRPORTS.values()])]
+    from_airport = airport_trip & (rng.random(n_rows) < 0.45)
+    to_airport = airport_trip & ~from_airport
+    pu[from_airport] = airport[from_airport]
+    do[to_airport] = airport[to_airport]
+    for zone, (_, median_miles, sigma) in SYNTHETIC_AIRPORTS.items():
+        trips = airport_trip & (airport == zone)
+        miles[trips] = rng.lognormal(np.log(median_miles), sigma, trips.sum())
+    miles = np.round(np.clip(miles, 0.1, 150), 2)
+
+    # Duración: velocidad según hora (congestión diurna) y aeropuertos (autopistas)
+    speed = np.where((hour >= 7) & (hour <= 19), 11.0, np.where(hour <= 5, 18.0, 14.0))
+    speed = speed * np.where(airport_trip, 1.4, 1.0) * rng.lognormal(0, 0.25, n_rows)
+    trip_time = (miles / speed * 3600 + 60).astype(np.int64)
+    minutes = trip_time / 60
+
+    # Tarifa: banderazo + distancia + tiempo, con tarifa dinámica en horas pico
+    peak = ((hour >= 7) & (hour <= 9)) | ((hour >= 16) & (hour <= 19))
+    surge = np.maximum(1.0, rng.lognormal(np.where(peak, 0.12, 0.02), 0.12))
+    fare = np.round(np.maximum(7.5, (base_fare + per_mile * miles + per_minute * minutes) * surge), 2)
+    toll_probability = np.where(airport_trip, 0.35, 0.04)
+    tolls = np.where(rng.random(n_rows) < toll_probability, rng.choice([6.94, 11.19, 17.63], n_rows), 0.0)
+    bcf = np.round(fare * 0.0275, 2)
+    sales_tax = np.round((fare + tolls + bcf) * 0.08875, 2)
+    if zones_df is not None and "Borough" in zones_df.columns:
+        manhattan = zones_df.loc[zones_df["Borough"] == "Manhattan", "LocationID"].to_numpy()
+        congestion = np.isin(pu, manhattan) | np.isin(do, manhattan)
+    else:
+        congestion = rng.random(n_rows) < 0.55
+    congestion_surcharge = np.where(congestion, 2.75, 0.0)
+    airport_fee = np.where(np.isin(pu, [132, 138]) | np.isin(do, [132, 138]), 2.50, 0.0)
+    tips = np.where(rng.random(n_rows) < tip_share,
+                    np.round(fare * rng.choice([0.10, 0.15, 0.18, 0.20, 0.25], n_rows), 2), 0.0)
+    driver_pay = np.round(np.maximum(3.0, fare * 0.72 + minutes * 0.05 + rng.normal(0, 1.5, n_rows)), 2)
+
+    # Tiempos de solicitud y llegada del conductor
+    wait = (60 + rng.exponential(300, n_rows)).astype(np.int64)
+    on_scene_wait = rng.exponential(60, n_rows).astype(np.int64)
+
+    shared_request = rng.random(n_rows) < 0.02
+    return pd.DataFrame({
+        "hvfhs_license_num": pd.Categorical.from_codes(op, licenses),
+        "dispatching_base_num": pd.Categorical.from_codes(op, [SYNTHETIC_OPERATORS[l][1] for l in licenses]),
+        "originating_base_num": pd.Categorical.from_codes(
+            np.where(op == licenses.index("HV0003"), 0, -1), [SYNTHETIC_OPERATORS["HV0003"][1]]),
+        "request_datetime": pickup - (wait * 1_000_000).astype("timedelta64[us]"),
+        "on_scene_datetime": pickup - (on_scene_wait * 1_000_000).astype("timedelta64[us]"),
+        "pickup_datetime": pickup,
+        "dropoff_datetime": pickup + (trip_time * 1_000_000).astype("timedelta64[us]"),
+        "PULocationID": pu,
+        "DOLocationID": do,
+        "trip_miles": miles,
+        "trip_time": trip_time,
+        "base_passenger_fare": fare,
+        "tolls": tolls,
+        "bcf": bcf,
+        "sales_tax": sales_tax,
+        "congestion_surcharge": congestion_surcharge,
+        "airport_fee": airport_fee,
+        "tips": tips,
+        "driver_pay": driver_pay,
+        "shared_request_flag": _flag_column(shared_request),
+        "shared_match_flag": _flag_column(shared_request & (rng.random(n_rows) < 0.4)),
+        "access_a_ride_flag": _flag_column(np.zeros(n_rows, dtype=bool)),
+        "wav_request_flag": _flag_column(rng.random(n_rows) < 0.003),
+        "wav_match_flag": _flag_column(rng.random(n_rows) < 0.06),
+    })
+
+
+def _flag_column(values):
+    """Columna de bandera 'Y'/'N' como categoría (se escribe como texto en Parquet)."""
+    return pd.Categorical.from_codes(values.astype(np.int8), ["N", "Y"])
+
+
+def write_synthetic_month(year, month, n_rows, output_dir='raw-data', seed=42, zones_df=None,
+                          chunk_rows=5_000_000):
+    """
+    Escribir un mes sintético en Parquet por bloques (memoria acotada para decenas de millones)
+    Args:
+        year (int): Año
+        month (int): Mes
+        n_rows (int): Número de viajes
+        output_dir (str): Directorio de salida (mismo nombre que las descargas: AAAA-MM.parquet)
+        seed (int): Semilla aleatoria
+        zones_df (DataFrame): Tabla de zonas (opcional)
+        chunk_rows (int): Viajes por bloque
+    Returns:
+        str: Ruta del archivo creado
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    os.makedirs(output_dir, exist_ok=True)
+    file_path = os.path.join(output_dir, f'{year}-{month:02d}.parquet')
+    start = time.time()
+    n_chunks = max(1, -(-n_rows // chunk_rows))
+    chunk_seeds = np.random.SeedSequence([seed, year, month]).spawn(n_chunks)
+
+    writer = None
+    try:
+        for i, chunk_seed in enumerate(chunk_seeds):
+            rows = min(chunk_rows, n_rows - i * chunk_rows)
+            table = pa.Table.from_pandas(
+                generate_synthetic_month(year, month, rows, chunk_seed, zones_df), preserve_index=False
+            )
+            # Las categorías se guardan como texto, igual que los archivos de la TLC
+            table = table.cast(pa.schema([
+                pa.field(f.name, pa.string()) if pa.types.is_dictionary(f.type) else f
+                for f in table.schema
+            ]))
+            if writer is None:
+                writer = pq.ParquetWriter(file_path, table.schema, compression='snappy')
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+
+    elapsed = time.time() - start
+    print(f"✅ Sintético {year}-{month:02d}: {n_rows:,} viajes en {elapsed:.1f}s "
+          f"({n_rows / max(elapsed, 1e-9) * 60 / 1e6:.1f} M filas/min) -> {file_path}")
+    return file_path
+
+
+def create_synthetic_months(months_data, rows_per_month, output_dir='raw-data', seed=42):
+    """
+    Generar varios meses sintéticos sin red (alternativa a download_multiple_months)
+    Args:
+        months_data (list): Lista de tuplas (mes, año)
+        rows_per_month (int): Viajes por mes
+        output_dir (str): Directorio de salida
+        seed (int): Semilla aleatoria
+    Returns:
+        list: Lista de archivos creados
+    """
+    zone_lookup_path = os.path.join('data', 'taxi_zone_lookup.csv')
+    zones_df = pd.read_csv(zone_lookup_path) if os.path.exists(zone_lookup_path) else None
+    return [
+        write_synthetic_month(year, month, rows_per_month, output_dir, seed, zones_df)
+        for month, year in months_data
+    ]
+
+
+def validate_month_files(input_files, clean_dir=os.path.join('raw-data', 'clean'),
+                         quarantine_dir=os.path.join('raw-data', 'quarantine')):
+    """
+    Aplicar las reglas de calidad a cada mes (una pasada por lote de registros)
+    Args:
+        input_files (list): Archivos Parquet de meses completos
+        clean_dir (str): Directorio de las particiones limpias (mismo nombre de archivo)
+        quarantine_dir (str): Directorio de las filas en cuarentena
+    Returns:
+        list: Particiones limpias (o el archivo original si la validación falla)
+    """
+    clean_files = []
+    for file_path in input_files:
+        name = os.path.basename(file_path)
+        clean_path = os.path.join(clean_dir, name)
+        if (os.path.exists(clean_path) and quality_utils.is_validated(clean_path)
+                and os.path.getmtime(clean_path) >= os.path.getmtime(file_path)):
+            print(f"⏭️  {name} ya validado")
+            clean_files.append(clean_path)
+            continue
+        try:
+            report = quality_utils.validate_parquet(file_path, clean_path, os.path.join(quarantine_dir, name))
+            share = report['quarantined_rows'] / max(report['rows'], 1)
+            print(f"✅ {name}: {report['clean_rows']:,} filas limpias, {report['quarantined_rows']:,} "
+                  f"en cuarentena ({share:.2%}) en {report['seconds']:.1f}s")
+            for rule, count in report['rules'].items():
+                if count:
+                    print(f"   - {quality_utils.QUALITY_RULES[rule]}: {count:,}")
+            clean_files.append(clean_path)
+        except Exception as e:
+            print(f"⚠️ No se pudo validar {name}: {e}")
+            clean_files.append(file_path)
+    return clean_files
+
 def create_combined_sample_data(input_files, sample_size_per_month=20000):
     """
     Crear una muestra combinada de múltiples archivos
@@ -102,7 +367,7 @@ def create_combined_sample_data(input_files, sample_size_per_month=20000):
             print(f"📊 Procesando {os.path.basename(file_path)}...")
             
             # Leer archivo
-            df = pd.read_parquet(file_path)
+            df = backend_utils.read_parquet(file_path)
             print(f"   📈 Registros originales: {len(df):,}")
             
             # Crear muestra estratificada por hora del día para mantener patrones
@@ -126,6 +391,15 @@ def create_combined_sample_data(input_files, sample_size_per_month=20000):
             sample_df.to_parquet(individual_file, compression='snappy', index=False)
             individual_files.append(individual_file)
             
+            # La muestra hereda el informe de calidad del mes (los consumidores omiten la limpieza)
+            source_report = quality_utils.load_report(file_path) if quality_utils.is_validated(file_path) else None
+            if source_report:
+                quality_utils.save_report(individual_file, {**source_report, 'sample_rows': len(sample_df)})
+            
+            # Sketches de distribuciones por celda para el dashboard
+            create_partition_sketches(sample_df, individual_file)
+            create_partition_density(sample_df, individual_file)
+            
             combined_samples.append(sample_df)
             print(f"   ✅ Muestra creada: {len(sample_df):,} registros -> {os.path.basename(individual_file)}")
             
@@ -159,6 +433,51 @@ def create_combined_sample_data(input_files, sample_size_per_month=20000):
     
     return output_file
 
+def create_partition_sketches(df, parquet_path):
+    """
+    Construir y guardar los sketches de distribuciones de una partición
+    Args:
+        df (DataFrame): Datos de la partición
+        parquet_path (str): Archivo Parquet de la partición (los sketches se guardan al lado)
+    """
+    try:
+        zone_lookup_path = os.path.join('data', 'taxi_zone_lookup.csv')
+        zones_df = pd.read_csv(zone_lookup_path) if os.path.exists(zone_lookup_path) else None
+        
+        sketches = sketch_utils.build_sketches(df, zones_df)
+        output_file = sketch_utils.sketch_path(parquet_path)
+        sketch_utils.save_sketches(sketches, output_file)
+        print(f"   📐 Sketches creados: {len(sketches.keys):,} celdas -> {os.path.basename(output_file)}")
+        return output_file
+    except Exception as e:
+        print(f"   ⚠️ No se pudieron crear los sketches: {e}")
+        return None
+
+def create_partition_density(df, parquet_path):
+    """
+    Construir y guardar la malla de densidad de recogidas de una partición
+    Args:
+        df (DataFrame): Datos de la partición
+        parquet_path (str): Archivo Parquet de la partición (la malla se guarda al lado)
+    """
+    try:
+        zone_lookup_path = os.path.join('data', 'taxi_zone_lookup.csv')
+        centroids_path = os.path.join('data', 'taxi_zone_centroids.csv')
+        zones_df = pd.read_csv(zone_lookup_path) if os.path.exists(zone_lookup_path) else None
+        zone_coords = geo_utils.zone_coordinates(pd.read_csv(centroids_path)) if os.path.exists(centroids_path) else None
+        
+        density = geo_utils.build_density_grid(df, zone_coords, zones_df)
+        if density is None:
+            print("   ⚠️ Sin coordenadas de zonas: no se creó la malla de densidad")
+            return None
+        output_path = geo_utils.density_path(parquet_path)
+        density.save(output_path)
+        print(f"   🗺️ Malla de densidad creada: {len(density.codes):,} entradas (porción × celda) -> {os.path.basename(output_path)}")
+        return output_path
+    except Exception as e:
+        print(f"   ⚠️ No se pudo crear la malla de densidad: {e}")
+        return None
+
 def create_sample_data_efficient(input_file, sample_percentage=10):
     """
     Crear datos de muestra de forma más eficiente
@@ -248,7 +567,7 @@ def create_zone_files():
         # Datos básicos de zonas de NYC
         zones_data = {
             'LocationID': list(range(1, 266)),
-            'Borough': ['Manhattan'] * 68 + ['Brooklyn'] * 61 + ['Queens'] * 100 + ['Bronx'] * 43 + ['Staten Island'] * 23,
+            'Borough': (['Manhattan'] * 68 + ['Brooklyn'] * 61 + ['Queens'] * 100 + ['Bronx'] * 43 + ['Staten Island'] * 23)[:265],
             'Zone': [f'Zone_{i}' for i in range(1, 266)],
             'service_zone': ['Yellow Zone'] * 200 + ['Green Zone'] * 65
         }
@@ -271,6 +590,13 @@ def create_zone_files():
         df_centroids = pd.DataFrame(centroids_data)
         df_centroids.to_csv(centroids_path, index=False)
         print(f"✅ Creado: {centroids_path}")
+    
+    # Polígonos simplificados para las coropletas (si se descargó el GeoJSON de zonas de la TLC)
+    if os.path.exists(geo_utils.ZONES_GEOJSON):
+        zones_df = pd.read_csv(zone_lookup_path)
+        geometries = geo_utils.zone_geometries(names=dict(zip(zones_df['LocationID'], zones_df['Zone'])))
+        for level, geojson in geometries.items():
+            print(f"✅ Polígonos nivel {level}: {geo_utils.count_vertices(geojson):,} vértices")
 
 def main():
     """Función principal optimizada para múltiples meses"""
@@ -293,15 +619,26 @@ def main():
         (6, 2024),   # Junio
     ]
     
-    print(f"\n📥 Descargando datos de {len(months_to_download)} meses...")
-    downloaded_files = download_multiple_months(months_to_download)
+    if "--synthetic" in sys.argv:
+        # Sin red: generar meses sintéticos con el esquema FHVHV (--synthetic N viajes por mes)
+        position = sys.argv.index("--synthetic") + 1
+        rows_per_month = int(sys.argv[position]) if position < len(sys.argv) else 1_000_000
+        print(f"\n🧪 Generando {len(months_to_download)} meses sintéticos de {rows_per_month:,} viajes...")
+        downloaded_files = create_synthetic_months(months_to_download, rows_per_month)
+    else:
+        print(f"\n📥 Descargando datos de {len(months_to_download)} meses...")
+        downloaded_files = download_multiple_months(months_to_download)
     
     if downloaded_files:
         print(f"\n✅ {len(downloaded_files)} archivos descargados exitosamente")
         
+        # Validar cada mes: particiones limpias + cuarentena
+        print("\n🧹 Validando calidad de datos...")
+        clean_files = validate_month_files(downloaded_files)
+        
         # Crear muestra combinada
         print("\n🎯 Creando dataset combinado para deployment...")
-        combined_file = create_combined_sample_data(downloaded_files, sample_size_per_month=15000)
+        combined_file = create_combined_sample_data(clean_files, sample_size_per_month=15000)
         
         if combined_file:
             print("\n✅ ¡Dataset multi-mes listo para deployment!")
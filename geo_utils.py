@@ -0,0 +1,476 @@
+"""
+Agregación espacial de las recogidas para los mapas de la pestaña 3.
+
+Las recogidas se cuentan una sola vez (en la ingesta, junto a los sketches) en una malla fija
+de celdas cuadradas sobre NYC, separadas por las mismas celdas de filtros que los sketches
+(operador, hora, distrito de recogida y dirección aeroportuaria). El mapa de densidad suma las
+porciones de la selección del sidebar y recibe una fila ponderada por celda con viajes: el
+resultado es determinista (sin muestreo por ejecución) y su tamaño no depende de los viajes.
+
+Los registros FHVHV solo traen la zona de recogida (PULocationID), así que cada viaje se ubica
+en el centroide de su zona; si el archivo trae coordenadas de recogida se usan directamente.
+
+Los polígonos de las zonas de taxi (GeoJSON de la TLC) se leen una sola vez, se simplifican con
+Douglas-Peucker a varias tolerancias y se guardan como GeoJSON compacto. Las coropletas se
+rellenan con el vector de viajes por LocationID: la geometría no se vuelve a procesar.
+"""
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+import sketch_utils
+import tree_utils
+
+# Malla fija: límites (oeste, sur, este, norte) y lado de la celda en grados (~450 m)
+GRID_BOUNDS = (-74.26, 40.49, -73.69, 40.92)
+CELL_SIZE = 0.005
+
+# Versión del formato de la malla (los archivos de otra versión se reconstruyen)
+DENSITY_VERSION = 1
+
+# Polígonos de las zonas de taxi (GeoJSON en WGS84 de la TLC / NYC Open Data) y su caché simplificada
+ZONES_GEOJSON = os.path.join("data", "taxi_zones.geojson")
+ZONES_CACHE_DIR = os.path.join("data", "taxi_zones_simplified")
+
+# Nivel de detalle -> tolerancia de Douglas-Peucker en grados (0.0001° ≈ 10 m)
+SIMPLIFY_TOLERANCES = {"Alto": 0.0001, "Medio": 0.0005, "Bajo": 0.002}
+
+# Decimales de las coordenadas guardadas (5 ≈ 1 m)
+COORD_DECIMALS = 5
+
+# LocationID van de 1 a 265 (como en od_utils)
+N_ZONES = 266
+
+
+def zone_coordinates(zones_df):
+    """
+    Coordenadas de los centroides de zona (acepta columnas Lat/Lon o latitude/longitude).
+
+    Returns:
+        DataFrame: LocationID, lon y lat de las zonas con coordenadas válidas, o None
+    """
+    if zones_df is None:
+        return None
+    for lat_col, lon_col in (("Lat", "Lon"), ("latitude", "longitude")):
+        if {lat_col, lon_col}.issubset(zones_df.columns):
+            coords = pd.DataFrame({
+                "LocationID": zones_df["LocationID"].to_numpy(),
+                "lon": pd.to_numeric(zones_df[lon_col], errors="coerce").to_numpy(),
+                "lat": pd.to_numeric(zones_df[lat_col], errors="coerce").to_numpy(),
+            })
+            # Coordenadas (0, 0) = zona sin ubicar
+            valid = coords["lon"].notna() & coords["lat"].notna() & (coords["lon"] != 0) & (coords["lat"] != 0)
+            return coords[valid].reset_index(drop=True)
+    return None
+
+
+def grid_shape(bounds=GRID_BOUNDS, cell_size=CELL_SIZE):
+    """Número de celdas (columnas, filas) de la malla."""
+    west, south, east, north = bounds
+    return int(np.ceil((east - west) / cell_size)), int(np.ceil((north - south) / cell_size))
+
+
+def cell_codes(lon, lat, bounds=GRID_BOUNDS, cell_size=CELL_SIZE):
+    """
+    Código de celda (fila * columnas + columna) de cada punto.
+
+    Returns:
+        np.ndarray: int64, -1 para puntos fuera de la malla o sin coordenadas
+    """
+    lon = np.asarray(lon, dtype=float)
+    lat = np.asarray(lat, dtype=float)
+    n_cols, n_rows = grid_shape(bounds, cell_size)
+    with np.errstate(invalid="ignore"):
+        col = np.floor((lon - bounds[0]) / cell_size)
+        row = np.floor((lat - bounds[1]) / cell_size)
+    inside = (col >= 0) & (col < n_cols) & (row >= 0) & (row < n_rows)
+    return np.where(inside, row * n_cols + col, -1).astype(np.int64)
+
+
+def cell_centers(codes, bounds=GRID_BOUNDS, cell_size=CELL_SIZE):
+    """Longitud y latitud del centro de cada celda."""
+    n_cols, _ = grid_shape(bounds, cell_size)
+    codes = np.asarray(codes, dtype=np.int64)
+    lon = bounds[0] + (codes % n_cols + 0.5) * cell_size
+    lat = bounds[1] + (codes // n_cols + 0.5) * cell_size
+    return lon, lat
+
+
+class DensityGrid:
+    """
+    Recogidas por celda de la malla y por porción de filtros.
+
+    Las entradas se guardan ordenadas por porción (como ODMatrix): las de la porción i están
+    en [slice_ptr[i], slice_ptr[i + 1]).
+
+    Attributes:
+        slices: DataFrame con una fila por porción y las columnas de sketch_utils.CELL_KEYS
+        slice_ptr: Inicio de las entradas de cada porción
+        codes: Código de celda de cada entrada
+        counts: Viajes por entrada
+        revenue: Suma de driver_pay por entrada
+        meta: bounds, cell_size, source ('coordinates' o 'centroids'), rows, outside y version
+    """
+
+    def __init__(self, slices, slice_ptr, codes, counts, revenue, meta):
+        self.slices = slices.reset_index(drop=True)
+        self.slice_ptr = slice_ptr
+        self.codes = codes
+        self.counts = counts
+        self.revenue = revenue
+        self.meta = meta
+
+    @property
+    def version(self):
+        return self.meta.get("version")
+
+    @property
+    def nbytes(self):
+        return self.slice_ptr.nbytes + self.codes.nbytes + self.counts.nbytes + self.revenue.nbytes
+
+    def mask(self, operators=None, hours=None, boroughs=None, airport_only=False):
+        """Máscara de las porciones que cumplen los filtros del sidebar (igual que SketchSet.mask)."""
+        return sketch_utils.cell_mask(self.slices, operators, hours, boroughs, airport_only)
+
+    def cells(self, mask=None):
+        """
+        Celdas con viajes para la selección.
+
+        Args:
+            mask: Máscara de porciones (None = todas)
+
+        Returns:
+            DataFrame: code, lon, lat, count y revenue por celda, ordenado por código
+        """
+        if mask is None:
+            entries = slice(None)
+        else:
+            selected = np.flatnonzero(mask)
+            lengths = self.slice_ptr[selected + 1] - self.slice_ptr[selected]
+            # Índices de las entradas de las porciones elegidas, sin recorrer las demás
+            starts = np.repeat(self.slice_ptr[selected] - np.cumsum(lengths) + lengths, lengths)
+            entries = starts + np.arange(lengths.sum())
+        codes = np.asarray(self.codes[entries])
+        unique, inverse = np.unique(codes, return_inverse=True)
+        counts = np.bincount(inverse, weights=self.counts[entries], minlength=len(unique))
+        revenue = np.bincount(inverse, weights=self.revenue[entries], minlength=len(unique))
+        lon, lat = cell_centers(unique, self.meta["bounds"], self.meta["cell_size"])
+        return pd.DataFrame({"code": unique, "lon": lon, "lat": lat,
+                             "count": counts.astype(np.int64), "revenue": revenue})
+
+    def save(self, path):
+        """Guarda la malla como directorio de arrays (las porciones van en meta.json)."""
+        slices = {column: [None if pd.isna(value) else value for value in self.slices[column].tolist()]
+                  for column in self.slices.columns}
+        tree_utils.save_arrays(path, {"slice_ptr": self.slice_ptr, "codes": self.codes,
+                                      "counts": self.counts, "revenue": self.revenue},
+                               {**self.meta, "slices": slices})
+
+    @classmethod
+    def load(cls, path, mmap_mode="r"):
+        """Carga una malla guardada con save()."""
+        arrays, meta = tree_utils.load_arrays(path, mmap_mode)
+        slices = pd.DataFrame(meta.pop("slices"))
+        meta["bounds"] = tuple(meta["bounds"])
+        return cls(slices, arrays["slice_ptr"], arrays["codes"], arrays["counts"], arrays["revenue"], meta)
+
+
+def pickup_positions(df, zone_coords=None):
+    """
+    Longitud y latitud de recogida de cada viaje.
+
+    Returns:
+        tuple: (lon, lat, source) o None si no hay coordenadas ni centroides
+    """
+    if {"pickup_longitude", "pickup_latitude"}.issubset(df.columns):
+        return (df["pickup_longitude"].to_numpy(dtype=float), df["pickup_latitude"].to_numpy(dtype=float),
+                "coordinates")
+    if zone_coords is None or zone_coords.empty:
+        return None
+    coords = zone_coords.set_index("LocationID")
+    zones = df["PULocationID"]
+    return (zones.map(coords["lon"]).to_numpy(dtype=float), zones.map(coords["lat"]).to_numpy(dtype=float),
+            "centroids")
+
+
+def build_density_grid(df, zone_coords=None, zones_df=None, airport_zones=None,
+                       bounds=GRID_BOUNDS, cell_size=CELL_SIZE):
+    """
+    Cuenta las recogidas de una partición por porción de filtros y celda de la malla.
+
+    Args:
+        df: DataFrame de viajes
+        zone_coords: Centroides de zona (zone_coordinates) si no hay coordenadas de recogida
+        zones_df: Tabla de zonas para derivar pickup_borough si no existe
+        airport_zones: IDs de zonas de aeropuertos (por defecto sketch_utils.AIRPORT_ZONES)
+        bounds, cell_size: Malla
+
+    Returns:
+        DensityGrid o None si no hay forma de ubicar las recogidas
+    """
+    positions = pickup_positions(df, zone_coords)
+    if positions is None:
+        return None
+    lon, lat, source = positions
+    codes = cell_codes(lon, lat, bounds, cell_size)
+
+    cells = sketch_utils.cell_frame(df, zones_df, airport_zones)
+    slice_id = cells.groupby(sketch_utils.CELL_KEYS, dropna=False, sort=True).ngroup().to_numpy()
+    n_slices = slice_id.max() + 1 if len(slice_id) else 0
+    first_rows = pd.Series(np.arange(len(slice_id))).groupby(slice_id).first().to_numpy()
+
+    inside = codes >= 0
+    n_cells = np.prod(grid_shape(bounds, cell_size))
+    # Una entrada por par (porción, celda): ordenar la clave combinada deja las porciones contiguas
+    keys, inverse = np.unique(slice_id[inside].astype(np.int64) * n_cells + codes[inside], return_inverse=True)
+    counts = np.bincount(inverse, minlength=len(keys))
+    pay = df["driver_pay"].to_numpy(dtype=float)[inside] if "driver_pay" in df.columns else np.zeros(inside.sum())
+    revenue = np.bincount(inverse, weights=np.nan_to_num(pay), minlength=len(keys))
+
+    entry_slices = keys // n_cells
+    slice_ptr = np.searchsorted(entry_slices, np.arange(n_slices + 1)).astype(np.int64)
+    meta = {
+        "bounds": tuple(bounds),
+        "cell_size": cell_size,
+        "source": source,
+        "rows": int(inside.sum()),
+        "outside": int((~inside).sum()),
+        "version": DENSITY_VERSION,
+    }
+    return DensityGrid(cells.iloc[first_rows], slice_ptr, (keys % n_cells).astype(np.int32),
+                       counts.astype(np.int32), revenue.astype(np.float32), meta)
+
+
+def density_path(parquet_path):
+    """Ruta de la malla de densidad asociada a una partición Parquet."""
+    return os.path.splitext(parquet_path)[0] + "_density"
+
+
+def simplify_line(points, tolerance):
+    """
+    Simplificación de Douglas-Peucker de una polilínea.
+
+    Se conserva el punto más alejado del segmento entre los extremos si su distancia supera la
+    tolerancia, y se repite en cada mitad (con una pila, sin recursión).
+
+    Args:
+        points: Array (n, 2) de coordenadas
+        tolerance: Distancia máxima al trazo original (mismas unidades que points)
+
+    Returns:
+        np.ndarray: Puntos conservados (siempre incluye el primero y el último)
+    """
+    points = np.asarray(points, dtype=float)
+    if len(points) < 3:
+        return points
+    keep = np.zeros(len(points), dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        segment = points[end] - points[start]
+        offsets = points[start + 1:end] - points[start]
+        length = np.hypot(*segment)
+        if length == 0:
+            distances = np.hypot(offsets[:, 0], offsets[:, 1])
+        else:
+            distances = np.abs(segment[0] * offsets[:, 1] - segment[1] * offsets[:, 0]) / length
+        farthest = int(distances.argmax())
+        if distances[farthest] > tolerance:
+            index = start + 1 + farthest
+            keep[index] = True
+            stack.append((start, index))
+            stack.append((index, end))
+    return points[keep]
+
+
+def simplify_ring(ring, tolerance):
+    """
+    Simplifica un anillo cerrado de un polígono.
+
+    El anillo se parte en el vértice más alejado del inicio para que Douglas-Peucker no lo
+    reduzca a un segmento.
+
+    Returns:
+        np.ndarray: Anillo cerrado o None si queda con menos de 4 puntos
+    """
+    ring = np.asarray(ring, dtype=float)
+    if len(ring) < 4:
+        return None
+    far = int(np.hypot(*(ring - ring[0]).T).argmax())
+    first = simplify_line(ring[:far + 1], tolerance)
+    second = simplify_line(ring[far:], tolerance)
+    simplified = np.vstack([first, second[1:]])
+    return simplified if len(simplified) >= 4 else None
+
+
+def _feature_zone_id(feature):
+    properties = feature.get("properties") or {}
+    for key in ("LocationID", "location_id", "locationid"):
+        if properties.get(key) is not None:
+            return int(float(properties[key]))
+    return None
+
+
+def load_zone_shapes(path=ZONES_GEOJSON):
+    """
+    Lee los polígonos de las zonas de taxi de un GeoJSON (Polygon o MultiPolygon por zona).
+
+    Returns:
+        dict: LocationID -> lista de polígonos (cada uno, lista de anillos como arrays (n, 2));
+              las zonas repetidas en el archivo se unen en una sola
+    """
+    with open(path) as f:
+        collection = json.load(f)
+    shapes = {}
+    for feature in collection.get("features", []):
+        zone_id = _feature_zone_id(feature)
+        geometry = feature.get("geometry") or {}
+        if zone_id is None or geometry.get("type") not in ("Polygon", "MultiPolygon"):
+            continue
+        polygons = [geometry["coordinates"]] if geometry["type"] == "Polygon" else geometry["coordinates"]
+        shapes.setdefault(zone_id, []).extend(
+            [np.asarray(ring, dtype=float)[:, :2] for ring in polygon] for polygon in polygons
+        )
+    return shapes
+
+
+def simplify_zones(shapes, tolerance, decimals=COORD_DECIMALS, names=None):
+    """
+    GeoJSON compacto de las zonas simplificadas (un Feature por zona con id = LocationID).
+
+    Los huecos que colapsan se descartan; un contorno exterior que colapsa se conserva sin
+    simplificar para no perder la zona.
+
+    Args:
+        shapes: Resultado de load_zone_shapes
+        tolerance: Tolerancia de Douglas-Peucker en grados
+        decimals: Decimales de las coordenadas
+        names: dict opcional LocationID -> nombre de la zona (queda en properties.zone)
+
+    Returns:
+        dict: FeatureCollection
+    """
+    features = []
+    for zone_id, polygons in sorted(shapes.items()):
+        coordinates = []
+        for rings in polygons:
+            simplified = []
+            for i, ring in enumerate(rings):
+                reduced = simplify_ring(ring, tolerance)
+                if reduced is None and i == 0:
+                    reduced = ring
+                if reduced is not None:
+                    simplified.append(np.round(reduced, decimals).tolist())
+            coordinates.append(simplified)
+        features.append({
+            "type": "Feature",
+            "id": int(zone_id),
+            "properties": {"zone": (names or {}).get(zone_id, str(zone_id))},
+            "geometry": {"type": "MultiPolygon", "coordinates": coordinates},
+        })
+    return {"type": "FeatureCollection", "features": features}
+
+
+def count_vertices(geojson):
+    """Número de vértices de un FeatureCollection de (Multi)Polygons."""
+    return sum(len(ring) for feature in geojson["features"]
+               for polygon in feature["geometry"]["coordinates"] for ring in polygon)
+
+
+def zone_geometries(source=ZONES_GEOJSON, cache_dir=ZONES_CACHE_DIR, tolerances=None, names=None):
+    """
+    Geometrías simplificadas por nivel de detalle, leídas de la caché en disco.
+
+    La caché (un GeoJSON compacto por tolerancia) se regenera si falta o si el archivo de
+    polígonos es más reciente. Sin archivo de polígonos se usa la caché existente.
+
+    Args:
+        source: GeoJSON original de las zonas
+        cache_dir: Directorio de la caché
+        tolerances: dict nivel -> tolerancia (por defecto SIMPLIFY_TOLERANCES)
+        names: dict opcional LocationID -> nombre de la zona
+
+    Returns:
+        dict: nivel -> FeatureCollection, o None si no hay polígonos ni caché
+    """
+    tolerances = tolerances or SIMPLIFY_TOLERANCES
+    paths = {level: os.path.join(cache_dir, f"taxi_zones_{tolerance}.geojson") for level, tolerance in tolerances.items()}
+    source_exists = os.path.exists(source)
+    stale = [level for level, path in paths.items()
+             if not os.path.exists(path) or (source_exists and os.path.getmtime(path) < os.path.getmtime(source))]
+    if stale and not source_exists:
+        return None
+
+    if stale:
+        shapes = load_zone_shapes(source)
+        os.makedirs(cache_dir, exist_ok=True)
+        for level in stale:
+            geojson = simplify_zones(shapes, tolerances[level], names=names)
+            tmp_path = f"{paths[level]}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(geojson, f, separators=(",", ":"))
+            os.replace(tmp_path, paths[level])
+
+    geometries = {}
+    for level, path in paths.items():
+        with open(path) as f:
+            geometries[level] = json.load(f)
+    return geometries
+
+
+def zone_vector(zone_ids, values=None, n_zones=N_ZONES):
+    """
+    Vector indexado por LocationID: viajes por zona (o suma de values por zona).
+
+    Returns:
+        np.ndarray: Largo n_zones; los IDs fuera de rango se ignoran
+    """
+    zone_ids = np.asarray(zone_ids)
+    valid = (zone_ids >= 0) & (zone_ids < n_zones)
+    weights = None if values is None else np.nan_to_num(np.asarray(values, dtype=float)[valid])
+    return np.bincount(zone_ids[valid].astype(np.int64), weights=weights, minlength=n_zones)
+
+
+def choropleth_figure(geojson, vector, title=None, colorbar_title="Viajes", zoom=9.3):
+    """
+    Coropleta de las zonas rellenada con un vector indexado por LocationID.
+
+    Args:
+        geojson: FeatureCollection de zone_geometries (id = LocationID)
+        vector: Valores por LocationID (zone_vector)
+        title: Título del gráfico
+        colorbar_title: Título de la barra de color
+
+    Returns:
+        go.Figure
+    """
+    import plotly.graph_objects as go
+
+    ids = np.array([feature["id"] for feature in geojson["features"]])
+    names = [feature["properties"].get("zone", str(feature["id"])) for feature in geojson["features"]]
+    fig = go.Figure(go.Choroplethmap(
+        geojson=geojson,
+        locations=ids,
+        z=np.asarray(vector)[ids],
+        featureidkey="id",
+        text=names,
+        colorscale="Viridis",
+        marker_line_width=0.3,
+        marker_opacity=0.75,
+        colorbar_title=colorbar_title,
+        hovertemplate="%{text}<br>" + colorbar_title + ": %{z:,.0f}<extra></extra>",
+    ))
+    fig.update_layout(
+        title=title,
+        map_style="carto-positron",
+        map_zoom=zoom,
+        map_center={"lat": 40.7128, "lon": -73.95},
+        margin={"l": 0, "r": 0, "t": 40 if title else 0, "b": 0},
+    )
+    return fig
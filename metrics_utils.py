@@ -0,0 +1,249 @@
+"""
+Métricas operativas del dashboard y de los modelos en formato de texto de Prometheus.
+
+Contadores, gauges e histogramas en memoria del proceso (sin dependencias externas). Registrar
+un valor es una búsqueda en un dict y una suma bajo un lock. La exposición es opcional y se
+configura por variables de entorno:
+
+    NYC_METRICS_PORT=9108             servidor HTTP local con /metrics
+    NYC_METRICS_TEXTFILE=/ruta/x.prom archivo para el textfile collector de node_exporter
+"""
+
+import bisect
+import os
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Buckets por defecto (segundos) para latencias de reruns y de inferencia
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Buckets (bytes) para el tamaño de las figuras enviadas al navegador
+SIZE_BUCKETS = (1e3, 1e4, 5e4, 1e5, 5e5, 1e6, 5e6, 1e7)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_lock = threading.Lock()
+_registry = {}
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs += [f'{name}="{value}"' for name, value in extra]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """Base de las métricas: nombre, ayuda, etiquetas y un valor por combinación de etiquetas."""
+
+    kind = None
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        with _lock:
+            _registry[name] = self
+
+    def _key(self, labels):
+        return tuple(labels.get(name, "") for name in self.labels)
+
+    def _samples(self):
+        return [(self.name, key, value) for key, value in self._values.items()]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for name, key, value, *extra in self._samples():
+            lines.append(f"{name}{_format_labels(self.labels, key, *extra)} {_format_value(value)}")
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """Contador monótono (p. ej. aciertos de caché, filas procesadas)."""
+
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """Valor instantáneo (p. ej. memoria residente)."""
+
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with _lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    """
+    Histograma con buckets fijos.
+
+    Cada observación incrementa un solo bucket; los conteos acumulados (le) se calculan al
+    exportar.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with _lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def _samples(self):
+        samples = []
+        for key, (counts, total, count) in self._values.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                samples.append((f"{self.name}_bucket", key, cumulative, [("le", _format_value(float(bound)))]))
+            samples.append((f"{self.name}_sum", key, total))
+            samples.append((f"{self.name}_count", key, count))
+        return samples
+
+
+# Métricas del dashboard
+RERUN_SECONDS = Histogram("dashboard_rerun_duration_seconds",
+                          "Duración de cada ejecución completa del script")
+STAGE_SECONDS = Histogram("dashboard_stage_duration_seconds",
+                          "Duración de cada etapa del script (carga, filtros, pestañas)", ["stage"])
+ROWS_SCANNED = Counter("dashboard_rows_scanned_total",
+                       "Filas recorridas por etapa del dashboard", ["stage"])
+CACHE_REQUESTS = Counter("dashboard_cache_requests_total",
+                         "Llamadas a funciones con caché de Streamlit", ["function", "result"])
+CHART_BYTES = Histogram("dashboard_chart_bytes",
+                        "Tamaño serializado de las figuras enviadas al navegador", ["chart"],
+                        buckets=SIZE_BUCKETS)
+RSS_BYTES = Gauge("dashboard_resident_memory_bytes", "Memoria residente del proceso al final del rerun")
+
+# Métricas de los modelos
+PREDICT_SECONDS = Histogram("model_predict_duration_seconds", "Latencia de predicción por modelo", ["model"])
+PREDICT_ROWS = Counter("model_predict_rows_total", "Filas predichas por modelo", ["model"])
+PREDICT_ERRORS = Counter("model_predict_errors_total", "Errores de predicción por modelo", ["model"])
+
+
+def render():
+    """
+    Exporta todas las métricas registradas en el formato de texto de Prometheus.
+
+    Returns:
+        str: Exposición completa (termina en salto de línea)
+    """
+    with _lock:
+        metrics = list(_registry.values())
+        body = "\n".join(metric.render() for metric in metrics)
+    return body + "\n"
+
+
+def exporting():
+    """Indica si hay algún destino de exportación configurado."""
+    return bool(os.environ.get("NYC_METRICS_PORT") or os.environ.get("NYC_METRICS_TEXTFILE"))
+
+
+def write_textfile(path=None):
+    """
+    Escribe las métricas para el textfile collector (escritura atómica: archivo temporal + rename).
+
+    Args:
+        path: Ruta del archivo .prom (por defecto NYC_METRICS_TEXTFILE; sin ruta no hace nada)
+    """
+    path = path or os.environ.get("NYC_METRICS_TEXTFILE")
+    if not path:
+        return
+    # Un temporal único por escritura: las sesiones de Streamlit son hilos del mismo proceso
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=os.path.basename(path) + ".",
+                                    suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(render())
+        # mkstemp crea el archivo con permisos 0600; el collector debe poder leerlo
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server = None
+
+
+def start_http_server(port=None, addr="127.0.0.1"):
+    """
+    Inicia (una sola vez por proceso) un servidor HTTP con /metrics en un hilo de fondo.
+
+    Args:
+        port: Puerto (por defecto NYC_METRICS_PORT; sin puerto no hace nada)
+        addr: Interfaz de escucha (local por defecto)
+
+    Returns:
+        ThreadingHTTPServer o None
+    """
+    global _server
+    port = port or os.environ.get("NYC_METRICS_PORT")
+    if not port:
+        return None
+    with _lock:
+        if _server is None:
+            try:
+                _server = ThreadingHTTPServer((addr, int(port)), _MetricsHandler)
+            except OSError as e:
+                print(f"No se pudo iniciar el servidor de métricas en el puerto {port}: {e}")
+                return None
+            threading.Thread(target=_server.serve_forever, name="metrics-http", daemon=True).start()
+    return _server
+
+
+def observe_run(run):
+    """
+    Registra una ejecución del script (resultado de perf_utils.finish_run).
+
+    Args:
+        run: dict con total_ms, stages y rss_mb
+    """
+    RERUN_SECONDS.observe(run["total_ms"] / 1000)
+    for stage, ms in run["stages"].items():
+        STAGE_SECONDS.observe(ms / 1000, stage=stage)
+    RSS_BYTES.set(int(run["rss_mb"] * 1024 * 1024))
+
@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+"""
+Búsqueda de hiperparámetros para los modelos de tarifas y de aeropuertos.
+
+Usa successive halving: muchas configuraciones aleatorias se entrenan con pocas filas y solo la
+mejor fracción (1/eta) pasa a la siguiente ronda, con eta veces más filas. Las pruebas de cada
+ronda corren en paralelo sobre la matriz de características en caché de train_models.
+
+Cada prueba registra su métrica de validación, el tiempo de entrenamiento y la latencia de
+predicción de una fila. El modelo final es el mejor que cumple el SLO de latencia (p99), no
+solo el de menor error. El ganador reemplaza a models/<modelo>.joblib, y el registro completo
+queda en models/<modelo>_search.json, junto a <modelo>_metrics.json.
+
+Uso:
+    python model_search.py --models driver_pay_lgb airport_lgb --trials 27 --slo-ms 5
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import joblib
+import numpy as np
+import pandas as pd
+
+import model_utils
+import train_models
+
+# Espacios de búsqueda por familia (muestreo aleatorio uniforme de cada lista)
+SEARCH_SPACES = {
+    'rf': {
+        'n_estimators': [25, 50, 100, 200],
+        'max_depth': [8, 12, 16, 24, None],
+        'min_samples_leaf': [1, 5, 20, 50],
+        'max_features': [1.0, 0.5, 'sqrt'],
+    },
+    'lgb': {
+        'n_estimators': [50, 100, 200, 400],
+        'num_leaves': [7, 15, 31, 63, 127],
+        'learning_rate': [0.03, 0.05, 0.1, 0.2],
+        'min_child_samples': [10, 20, 50, 100],
+        'colsample_bytree': [0.6, 0.8, 1.0],
+    },
+}
+
+SEARCH_DIR = os.path.join(train_models.MODEL_DIR, 'search')
+VALIDATION_ROWS = 20_000   # Filas de entrenamiento reservadas para validar las pruebas
+MIN_ROWS = 2_000           # Filas de la primera ronda
+LATENCY_CALLS = 200        # Predicciones de una fila para estimar p50/p99
+
+
+def sample_configs(family, n_trials, seed=train_models.RANDOM_STATE):
+    """
+    Configuraciones aleatorias (sin repetir) del espacio de búsqueda de una familia.
+
+    Returns:
+        list: dicts de hiperparámetros
+    """
+    space = SEARCH_SPACES[family]
+    rng = np.random.default_rng(seed)
+    configs, seen = [], set()
+    max_configs = int(np.prod([len(values) for values in space.values()]))
+    while len(configs) < min(n_trials, max_configs):
+        config = {key: values[rng.integers(len(values))] for key, values in space.items()}
+        key = json.dumps(config, sort_keys=True, default=str)
+        if key not in seen:
+            seen.add(key)
+            configs.append(config)
+    return configs
+
+
+def rung_schedule(n_configs, n_rows, eta, min_rows=MIN_ROWS):
+    """
+    Rondas de successive halving: (configuraciones, filas) por ronda.
+
+    La última ronda usa todas las filas disponibles; cada ronda anterior, eta veces menos.
+    """
+    rungs = max(1, int(np.floor(np.log(max(n_configs, 1)) / np.log(eta))) + 1)
+    # Sin rondas con menos de min_rows filas
+    while rungs > 1 and n_rows / eta ** (rungs - 1) < min_rows:
+        rungs -= 1
+    schedule = []
+    for i in range(rungs):
+        configs = max(1, int(np.ceil(n_configs / eta ** i)))
+        rows = int(n_rows / eta ** (rungs - 1 - i))
+        schedule.append((configs, rows))
+    return schedule
+
+
+def loss(task, metrics):
+    """Pérdida a minimizar (RMSE o 1 - precisión)."""
+    return metrics['rmse'] if task == 'regression' else 1 - metrics['accuracy']
+
+
+def _split_rows(n_train):
+    """Orden fijo de filas: las primeras VALIDATION_ROWS validan, el resto se usa para entrenar."""
+    order = np.random.default_rng(train_models.RANDOM_STATE).permutation(n_train)
+    val_rows = min(VALIDATION_ROWS, n_train // 5)
+    return np.sort(order[:val_rows]), order[val_rows:]
+
+
+def run_trial(trial_id, spec, params, paths, features, rows, n_jobs, save_path=None):
+    """
+    Entrena y evalúa una configuración (se ejecuta en un proceso del pool).
+
+    Las filas de entrenamiento son un prefijo de un orden aleatorio fijo, así cada ronda
+    contiene a la anterior.
+
+    Args:
+        trial_id: Identificador de la prueba
+        spec: Especificación base (MODEL_SPECS)
+        params: Hiperparámetros de la prueba
+        paths: Rutas de la matriz en caché
+        features: Nombres de las columnas
+        rows: Filas de entrenamiento (None = todas)
+        n_jobs: Hilos de entrenamiento
+        save_path: Si se indica, guarda el modelo entrenado (finalistas)
+
+    Returns:
+        dict: Resultado de la prueba
+    """
+    arrays = train_models.open_feature_matrix(paths)
+    X_train, y_train = arrays['X_train'], arrays[f"{spec['target']}_train"]
+    val_idx, fit_order = _split_rows(len(X_train))
+    fit_idx = np.sort(fit_order[:rows] if rows else fit_order)
+
+    X_val = pd.DataFrame(X_train[val_idx], columns=features)
+    y_val = np.asarray(y_train[val_idx])
+
+    start = time.perf_counter()
+    model = train_models.build_estimator({**spec, 'params': params}, n_jobs)
+    model.fit(pd.DataFrame(X_train[fit_idx], columns=features), np.asarray(y_train[fit_idx]))
+    train_seconds = time.perf_counter() - start
+
+    # El dashboard predice fila a fila: sin hilos por llamada
+    model.set_params(n_jobs=1)
+    start = time.perf_counter()
+    y_pred = model.predict(X_val)
+    batch_seconds = time.perf_counter() - start
+    metrics = train_models.evaluate(spec, y_val, y_pred)
+
+    result = {
+        'trial': trial_id,
+        'params': params,
+        'rows': int(len(fit_idx)),
+        'metrics': metrics,
+        'loss': loss(spec['task'], metrics),
+        'train_seconds': train_seconds,
+        'batch_rows_per_second': len(X_val) / batch_seconds if batch_seconds > 0 else None,
+        'latency': model_utils.measure_latency(model, X_val, calls=LATENCY_CALLS),
+    }
+    if save_path:
+        joblib.dump(model, save_path)
+        result['path'] = save_path
+    return result
+
+
+def _run_parallel(tasks, workers):
+    """Ejecuta run_trial para cada tupla de argumentos (en serie si workers == 1)."""
+    if workers == 1:
+        return [run_trial(*task) for task in tasks]
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        return list(pool.map(run_trial, *zip(*tasks)))
+
+
+def _rank_key(result, slo_ms):
+    # Primero las que cumplen el SLO; después, menor pérdida
+    return (result['latency']['p99_ms'] > slo_ms, result['loss'])
+
+
+def successive_halving(name, spec, paths, features, n_trials=27, eta=3, slo_ms=10.0,
+                       cpus=None, workers=None, finalists=3):
+    """
+    Busca hiperparámetros para un modelo con successive halving y pruebas en paralelo.
+
+    Args:
+        name: Nombre del modelo (clave de MODEL_SPECS)
+        spec: Especificación base
+        paths: Rutas de la matriz en caché
+        features: Nombres de las columnas
+        n_trials: Configuraciones iniciales
+        eta: Factor de reducción por ronda
+        slo_ms: Objetivo de latencia p99 de una fila (ms)
+        cpus: Presupuesto de núcleos
+        workers: Pruebas simultáneas
+        finalists: Configuraciones que se reentrenan con todas las filas
+
+    Returns:
+        tuple: (registro de pruebas, finalistas con modelo guardado)
+    """
+    arrays = train_models.open_feature_matrix(paths)
+    n_fit = len(arrays['X_train']) - len(_split_rows(len(arrays['X_train']))[0])
+    configs = sample_configs(spec['family'], n_trials)
+    schedule = rung_schedule(len(configs), n_fit, eta)
+    print(f"\n🔎 {name}: {len(configs)} configuraciones, rondas {[(c, r) for c, r in schedule]}")
+
+    log = []
+    candidates = list(enumerate(configs))
+    for rung, (n_configs, rows) in enumerate(schedule[:-1]):
+        n_workers, n_jobs = train_models.plan_resources(len(candidates), cpus, workers)
+        results = _run_parallel(
+            [(trial, spec, params, paths, features, rows, n_jobs) for trial, params in candidates], n_workers)
+        for result in results:
+            result.update({'rung': rung, 'meets_slo': result['latency']['p99_ms'] <= slo_ms})
+        results.sort(key=lambda result: _rank_key(result, slo_ms))
+        keep = max(1, schedule[rung + 1][0])
+        for position, result in enumerate(results):
+            result['promoted'] = position < keep
+            log.append(result)
+        best = results[0]
+        print(f"   Ronda {rung} ({rows:,} filas): mejor pérdida {best['loss']:.4f}, "
+              f"p99 {best['latency']['p99_ms']:.2f} ms")
+        candidates = [(result['trial'], result['params']) for result in results[:keep]]
+
+    # Última ronda: los finalistas se entrenan con todas las filas y se guardan
+    os.makedirs(SEARCH_DIR, exist_ok=True)
+    candidates = candidates[:finalists]
+    n_workers, n_jobs = train_models.plan_resources(len(candidates), cpus, workers)
+    final = _run_parallel(
+        [(trial, spec, params, paths, features, None, n_jobs,
+          os.path.join(SEARCH_DIR, f"{name}_trial{trial}.joblib")) for trial, params in candidates],
+        n_workers)
+    for result in final:
+        result.update({'rung': len(schedule) - 1, 'promoted': True})
+    return log, final
+
+
+def select_model(spec, final, paths, features, slo_ms):
+    """
+    Elige el finalista con menor pérdida de validación entre los que cumplen el SLO.
+
+    La latencia de los finalistas se vuelve a medir en serie (sin competir por CPU con otras
+    pruebas). Si ninguno cumple el SLO, se elige el más rápido. El conjunto de prueba no
+    interviene en la elección: solo se evalúa el elegido, para reportar sus métricas.
+
+    Returns:
+        tuple: (resultado elegido, modelo)
+    """
+    arrays = train_models.open_feature_matrix(paths)
+    X_train = arrays['X_train']
+    val_idx, _ = _split_rows(len(X_train))
+    X_val = pd.DataFrame(X_train[val_idx], columns=features)
+
+    scored = []
+    for result in final:
+        model = joblib.load(result['path'])
+        result['latency'] = model_utils.measure_latency(model, X_val, calls=LATENCY_CALLS)
+        result['meets_slo'] = result['latency']['p99_ms'] <= slo_ms
+        scored.append((result, model))
+
+    feasible = [item for item in scored if item[0]['meets_slo']]
+    if feasible:
+        # 'loss' es la pérdida de validación de run_trial
+        chosen, model = min(feasible, key=lambda item: _rank_key(item[0], slo_ms))
+    else:
+        print(f"   ⚠️ Ningún finalista cumple el SLO de {slo_ms} ms; se elige el más rápido")
+        chosen, model = min(scored, key=lambda item: item[0]['latency']['p99_ms'])
+
+    X_test = pd.DataFrame(np.asarray(arrays['X_test']), columns=features)
+    y_test = np.asarray(arrays[f"{spec['target']}_test"])
+    chosen['test_metrics'] = train_models.evaluate(spec, y_test, model.predict(X_test))
+    return chosen, model
+
+
+def save_search(name, spec, log, final, chosen, model, slo_ms, paths, features):
+    """Guarda el modelo elegido (y su exportación a NumPy), sus métricas y el registro en models/."""
+    metrics = {
+        **chosen['test_metrics'],
+        'params': chosen['params'],
+        'train_rows': chosen['rows'],
+        'train_seconds': chosen['train_seconds'],
+        'predict_p50_ms': chosen['latency']['p50_ms'],
+        'predict_p99_ms': chosen['latency']['p99_ms'],
+        'latency_slo_ms': slo_ms,
+        'meets_slo': chosen['meets_slo'],
+        'search': f"{name}_search.json",
+    }
+    train_models.save_models({name: {'model': model, 'metrics': metrics, 'type': 'traditional'}})
+    arrays = train_models.open_feature_matrix(paths)
+    X_test = pd.DataFrame(np.asarray(arrays['X_test']), columns=features)
+    train_models.export_numpy_model(name, spec, model, X_test, np.asarray(arrays[f"{spec['target']}_test"]))
+
+    search_log = {
+        'model': name,
+        'family': spec['family'],
+        'finished_at': datetime.now().isoformat(timespec='seconds'),
+        'latency_slo_ms': slo_ms,
+        'chosen_trial': chosen['trial'],
+        'trials': [{key: value for key, value in result.items() if key != 'path'} for result in log + final],
+    }
+    with open(os.path.join(train_models.MODEL_DIR, f"{name}_search.json"), 'w') as f:
+        json.dump(search_log, f, indent=2, default=str)
+
+
+def main():
+    """Función principal."""
+    parser = argparse.ArgumentParser(description="Búsqueda de hiperparámetros con successive halving")
+    searchable = [name for name, spec in train_models.MODEL_SPECS.items() if spec['family'] in SEARCH_SPACES]
+    parser.add_argument("--models", nargs="+", choices=searchable, default=searchable)
+    parser.add_argument("--trials", type=int, default=27, help="Configuraciones iniciales por modelo")
+    parser.add_argument("--eta", type=int, default=3, help="Factor de reducción por ronda")
+    parser.add_argument("--slo-ms", type=float, default=10.0, help="Latencia p99 máxima de una fila (ms)")
+    parser.add_argument("--finalists", type=int, default=3)
+    parser.add_argument("--cpus", type=int, default=None)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--stream", action="store_true", help="Usar la matriz completa (train_models --stream)")
+    parser.add_argument("--memory-mb", type=int, default=train_models.DEFAULT_MEMORY_MB)
+    args = parser.parse_args()
+
+    print("🔎 Búsqueda de hiperparámetros - NYC Ride-Hailing Analytics")
+    print("=" * 70)
+    train_models.setup_directories()
+    paths, features, _, _ = train_models.prepare_matrix(args.stream, args.memory_mb)
+
+    for name in args.models:
+        spec = train_models.MODEL_SPECS[name]
+        log, final = successive_halving(name, spec, paths, features, args.trials, args.eta, args.slo_ms,
+                                        args.cpus, args.workers, args.finalists)
+        chosen, model = select_model(spec, final, paths, features, args.slo_ms)
+        save_search(name, spec, log, final, chosen, model, args.slo_ms, paths, features)
+        print(f"   ✅ {name}: prueba {chosen['trial']} {chosen['params']}")
+        print(f"      {chosen['test_metrics']}, p99 {chosen['latency']['p99_ms']:.2f} ms "
+              f"({'cumple' if chosen['meets_slo'] else 'no cumple'} SLO de {args.slo_ms} ms)")
+
+    shutil.rmtree(SEARCH_DIR, ignore_errors=True)
+    print("\n" + "=" * 70)
+    print(f"🎉 Búsqueda completada. Registros en {train_models.MODEL_DIR}/<modelo>_search.json")
+
+
+if __name__ == "__main__":
+    main()
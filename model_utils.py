@@ -1,15 +1,158 @@
 import os
+import json
+import time
 import joblib
 import pandas as pd
 import numpy as np
-try:
-    import tensorflow as tf
-    from tensorflow import keras
-    HAS_TENSORFLOW = True
-except ImportError:
-    HAS_TENSORFLOW = False
+import analysis_utils
+import metrics_utils
+import perf_utils
+import surface_utils
+import tree_utils
+
+# TensorFlow se importa solo al cargar una red neuronal (segundos y cientos de MB)
+HAS_TENSORFLOW = perf_utils.module_available("tensorflow")
+if not HAS_TENSORFLOW:
     print("TensorFlow no está disponible. Se usarán solo modelos tradicionales.")
 
+def _load_keras():
+    """Importa Keras bajo demanda."""
+    from tensorflow import keras
+    return keras
+
+class BoosterModel:
+    """
+    Adaptador de un lgb.Booster (entrenado con lgb.train) con la interfaz de sklearn.
+
+    Los modelos entrenados por lotes (train_models.py --stream) se guardan con esta clase para
+    que el dashboard los use igual que a LGBMRegressor / LGBMClassifier.
+    """
+
+    def __init__(self, booster, task='regression'):
+        self.booster = booster
+        self.task = task
+        self.feature_names_in_ = np.array(booster.feature_name())
+        self.n_features_in_ = booster.num_feature()
+        if task == 'classification':
+            self.classes_ = np.array([0, 1])
+
+    def predict(self, X):
+        values = self.booster.predict(X)
+        if self.task == 'classification':
+            return (values > 0.5).astype(int)
+        return values
+
+    def predict_proba(self, X):
+        positive = self.booster.predict(X)
+        return np.column_stack([1 - positive, positive])
+
+    @property
+    def feature_importances_(self):
+        return self.booster.feature_importance()
+
+class NumpyMLP:
+    """
+    Red neuronal densa (capas Dense de Keras) evaluada con NumPy, con el StandardScaler incluido.
+
+    Reproduce la inferencia de driver_pay_nn sin importar TensorFlow: normaliza la entrada y
+    aplica x @ W + b y la activación de cada capa en float32 (Dropout no actúa al predecir).
+    """
+
+    ACTIVATIONS = {
+        'linear': lambda x: x,
+        'relu': lambda x: np.maximum(x, 0),
+        'sigmoid': lambda x: 1 / (1 + np.exp(-x)),
+        'tanh': np.tanh,
+    }
+
+    def __init__(self, weights, biases, activations, mean, scale, feature_names=None):
+        self.weights = [np.asarray(w, dtype=np.float32) for w in weights]
+        self.biases = [np.asarray(b, dtype=np.float32) for b in biases]
+        self.activations = list(activations)
+        self.mean = np.asarray(mean, dtype=np.float32)
+        self.scale = np.asarray(scale, dtype=np.float32)
+        self.feature_names_in_ = np.array(feature_names) if feature_names is not None else None
+
+    @classmethod
+    def from_keras(cls, model, scaler, feature_names=None):
+        """
+        Extrae pesos y activaciones de un modelo Keras secuencial de capas Dense.
+
+        Args:
+            model: keras.Sequential entrenado
+            scaler: StandardScaler usado al entrenar
+            feature_names: Columnas de entrada (por defecto las del scaler, si las tiene)
+
+        Returns:
+            NumpyMLP
+        """
+        weights, biases, activations = [], [], []
+        for layer in model.layers:
+            kind = layer.__class__.__name__
+            if kind in ('Dropout', 'InputLayer'):
+                continue
+            if kind != 'Dense':
+                raise ValueError(f"Capa no soportada en la exportación a NumPy: {kind}")
+            activation = layer.activation.__name__
+            if activation not in cls.ACTIVATIONS:
+                raise ValueError(f"Activación no soportada: {activation}")
+            kernel, bias = layer.get_weights()
+            weights.append(kernel)
+            biases.append(bias)
+            activations.append(activation)
+        if feature_names is None:
+            feature_names = getattr(scaler, 'feature_names_in_', None)
+        return cls(weights, biases, activations, scaler.mean_, scaler.scale_, feature_names)
+
+    def predict(self, X):
+        if isinstance(X, pd.DataFrame) and self.feature_names_in_ is not None:
+            X = X[list(self.feature_names_in_)]
+        x = (np.asarray(X, dtype=np.float32) - self.mean) / self.scale
+        for weight, bias, activation in zip(self.weights, self.biases, self.activations):
+            x = self.ACTIVATIONS[activation](x @ weight + bias)
+        return x.ravel()
+
+    @property
+    def nbytes(self):
+        return sum(w.nbytes + b.nbytes for w, b in zip(self.weights, self.biases))
+
+    def save(self, path):
+        """Guarda pesos, activaciones y parámetros del scaler como directorio de arrays."""
+        meta = {
+            'kind': 'mlp',
+            'activations': self.activations,
+            'feature_names': None if self.feature_names_in_ is None else list(self.feature_names_in_),
+        }
+        arrays = {'mean': self.mean, 'scale': self.scale}
+        for i, (weight, bias) in enumerate(zip(self.weights, self.biases)):
+            arrays[f"W{i}"] = weight
+            arrays[f"b{i}"] = bias
+        tree_utils.save_arrays(path, arrays, meta)
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        """Carga una red guardada con save()."""
+        arrays, meta = tree_utils.load_arrays(path, mmap_mode)
+        layers = range(len(meta['activations']))
+        weights = [arrays[f"W{i}"] for i in layers]
+        biases = [arrays[f"b{i}"] for i in layers]
+        return cls(weights, biases, meta['activations'], arrays['mean'], arrays['scale'], meta['feature_names'])
+
+def load_numpy_model(path, mmap_mode='r'):
+    """
+    Carga un modelo exportado a NumPy: red densa o ensamble de árboles.
+
+    Args:
+        path: Directorio del modelo (o .npz de versiones anteriores)
+        mmap_mode: 'r' para compartir los arrays entre procesos; None para copiarlos en memoria
+
+    Returns:
+        NumpyMLP o tree_utils.TreeEnsemble
+    """
+    if tree_utils.load_meta(path)['kind'] == 'mlp':
+        return NumpyMLP.load(path, mmap_mode)
+    return tree_utils.TreeEnsemble.load(path, mmap_mode)
+
 # Directorio para modelos
 MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models')
 
@@ -33,7 +176,6 @@ def get_available_models():
         metrics_file = f"{model_name}_metrics.json"
         
         if os.path.exists(os.path.join(MODEL_DIR, metrics_file)):
-            import json
             with open(os.path.join(MODEL_DIR, metrics_file), 'r') as f:
                 metrics = json.load(f)
             models[model_name] = {
@@ -42,6 +184,24 @@ def get_available_models():
                 'metrics': metrics
             }
     
+    # Buscar modelos exportados a NumPy (directorio de arrays mapeables o .npz anterior):
+    # ensambles de árboles y redes densas
+    numpy_models = [f for f in os.listdir(MODEL_DIR)
+                    if f.endswith('.npz') or os.path.exists(os.path.join(MODEL_DIR, f, 'meta.json'))]
+    
+    for model_file in numpy_models:
+        model_name = model_file.replace('.npz', '')
+        metrics_file = f"{model_name}_metrics.json"
+        
+        if os.path.exists(os.path.join(MODEL_DIR, metrics_file)):
+            with open(os.path.join(MODEL_DIR, metrics_file), 'r') as f:
+                metrics = json.load(f)
+            models[model_name] = {
+                'type': 'numpy',
+                'file': model_file,
+                'metrics': metrics
+            }
+    
     # Buscar modelos de redes neuronales (.keras)
     keras_models = [f for f in os.listdir(MODEL_DIR) if f.endswith('.keras')]
     
@@ -51,7 +211,6 @@ def get_available_models():
         scaler_file = f"{model_name}_scaler.joblib"
         
         if os.path.exists(os.path.join(MODEL_DIR, metrics_file)):
-            import json
             with open(os.path.join(MODEL_DIR, metrics_file), 'r') as f:
                 metrics = json.load(f)
             models[f"{model_name}_nn"] = {
@@ -77,6 +236,15 @@ def load_model(model_name):
     if not os.path.exists(MODEL_DIR):
         raise FileNotFoundError(f"Directorio de modelos no encontrado: {MODEL_DIR}")
     
+    # Verificar si es un modelo exportado a NumPy (sin sklearn, LightGBM ni TensorFlow);
+    # sus arrays se mapean en memoria y se comparten entre los procesos del dashboard
+    model_arrays_path = os.path.join(MODEL_DIR, model_name)
+    if os.path.exists(os.path.join(model_arrays_path, 'meta.json')):
+        return load_numpy_model(model_arrays_path), None
+    model_npz_path = os.path.join(MODEL_DIR, f"{model_name}.npz")
+    if os.path.exists(model_npz_path):
+        return load_numpy_model(model_npz_path), None
+    
     # Verificar si es un modelo joblib
     model_joblib_path = os.path.join(MODEL_DIR, f"{model_name}.joblib")
     if os.path.exists(model_joblib_path):
@@ -95,7 +263,7 @@ def load_model(model_name):
         if not HAS_TENSORFLOW:
             raise ImportError("TensorFlow no está disponible para cargar modelos de redes neuronales")
         
-        model = keras.models.load_model(model_keras_path)
+        model = _load_keras().models.load_model(model_keras_path)
         # Cargar scaler
         scaler_path = os.path.join(MODEL_DIR, f"{model_name.replace('_nn', '')}_scaler.joblib")
         if os.path.exists(scaler_path):
@@ -106,6 +274,45 @@ def load_model(model_name):
     
     raise FileNotFoundError(f"Modelo no encontrado: {model_name}")
 
+def measure_latency(model, X, calls=200, warmup=10):
+    """
+    Latencia de predicción de una sola fila (como en los formularios del dashboard).
+
+    Args:
+        model: Modelo con predict
+        X: DataFrame de ejemplo; se usa una fila distinta en cada llamada
+        calls: Llamadas medidas
+        warmup: Llamadas previas sin medir
+
+    Returns:
+        dict: p50_ms, p99_ms y mean_ms
+    """
+    rows = [X.iloc[[i % len(X)]] for i in range(calls + warmup)]
+    timings = []
+    for i, row in enumerate(rows):
+        start = time.perf_counter()
+        model.predict(row)
+        if i >= warmup:
+            timings.append((time.perf_counter() - start) * 1000)
+    timings = np.array(timings)
+    return {
+        'p50_ms': float(np.percentile(timings, 50)),
+        'p99_ms': float(np.percentile(timings, 99)),
+        'mean_ms': float(timings.mean()),
+    }
+
+def _predict(model, model_name, X, method='predict'):
+    """Llama a model.predict (o predict_proba) registrando latencia, filas y errores."""
+    try:
+        with perf_utils.timer(f"predict:{model_name}", "model", rows=len(X)) as section:
+            result = getattr(model, method)(X)
+    except Exception:
+        metrics_utils.PREDICT_ERRORS.inc(model=model_name)
+        raise
+    metrics_utils.PREDICT_SECONDS.observe(section.elapsed_ms / 1000, model=model_name)
+    metrics_utils.PREDICT_ROWS.inc(len(X), model=model_name)
+    return result
+
 def predict_fare(df, features=None, model_name=None):
     """
     Predice el costo del viaje utilizando el modelo entrenado.
@@ -140,11 +347,17 @@ def predict_fare(df, features=None, model_name=None):
     try:
         model, scaler = load_model(model_name)
         
-        # Preparar características básicas si no se especifican
+        # Preparar características si no se especifican: las del entrenamiento del modelo
         if features is None:
-            # Características básicas que esperan los modelos
-            basic_features = ['trip_miles', 'trip_time', 'pickup_hour']
-            features = [f for f in basic_features if f in df.columns]
+            trained_features = getattr(model, 'feature_names_in_', None)
+            if trained_features is None:
+                trained_features = getattr(scaler, 'feature_names_in_', None)
+            if trained_features is not None:
+                features = list(trained_features)
+            else:
+                # Características básicas que esperan los modelos
+                basic_features = ['trip_miles', 'trip_time', 'pickup_hour']
+                features = [f for f in basic_features if f in df.columns]
         
         # Filtrar DataFrame para incluir solo las características disponibles
         available_features = [f for f in features if f in df.columns]
@@ -158,103 +371,152 @@ def predict_fare(df, features=None, model_name=None):
         # Si es un modelo de red neuronal y hay scaler, aplicar escalado
         if model_name.endswith('_nn') and scaler is not None:
             X_processed = scaler.transform(df_filtered)
-            predictions = model.predict(X_processed)
+            predictions = _predict(model, model_name, X_processed)
             return predictions.flatten()
         else:
             # Para modelos tradicionales
-            predictions = model.predict(df_filtered)
+            predictions = _predict(model, model_name, df_filtered)
             return predictions
     
     except Exception as e:
         print(f"Error al predecir con el modelo {model_name}: {e}")
         return None
 
-def predict_airport(df, features=None):
+# Superficie de tarifas precalculada (train_models.py --fare-surface)
+SURFACE_PATH = os.path.join(MODEL_DIR, 'fare_surface')
+
+# Superficie cargada en este proceso: (fecha del directorio, FareSurface)
+_SURFACE = {}
+
+def load_fare_surface():
+    """
+    Carga la superficie de tarifas precalculada (una vez por versión, con memoria mapeada).
+
+    Returns:
+        surface_utils.FareSurface o None si no se ha generado
+    """
+    if not os.path.exists(os.path.join(SURFACE_PATH, 'meta.json')):
+        return None
+    mtime = os.path.getmtime(SURFACE_PATH)
+    if _SURFACE.get('mtime') != mtime:
+        _SURFACE['surface'] = surface_utils.FareSurface.load(SURFACE_PATH)
+        _SURFACE['mtime'] = mtime
+    return _SURFACE['surface']
+
+def estimate_fare(trip_miles, trip_minutes, hour, weekday, borough=None, model_name=None):
+    """
+    Estimación de tarifa de una consulta del formulario.
+
+    Si existe la superficie precalculada del modelo y la consulta cae dentro de su malla, la
+    tarifa se interpola (microsegundos); si no, se predice con el modelo.
+
+    Args:
+        trip_miles: Distancia (millas)
+        trip_minutes: Duración (minutos)
+        hour: Hora de recogida (0-23)
+        weekday: Día de la semana (0 = lunes)
+        borough: Borough de recogida (None o surface_utils.ALL_BOROUGHS: sin distinguir)
+        model_name: Modelo de tarifa (por defecto el de la superficie o el más rápido)
+
+    Returns:
+        dict: fare, source ('surface' o 'model'), model, elapsed_ms y max_error (error máximo de
+              interpolación medido al generar la superficie), o None si no se pudo predecir
+    """
+    surface = load_fare_surface()
+    if model_name is None:
+        model_name = surface.model_name if surface is not None else select_fastest_model('driver_pay')
+    if surface is not None and surface.model_name != model_name:
+        surface = None
+
+    start = time.perf_counter()
+    if surface is not None:
+        fare = surface.estimate(trip_miles, trip_minutes, hour, weekday, borough)
+        if fare is not None:
+            return {'fare': fare, 'source': 'surface', 'model': model_name,
+                    'elapsed_ms': (time.perf_counter() - start) * 1000,
+                    'max_error': surface.meta.get('errors', {}).get('max_abs_err')}
+
+    # Fuera de la malla (o sin superficie): predicción con el modelo
+    try:
+        model, scaler = load_model(model_name)
+    except (FileNotFoundError, ImportError) as e:
+        print(f"Error al cargar el modelo {model_name}: {e}")
+        return None
+    if surface is not None:
+        X = surface.feature_frame(trip_miles, trip_minutes, hour, weekday, borough)
+    else:
+        names = getattr(model, 'feature_names_in_', None)
+        if names is None:
+            names = getattr(scaler, 'feature_names_in_', None)
+        if names is None:
+            return None
+        X = surface_utils.feature_frame(list(names), trip_miles, trip_minutes, hour, weekday,
+                                        surface_utils.DEFAULT_FIXED)
+    if scaler is not None:
+        X = scaler.transform(X)
+    fare = float(np.ravel(_predict(model, model_name, X))[0])
+    return {'fare': fare, 'source': 'model', 'model': model_name,
+            'elapsed_ms': (time.perf_counter() - start) * 1000, 'max_error': None}
+
+def _trained_features(model, scaler=None):
+    """Columnas con las que se entrenó el modelo (del modelo o de su scaler), o None."""
+    names = getattr(model, 'feature_names_in_', None)
+    if names is None:
+        names = getattr(scaler, 'feature_names_in_', None)
+    return None if names is None else list(names)
+
+def predict_airport(df, features=None, model_name=None, tolerance=0.05):
     """
     Clasifica si un viaje es a/desde un aeropuerto.
     
     Args:
-        df: DataFrame con los datos para la clasificación
-        features: Lista de características para usar (si es None, usa todas las disponibles)
+        df: DataFrame con los datos para la clasificación (columnas del entrenamiento o las del
+            formulario: trip_miles, trip_time en segundos, pickup_hour y pickup_weekday)
+        features: Lista de características para usar si el modelo no guarda las suyas
+        model_name: Modelo a usar (por defecto el más rápido dentro de la tolerancia)
+        tolerance: Pérdida relativa aceptada frente al mejor modelo al elegirlo
         
     Returns:
         array: Predicciones binarias (1 = aeropuerto, 0 = no aeropuerto)
         array: Probabilidades para la clase positiva
     """
-    model_name = 'airport_classifier'
+    if model_name is None:
+        model_name = select_fastest_model('airport', tolerance)
+        if model_name is None:
+            print("No hay modelos de clasificación de aeropuertos disponibles")
+            return None, None
     
     try:
-        model, _ = load_model(model_name)
-        
-        # Obtener las características que el modelo espera
-        required_features = []
-        if hasattr(model, 'feature_names_in_'):
-            required_features = model.feature_names_in_.tolist()
-        elif hasattr(model, 'feature_names'):
-            required_features = model.feature_names
+        model, scaler = load_model(model_name)
         
-        # Filtrar el DataFrame para incluir solo las características requeridas
-        if required_features:
-            # Verificar qué características están disponibles
-            available_features = [f for f in required_features if f in df.columns]
-            
-            if len(available_features) == 0:
-                print(f"Ninguna de las características requeridas está disponible. Requeridas: {required_features}")
-                # Usar las características más básicas como fallback
-                if all(col in df.columns for col in ['trip_miles', 'trip_time']):
-                    available_features = ['trip_miles', 'trip_time']
-            
-            # Usar solo las características disponibles
-            df_filtered = df[available_features].copy()
+        # Características que el modelo espera; las del formulario se convierten con las mismas
+        # reglas que la superficie de tarifas (minutos, hora, día y zonas fijas)
+        required_features = _trained_features(model, scaler)
+        if required_features is None:
+            required_features = [f for f in (features or df.columns) if f in df.columns]
+        if all(f in df.columns for f in required_features):
+            X = df[required_features]
         else:
-            # Si no hay información de características, usar el df tal cual
-            df_filtered = df.copy()
-            
-            # Si se especifican características explícitamente, filtrar el df
-            if features is not None:
-                valid_features = [f for f in features if f in df.columns]
-                df_filtered = df[valid_features].copy()
-        
-        # Realizar predicción
-        predictions = model.predict(df_filtered)
-        
-        # Obtener probabilidades si el modelo lo soporta
-        try:
-            probabilities = model.predict_proba(df_filtered)[:, 1]  # Probabilidad para la clase positiva
-        except:
-            probabilities = None
+            weekdays = df['pickup_weekday'].to_numpy() if 'pickup_weekday' in df.columns else np.zeros(len(df), dtype=int)
+            X = surface_utils.feature_frame(required_features, df['trip_miles'].to_numpy(),
+                                            df['trip_time'].to_numpy() / 60, df['pickup_hour'].to_numpy(),
+                                            weekdays, surface_utils.DEFAULT_FIXED)
+        if scaler is not None:
+            X = scaler.transform(X)
         
+        if hasattr(model, 'predict_proba'):
+            # Probabilidad de la clase positiva
+            probabilities = np.asarray(_predict(model, model_name, X, 'predict_proba'))[:, 1]
+        else:
+            # Red neuronal: la salida ya es la probabilidad
+            output = np.asarray(_predict(model, model_name, X))
+            probabilities = output[:, 1] if output.ndim == 2 and output.shape[1] > 1 else output.ravel()
+        predictions = (probabilities > 0.5).astype(int)
         return predictions, probabilities
     
     except Exception as e:
         print(f"Error al predecir con el modelo {model_name}: {e}")
-        
-        # Si falla el modelo tradicional, intentar con la red neuronal
-        try:
-            model_name = 'airport_nn'
-            model, preprocessor = load_model(model_name)
-            
-            # Si se especifican características, filtrar el df
-            if features is not None:
-                df = df[features].copy()
-            
-            # Preprocesar datos y predecir
-            X_processed = preprocessor.transform(df)
-            
-            # Obtener probabilidades y predicciones
-            if model.output_shape[-1] == 1:  # Modelo binario
-                probs = model.predict(X_processed).flatten()
-                preds = (probs > 0.5).astype(int)
-                return preds, probs
-            else:  # Modelo multiclase
-                probs = model.predict(X_processed)
-                preds = np.argmax(probs, axis=1)
-                return preds, probs[:, 1] if probs.shape[1] > 1 else probs
-        
-        except Exception as e2:
-            print(f"Error al predecir con el modelo de red neuronal: {e2}")
-            # Retornar None si ambos modelos fallan
-            return None, None
+        return None, None
 
 def predict_trip_time(df, features=None):
     """
@@ -302,7 +564,7 @@ def predict_trip_time(df, features=None):
                 df_filtered = df[valid_features].copy()
         
         # Realizar predicción
-        predictions = model.predict(df_filtered)
+        predictions = _predict(model, model_name, df_filtered)
         return predictions
     
     except Exception as e:
@@ -319,7 +581,7 @@ def predict_trip_time(df, features=None):
             
             # Preprocesar datos y predecir
             X_processed = preprocessor.transform(df)
-            predictions = model.predict(X_processed)
+            predictions = _predict(model, model_name, X_processed)
             return predictions.flatten()
         
         except Exception as e2:
@@ -327,12 +589,128 @@ def predict_trip_time(df, features=None):
             # Retornar None si ambos modelos fallan
             return None
 
-def get_model_info():
+# Rangos típicos de las características para generar filas de prueba de latencia
+LATENCY_SAMPLE_RANGES = {
+    'trip_miles': (0.5, 20), 'trip_time_minutes': (3, 60), 'trip_time': (180, 3600),
+    'hour': (0, 23), 'pickup_hour': (0, 23), 'day_of_week': (0, 6), 'pickup_weekday': (0, 6),
+    'month': (1, 12), 'is_weekend': (0, 1), 'PULocationID': (1, 263), 'DOLocationID': (1, 263),
+}
+
+# Perfiles medidos en este proceso: (modelo, fechas de sus archivos) -> perfil
+_PROFILES = {}
+
+def _model_files(model_name, data):
+    files = [data['file']] + ([data['scaler_file']] if data.get('scaler_file') else [])
+    return [os.path.join(MODEL_DIR, f) for f in files]
+
+def _path_size(path):
+    """Tamaño en bytes de un archivo o de los archivos de un directorio."""
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+def latency_sample(feature_names, rows=50, seed=0):
+    """Filas sintéticas con valores típicos para medir la latencia de un modelo."""
+    rng = np.random.default_rng(seed)
+    columns = {}
+    for name in feature_names:
+        low, high = LATENCY_SAMPLE_RANGES.get(name, (0, 1))
+        columns[name] = np.round(rng.uniform(low, high, rows), 2)
+    return pd.DataFrame(columns)
+
+def profile_model(model_name, calls=100):
+    """
+    Mide el tiempo de carga y la latencia de una fila de un modelo (una vez por versión y proceso).
+
+    Args:
+        model_name: Nombre del modelo
+        calls: Predicciones de una fila medidas
+
+    Returns:
+        dict: size_mb, load_ms, p50_ms, p99_ms, resident_mb (memoria que el modelo añadió a este
+              proceso) y shared_mb (parte de ella compartida con otros procesos a través de los
+              arrays mapeados); None si no se pudo medir
+    """
+    data = get_available_models().get(model_name)
+    if data is None:
+        return None
+    files = _model_files(model_name, data)
+    key = (model_name, tuple(os.path.getmtime(f) for f in files if os.path.exists(f)))
+    if key in _PROFILES:
+        return _PROFILES[key]
+
+    profile = {'size_mb': sum(_path_size(f) for f in files) / 1024**2,
+               'load_ms': None, 'p50_ms': None, 'p99_ms': None, 'resident_mb': None, 'shared_mb': None}
+    try:
+        rss_before = perf_utils.rss_mb()
+        start = time.perf_counter()
+        model, scaler = load_model(model_name)
+        profile['load_ms'] = (time.perf_counter() - start) * 1000
+        names = getattr(model, 'feature_names_in_', None)
+        if names is None:
+            names = getattr(scaler, 'feature_names_in_', None)
+        if names is not None and scaler is None:
+            if hasattr(model, 'set_params'):
+                model.set_params(n_jobs=1)
+            latency = measure_latency(model, latency_sample(list(names)), calls=calls)
+            profile['p50_ms'], profile['p99_ms'] = latency['p50_ms'], latency['p99_ms']
+        # Medido con el modelo aún cargado: los arrays mapeados solo ocupan las páginas leídas
+        profile['resident_mb'] = max(perf_utils.rss_mb() - rss_before, 0.0)
+        mapped = perf_utils.mapped_memory_mb(files[0]) if os.path.isdir(files[0]) else None
+        profile['shared_mb'] = mapped['shared_mb'] if mapped else 0.0
+    except Exception as e:
+        print(f"No se pudo perfilar el modelo {model_name}: {e}")
+    _PROFILES[key] = profile
+    return profile
+
+def select_fastest_model(target, tolerance=0.05, profile=False):
+    """
+    Elige el modelo más rápido cuyo error esté dentro de una tolerancia del mejor.
+
+    Usa la latencia p99 registrada al entrenar (predict_p99_ms) o, si falta o profile=True,
+    la medida en este proceso.
+
+    Args:
+        target: 'driver_pay' o 'airport'
+        tolerance: Pérdida relativa aceptada frente al mejor modelo (0.05 = 5%)
+        profile: Medir la latencia en este proceso en lugar de usar la registrada
+
+    Returns:
+        str: Nombre del modelo elegido o None
+    """
+    candidates = {}
+    for name, data in get_available_models().items():
+        metrics = data.get('metrics', {})
+        if not name.startswith(target):
+            continue
+        if 'rmse' in metrics:
+            candidates[name] = (metrics['rmse'], metrics.get('predict_p99_ms'))
+        elif 'accuracy' in metrics:
+            candidates[name] = (1 - metrics['accuracy'], metrics.get('predict_p99_ms'))
+    if not candidates:
+        return None
+
+    best = min(loss for loss, _ in candidates.values())
+    eligible = [name for name, (loss, _) in candidates.items() if loss <= best * (1 + tolerance) + 1e-12]
+
+    def latency(name):
+        p99 = None if profile else candidates[name][1]
+        if p99 is None:
+            p99 = (profile_model(name) or {}).get('p99_ms')
+        return p99 if p99 is not None else float('inf')
+
+    return min(eligible, key=latency)
+
+def get_model_info(profile=False):
     """
     Obtiene información sobre los modelos disponibles para mostrar en la UI.
     
+    Args:
+        profile: Medir tiempo de carga y latencia en este proceso (carga cada modelo una vez)
+    
     Returns:
-        dict: Información sobre los modelos disponibles
+        dict: Información sobre los modelos disponibles (incluye tamaño, carga, latencia p99 y
+              memoria residente/compartida)
     """
     models = get_available_models()
     
@@ -380,10 +758,30 @@ def get_model_info():
             model_type = 'Otro'
             performance = "Métricas no definidas"
         
+        if data['type'] == 'numpy':
+            tech = 'Red Neuronal en NumPy' if '_nn' in name else 'Árboles en NumPy'
+        elif 'nn' in name:
+            tech = 'Red Neuronal'
+        elif '_lgb' in name:
+            tech = 'LightGBM'
+        else:
+            tech = 'XGBoost' if 'best_model' in metrics and metrics['best_model'] == 'XGBoost' else 'RandomForest'
+        
+        # Tamaño y latencia registrados al entrenar; carga y latencia medidas si profile=True
+        measured = profile_model(name) if profile else {}
+        size_mb = sum(_path_size(f) for f in _model_files(name, data)) / 1024**2
         model_info['models'][name] = {
             'type': model_type,
             'performance': performance,
-            'tech': 'Red Neuronal' if 'nn' in name else ('XGBoost' if 'best_model' in metrics and metrics['best_model'] == 'XGBoost' else 'RandomForest')
+            'tech': tech,
+            'rmse': metrics.get('rmse'),
+            'accuracy': metrics.get('accuracy'),
+            'size_mb': size_mb,
+            'load_ms': measured.get('load_ms'),
+            'p99_ms': measured.get('p99_ms') or metrics.get('predict_p99_ms'),
+            'shared': data['type'] == 'numpy' and os.path.isdir(os.path.join(MODEL_DIR, data['file'])),
+            'resident_mb': measured.get('resident_mb'),
+            'shared_mb': measured.get('shared_mb'),
         }
     
     return model_info
@@ -418,8 +816,11 @@ def get_feature_importance(model_name):
         if hasattr(model_component, 'feature_importances_'):
             importances = model_component.feature_importances_
             
-            # Obtener nombres de características
-            if preprocessor is not None and hasattr(preprocessor, 'get_feature_names_out'):
+            # Obtener nombres de características (los del entrenamiento si el modelo los guarda)
+            trained_names = getattr(model_component, 'feature_names_in_', None)
+            if trained_names is not None and len(trained_names) == len(importances):
+                feature_names = [str(name) for name in trained_names]
+            elif preprocessor is not None and hasattr(preprocessor, 'get_feature_names_out'):
                 try:
                     feature_names = preprocessor.get_feature_names_out()
                 except:
@@ -438,4 +839,33 @@ def get_feature_importance(model_name):
     
     except Exception as e:
         print(f"Error al obtener importancia de características: {e}")
-        return None
\ No newline at end of file
+        return None
+
+# Análisis de características guardados por train_models.py (uno por versión de modelo)
+ANALYSIS_DIR = os.path.join(MODEL_DIR, 'analysis')
+
+def get_feature_analysis(model_name):
+    """
+    Análisis de características precalculado de un modelo (importancia por permutación y, en
+    LightGBM, contribuciones), si corresponde a la versión actual del modelo.
+
+    Los modelos exportados a NumPy sin análisis propio usan el de su modelo original: sus
+    predicciones son las mismas.
+
+    Args:
+        model_name: Nombre del modelo
+
+    Returns:
+        dict (ver analysis_utils.analyze_model) o None si no hay análisis vigente
+    """
+    models = get_available_models()
+    data = models.get(model_name)
+    if data is None:
+        return None
+    analysis = analysis_utils.load_analysis(ANALYSIS_DIR, model_name,
+                                            analysis_utils.model_version(_model_files(model_name, data)))
+    source = data.get('metrics', {}).get('source_model')
+    if analysis is None and source in models:
+        analysis = analysis_utils.load_analysis(ANALYSIS_DIR, source,
+                                                analysis_utils.model_version(_model_files(source, models[source])))
+    return analysis
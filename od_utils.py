@@ -0,0 +1,250 @@
+"""
+Motor de matrices origen-destino (OD) para los flujos entre zonas.
+
+Los viajes se agregan una sola vez en matrices dispersas 266x266 (LocationID 0-265)
+de conteos e ingresos por porción (operador, hora, día de la semana). Las consultas
+combinan las porciones seleccionadas, aplican restricciones de zona y devuelven
+matrices scipy.sparse; los top-k se obtienen con argpartition sin ordenar todo.
+"""
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+# LocationID van de 1 a 265 (264 y 265 = desconocido); se reserva el 0
+N_ZONES = 266
+
+# Columnas que definen una porción de la matriz
+SLICE_KEYS = ["hvfhs_license_num", "pickup_hour", "pickup_weekday"]
+
+
+class ODMatrix:
+    """
+    Matrices OD dispersas por porción (operador, hora, día de la semana).
+
+    Las entradas se guardan ordenadas por porción (estilo CSR sobre porciones):
+    las de la porción i están en [slice_ptr[i], slice_ptr[i + 1]).
+
+    Attributes:
+        slices: DataFrame con una fila por porción y las columnas de SLICE_KEYS
+        slice_ptr: Inicio de las entradas de cada porción
+        od_codes: Código PU * N_ZONES + DO de cada entrada
+        counts: Número de viajes por entrada
+        revenue: Suma de driver_pay por entrada
+    """
+
+    def __init__(self, slices, slice_ptr, od_codes, counts, revenue):
+        self.slices = slices.reset_index(drop=True)
+        self.slice_ptr = slice_ptr
+        self.od_codes = od_codes
+        self.counts = counts
+        self.revenue = revenue
+
+    @property
+    def nbytes(self):
+        return self.slice_ptr.nbytes + self.od_codes.nbytes + self.counts.nbytes + self.revenue.nbytes
+
+    def slice_mask(self, operators=None, hours=None, weekdays=None):
+        """Máscara booleana de las porciones que cumplen los filtros."""
+        mask = np.ones(len(self.slices), dtype=bool)
+        if operators is not None:
+            mask &= self.slices["hvfhs_license_num"].isin(list(operators)).to_numpy()
+        if hours is not None:
+            mask &= self.slices["pickup_hour"].between(hours[0], hours[1]).to_numpy()
+        if weekdays is not None:
+            mask &= self.slices["pickup_weekday"].isin(list(weekdays)).to_numpy()
+        return mask
+
+    def select(self, operators=None, hours=None, weekdays=None, pickup_zones=None,
+               airport_zones=None, value="count"):
+        """
+        Matriz OD agregada para una selección.
+
+        Args:
+            operators: Lista de operadores (None = todos)
+            hours: Tupla (hora_inicio, hora_fin) inclusiva (None = todas)
+            weekdays: Lista de días de la semana 0-6 (None = todos)
+            pickup_zones: LocationID de recogida permitidos (None = todos)
+            airport_zones: Si se indica, solo viajes con origen o destino en estas zonas
+            value: 'count' (viajes) o 'revenue' (suma de driver_pay)
+
+        Returns:
+            csr_matrix: Matriz N_ZONES x N_ZONES (filas = origen, columnas = destino)
+        """
+        entry_mask = np.repeat(self.slice_mask(operators, hours, weekdays), np.diff(self.slice_ptr))
+        codes = self.od_codes[entry_mask]
+        weights = (self.counts if value == "count" else self.revenue)[entry_mask]
+
+        pu, do = np.divmod(codes, N_ZONES)
+        keep = np.ones(len(codes), dtype=bool)
+        if pickup_zones is not None:
+            keep &= zone_mask(pickup_zones)[pu]
+        if airport_zones is not None:
+            airports = zone_mask(airport_zones)
+            keep &= airports[pu] | airports[do]
+
+        # coo -> csr suma los duplicados (mismo par OD en varias porciones)
+        return sparse.coo_matrix(
+            (weights[keep].astype(np.float64), (pu[keep], do[keep])),
+            shape=(N_ZONES, N_ZONES)
+        ).tocsr()
+
+
+def zone_mask(zone_ids):
+    """Máscara booleana de longitud N_ZONES para una lista de LocationID."""
+    mask = np.zeros(N_ZONES, dtype=bool)
+    ids = np.asarray(list(zone_ids), dtype=np.int64)
+    mask[ids[(ids >= 0) & (ids < N_ZONES)]] = True
+    return mask
+
+
+def build_od_matrix(df):
+    """
+    Agrega los viajes en matrices OD dispersas por porción en una sola pasada.
+
+    Args:
+        df: DataFrame de viajes con PULocationID, DOLocationID, hvfhs_license_num
+            y pickup_hour/pickup_weekday (o pickup_datetime)
+
+    Returns:
+        ODMatrix: Motor de consultas OD
+    """
+    if "pickup_hour" in df.columns and "pickup_weekday" in df.columns:
+        hours, weekdays = df["pickup_hour"], df["pickup_weekday"]
+    else:
+        pickups = pd.to_datetime(df["pickup_datetime"], errors="coerce")
+        hours, weekdays = pickups.dt.hour, pickups.dt.weekday
+
+    pu = df["PULocationID"].to_numpy(dtype=np.float64, na_value=np.nan)
+    do = df["DOLocationID"].to_numpy(dtype=np.float64, na_value=np.nan)
+    valid = (pu >= 0) & (pu < N_ZONES) & (do >= 0) & (do < N_ZONES)
+
+    slice_frame = pd.DataFrame({
+        "hvfhs_license_num": df["hvfhs_license_num"].to_numpy()[valid],
+        "pickup_hour": hours.to_numpy()[valid],
+        "pickup_weekday": weekdays.to_numpy()[valid],
+    })
+    slice_id = slice_frame.groupby(SLICE_KEYS, dropna=False, sort=True).ngroup().to_numpy()
+    n_slices = slice_id.max() + 1 if len(slice_id) else 0
+    first_rows = pd.Series(np.arange(len(slice_id))).groupby(slice_id).first().to_numpy()
+
+    pair = pu[valid].astype(np.int64) * N_ZONES + do[valid].astype(np.int64)
+    code = slice_id.astype(np.int64) * (N_ZONES * N_ZONES) + pair
+    unique_codes, inverse, counts = np.unique(code, return_inverse=True, return_counts=True)
+
+    if "driver_pay" in df.columns:
+        pay = np.nan_to_num(df["driver_pay"].to_numpy(dtype=np.float64, na_value=np.nan)[valid])
+        revenue = np.bincount(inverse, weights=pay, minlength=len(unique_codes))
+    else:
+        revenue = np.zeros(len(unique_codes))
+
+    entry_slice = unique_codes // (N_ZONES * N_ZONES)
+    slice_ptr = np.searchsorted(entry_slice, np.arange(n_slices + 1))
+
+    return ODMatrix(
+        slices=slice_frame.iloc[first_rows],
+        slice_ptr=slice_ptr,
+        od_codes=(unique_codes % (N_ZONES * N_ZONES)).astype(np.int32),
+        counts=counts.astype(np.int64),
+        revenue=revenue,
+    )
+
+
+def top_flows(matrix, k, revenue=None):
+    """
+    Los k pares OD con más valor, usando argpartition (sin ordenar todos los pares).
+
+    Args:
+        matrix: Matriz OD (csr_matrix)
+        k: Número de flujos
+        revenue: Matriz OD de ingresos con el mismo patrón (opcional)
+
+    Returns:
+        DataFrame: PULocationID, DOLocationID, trip_count (y revenue) ordenado desc.
+    """
+    coo = matrix.tocoo()
+    k = min(k, coo.nnz)
+    if k == 0:
+        return pd.DataFrame(columns=["PULocationID", "DOLocationID", "trip_count"])
+
+    top = np.argpartition(-coo.data, k - 1)[:k]
+    top = top[np.argsort(-coo.data[top], kind="stable")]
+    flows = pd.DataFrame({
+        "PULocationID": coo.row[top],
+        "DOLocationID": coo.col[top],
+        "trip_count": coo.data[top].astype(np.int64),
+    })
+    if revenue is not None:
+        flows["revenue"] = np.asarray(revenue[coo.row[top], coo.col[top]]).ravel()
+    return flows
+
+
+def asymmetric_flows(matrix, k):
+    """
+    Pares de zonas con mayor desequilibrio entre ida y vuelta.
+
+    Args:
+        matrix: Matriz OD (csr_matrix)
+        k: Número de pares
+
+    Returns:
+        DataFrame: origen/destino dominante, viajes de ida, de vuelta y flujo neto
+    """
+    net = (matrix - matrix.T).tocoo()
+    dominant = net.data > 0
+    row, col, data = net.row[dominant], net.col[dominant], net.data[dominant]
+    k = min(k, len(data))
+    if k == 0:
+        return pd.DataFrame(columns=["PULocationID", "DOLocationID", "forward", "backward", "net"])
+
+    top = np.argpartition(-data, k - 1)[:k]
+    top = top[np.argsort(-data[top], kind="stable")]
+    forward = np.asarray(matrix[row[top], col[top]]).ravel()
+    return pd.DataFrame({
+        "PULocationID": row[top],
+        "DOLocationID": col[top],
+        "forward": forward.astype(np.int64),
+        "backward": (forward - data[top]).astype(np.int64),
+        "net": data[top].astype(np.int64),
+    })
+
+
+def borough_rollup(matrix, zones_df):
+    """
+    Agrega una matriz OD de zonas a distritos: B^T · M · B.
+
+    Args:
+        matrix: Matriz OD (csr_matrix)
+        zones_df: Tabla de zonas con LocationID y Borough
+
+    Returns:
+        DataFrame: Matriz distrito de origen x distrito de destino
+    """
+    zone_boroughs = pd.Series("Unknown", index=np.arange(N_ZONES), dtype=object)
+    lookup = zones_df.dropna(subset=["LocationID"])
+    lookup = lookup[(lookup["LocationID"] >= 0) & (lookup["LocationID"] < N_ZONES)]
+    zone_boroughs[lookup["LocationID"].astype(int).to_numpy()] = lookup["Borough"].fillna("Unknown").to_numpy()
+
+    codes, boroughs = pd.factorize(zone_boroughs)
+    indicator = sparse.csr_matrix(
+        (np.ones(N_ZONES), (np.arange(N_ZONES), codes)),
+        shape=(N_ZONES, len(boroughs))
+    )
+    rolled = (indicator.T @ matrix @ indicator).toarray()
+    return pd.DataFrame(rolled, index=boroughs, columns=boroughs)
+
+
+def sankey_links(sources, targets):
+    """
+    Índices de nodos para un diagrama Sankey con mapeo vectorizado de etiquetas.
+
+    Args:
+        sources: Etiquetas de origen de cada enlace
+        targets: Etiquetas de destino de cada enlace
+
+    Returns:
+        tuple: (etiquetas de nodos, índice origen, índice destino)
+    """
+    sources, targets = np.asarray(sources), np.asarray(targets)
+    codes, labels = pd.factorize(np.concatenate([sources, targets]))
+    return list(labels), codes[:len(sources)], codes[len(sources):]
@@ -0,0 +1,137 @@
+"""
+Métricas comparativas entre operadores (Uber vs Lyft).
+
+Todas las métricas son cocientes de sumas: se calculan con una sola pasada de sumas y
+conteos por operador y, opcionalmente, por una columna de tiempo.
+Las sumas pueden salir de los viajes o de las celdas de los sketches (sin recorrer filas).
+"""
+
+import numpy as np
+import pandas as pd
+
+# Métricas aditivas que alimentan los cocientes
+SUM_METRICS = ["driver_pay", "tips", "trip_miles", "trip_time"]
+
+# Cocientes de sumas: nombre -> (numerador, denominador, factor)
+RATIO_METRICS = {
+    "price_per_mile": ("driver_pay", "trip_miles", 1.0),
+    "price_per_minute": ("driver_pay", "trip_time", 60.0),
+    "miles_per_minute": ("trip_miles", "trip_time", 60.0),
+    "tip_share": ("tips", "driver_pay", 100.0),
+}
+
+
+def operator_sums(df, operators=None, by=None):
+    """
+    Sumas y conteos por operador en una sola pasada sobre los viajes.
+
+    Los grupos se factorizan una vez y cada suma es un np.bincount sobre los códigos.
+
+    Args:
+        df: DataFrame de viajes
+        operators: Lista de operadores a incluir (None = todos)
+        by: Columna adicional de agrupación, p. ej. 'pickup_hour' (opcional)
+
+    Returns:
+        DataFrame: trips, <métrica>_sum, <métrica>_count y tipped_trips por grupo
+    """
+    if operators is not None:
+        df = df[df["hvfhs_license_num"].isin(list(operators))]
+    keys = ["hvfhs_license_num"] + ([by] if by else [])
+
+    grouped = df.groupby(keys, observed=True, sort=True)
+    sums = grouped.size().to_frame("trips")
+    codes = grouped.ngroup().to_numpy()
+    n_groups = len(sums)
+    valid = codes >= 0  # ngroup devuelve -1 en claves nulas
+    if valid.all():
+        valid = slice(None)
+    codes = codes[valid]
+
+    for metric in [m for m in SUM_METRICS if m in df.columns]:
+        values = df[metric].to_numpy(dtype=np.float64, na_value=np.nan)[valid]
+        missing = ~np.isfinite(values)
+        if missing.any():
+            values = np.where(missing, 0.0, values)
+        sums[f"{metric}_sum"] = np.bincount(codes, weights=values, minlength=n_groups)
+        # Conteo de valores válidos = viajes - faltantes (evita copiar los códigos)
+        sums[f"{metric}_count"] = sums["trips"].to_numpy() - np.bincount(codes[missing], minlength=n_groups)
+        if metric == "tips":
+            sums["tipped_trips"] = np.bincount(codes[values > 0], minlength=n_groups)
+    return sums
+
+
+def operator_sums_from_sketches(sketches, mask=None, operators=None, by=None):
+    """
+    Las mismas sumas que operator_sums, a partir de las celdas de un SketchSet.
+
+    Args:
+        sketches: SketchSet de la partición
+        mask: Máscara de celdas de los filtros actuales (None = todas)
+        operators: Lista de operadores a incluir (None = todos)
+        by: Columna clave de celda adicional, p. ej. 'pickup_hour' (opcional)
+
+    Returns:
+        DataFrame: Mismo formato que operator_sums
+    """
+    selected = np.ones(len(sketches.keys), dtype=bool) if mask is None else mask.copy()
+    if operators is not None:
+        selected &= sketches.keys["hvfhs_license_num"].isin(list(operators)).to_numpy()
+    keys = ["hvfhs_license_num"] + ([by] if by else [])
+
+    cells = sketches.keys.loc[selected, keys].copy()
+    cells["trips"] = sketches.trips[selected]
+    for metric in [m for m in SUM_METRICS if m in sketches.quantiles]:
+        totals = sketches.totals(metric)[selected]
+        cells[f"{metric}_sum"] = totals["sum"].to_numpy()
+        cells[f"{metric}_count"] = totals["count"].to_numpy()
+        if metric == "tips":
+            cells["tipped_trips"] = totals["positive"].to_numpy()
+
+    return cells.groupby(keys, observed=True).sum()
+
+
+def efficiency_metrics(sums):
+    """
+    Cocientes y promedios vectorizados a partir de las sumas.
+
+    Args:
+        sums: Resultado de operator_sums u operator_sums_from_sketches
+
+    Returns:
+        DataFrame: trips, promedios por métrica, cocientes de RATIO_METRICS y tip_rate (%)
+    """
+    result = pd.DataFrame({"trips": sums["trips"]}, index=sums.index)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for metric in SUM_METRICS:
+            if f"{metric}_sum" in sums.columns:
+                result[f"{metric}_mean"] = sums[f"{metric}_sum"] / sums[f"{metric}_count"]
+        for name, (numerator, denominator, factor) in RATIO_METRICS.items():
+            if f"{numerator}_sum" in sums.columns and f"{denominator}_sum" in sums.columns:
+                result[name] = sums[f"{numerator}_sum"] / sums[f"{denominator}_sum"] * factor
+        if "tipped_trips" in sums.columns:
+            result["tip_rate"] = sums["tipped_trips"] / sums["trips"] * 100
+    return result.replace([np.inf, -np.inf], np.nan)
+
+
+def compare_operators(df=None, sketches=None, mask=None, operators=None, by=None):
+    """
+    Métricas de eficiencia por operador (y por franja si se indica 'by').
+
+    Usa los sketches cuando están disponibles; si no, agrega los viajes.
+
+    Args:
+        df: DataFrame de viajes (ya filtrado)
+        sketches: SketchSet de la partición (opcional)
+        mask: Máscara de celdas equivalente a los filtros de df
+        operators: Lista de operadores a comparar (None = todos)
+        by: Columna adicional de agrupación (opcional)
+
+    Returns:
+        DataFrame: Una fila por operador (y franja) con hvfhs_license_num como columna
+    """
+    if sketches is not None:
+        sums = operator_sums_from_sketches(sketches, mask, operators, by)
+    else:
+        sums = operator_sums(df, operators, by)
+    return efficiency_metrics(sums).reset_index()
@@ -0,0 +1,388 @@
+"""
+Utilidades de rendimiento del dashboard: carga diferida de módulos pesados, perfil de
+tiempos/memoria de importación e instrumentación de cada ejecución del script (etapas,
+secciones con tiempo y memoria, aciertos de caché) con exportación a JSON y Chrome Trace.
+"""
+
+import functools
+import importlib
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from collections import deque
+
+import metrics_utils
+
+# Módulos pesados que el dashboard carga solo al usarlos
+HEAVY_MODULES = ["tensorflow", "lightgbm", "folium", "streamlit_folium", "pydeck"]
+
+# Tiempos de importación (ms) de los módulos cargados con lazy_import
+IMPORT_TIMES = {}
+
+# Últimas ejecuciones completas del script (una entrada por start_run/finish_run)
+RUN_HISTORY = deque(maxlen=50)
+
+# Cada sesión de Streamlit ejecuta el script en su propio hilo
+_current_run = threading.local()
+
+
+def module_available(name):
+    """Comprueba si un módulo está instalado sin importarlo."""
+    try:
+        return importlib.util.find_spec(name) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+class LazyModule:
+    """
+    Proxy de un módulo que se importa en el primer acceso a un atributo.
+
+    Ejemplo:
+        folium = LazyModule("folium")
+        folium.Map(...)  # aquí se importa folium
+    """
+
+    def __init__(self, name):
+        self.__dict__["_name"] = name
+        self.__dict__["_module"] = None
+
+    def _load(self):
+        module = self.__dict__["_module"]
+        if module is None:
+            name = self.__dict__["_name"]
+            start = time.perf_counter()
+            module = importlib.import_module(name)
+            IMPORT_TIMES[name] = (time.perf_counter() - start) * 1000
+            self.__dict__["_module"] = module
+        return module
+
+    @property
+    def is_loaded(self):
+        return self.__dict__["_module"] is not None
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        state = "cargado" if self.is_loaded else "sin cargar"
+        return f"<LazyModule {self.__dict__['_name']} ({state})>"
+
+
+def lazy_import(name):
+    """
+    Devuelve el módulo si ya está importado o un LazyModule que lo importará al usarlo.
+
+    Args:
+        name: Nombre del módulo (p. ej. 'pydeck')
+
+    Returns:
+        module o LazyModule
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    return LazyModule(name)
+
+
+def peak_rss_mb():
+    """Pico de memoria residente del proceso en MB."""
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss está en KB en Linux y en bytes en macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def rss_mb():
+    """Memoria residente actual del proceso en MB (Linux: /proc; resto: pico de ru_maxrss)."""
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        return peak_rss_mb()
+
+
+def mapped_memory_mb(path):
+    """
+    Memoria de los archivos bajo una ruta que el proceso tiene mapeados (Linux: /proc/self/smaps).
+
+    Args:
+        path: Archivo o directorio (p. ej. el de un modelo cargado con mmap)
+
+    Returns:
+        dict: rss_mb (páginas residentes en este proceso) y shared_mb (de ellas, las que también
+              tienen mapeadas otros procesos), o None si no hay /proc
+    """
+    prefix = os.path.abspath(path)
+    if os.path.isdir(prefix):
+        prefix = os.path.join(prefix, "")
+    totals = {"rss_mb": 0.0, "shared_mb": 0.0}
+    try:
+        with open("/proc/self/smaps") as f:
+            matching = False
+            for line in f:
+                fields = line.split()
+                if not fields:
+                    continue
+                if not fields[0].endswith(":"):
+                    # Cabecera de un mapeo: rango, permisos, offset, dispositivo, inodo y ruta
+                    matching = " ".join(fields[5:]).startswith(prefix)
+                elif matching and fields[0] == "Rss:":
+                    totals["rss_mb"] += int(fields[1]) / 1024
+                elif matching and fields[0] in ("Shared_Clean:", "Shared_Dirty:"):
+                    totals["shared_mb"] += int(fields[1]) / 1024
+    except OSError:
+        return None
+    return totals
+
+
+_PROFILE_SNIPPET = """
+import importlib, json, sys, time
+sys.path.insert(0, {cwd!r})
+from perf_utils import rss_mb
+before = rss_mb()
+start = time.perf_counter()
+importlib.import_module({name!r})
+elapsed = (time.perf_counter() - start) * 1000
+print(json.dumps({{"ms": elapsed, "rss_mb": rss_mb() - before, "base_rss_mb": before}}))
+"""
+
+
+def profile_import(name, preload=()):
+    """
+    Mide el costo de importar un módulo en un intérprete nuevo (sin caché de sys.modules).
+
+    Args:
+        name: Módulo a importar
+        preload: Módulos a importar antes de medir (p. ej. dependencias ya cargadas por la app)
+
+    Returns:
+        dict: module, ms, rss_mb (incremento), base_rss_mb y error si falla
+    """
+    if not module_available(name):
+        return {"module": name, "ms": None, "rss_mb": None, "base_rss_mb": None, "error": "no instalado"}
+
+    snippet = "".join(f"import {module}\n" for module in preload)
+    snippet += _PROFILE_SNIPPET.format(cwd=os.path.dirname(os.path.abspath(__file__)), name=name)
+    result = subprocess.run([sys.executable, "-c", snippet], capture_output=True, text=True,
+                            env={**os.environ, "TF_CPP_MIN_LOG_LEVEL": "3"})
+    try:
+        measured = json.loads(result.stdout.strip().splitlines()[-1])
+    except (IndexError, ValueError):
+        error = (result.stderr.strip().splitlines() or ["error desconocido"])[-1]
+        return {"module": name, "ms": None, "rss_mb": None, "base_rss_mb": None, "error": error}
+    return {"module": name, **measured, "error": None}
+
+
+def import_profile(modules=None, preload=("streamlit", "pandas", "numpy")):
+    """
+    Perfil de importación por módulo (ms y MB de memoria residente añadidos).
+
+    Cada módulo se mide en un proceso aislado tras cargar las dependencias base de la app,
+    de modo que el resultado es el costo incremental que evita la carga diferida.
+
+    Args:
+        modules: Lista de módulos (por defecto HEAVY_MODULES)
+        preload: Módulos ya presentes en cualquier arranque del dashboard
+
+    Returns:
+        list: Un dict por módulo (ver profile_import)
+    """
+    preload = [module for module in preload if module_available(module)]
+    return [profile_import(name, preload) for name in (modules or HEAVY_MODULES)]
+
+
+def start_run():
+    """Inicia la medición de una ejecución del script (llamar al principio de app.py)."""
+    now = time.perf_counter()
+    _current_run.start = now
+    _current_run.last = now
+    _current_run.last_rss = rss_mb()
+    _current_run.stages = {}
+    _current_run.spans = []
+    _current_run.cache = {}
+    _current_run.depth = 0
+
+
+def _active():
+    return getattr(_current_run, "stages", None) is not None
+
+
+def _add_span(name, category, start, end, rss_before, rss_after, **args):
+    _current_run.spans.append({
+        "name": name,
+        "category": category,
+        "start_ms": (start - _current_run.start) * 1000,
+        "duration_ms": (end - start) * 1000,
+        "rss_delta_mb": rss_after - rss_before,
+        "rss_mb": rss_after,
+        "depth": _current_run.depth,
+        **args,
+    })
+
+
+def checkpoint(stage):
+    """
+    Registra el tiempo transcurrido desde el checkpoint anterior como una etapa.
+
+    Args:
+        stage: Nombre de la etapa que termina (p. ej. 'load', 'tab3')
+    """
+    if not _active():
+        return
+    now = time.perf_counter()
+    current_rss = rss_mb()
+    _current_run.stages[stage] = _current_run.stages.get(stage, 0.0) + (now - _current_run.last) * 1000
+    _add_span(stage, "stage", _current_run.last, now, _current_run.last_rss, current_rss)
+    _current_run.last = now
+    _current_run.last_rss = current_rss
+
+
+class timer:
+    """
+    Context manager que mide una sección (tiempo y memoria residente) dentro de la ejecución.
+
+    Fuera de una ejecución iniciada con start_run solo mide el tiempo (elapsed_ms).
+
+    Ejemplo:
+        with perf_utils.timer("merge zonas", "enrichment"):
+            df = df.merge(...)
+    """
+
+    def __init__(self, name, category="section", **args):
+        self.name = name
+        self.category = category
+        self.args = args
+        self.elapsed_ms = None
+
+    def __enter__(self):
+        self.active = _active()
+        if self.active:
+            self.rss_before = rss_mb()
+            _current_run.depth += 1
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter()
+        self.elapsed_ms = (end - self.start) * 1000
+        if self.active and _active():
+            _current_run.depth -= 1
+            _add_span(self.name, self.category, self.start, end, self.rss_before, rss_mb(), **self.args)
+        return False
+
+
+# Aciertos/fallos acumulados de las cachés de Streamlit en el proceso
+CACHE_STATS = {}
+
+
+def _record_cache(name, hit):
+    stats = CACHE_STATS.setdefault(name, {"hits": 0, "misses": 0})
+    stats["hits" if hit else "misses"] += 1
+    metrics_utils.CACHE_REQUESTS.inc(function=name, result="hit" if hit else "miss")
+    if _active():
+        run_stats = _current_run.cache.setdefault(name, {"hits": 0, "misses": 0})
+        run_stats["hits" if hit else "misses"] += 1
+
+
+def tracked_cache(cache_decorator, name=None):
+    """
+    Envuelve un decorador de caché de Streamlit para contar aciertos y fallos y medir la llamada.
+
+    El cuerpo de la función solo se ejecuta en un fallo, así que se marca desde dentro de la
+    caché; la llamada externa registra el resultado y un span 'cache'.
+
+    Ejemplo:
+        @perf_utils.tracked_cache(st.cache_data)
+        def load_and_process_data(file_path): ...
+
+    Args:
+        cache_decorator: st.cache_data, st.cache_resource o una variante configurada
+        name: Nombre en las estadísticas (por defecto el de la función)
+    """
+    def decorate(func):
+        cache_name = name or func.__name__
+        misses = threading.local()
+
+        @functools.wraps(func)
+        def on_miss(*args, **kwargs):
+            misses.count = getattr(misses, "count", 0) + 1
+            return func(*args, **kwargs)
+
+        cached = cache_decorator(on_miss)
+
+        @functools.wraps(func)
+        def call(*args, **kwargs):
+            before = getattr(misses, "count", 0)
+            with timer(cache_name, "cache") as section:
+                result = cached(*args, **kwargs)
+                hit = getattr(misses, "count", 0) == before
+                section.args["cache_hit"] = hit
+            _record_cache(cache_name, hit)
+            return result
+
+        call.clear = getattr(cached, "clear", None)
+        return call
+    return decorate
+
+
+def finish_run():
+    """
+    Cierra la ejecución actual y la guarda en RUN_HISTORY.
+
+    Returns:
+        dict: stages (ms por etapa), spans (secciones medidas), cache (aciertos/fallos de la
+              ejecución), total_ms y rss_mb al terminar. También se registra en metrics_utils.
+    """
+    if not _active():
+        return None
+    run = {
+        "stages": dict(_current_run.stages),
+        "spans": list(_current_run.spans),
+        "cache": dict(_current_run.cache),
+        "total_ms": (time.perf_counter() - _current_run.start) * 1000,
+        "rss_mb": rss_mb(),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    RUN_HISTORY.append(run)
+    metrics_utils.observe_run(run)
+    _current_run.stages = None
+    return run
+
+
+def run_to_json(run):
+    """Serializa una ejecución (resultado de finish_run) a JSON."""
+    return json.dumps({**run, "cache_totals": CACHE_STATS}, indent=2, default=str)
+
+
+def run_to_chrome_trace(run):
+    """
+    Convierte una ejecución al formato Chrome Trace (chrome://tracing, Perfetto).
+
+    Las etapas y las secciones anidadas van en hilos distintos para que la cascada sea legible.
+
+    Returns:
+        str: JSON con traceEvents
+    """
+    events = [{"name": "thread_name", "ph": "M", "pid": 1, "tid": tid, "args": {"name": label}}
+              for tid, label in [(1, "etapas"), (2, "secciones")]]
+    for span in run["spans"]:
+        args = {key: value for key, value in span.items()
+                if key not in ("name", "category", "start_ms", "duration_ms", "depth")}
+        events.append({
+            "name": span["name"],
+            "cat": span["category"],
+            "ph": "X",
+            "ts": span["start_ms"] * 1000,
+            "dur": span["duration_ms"] * 1000,
+            "pid": 1,
+            "tid": 1 if span["category"] == "stage" else 2,
+            "args": args,
+        })
+        events.append({"name": "rss_mb", "ph": "C", "pid": 1, "ts": (span["start_ms"] + span["duration_ms"]) * 1000,
+                       "args": {"rss_mb": span["rss_mb"]}})
+    return json.dumps({"traceEvents": events, "displayTimeUnit": "ms"}, default=str)
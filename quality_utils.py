@@ -0,0 +1,249 @@
+"""
+Etapa de calidad de datos de la ingesta: reglas vectorizadas y cuarentena.
+
+Cada mes descargado se lee por lotes de registros (pyarrow) y a cada lote se le aplican todas
+las reglas de QUALITY_RULES en una sola pasada con NumPy. Cada regla es un bit de un entero por
+fila (quality_flags): las filas sin bits van a la partición limpia y el resto a un archivo de
+cuarentena con sus banderas y la primera regla incumplida. Los lotes se filtran en Arrow, sin
+pasar por pandas, así que el esquema de salida es el mismo que el de entrada.
+
+Junto a cada partición validada se guarda un informe (<partición>_quality.json) con los
+contadores por regla. Quien lea una partición con informe puede omitir su propia limpieza.
+"""
+
+import json
+import os
+import re
+import time
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+# Reglas en orden de prioridad (el bit de cada una es su posición)
+QUALITY_RULES = {
+    "missing_values": "Valores nulos en columnas requeridas",
+    "datetime_order": "Llegada anterior o igual a la recogida",
+    "out_of_period": "Recogida fuera del mes de la partición",
+    "unknown_zone": "Zona de recogida o destino desconocida (264/265) o inválida",
+    "trip_miles_range": "Distancia fuera de rango",
+    "trip_time_range": "Duración fuera de rango",
+    "driver_pay_range": "Pago al conductor fuera de rango",
+    "tips_range": "Propina negativa o fuera de rango",
+    "speed_outlier": "Velocidad media imposible",
+}
+RULE_BITS = {rule: 1 << i for i, rule in enumerate(QUALITY_RULES)}
+
+# Columnas que no pueden ser nulas (las que no estén en el archivo se omiten)
+REQUIRED_COLUMNS = ["hvfhs_license_num", "pickup_datetime", "dropoff_datetime", "PULocationID",
+                    "DOLocationID", "trip_miles", "driver_pay"]
+
+# Límites de las reglas de rango
+VALID_ZONES = (1, 263)        # 264 y 265 = zona desconocida
+MAX_TRIP_MILES = 200
+MAX_TRIP_SECONDS = 6 * 3600
+MAX_DRIVER_PAY = 1000
+MAX_TIPS = 500
+MAX_SPEED_MPH = 90
+
+# Versión de las reglas (los informes de otra versión no cuentan como validados)
+QUALITY_VERSION = 1
+
+# Filas por lote de lectura
+BATCH_ROWS = 1_000_000
+
+
+def period_from_path(path):
+    """Mes (año, mes) de una partición a partir de su nombre (AAAA-MM...), o None."""
+    match = re.search(r"(\d{4})-(\d{2})", os.path.basename(path))
+    return (int(match.group(1)), int(match.group(2))) if match else None
+
+
+def _numbers(batch, name):
+    """Columna numérica como array float de NumPy (nulos como NaN) o None si no existe."""
+    if name not in batch.schema.names:
+        return None
+    return batch.column(name).to_numpy(zero_copy_only=False).astype(float, copy=False)
+
+
+def _timestamps(batch, name):
+    """Columna de fecha como nanosegundos int64 (nulos como NaT) o None si no existe."""
+    if name not in batch.schema.names:
+        return None
+    column = batch.column(name)
+    if not pa.types.is_timestamp(column.type):
+        column = pc.cast(column, pa.timestamp("ns"))
+    return column.to_numpy(zero_copy_only=False).astype("datetime64[ns]")
+
+
+def rule_flags(batch, period=None):
+    """
+    Banderas de calidad de cada fila de un lote.
+
+    Args:
+        batch: pa.RecordBatch o pa.Table con el esquema FHVHV
+        period: (año, mes) de la partición para la regla out_of_period (None = no se aplica)
+
+    Returns:
+        np.ndarray: uint16 por fila; 0 = fila válida, cada bit = una regla de RULE_BITS
+    """
+    n = batch.num_rows
+    flags = np.zeros(n, dtype=np.uint16)
+
+    def mark(rule, violated):
+        flags[violated] |= RULE_BITS[rule]
+
+    missing = np.zeros(n, dtype=bool)
+    for name in REQUIRED_COLUMNS:
+        if name in batch.schema.names:
+            missing |= batch.column(name).is_null().to_numpy(zero_copy_only=False)
+    mark("missing_values", missing)
+
+    pickup = _timestamps(batch, "pickup_datetime")
+    dropoff = _timestamps(batch, "dropoff_datetime")
+    if pickup is not None and dropoff is not None:
+        mark("datetime_order", ~np.isnat(pickup) & ~np.isnat(dropoff) & (dropoff <= pickup))
+    if pickup is not None and period is not None:
+        start = np.datetime64(f"{period[0]:04d}-{period[1]:02d}", "M")
+        mark("out_of_period", ~np.isnat(pickup) & ((pickup < start) | (pickup >= start + 1)))
+
+    for name in ["PULocationID", "DOLocationID"]:
+        zones = _numbers(batch, name)
+        if zones is not None:
+            mark("unknown_zone", (zones < VALID_ZONES[0]) | (zones > VALID_ZONES[1]))
+
+    miles = _numbers(batch, "trip_miles")
+    if miles is not None:
+        mark("trip_miles_range", (miles <= 0) | (miles > MAX_TRIP_MILES))
+
+    seconds = _numbers(batch, "trip_time")
+    if seconds is None and pickup is not None and dropoff is not None:
+        seconds = (dropoff - pickup).astype("timedelta64[s]").astype(float)
+        seconds[np.isnat(pickup) | np.isnat(dropoff)] = np.nan
+    if seconds is not None:
+        mark("trip_time_range", (seconds <= 0) | (seconds > MAX_TRIP_SECONDS))
+
+    pay = _numbers(batch, "driver_pay")
+    if pay is not None:
+        mark("driver_pay_range", (pay <= 0) | (pay > MAX_DRIVER_PAY))
+
+    tips = _numbers(batch, "tips")
+    if tips is not None:
+        mark("tips_range", (tips < 0) | (tips > MAX_TIPS))
+
+    if miles is not None and seconds is not None:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            speed = miles / (seconds / 3600)
+        mark("speed_outlier", (seconds > 0) & (speed > MAX_SPEED_MPH))
+
+    return flags
+
+
+def rule_counts(flags):
+    """Filas que incumplen cada regla (una fila cuenta en todas las reglas que incumple)."""
+    return {rule: int(np.count_nonzero(flags & bit)) for rule, bit in RULE_BITS.items()}
+
+
+def first_rule(flags):
+    """Nombre de la primera regla incumplida por fila ('' si la fila es válida)."""
+    names = np.array([""] + list(QUALITY_RULES), dtype=object)
+    first = np.zeros(len(flags), dtype=np.int64)
+    valid = flags > 0
+    # Posición del bit menos significativo + 1
+    lowest = flags[valid] & (~flags[valid] + 1)
+    first[valid] = np.log2(lowest).astype(np.int64) + 1
+    return names[first]
+
+
+def validate_parquet(input_path, clean_path, quarantine_path, period=None, batch_rows=BATCH_ROWS):
+    """
+    Valida una partición Parquet por lotes y escribe la partición limpia y la cuarentena.
+
+    Args:
+        input_path: Parquet de entrada (mes crudo)
+        clean_path: Parquet de salida con las filas válidas (mismo esquema)
+        quarantine_path: Parquet con las filas inválidas más quality_flags y quality_rule
+        period: (año, mes) esperado (por defecto, el del nombre de input_path)
+        batch_rows: Filas por lote de lectura
+
+    Returns:
+        dict: Informe con rows, clean_rows, quarantined_rows, rules (contadores), seconds y
+              version; se guarda también junto a clean_path (quality_path)
+    """
+    start = time.perf_counter()
+    period = period or period_from_path(input_path)
+    parquet_file = pq.ParquetFile(input_path)
+    schema = parquet_file.schema_arrow
+    quarantine_schema = schema.append(pa.field("quality_flags", pa.uint16())).append(pa.field("quality_rule", pa.string()))
+
+    for path in [clean_path, quarantine_path]:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    clean_tmp, quarantine_tmp = f"{clean_path}.{os.getpid()}.tmp", f"{quarantine_path}.{os.getpid()}.tmp"
+    counts = dict.fromkeys(QUALITY_RULES, 0)
+    rows = clean_rows = 0
+    with pq.ParquetWriter(clean_tmp, schema, compression="snappy") as clean_writer, \
+            pq.ParquetWriter(quarantine_tmp, quarantine_schema, compression="snappy") as quarantine_writer:
+        for batch in parquet_file.iter_batches(batch_size=batch_rows):
+            flags = rule_flags(batch, period)
+            valid = flags == 0
+            clean_writer.write_batch(batch.filter(pa.array(valid)))
+            if not valid.all():
+                bad = batch.filter(pa.array(~valid))
+                bad_flags = flags[~valid]
+                quarantine_writer.write_batch(pa.RecordBatch.from_arrays(
+                    bad.columns + [pa.array(bad_flags), pa.array(first_rule(bad_flags), pa.string())],
+                    schema=quarantine_schema))
+            for rule, count in rule_counts(flags).items():
+                counts[rule] += count
+            rows += batch.num_rows
+            clean_rows += int(valid.sum())
+    os.replace(clean_tmp, clean_path)
+    os.replace(quarantine_tmp, quarantine_path)
+
+    report = {
+        "source": os.path.basename(input_path),
+        "period": list(period) if period else None,
+        "rows": rows,
+        "clean_rows": clean_rows,
+        "quarantined_rows": rows - clean_rows,
+        "rules": counts,
+        "seconds": time.perf_counter() - start,
+        "version": QUALITY_VERSION,
+    }
+    save_report(clean_path, report)
+    return report
+
+
+def quality_path(parquet_path):
+    """Ruta del informe de calidad asociado a una partición Parquet."""
+    return os.path.splitext(parquet_path)[0] + "_quality.json"
+
+
+def save_report(parquet_path, report):
+    """Guarda el informe de calidad de una partición (después de escribir la partición)."""
+    path = quality_path(parquet_path)
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    return path
+
+
+def load_report(parquet_path):
+    """Informe de calidad de una partición o None si no existe."""
+    path = quality_path(parquet_path)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def is_validated(parquet_path):
+    """
+    Indica si una partición pasó la etapa de calidad con las reglas actuales.
+
+    El informe debe ser de QUALITY_VERSION y no más antiguo que la partición (si la partición
+    se reescribe, deja de contar como validada).
+    """
+    report = load_report(parquet_path)
+    return (report is not None and report.get("version") == QUALITY_VERSION
+            and os.path.getmtime(quality_path(parquet_path)) >= os.path.getmtime(parquet_path))
@@ -0,0 +1,159 @@
+"""
+Backend de consultas para las agregaciones de las pestañas: pandas (en memoria) o Polars (lazy).
+
+Cada agregación se describe una sola vez como claves de agrupación y columnas de salida
+{nombre: (columna, función)}. Con pandas se ejecuta sobre el DataFrame ya filtrado de app.py; con
+Polars (NYC_QUERY_BACKEND=polars) se arma una consulta lazy sobre el Parquet del mes: lectura,
+hora/día, unión con las zonas, filtros de la barra lateral y agrupación. El optimizador de Polars
+lee solo las columnas que usa la consulta (projection pushdown), aplica el filtro de operadores
+al leer (predicate pushdown) y ejecuta en varios hilos. Ambos backends devuelven el mismo
+DataFrame pequeño de pandas, ordenado por las claves, que consumen los gráficos.
+"""
+
+import os
+
+import pandas as pd
+
+import perf_utils
+
+QUERY_BACKENDS = ("pandas", "polars")
+
+# Polars es opcional y se importa en la primera consulta
+HAS_POLARS = perf_utils.module_available("polars")
+pl = perf_utils.lazy_import("polars")
+
+QUERY_BACKEND = os.environ.get("NYC_QUERY_BACKEND", "pandas").lower()
+if QUERY_BACKEND not in QUERY_BACKENDS:
+    raise ValueError(f"NYC_QUERY_BACKEND debe ser uno de {QUERY_BACKENDS}, no '{QUERY_BACKEND}'")
+if QUERY_BACKEND == "polars" and not HAS_POLARS:
+    print("Polars no está disponible. Las agregaciones se ejecutarán con pandas.")
+    QUERY_BACKEND = "pandas"
+
+# Funciones de agregación soportadas ('size' = filas del grupo, sin columna)
+AGG_FUNCS = ("size", "count", "sum", "mean")
+
+DAY_NAMES = {0: "Lunes", 1: "Martes", 2: "Miércoles", 3: "Jueves", 4: "Viernes", 5: "Sábado", 6: "Domingo"}
+
+
+def filter_spec(operators, hours, boroughs=None, airport_only=False):
+    """
+    Filtros de la barra lateral como tupla (clave de caché de las consultas de Polars).
+
+    Args:
+        operators: Operadores seleccionados
+        hours: (hora inicial, hora final), inclusivas
+        boroughs: Distritos de recogida (None = sin filtro)
+        airport_only: Solo viajes desde/hacia aeropuertos
+
+    Returns:
+        tuple: (operadores, horas, distritos, solo aeropuertos)
+    """
+    return (tuple(operators), tuple(hours), tuple(boroughs) if boroughs else None, bool(airport_only))
+
+
+def pandas_aggregate(df, keys, aggs):
+    """
+    Agregación en memoria sobre el DataFrame filtrado.
+
+    Args:
+        df: Viajes ya filtrados
+        keys: Columnas de agrupación
+        aggs: dict nombre -> (columna, función de AGG_FUNCS); la columna de 'size' se ignora
+
+    Returns:
+        DataFrame: Una fila por grupo (sin grupos con claves nulas), ordenado por las claves
+    """
+    named = {name: (keys[0] if func == "size" else column, func) for name, (column, func) in aggs.items()}
+    result = df.groupby(list(keys), observed=True).agg(**named).reset_index()
+    return _normalize(result, aggs)
+
+
+def lazy_trips(file_path, zones_df=None, airport_zones=(), filters=None):
+    """
+    Consulta lazy de Polars con la carga, el enriquecimiento y los filtros de app.py.
+
+    Args:
+        file_path: Parquet del mes
+        zones_df: Tabla de zonas (LocationID, Borough, Zone) o None
+        airport_zones: IDs de zona de los aeropuertos
+        filters: Resultado de filter_spec (None = sin filtros)
+
+    Returns:
+        pl.LazyFrame: Viajes con pickup_hour, pickup_weekday, day_name, pickup_borough,
+                      pickup_zone, from_airport y to_airport (nada se lee hasta collect)
+    """
+    trips = pl.scan_parquet(file_path)
+    schema = trips.collect_schema()
+    if schema["pickup_datetime"] == pl.String:
+        trips = trips.with_columns(pl.col("pickup_datetime").str.to_datetime(strict=False))
+    if "pickup_hour" not in schema:
+        trips = trips.with_columns(pickup_hour=pl.col("pickup_datetime").dt.hour().cast(pl.Int64))
+    if "pickup_weekday" not in schema:
+        # Polars numera los días de 1 (lunes) a 7; pandas de 0 a 6
+        trips = trips.with_columns(pickup_weekday=pl.col("pickup_datetime").dt.weekday().cast(pl.Int64) - 1)
+    trips = trips.with_columns(
+        day_name=pl.col("pickup_weekday").replace_strict(DAY_NAMES, default=None, return_dtype=pl.String),
+        from_airport=pl.col("PULocationID").is_in(list(airport_zones)),
+        to_airport=pl.col("DOLocationID").is_in(list(airport_zones)),
+    )
+
+    if zones_df is not None:
+        zones = pl.from_pandas(pd.DataFrame({
+            "PULocationID": zones_df["LocationID"].astype("int64"),
+            "pickup_borough": zones_df["Borough"].astype(str),
+            "pickup_zone": zones_df["Zone"].astype(str),
+        })).lazy()
+        trips = trips.with_columns(pl.col("PULocationID").cast(pl.Int64)).join(zones, on="PULocationID", how="left")
+
+    if filters is not None:
+        operators, hours, boroughs, airport_only = filters
+        predicate = pl.col("hvfhs_license_num").is_in(list(operators)) & pl.col("pickup_hour").is_between(*hours)
+        if boroughs and zones_df is not None:
+            predicate &= pl.col("pickup_borough").is_in(list(boroughs))
+        if airport_only:
+            predicate &= pl.col("from_airport") | pl.col("to_airport")
+        trips = trips.filter(predicate)
+    return trips
+
+
+def lazy_aggregate(trips, keys, aggs):
+    """Agrupación lazy equivalente a pandas_aggregate (pl.LazyFrame ordenado por las claves)."""
+    exprs = []
+    for name, (column, func) in aggs.items():
+        expr = pl.len() if func == "size" else getattr(pl.col(column), func)()
+        exprs.append(expr.alias(name))
+    return trips.drop_nulls(list(keys)).group_by(list(keys)).agg(exprs).sort(list(keys))
+
+
+def polars_aggregate(file_path, keys, aggs, zones_df=None, airport_zones=(), filters=None):
+    """
+    Ejecuta una agregación como consulta lazy de Polars sobre el Parquet del mes.
+
+    Returns:
+        DataFrame: Mismo resultado que pandas_aggregate sobre los viajes filtrados
+    """
+    query = lazy_aggregate(lazy_trips(file_path, zones_df, airport_zones, filters), keys, aggs)
+    return _normalize(query.collect().to_pandas(), aggs)
+
+
+def polars_aggregate_all(file_path, queries, zones_df=None, airport_zones=(), filters=None):
+    """
+    Ejecuta varias agregaciones en una sola pasada (pl.collect_all comparte la lectura y los filtros).
+
+    Args:
+        queries: Lista de (keys, aggs)
+
+    Returns:
+        list: Un DataFrame de pandas por consulta
+    """
+    trips = lazy_trips(file_path, zones_df, airport_zones, filters)
+    frames = pl.collect_all([lazy_aggregate(trips, keys, aggs) for keys, aggs in queries])
+    return [_normalize(frame.to_pandas(), aggs) for frame, (_, aggs) in zip(frames, queries)]
+
+
+def _normalize(result, aggs):
+    # Conteos como int64 y filas en orden de las claves en los dos backends
+    for name, (_, func) in aggs.items():
+        if func in ("size", "count"):
+            result[name] = result[name].astype("int64")
+    return result.reset_index(drop=True)
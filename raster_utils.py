@@ -0,0 +1,164 @@
+"""
+Gráficos de densidad rasterizados en el servidor para relaciones entre dos variables.
+
+En lugar de enviar un marcador por viaje, los registros filtrados se cuentan en una malla 2D
+con NumPy (una pasada: índice de celda + bincount) y la malla se dibuja como un heatmap con
+escala logarítmica. El costo en el servidor es O(filas) y el tamaño en el navegador es
+constante (bins_x × bins_y celdas), sin importar cuántos viajes haya. Cada celda conserva los
+conteos por operador (canales) para el hover y para ver un operador por separado.
+"""
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+# Celdas de la malla (x, y)
+DEFAULT_BINS = (160, 120)
+
+# Cuantil que fija el máximo de cada eje (los valores extremos no comprimen el resto)
+RANGE_QUANTILE = 0.995
+
+
+def axis_range(values, quantile=RANGE_QUANTILE):
+    """Rango [mínimo, cuantil alto] de un eje, ignorando valores no finitos."""
+    values = values[np.isfinite(values)]
+    if len(values) == 0:
+        return 0.0, 1.0
+    low, high = float(values.min()), float(np.quantile(values, quantile))
+    return (low, high) if high > low else (low, low + 1.0)
+
+
+def _cell_index(values, low, high, bins):
+    index = np.floor((values - low) * (bins / (high - low))).astype(np.int64)
+    # El borde superior pertenece a la última celda, como en np.histogram
+    index[values == high] = bins - 1
+    return index
+
+
+def density_grid(x, y, groups=None, bins=DEFAULT_BINS, x_range=None, y_range=None):
+    """
+    Cuenta los registros en una malla 2D, en total y por grupo.
+
+    Args:
+        x, y: Arrays de valores
+        groups: Array opcional con el grupo (operador) de cada registro
+        bins: (celdas en x, celdas en y)
+        x_range, y_range: Rangos de los ejes (por defecto axis_range)
+
+    Returns:
+        dict: counts (canales, bins_x, bins_y) int32, channels (nombres; el primero es el total),
+              x_edges, y_edges, rows (registros dentro de la malla) y outside (fuera de ella)
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    finite = np.isfinite(x) & np.isfinite(y)
+    if not finite.all():
+        x, y = x[finite], y[finite]
+        groups = None if groups is None else np.asarray(groups)[finite]
+    bins_x, bins_y = bins
+    x_range = x_range or axis_range(x)
+    y_range = y_range or axis_range(y)
+
+    ix = _cell_index(x, x_range[0], x_range[1], bins_x)
+    iy = _cell_index(y, y_range[0], y_range[1], bins_y)
+    inside = (ix >= 0) & (ix < bins_x) & (iy >= 0) & (iy < bins_y)
+    cell = ix[inside] * bins_y + iy[inside]
+
+    channels = ["Total"]
+    counts = [np.bincount(cell, minlength=bins_x * bins_y)]
+    if groups is not None:
+        codes, names = _factorize(np.asarray(groups)[inside])
+        # Un solo bincount para todos los canales: celda + canal * celdas
+        per_group = np.bincount(codes * (bins_x * bins_y) + cell, minlength=len(names) * bins_x * bins_y)
+        channels += [str(name) for name in names]
+        counts += list(per_group.reshape(len(names), bins_x * bins_y))
+
+    return {
+        "counts": np.stack(counts).reshape(len(channels), bins_x, bins_y).astype(np.int32),
+        "channels": channels,
+        "x_edges": np.linspace(x_range[0], x_range[1], bins_x + 1),
+        "y_edges": np.linspace(y_range[0], y_range[1], bins_y + 1),
+        "rows": int(inside.sum()),
+        "outside": int((~inside).sum()) + int((~finite).sum()),
+    }
+
+
+def _factorize(values):
+    # pd.factorize usa una tabla hash: O(filas), sin ordenar las cadenas
+    codes, names = pd.factorize(values, sort=True)
+    return codes.astype(np.int64), np.asarray(names)
+
+
+def linear_fit(x, y):
+    """Recta de mínimos cuadrados (pendiente, intercepto) o None si no hay datos suficientes."""
+    valid = np.isfinite(x) & np.isfinite(y)
+    if valid.sum() < 2 or np.ptp(x[valid]) == 0:
+        return None
+    slope, intercept = np.polyfit(x[valid], y[valid], 1)
+    return float(slope), float(intercept)
+
+
+def density_figure(grid, channel="Total", title=None, x_title=None, y_title=None, trendlines=None):
+    """
+    Heatmap de una malla de density_grid (conteos en escala logarítmica).
+
+    El hover de cada celda muestra su centro y semiancho en x e y, los viajes del canal y, en el
+    canal total, el desglose por operador.
+
+    Args:
+        grid: Resultado de density_grid
+        channel: Canal a dibujar ('Total' o un operador)
+        title, x_title, y_title: Títulos
+        trendlines: dict nombre -> (pendiente, intercepto) para superponer rectas de tendencia
+
+    Returns:
+        go.Figure
+    """
+    channels = grid["channels"]
+    counts = grid["counts"][channels.index(channel)]
+    x_edges, y_edges = grid["x_edges"], grid["y_edges"]
+    x_centers = (x_edges[:-1] + x_edges[1:]) / 2
+    y_centers = (y_edges[:-1] + y_edges[1:]) / 2
+
+    # Celdas vacías transparentes; color = log10(viajes)
+    z = np.where(counts > 0, np.log10(np.maximum(counts, 1)), np.nan).T
+    max_count = max(int(counts.max()), 1)
+    tick_counts = [10 ** power for power in range(0, int(np.log10(max_count)) + 1)]
+
+    # customdata: [viajes, viajes por operador...] por celda (enteros: el JSON es compacto)
+    half_x = (x_edges[1] - x_edges[0]) / 2
+    half_y = (y_edges[1] - y_edges[0]) / 2
+    layers = [counts.T]
+    hover = (f"{x_title or 'x'}: %{{x:.2f}} ± {half_x:.2f}<br>{y_title or 'y'}: %{{y:.2f}} ± {half_y:.2f}"
+             "<br>Viajes: %{customdata[0]:,}")
+    if channel == "Total" and len(channels) > 1:
+        for i, name in enumerate(channels[1:], start=1):
+            layers.append(grid["counts"][i].T)
+            hover += f"<br>{name}: %{{customdata[{i}]:,}}"
+    customdata = np.stack(layers, axis=-1)
+
+    fig = go.Figure(go.Heatmap(
+        x=x_centers,
+        y=y_centers,
+        z=z,
+        customdata=customdata,
+        hovertemplate=hover + "<extra></extra>",
+        colorscale="Viridis",
+        colorbar=dict(title="Viajes", tickvals=np.log10(tick_counts), ticktext=[f"{c:,}" for c in tick_counts]),
+    ))
+    for name, (slope, intercept) in (trendlines or {}).items():
+        fig.add_trace(go.Scatter(
+            x=[x_edges[0], x_edges[-1]],
+            y=[intercept + slope * x_edges[0], intercept + slope * x_edges[-1]],
+            mode="lines",
+            name=f"Tendencia {name}",
+        ))
+    fig.update_layout(
+        title=title,
+        xaxis_title=x_title,
+        yaxis_title=y_title,
+        xaxis_range=[x_edges[0], x_edges[-1]],
+        yaxis_range=[y_edges[0], y_edges[-1]],
+        legend=dict(orientation="h", y=-0.2),
+    )
+    return fig
@@ -0,0 +1,799 @@
+"""
+Sketches mergeables para las distribuciones del dashboard de NYC Ride-Hailing.
+
+Cada partición (mes) se resume en un conjunto de celdas definidas por los mismos
+filtros del sidebar (operador, hora, distrito de recogida y dirección aeroportuaria).
+Cada celda guarda, para driver_pay, tips, trip_miles, trip_time y tip_percent:
+
+- Un sketch de cuantiles con error relativo acotado (estilo DDSketch). Los buckets
+  son logarítmicos y fijos, por lo que combinar sketches suma conteos: el resultado
+  es idéntico al sketch construido sobre la unión de los datos.
+- Un histograma de bins fijos con conteos de underflow/overflow.
+
+Además cada celda guarda lo necesario para contar valores distintos por unión:
+conjuntos exactos de días y zonas de recogida (dominios pequeños) y un sketch
+HyperLogLog de rutas PU→DO (unión = máximo por registro).
+
+Así cualquier combinación de filtros, meses u operadores se responde combinando
+celdas, en memoria constante respecto al número de viajes.
+"""
+
+import os
+import joblib
+import numpy as np
+import pandas as pd
+
+# Zonas de aeropuertos (mismas que usa app.py): Newark (1), JFK (132), LaGuardia (138)
+AIRPORT_ZONES = [1, 132, 138]
+
+# Códigos de dirección aeroportuaria por viaje
+AIRPORT_NONE = 0
+AIRPORT_TO = 1
+AIRPORT_FROM = 2
+AIRPORT_BOTH = 3
+
+# Claves que definen una celda (coinciden con los filtros del sidebar)
+CELL_KEYS = ["hvfhs_license_num", "pickup_hour", "pickup_borough", "airport_code"]
+
+# Métricas con sketch y bordes de su histograma fijo
+SKETCH_METRICS = {
+    "driver_pay": np.linspace(0, 200, 101),
+    "tips": np.linspace(0, 50, 101),
+    "trip_miles": np.linspace(0, 50, 101),
+    "trip_time": np.linspace(0, 7200, 121),  # segundos, bins de 1 minuto
+    "tip_percent": np.linspace(0, 100, 51),
+}
+
+# Conteos de valores distintos por celda:
+# - Días y zonas tienen dominios pequeños (≤ 31 días por mes, 265 zonas), así que se
+#   guarda el conjunto exacto de valores presentes (error 0).
+# - Las rutas PU→DO llegan a ~70k valores: HyperLogLog con 2^p registros, cuyo error
+#   estándar relativo es 1.04 / sqrt(2^p) (±1.6% con p = 12; ~95% de las
+#   estimaciones quedan dentro de ±3.3%).
+EXACT_DISTINCT_TARGETS = ["days", "zones"]
+HLL_TARGETS = {"routes": 12}
+
+# Versión del formato de SketchSet (los archivos de otra versión se reconstruyen)
+SKETCH_VERSION = 2
+
+# Parámetros de los buckets logarítmicos
+RELATIVE_ACCURACY = 0.01
+MIN_INDEXABLE = 1e-3   # |x| menores se cuentan en el bucket cero
+MAX_INDEXABLE = 1e9    # |x| mayores se recortan al último bucket
+_KEY_OFFSET = 2048
+_KEY_SPAN = 4096
+
+
+def _log_gamma(relative_accuracy):
+    gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+    return np.log(gamma)
+
+
+def _bucket_keys(values, log_gamma):
+    """
+    Calcula signo y clave de bucket logarítmico para un arreglo de valores.
+
+    Returns:
+        tuple: (signo en {-1, 0, 1}, clave entera del bucket)
+    """
+    magnitude = np.abs(values)
+    sign = np.sign(values).astype(np.int8)
+    sign[magnitude < MIN_INDEXABLE] = 0
+    keys = np.zeros(len(values), dtype=np.int64)
+    indexable = sign != 0
+    clipped = np.minimum(magnitude[indexable], MAX_INDEXABLE)
+    keys[indexable] = np.ceil(np.log(clipped) / log_gamma).astype(np.int64)
+    return sign, keys
+
+
+class QuantileSketch:
+    """
+    Sketch de cuantiles con error relativo acotado (estilo DDSketch).
+
+    Cualquier cuantil estimado está dentro de ±relative_accuracy (1% por defecto)
+    del valor real. La memoria depende del rango de valores, no del número de filas.
+    """
+
+    def __init__(self, relative_accuracy=RELATIVE_ACCURACY):
+        self.relative_accuracy = relative_accuracy
+        self._log_gamma = _log_gamma(relative_accuracy)
+        self.pos_keys = np.empty(0, dtype=np.int64)
+        self.pos_counts = np.empty(0, dtype=np.int64)
+        self.neg_keys = np.empty(0, dtype=np.int64)
+        self.neg_counts = np.empty(0, dtype=np.int64)
+        self.zero_count = 0
+        self.count = 0
+        self.sum = 0.0
+        self.sum_sq = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    @classmethod
+    def from_values(cls, values, relative_accuracy=RELATIVE_ACCURACY):
+        """Construye un sketch a partir de un arreglo de valores."""
+        sketch = cls(relative_accuracy)
+        sketch.update(values)
+        return sketch
+
+    def update(self, values):
+        """Añade un arreglo de valores (los NaN se ignoran)."""
+        values = np.asarray(values, dtype=np.float64)
+        values = values[np.isfinite(values)]
+        if len(values) == 0:
+            return self
+
+        sign, keys = _bucket_keys(values, self._log_gamma)
+        other = QuantileSketch(self.relative_accuracy)
+        other.pos_keys, other.pos_counts = np.unique(keys[sign > 0], return_counts=True)
+        other.neg_keys, other.neg_counts = np.unique(keys[sign < 0], return_counts=True)
+        other.zero_count = int((sign == 0).sum())
+        other.count = len(values)
+        other.sum = float(values.sum())
+        other.sum_sq = float(np.square(values).sum())
+        other.min = float(values.min())
+        other.max = float(values.max())
+        return self.merge(other)
+
+    def merge(self, other):
+        """Combina otro sketch en este (in-place)."""
+        merged = QuantileSketch.merge_all([self, other])
+        self.__dict__.update(merged.__dict__)
+        return self
+
+    @classmethod
+    def merge_all(cls, sketches):
+        """
+        Combina una lista de sketches en uno nuevo.
+
+        El resultado es idéntico al sketch construido sobre la unión de los datos.
+        """
+        sketches = list(sketches)
+        relative_accuracy = sketches[0].relative_accuracy if sketches else RELATIVE_ACCURACY
+        merged = cls(relative_accuracy)
+        if not sketches:
+            return merged
+        if any(s.relative_accuracy != relative_accuracy for s in sketches):
+            raise ValueError("No se pueden combinar sketches con distinta precisión relativa")
+
+        merged.pos_keys, merged.pos_counts = _sum_by_key(
+            [s.pos_keys for s in sketches], [s.pos_counts for s in sketches]
+        )
+        merged.neg_keys, merged.neg_counts = _sum_by_key(
+            [s.neg_keys for s in sketches], [s.neg_counts for s in sketches]
+        )
+        merged.zero_count = sum(s.zero_count for s in sketches)
+        merged.count = sum(s.count for s in sketches)
+        merged.sum = float(sum(s.sum for s in sketches))
+        merged.sum_sq = float(sum(s.sum_sq for s in sketches))
+        merged.min = min(s.min for s in sketches)
+        merged.max = max(s.max for s in sketches)
+        return merged
+
+    @property
+    def mean(self):
+        return self.sum / self.count if self.count else np.nan
+
+    @property
+    def std(self):
+        if self.count < 2:
+            return np.nan
+        variance = (self.sum_sq - self.sum ** 2 / self.count) / (self.count - 1)
+        return float(np.sqrt(max(variance, 0.0)))
+
+    def _ordered_buckets(self):
+        """Valores representativos y conteos de todos los buckets en orden ascendente."""
+        gamma = np.exp(self._log_gamma)
+        pos_values = 2 * np.power(gamma, self.pos_keys.astype(np.float64)) / (gamma + 1)
+        neg_values = -2 * np.power(gamma, self.neg_keys[::-1].astype(np.float64)) / (gamma + 1)
+        values = np.concatenate([neg_values, [0.0], pos_values])
+        counts = np.concatenate([self.neg_counts[::-1], [self.zero_count], self.pos_counts])
+        return values, counts
+
+    def quantile(self, q):
+        """
+        Estima uno o varios cuantiles.
+
+        Args:
+            q: Cuantil (o arreglo de cuantiles) entre 0 y 1
+
+        Returns:
+            float o array: Valores estimados
+        """
+        scalar = np.isscalar(q)
+        q = np.atleast_1d(np.asarray(q, dtype=np.float64))
+        if self.count == 0:
+            result = np.full(len(q), np.nan)
+            return float(result[0]) if scalar else result
+
+        values, counts = self._ordered_buckets()
+        cumulative = np.cumsum(counts)
+        ranks = np.clip(q, 0, 1) * (self.count - 1)
+        idx = np.searchsorted(cumulative, ranks, side="right")
+        result = np.clip(values[np.minimum(idx, len(values) - 1)], self.min, self.max)
+        return float(result[0]) if scalar else result
+
+    def describe(self):
+        """Resumen equivalente a pandas.Series.describe()."""
+        q25, q50, q75 = self.quantile([0.25, 0.5, 0.75])
+        return pd.Series({
+            "count": float(self.count),
+            "mean": self.mean,
+            "std": self.std,
+            "min": self.min if self.count else np.nan,
+            "25%": q25,
+            "50%": q50,
+            "75%": q75,
+            "max": self.max if self.count else np.nan,
+        })
+
+    def box_stats(self):
+        """Estadísticos para dibujar un box plot (cuartiles y bigotes 1.5·IQR)."""
+        q1, median, q3 = self.quantile([0.25, 0.5, 0.75])
+        iqr = q3 - q1
+        return {
+            "q1": q1,
+            "median": median,
+            "q3": q3,
+            "lowerfence": max(self.min, q1 - 1.5 * iqr),
+            "upperfence": min(self.max, q3 + 1.5 * iqr),
+            "mean": self.mean,
+        }
+
+
+class FixedHistogram:
+    """Histograma de bins fijos, exactamente mergeable sumando conteos."""
+
+    def __init__(self, edges, counts=None, underflow=0, overflow=0):
+        self.edges = np.asarray(edges, dtype=np.float64)
+        n_bins = len(self.edges) - 1
+        self.counts = np.zeros(n_bins, dtype=np.int64) if counts is None else np.asarray(counts, dtype=np.int64)
+        self.underflow = int(underflow)
+        self.overflow = int(overflow)
+
+    def update(self, values):
+        """Añade un arreglo de valores (los NaN se ignoran)."""
+        values = np.asarray(values, dtype=np.float64)
+        values = values[np.isfinite(values)]
+        idx = _bin_index(values, self.edges)
+        binned = np.bincount(idx + 1, minlength=len(self.counts) + 2)
+        self.underflow += int(binned[0])
+        self.counts += binned[1:-1]
+        self.overflow += int(binned[-1])
+        return self
+
+    def merge(self, other):
+        """Combina otro histograma con los mismos bordes (in-place)."""
+        if not np.array_equal(self.edges, other.edges):
+            raise ValueError("Los histogramas deben tener los mismos bordes")
+        self.counts = self.counts + other.counts
+        self.underflow += other.underflow
+        self.overflow += other.overflow
+        return self
+
+    def to_frame(self, scale=1.0):
+        """
+        Convierte el histograma en un DataFrame listo para graficar.
+
+        Args:
+            scale: Divisor para las unidades de los bordes (p. ej. 60 para segundos -> minutos)
+        """
+        edges = self.edges / scale
+        return pd.DataFrame({
+            "bin_left": edges[:-1],
+            "bin_right": edges[1:],
+            "bin_center": (edges[:-1] + edges[1:]) / 2,
+            "count": self.counts,
+        })
+
+
+class HyperLogLog:
+    """
+    Sketch HyperLogLog para contar valores distintos.
+
+    Con 2^p registros el error estándar relativo es 1.04 / sqrt(2^p). La unión de
+    dos sketches es el máximo por registro, así que es exacta y conmutativa.
+    """
+
+    def __init__(self, p, registers=None):
+        self.p = p
+        self.m = 1 << p
+        self.registers = np.zeros(self.m, dtype=np.uint8) if registers is None else np.asarray(registers, dtype=np.uint8)
+
+    @property
+    def standard_error(self):
+        return 1.04 / np.sqrt(self.m)
+
+    def update(self, values):
+        """Añade un arreglo de valores enteros (se ignoran los nulos)."""
+        index, rank = _hll_index_rank(hash_values(values), self.p)
+        np.maximum.at(self.registers, index, rank)
+        return self
+
+    def merge(self, other):
+        """Unión con otro sketch de la misma precisión (in-place)."""
+        if self.p != other.p:
+            raise ValueError("Los sketches HyperLogLog deben tener la misma precisión")
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def estimate(self):
+        """Número estimado de valores distintos."""
+        return hll_estimate(self.registers)
+
+
+def hash_values(values):
+    """Hash de 64 bits vectorizado de un arreglo de enteros (descarta nulos)."""
+    values = pd.Series(values)
+    values = values[values.notna()].to_numpy(dtype=np.int64)
+    return pd.util.hash_array(values)
+
+
+def _hll_index_rank(hashes, p):
+    """Registro (primeros p bits) y rango (ceros iniciales + 1 del resto) de cada hash."""
+    hashes = np.asarray(hashes, dtype=np.uint64)
+    index = (hashes >> np.uint64(64 - p)).astype(np.int64)
+    remainder = hashes << np.uint64(p)
+    # frexp devuelve la longitud en bits del resto; para 0 el rango es el máximo
+    bit_length = np.frexp(remainder.astype(np.float64))[1]
+    rank = np.where(remainder == 0, 64 - p + 1, np.minimum(64 - bit_length + 1, 64 - p + 1))
+    return index, rank.astype(np.uint8)
+
+
+def hll_estimate(registers):
+    """
+    Estimación HyperLogLog con corrección de rango pequeño (linear counting).
+
+    Args:
+        registers: Arreglo de registros (2^p valores)
+
+    Returns:
+        float: Número estimado de valores distintos
+    """
+    registers = np.asarray(registers, dtype=np.float64)
+    m = len(registers)
+    alpha = 0.7213 / (1 + 1.079 / m)
+    raw = alpha * m * m / np.power(2.0, -registers).sum()
+    zeros = int((registers == 0).sum())
+    if raw <= 2.5 * m and zeros > 0:
+        return float(m * np.log(m / zeros))
+    return float(raw)
+
+
+def distinct_values(df, target):
+    """Valores enteros a contar para un objetivo de conteo de distintos."""
+    if target == "days":
+        pickups = pd.to_datetime(df["pickup_datetime"], errors="coerce")
+        days = pickups.to_numpy(dtype="datetime64[D]").astype(np.int64)
+        return np.where(pickups.isna().to_numpy(), np.nan, days)
+    if target == "zones":
+        return df["PULocationID"].to_numpy(dtype=np.float64, na_value=np.nan)
+    if target == "routes":
+        pu = df["PULocationID"].to_numpy(dtype=np.float64, na_value=np.nan)
+        do = df["DOLocationID"].to_numpy(dtype=np.float64, na_value=np.nan)
+        return pu * 1000 + do
+    raise ValueError(f"Objetivo de conteo desconocido: {target}")
+
+
+def _bin_index(values, edges):
+    """Índice de bin por valor: -1 underflow, len(edges)-1 overflow (último bin cerrado)."""
+    idx = np.searchsorted(edges, values, side="right") - 1
+    idx[values == edges[-1]] = len(edges) - 2
+    return np.clip(idx, -1, len(edges) - 1)
+
+
+def _sum_by_key(key_arrays, count_arrays):
+    """Suma conteos por clave a través de varios pares (claves, conteos)."""
+    keys = np.concatenate(key_arrays) if key_arrays else np.empty(0, dtype=np.int64)
+    counts = np.concatenate(count_arrays) if count_arrays else np.empty(0, dtype=np.int64)
+    if len(keys) == 0:
+        return keys.astype(np.int64), counts.astype(np.int64)
+    unique_keys, inverse = np.unique(keys, return_inverse=True)
+    return unique_keys.astype(np.int64), np.bincount(inverse, weights=counts).astype(np.int64)
+
+
+def airport_codes(pu_ids, do_ids, airport_zones=None):
+    """Calcula el código de dirección aeroportuaria de cada viaje."""
+    airport_zones = AIRPORT_ZONES if airport_zones is None else airport_zones
+    to_airport = np.isin(np.asarray(do_ids), airport_zones)
+    from_airport = np.isin(np.asarray(pu_ids), airport_zones)
+    return (to_airport * AIRPORT_TO + from_airport * AIRPORT_FROM).astype(np.int8)
+
+
+def metric_values(df, metric):
+    """Obtiene los valores de una métrica con sketch (tip_percent se deriva)."""
+    if metric == "tip_percent":
+        if "tips" not in df.columns or "driver_pay" not in df.columns:
+            return None
+        pay = df["driver_pay"].to_numpy(dtype=np.float64, na_value=np.nan)
+        tips = df["tips"].to_numpy(dtype=np.float64, na_value=np.nan)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return tips / pay * 100
+    if metric not in df.columns:
+        return None
+    return df[metric].to_numpy(dtype=np.float64, na_value=np.nan)
+
+
+def cell_mask(keys, operators=None, hours=None, boroughs=None, airport_only=False):
+    """Máscara de las filas de keys (columnas de CELL_KEYS) que cumplen los filtros del sidebar."""
+    mask = np.ones(len(keys), dtype=bool)
+    if operators is not None:
+        mask &= keys["hvfhs_license_num"].isin(list(operators)).to_numpy()
+    if hours is not None:
+        mask &= keys["pickup_hour"].between(hours[0], hours[1]).to_numpy()
+    if boroughs:
+        mask &= keys["pickup_borough"].isin(list(boroughs)).to_numpy()
+    if airport_only:
+        mask &= (keys["airport_code"] != AIRPORT_NONE).to_numpy()
+    return mask
+
+
+class SketchSet:
+    """
+    Sketches por celda (operador, hora, distrito, dirección aeroportuaria).
+
+    Attributes:
+        keys: DataFrame con una fila por celda y las columnas de CELL_KEYS
+        trips: Número de viajes por celda
+        quantiles: dict métrica -> lista de QuantileSketch (una por celda)
+        histograms: dict métrica -> matriz de conteos (celdas x (bins + 2))
+        presence: dict objetivo exacto -> (celdas, valores) con los pares únicos presentes
+        registers: dict objetivo HLL -> matriz de registros HyperLogLog (celdas x 2^p)
+    """
+
+    def __init__(self, keys, trips, quantiles, histograms, presence, registers,
+                 relative_accuracy=RELATIVE_ACCURACY):
+        self.keys = keys.reset_index(drop=True)
+        self.trips = np.asarray(trips, dtype=np.int64)
+        self.quantiles = quantiles
+        self.histograms = histograms
+        self.presence = presence
+        self.registers = registers
+        self.relative_accuracy = relative_accuracy
+        self.version = SKETCH_VERSION
+
+    @property
+    def metrics(self):
+        return list(self.quantiles.keys())
+
+    def __getstate__(self):
+        # Empaquetar los sketches de cada celda en arreglos planos: serializar miles
+        # de objetos pequeños es mucho más lento que unos pocos arreglos grandes
+        state = self.__dict__.copy()
+        state["quantiles"] = {metric: _pack_sketches(cells) for metric, cells in self.quantiles.items()}
+        return state
+
+    def __setstate__(self, state):
+        state["quantiles"] = {
+            metric: _unpack_sketches(packed, state["relative_accuracy"])
+            for metric, packed in state["quantiles"].items()
+        }
+        self.__dict__.update(state)
+
+    def mask(self, operators=None, hours=None, boroughs=None, airport_only=False):
+        """
+        Selecciona las celdas que cumplen los filtros del sidebar.
+
+        Args:
+            operators: Lista de operadores (None = todos)
+            hours: Tupla (hora_inicio, hora_fin) inclusiva (None = todas)
+            boroughs: Lista de distritos de recogida (None o vacía = todos)
+            airport_only: Solo viajes hacia/desde aeropuertos
+
+        Returns:
+            array: Máscara booleana sobre las celdas
+        """
+        return cell_mask(self.keys, operators, hours, boroughs, airport_only)
+
+    def airport_mask(self, direction):
+        """Celdas con viajes hacia ('to') o desde ('from') aeropuertos."""
+        codes = self.keys["airport_code"].to_numpy()
+        if direction == "to":
+            return np.isin(codes, [AIRPORT_TO, AIRPORT_BOTH])
+        return np.isin(codes, [AIRPORT_FROM, AIRPORT_BOTH])
+
+    def quantile_sketch(self, metric, mask=None):
+        """Combina los sketches de cuantiles de las celdas seleccionadas."""
+        selected = np.flatnonzero(np.ones(len(self.keys), dtype=bool) if mask is None else mask)
+        cells = self.quantiles[metric]
+        if len(selected) == 0:
+            return QuantileSketch(self.relative_accuracy)
+        return QuantileSketch.merge_all([cells[i] for i in selected])
+
+    def totals(self, metric):
+        """
+        Agregados aditivos por celda de una métrica, sin combinar buckets.
+
+        Returns:
+            DataFrame: count (valores finitos), sum y positive (valores > 0) por celda
+        """
+        cells = self.quantiles[metric]
+        return pd.DataFrame({
+            "count": np.fromiter((c.count for c in cells), dtype=np.int64, count=len(cells)),
+            "sum": np.fromiter((c.sum for c in cells), dtype=np.float64, count=len(cells)),
+            "positive": np.fromiter((c.pos_counts.sum() for c in cells), dtype=np.int64, count=len(cells)),
+        })
+
+    def histogram(self, metric, mask=None):
+        """Combina los histogramas fijos de las celdas seleccionadas."""
+        matrix = self.histograms[metric]
+        summed = matrix.sum(axis=0) if mask is None else matrix[mask].sum(axis=0)
+        return FixedHistogram(SKETCH_METRICS[metric], summed[1:-1], summed[0], summed[-1])
+
+    def hll(self, target, mask=None):
+        """Unión de los sketches HyperLogLog de las celdas seleccionadas."""
+        matrix = self.registers[target]
+        selected = matrix if mask is None else matrix[mask]
+        registers = selected.max(axis=0) if len(selected) else np.zeros(matrix.shape[1], dtype=np.uint8)
+        return HyperLogLog(HLL_TARGETS[target], registers)
+
+    def distinct_count(self, target, mask=None):
+        """
+        Número de valores distintos para la selección.
+
+        Args:
+            target: 'days' o 'zones' (exactos) o 'routes' (HyperLogLog)
+            mask: Máscara de celdas (None = todas)
+
+        Returns:
+            int: Conteo (estimación redondeada para objetivos HyperLogLog)
+        """
+        if target in self.presence:
+            cells, values = self.presence[target]
+            selected = values if mask is None else values[mask[cells]]
+            return int(np.unique(selected).size)
+        return int(round(self.hll(target, mask).estimate()))
+
+    @staticmethod
+    def distinct_error(target):
+        """Error estándar relativo del conteo de distintos (0 para objetivos exactos)."""
+        if target in HLL_TARGETS:
+            return 1.04 / np.sqrt(1 << HLL_TARGETS[target])
+        return 0.0
+
+    def operators(self, mask=None):
+        """Operadores presentes en la selección (exacto: el operador es clave de celda)."""
+        mask = np.ones(len(self.keys), dtype=bool) if mask is None else mask
+        return self.keys.loc[mask & (self.trips > 0), "hvfhs_license_num"].dropna().unique()
+
+    def by(self, column, mask=None):
+        """
+        Agrupa las celdas seleccionadas por una columna clave.
+
+        Returns:
+            dict: valor de la clave -> máscara booleana de celdas
+        """
+        mask = np.ones(len(self.keys), dtype=bool) if mask is None else mask
+        values = self.keys[column]
+        return {
+            value: mask & (values == value).to_numpy()
+            for value in values[mask].dropna().unique()
+        }
+
+    @classmethod
+    def merge_all(cls, sketch_sets):
+        """Combina varias particiones (p. ej. meses) en un solo SketchSet."""
+        sketch_sets = list(sketch_sets)
+        keys = pd.concat([s.keys for s in sketch_sets], ignore_index=True)
+        group = keys.groupby(CELL_KEYS, dropna=False, sort=False).ngroup().to_numpy()
+        n_cells = group.max() + 1 if len(group) else 0
+        first = pd.Series(np.arange(len(group))).groupby(group).first().to_numpy()
+
+        trips = np.bincount(group, weights=np.concatenate([s.trips for s in sketch_sets]),
+                            minlength=n_cells).astype(np.int64)
+        members = pd.Series(np.arange(len(group))).groupby(group).apply(list)
+        quantiles, histograms = {}, {}
+        for metric in sketch_sets[0].metrics:
+            stacked = [q for s in sketch_sets for q in s.quantiles[metric]]
+            quantiles[metric] = [QuantileSketch.merge_all([stacked[i] for i in idx]) for idx in members]
+            matrix = np.vstack([s.histograms[metric] for s in sketch_sets])
+            summed = np.zeros((n_cells, matrix.shape[1]), dtype=np.int64)
+            np.add.at(summed, group, matrix)
+            histograms[metric] = summed
+
+        offsets = np.concatenate([[0], np.cumsum([len(s.keys) for s in sketch_sets])])
+        presence = {}
+        for target in sketch_sets[0].presence:
+            cells = np.concatenate([group[s.presence[target][0] + offset]
+                                    for s, offset in zip(sketch_sets, offsets)])
+            values = np.concatenate([s.presence[target][1] for s in sketch_sets])
+            presence[target] = _unique_pairs(cells, values)
+
+        registers = {}
+        for target in sketch_sets[0].registers:
+            matrix = np.vstack([s.registers[target] for s in sketch_sets])
+            union = np.zeros((n_cells, matrix.shape[1]), dtype=np.uint8)
+            np.maximum.at(union, group, matrix)
+            registers[target] = union
+
+        return cls(keys.iloc[first], trips, quantiles, histograms, presence, registers,
+                   sketch_sets[0].relative_accuracy)
+
+
+def cell_frame(df, zones_df=None, airport_zones=None):
+    """
+    Claves de celda (CELL_KEYS) de cada viaje.
+
+    Args:
+        df: DataFrame de viajes (con pickup_datetime o pickup_hour)
+        zones_df: Tabla de zonas para derivar pickup_borough si no existe
+        airport_zones: IDs de zonas de aeropuertos (por defecto AIRPORT_ZONES)
+
+    Returns:
+        DataFrame: Una fila por viaje con las columnas de CELL_KEYS
+    """
+    if "pickup_hour" in df.columns:
+        hours = df["pickup_hour"]
+    else:
+        hours = pd.to_datetime(df["pickup_datetime"], errors="coerce").dt.hour
+
+    if "pickup_borough" in df.columns:
+        boroughs = df["pickup_borough"]
+    elif zones_df is not None:
+        boroughs = df["PULocationID"].map(zones_df.set_index("LocationID")["Borough"])
+    else:
+        boroughs = pd.Series(np.nan, index=df.index, dtype=object)
+
+    return pd.DataFrame({
+        "hvfhs_license_num": df["hvfhs_license_num"].to_numpy(),
+        "pickup_hour": hours.to_numpy(),
+        "pickup_borough": boroughs.to_numpy(),
+        "airport_code": airport_codes(df["PULocationID"], df["DOLocationID"], airport_zones),
+    })
+
+
+def build_sketches(df, zones_df=None, airport_zones=None, relative_accuracy=RELATIVE_ACCURACY):
+    """
+    Construye los sketches por celda de una partición en una sola pasada vectorizada.
+
+    Args:
+        df: DataFrame de viajes (con pickup_datetime o pickup_hour)
+        zones_df: Tabla de zonas para derivar pickup_borough si no existe
+        airport_zones: IDs de zonas de aeropuertos (por defecto AIRPORT_ZONES)
+        relative_accuracy: Error relativo de los sketches de cuantiles
+
+    Returns:
+        SketchSet: Sketches de la partición
+    """
+    cells = cell_frame(df, zones_df, airport_zones)
+    cell_id = cells.groupby(CELL_KEYS, dropna=False, sort=True).ngroup().to_numpy()
+    n_cells = cell_id.max() + 1 if len(cell_id) else 0
+    first_rows = pd.Series(np.arange(len(cell_id))).groupby(cell_id).first().to_numpy()
+    keys = cells.iloc[first_rows]
+    trips = np.bincount(cell_id, minlength=n_cells)
+
+    log_gamma = _log_gamma(relative_accuracy)
+    quantiles, histograms = {}, {}
+    for metric, edges in SKETCH_METRICS.items():
+        values = metric_values(df, metric)
+        if values is None:
+            continue
+        valid = np.isfinite(values)
+        cell_valid, values_valid = cell_id[valid], values[valid]
+        quantiles[metric] = _build_cell_quantiles(cell_valid, values_valid, n_cells, log_gamma, relative_accuracy)
+
+        idx = _bin_index(values_valid, edges)
+        width = len(edges) + 1
+        histograms[metric] = np.bincount(
+            cell_valid * width + idx + 1, minlength=n_cells * width
+        ).reshape(n_cells, width).astype(np.int64)
+
+    presence = {}
+    for target in EXACT_DISTINCT_TARGETS:
+        values = distinct_values(df, target)
+        valid = np.isfinite(values)
+        presence[target] = _unique_pairs(cell_id[valid], values[valid].astype(np.int64))
+
+    registers = {}
+    for target, p in HLL_TARGETS.items():
+        values = distinct_values(df, target)
+        valid = np.isfinite(values)
+        index, rank = _hll_index_rank(pd.util.hash_array(values[valid].astype(np.int64)), p)
+        flat = np.zeros(n_cells << p, dtype=np.uint8)
+        np.maximum.at(flat, (cell_id[valid].astype(np.int64) << p) + index, rank)
+        registers[target] = flat.reshape(n_cells, 1 << p)
+
+    return SketchSet(keys, trips, quantiles, histograms, presence, registers, relative_accuracy)
+
+
+def _unique_pairs(cells, values):
+    """Pares (celda, valor) únicos, compactados a int32."""
+    codes = np.unique((np.asarray(cells, dtype=np.int64) << 32) | (np.asarray(values, dtype=np.int64) & 0xFFFFFFFF))
+    return (codes >> 32).astype(np.int32), (codes & 0xFFFFFFFF).astype(np.uint32).astype(np.int32)
+
+
+def _build_cell_quantiles(cell_id, values, n_cells, log_gamma, relative_accuracy):
+    """Construye un QuantileSketch por celda con un único np.unique sobre todas las filas."""
+    sign, keys = _bucket_keys(values, log_gamma)
+    code = (cell_id.astype(np.int64) * 3 + (sign + 1)) * _KEY_SPAN + (keys + _KEY_OFFSET)
+    unique_codes, counts = np.unique(code, return_counts=True)
+    bucket_cell = unique_codes // (3 * _KEY_SPAN)
+    bucket_sign = (unique_codes // _KEY_SPAN) % 3 - 1
+    bucket_key = unique_codes % _KEY_SPAN - _KEY_OFFSET
+    bounds = np.searchsorted(bucket_cell, np.arange(n_cells + 1))
+
+    n = np.bincount(cell_id, minlength=n_cells)
+    sums = np.bincount(cell_id, weights=values, minlength=n_cells)
+    sums_sq = np.bincount(cell_id, weights=np.square(values), minlength=n_cells)
+    mins = np.full(n_cells, np.inf)
+    maxs = np.full(n_cells, -np.inf)
+    np.minimum.at(mins, cell_id, values)
+    np.maximum.at(maxs, cell_id, values)
+
+    sketches = []
+    for cell in range(n_cells):
+        start, end = bounds[cell], bounds[cell + 1]
+        cell_sign, cell_key, cell_counts = bucket_sign[start:end], bucket_key[start:end], counts[start:end]
+        sketch = QuantileSketch(relative_accuracy)
+        sketch.pos_keys, sketch.pos_counts = cell_key[cell_sign > 0], cell_counts[cell_sign > 0]
+        sketch.neg_keys, sketch.neg_counts = cell_key[cell_sign < 0], cell_counts[cell_sign < 0]
+        sketch.zero_count = int(cell_counts[cell_sign == 0].sum())
+        sketch.count = int(n[cell])
+        sketch.sum = float(sums[cell])
+        sketch.sum_sq = float(sums_sq[cell])
+        sketch.min = float(mins[cell])
+        sketch.max = float(maxs[cell])
+        sketches.append(sketch)
+    return sketches
+
+
+def _pack_sketches(sketches):
+    """Convierte una lista de QuantileSketch en un dict de arreglos planos."""
+    packed = {
+        "pos_lengths": np.array([len(s.pos_keys) for s in sketches], dtype=np.int64),
+        "neg_lengths": np.array([len(s.neg_keys) for s in sketches], dtype=np.int64),
+    }
+    for field in ("pos_keys", "pos_counts", "neg_keys", "neg_counts"):
+        arrays = [getattr(s, field) for s in sketches]
+        packed[field] = np.concatenate(arrays) if arrays else np.empty(0, dtype=np.int64)
+    for field in ("zero_count", "count", "sum", "sum_sq", "min", "max"):
+        packed[field] = np.array([getattr(s, field) for s in sketches])
+    return packed
+
+
+def _unpack_sketches(packed, relative_accuracy):
+    """Reconstruye la lista de QuantileSketch empaquetada con _pack_sketches."""
+    pos_bounds = np.concatenate([[0], np.cumsum(packed["pos_lengths"])])
+    neg_bounds = np.concatenate([[0], np.cumsum(packed["neg_lengths"])])
+    sketches = []
+    for i in range(len(packed["count"])):
+        sketch = QuantileSketch(relative_accuracy)
+        sketch.pos_keys = packed["pos_keys"][pos_bounds[i]:pos_bounds[i + 1]]
+        sketch.pos_counts = packed["pos_counts"][pos_bounds[i]:pos_bounds[i + 1]]
+        sketch.neg_keys = packed["neg_keys"][neg_bounds[i]:neg_bounds[i + 1]]
+        sketch.neg_counts = packed["neg_counts"][neg_bounds[i]:neg_bounds[i + 1]]
+        sketch.zero_count = int(packed["zero_count"][i])
+        sketch.count = int(packed["count"][i])
+        sketch.sum = float(packed["sum"][i])
+        sketch.sum_sq = float(packed["sum_sq"][i])
+        sketch.min = float(packed["min"][i])
+        sketch.max = float(packed["max"][i])
+        sketches.append(sketch)
+    return sketches
+
+
+def describe_sketches(sketches):
+    """
+    Tabla equivalente a groupby(...).describe() a partir de sketches.
+
+    Args:
+        sketches: dict etiqueta -> QuantileSketch
+
+    Returns:
+        DataFrame: Una fila por etiqueta con count, mean, std, min, cuartiles y max
+    """
+    return pd.DataFrame({label: sketch.describe() for label, sketch in sketches.items()}).T
+
+
+def sketch_path(parquet_path):
+    """Ruta del archivo de sketches asociado a una partición Parquet."""
+    return os.path.splitext(parquet_path)[0] + "_sketches.joblib"
+
+
+def save_sketches(sketch_set, path):
+    """Guarda un SketchSet en disco."""
+    joblib.dump(sketch_set, path, compress=3)
+
+
+def load_sketches(path):
+    """Carga un SketchSet guardado con save_sketches."""
+    return joblib.load(path)
@@ -0,0 +1,217 @@
+"""
+Superficie de tarifas precalculada para el formulario de predicción de la pestaña 7.
+
+Un modelo de tarifa se evalúa una sola vez, fuera del dashboard, sobre una malla de distancia ×
+duración × hora × día de la semana (y opcionalmente borough de recogida). En el dashboard cada
+consulta es una interpolación bilineal en distancia y duración dentro de la porción de su hora,
+día y borough: unos microsegundos, sin cargar el modelo. Las consultas fuera de la malla se
+responden con el modelo.
+
+La malla se guarda en float32 como directorio de arrays (tree_utils.save_arrays), así que se
+carga con memoria mapeada igual que los modelos exportados a NumPy.
+"""
+
+import bisect
+
+import numpy as np
+import pandas as pd
+
+import tree_utils
+
+# Ejes de la malla: más densos en los viajes cortos, que son la mayoría
+DISTANCE_AXIS = np.unique(np.round(np.concatenate([
+    np.arange(0.1, 5, 0.2), np.arange(5, 20, 0.5), np.arange(20, 50.01, 2.5)]), 2))
+DURATION_AXIS = np.concatenate([np.arange(1, 30, 1), np.arange(30, 120.01, 3)]).astype(float)
+HOURS = 24
+WEEKDAYS = 7
+
+# Porción usada cuando la superficie no distingue boroughs
+ALL_BOROUGHS = "Todos"
+
+# Valores de las características que el formulario no pide (si no hay datos para estimarlos)
+DEFAULT_FIXED = {'month': 1, 'PULocationID': 161, 'DOLocationID': 161}
+
+
+def feature_frame(feature_names, distances, durations, hours, weekdays, fixed, pickup_zone=None):
+    """
+    Filas de características de un modelo de tarifa a partir de los datos del formulario.
+
+    Args:
+        feature_names: Columnas que espera el modelo (en su orden)
+        distances, durations, hours, weekdays: Arrays (o escalares) de millas, minutos, hora y día
+        fixed: Valores de las demás características (month, PULocationID, DOLocationID)
+        pickup_zone: PULocationID representativo del borough elegido (reemplaza al de fixed)
+
+    Returns:
+        DataFrame: Una fila por combinación, con las columnas de feature_names
+    """
+    weekdays = np.asarray(weekdays)
+    columns = {
+        'trip_miles': distances,
+        'trip_time_minutes': durations,
+        'hour': hours,
+        'day_of_week': weekdays,
+        'is_weekend': (weekdays >= 5).astype(int),
+        **fixed,
+    }
+    if pickup_zone is not None:
+        columns['PULocationID'] = pickup_zone
+    missing = [name for name in feature_names if name not in columns]
+    if missing:
+        raise ValueError(f"Características no soportadas por la superficie de tarifas: {missing}")
+    rows = max(np.size(value) for value in columns.values())
+    return pd.DataFrame({name: np.broadcast_to(columns[name], rows) for name in feature_names})
+
+
+class FareSurface:
+    """
+    Tarifas precalculadas en una malla (borough, día, hora, distancia, duración).
+
+    Atributos:
+        values: array float32 (boroughs, 7, 24, distancias, duraciones)
+        distance, duration: Ejes de la malla
+        boroughs: Nombres de las porciones de borough ([ALL_BOROUGHS] si no se distinguen)
+        meta: model, feature_names, fixed, borough_zones y errores de interpolación
+    """
+
+    def __init__(self, values, distance, duration, boroughs, meta):
+        self.values = values
+        self.distance = np.asarray(distance, dtype=float)
+        self.duration = np.asarray(duration, dtype=float)
+        self.boroughs = list(boroughs)
+        self.meta = meta
+        # Listas de Python: bisect sobre ellas es más rápido que np.searchsorted para un escalar
+        self._distance = self.distance.tolist()
+        self._duration = self.duration.tolist()
+
+    @property
+    def model_name(self):
+        return self.meta['model']
+
+    @property
+    def nbytes(self):
+        return self.values.nbytes
+
+    def _borough_index(self, borough):
+        if borough in (None, ALL_BOROUGHS) and self.boroughs == [ALL_BOROUGHS]:
+            return 0
+        if borough in self.boroughs:
+            return self.boroughs.index(borough)
+        return None
+
+    def contains(self, distance, duration, hour, weekday, borough=None):
+        """Indica si la consulta cae dentro de la malla."""
+        return (self._distance[0] <= distance <= self._distance[-1]
+                and self._duration[0] <= duration <= self._duration[-1]
+                and 0 <= hour < HOURS and 0 <= weekday < WEEKDAYS and float(hour).is_integer()
+                and float(weekday).is_integer() and self._borough_index(borough) is not None)
+
+    @staticmethod
+    def _cell(axis, x):
+        """Índice de la celda que contiene x y peso del extremo derecho."""
+        i = min(max(bisect.bisect_right(axis, x) - 1, 0), len(axis) - 2)
+        return i, (x - axis[i]) / (axis[i + 1] - axis[i])
+
+    def estimate(self, distance, duration, hour, weekday, borough=None):
+        """
+        Tarifa interpolada para una consulta del formulario.
+
+        Returns:
+            float o None si la consulta está fuera de la malla
+        """
+        if not self.contains(distance, duration, hour, weekday, borough):
+            return None
+        i, u = self._cell(self._distance, distance)
+        j, v = self._cell(self._duration, duration)
+        grid = self.values[self._borough_index(borough), int(weekday), int(hour)]
+        return float((1 - u) * ((1 - v) * grid[i, j] + v * grid[i, j + 1])
+                     + u * ((1 - v) * grid[i + 1, j] + v * grid[i + 1, j + 1]))
+
+    def pickup_zone(self, borough):
+        """PULocationID representativo de un borough (None si la superficie no distingue boroughs)."""
+        return self.meta.get('borough_zones', {}).get(borough)
+
+    def feature_frame(self, distances, durations, hours, weekdays, borough=None):
+        """Filas para el modelo de la superficie con las mismas características fijas."""
+        return feature_frame(self.meta['feature_names'], distances, durations, hours, weekdays,
+                             self.meta['fixed'], self.pickup_zone(borough))
+
+    def save(self, path):
+        """Guarda la malla y sus metadatos como directorio de arrays."""
+        meta = {**self.meta, 'boroughs': self.boroughs}
+        tree_utils.save_arrays(path, {'values': self.values, 'distance': self.distance,
+                                      'duration': self.duration}, meta)
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        """Carga una superficie guardada con save()."""
+        arrays, meta = tree_utils.load_arrays(path, mmap_mode)
+        return cls(arrays['values'], arrays['distance'], arrays['duration'], meta.pop('boroughs'), meta)
+
+
+def build_surface(model, model_name, feature_names, fixed, borough_zones=None,
+                  distance_axis=DISTANCE_AXIS, duration_axis=DURATION_AXIS):
+    """
+    Evalúa un modelo de tarifa en toda la malla.
+
+    Args:
+        model: Modelo con predict (sklearn, LightGBM o exportado a NumPy)
+        model_name: Nombre del modelo (queda en los metadatos)
+        feature_names: Columnas que espera el modelo
+        fixed: Valores de las características que el formulario no pide
+        borough_zones: dict borough -> PULocationID representativo (None: sin porciones por borough)
+        distance_axis, duration_axis: Ejes de la malla
+
+    Returns:
+        FareSurface
+    """
+    boroughs = list(borough_zones) if borough_zones else [ALL_BOROUGHS]
+    values = np.empty((len(boroughs), WEEKDAYS, HOURS, len(distance_axis), len(duration_axis)), dtype=np.float32)
+    distances, hours, durations = np.meshgrid(distance_axis, np.arange(HOURS), duration_axis, indexing='ij')
+    for b, borough in enumerate(boroughs):
+        zone = borough_zones[borough] if borough_zones else None
+        for weekday in range(WEEKDAYS):
+            # Un predict por (borough, día): hora × distancia × duración de una vez
+            X = feature_frame(feature_names, distances.ravel(), durations.ravel(), hours.ravel(),
+                              np.full(distances.size, weekday), fixed, zone)
+            pred = np.asarray(model.predict(X), dtype=np.float32).reshape(distances.shape)
+            values[b, weekday] = pred.transpose(1, 0, 2)
+    meta = {
+        'model': model_name,
+        'feature_names': list(feature_names),
+        'fixed': {name: float(value) for name, value in fixed.items()},
+        'borough_zones': {name: int(zone) for name, zone in (borough_zones or {}).items()},
+    }
+    return FareSurface(values, distance_axis, duration_axis, boroughs, meta)
+
+
+def interpolation_error(surface, model, samples=5000, seed=0):
+    """
+    Error de la superficie frente al modelo en puntos aleatorios dentro de la malla.
+
+    Las distancias y duraciones se sortean de forma continua (entre nodos), que es donde la
+    interpolación se aleja del modelo.
+
+    Returns:
+        dict: max_abs_err, p99_abs_err, mean_abs_err (USD) y samples
+    """
+    rng = np.random.default_rng(seed)
+    distances = rng.uniform(surface.distance[0], surface.distance[-1], samples)
+    durations = rng.uniform(surface.duration[0], surface.duration[-1], samples)
+    hours = rng.integers(0, HOURS, samples)
+    weekdays = rng.integers(0, WEEKDAYS, samples)
+    boroughs = rng.choice(surface.boroughs, samples)
+    errors = np.empty(samples)
+    for borough in surface.boroughs:
+        rows = boroughs == borough
+        X = surface.feature_frame(distances[rows], durations[rows], hours[rows], weekdays[rows], borough)
+        expected = np.asarray(model.predict(X), dtype=float)
+        estimated = [surface.estimate(*query, borough) for query in
+                     zip(distances[rows], durations[rows], hours[rows], weekdays[rows])]
+        errors[rows] = np.abs(np.asarray(estimated) - expected)
+    return {
+        'max_abs_err': float(errors.max()),
+        'p99_abs_err': float(np.percentile(errors, 99)),
+        'mean_abs_err': float(errors.mean()),
+        'samples': int(samples),
+    }
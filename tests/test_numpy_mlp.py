@@ -0,0 +1,107 @@
+# tests/test_numpy_mlp.py
+"""Equivalencia de la red exportada a NumPy (model_utils.NumpyMLP) con su referencia."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from model_utils import NumpyMLP, load_numpy_model
+from train_models import NN_EXPORT_TOLERANCE
+
+FEATURES = ['trip_miles', 'trip_time_minutes', 'hour', 'day_of_week']
+
+
+def reference_predict(X, weights, biases, activations, mean, scale):
+    """Referencia en float64: scaler, capas Dense y activaciones."""
+    x = (np.asarray(X, dtype=np.float64) - mean) / scale
+    for weight, bias, activation in zip(weights, biases, activations):
+        x = x @ weight + bias
+        if activation == 'relu':
+            x = np.maximum(x, 0)
+        elif activation == 'sigmoid':
+            x = 1 / (1 + np.exp(-x))
+    return x.ravel()
+
+
+class TestNumpyMLP:
+    """Tests para NumpyMLP con pesos y parámetros del scaler fijos."""
+
+    def setup_method(self):
+        """Red 4 -> 16 -> 8 -> 1 con pesos aleatorios fijos y datos de entrada."""
+        rng = np.random.default_rng(0)
+        sizes = [len(FEATURES), 16, 8, 1]
+        self.weights = [rng.normal(0, 0.5, (n_in, n_out)) for n_in, n_out in zip(sizes[:-1], sizes[1:])]
+        self.biases = [rng.normal(0, 0.1, n_out) for n_out in sizes[1:]]
+        self.activations = ['relu', 'relu', 'linear']
+        self.mean = np.array([3.5, 18.0, 12.0, 3.0])
+        self.scale = np.array([3.0, 12.0, 6.5, 2.0])
+        self.X = pd.DataFrame({
+            'trip_miles': rng.uniform(0.1, 30, 200),
+            'trip_time_minutes': rng.uniform(1, 90, 200),
+            'hour': rng.integers(0, 24, 200),
+            'day_of_week': rng.integers(0, 7, 200),
+        })
+        self.network = NumpyMLP(self.weights, self.biases, self.activations, self.mean, self.scale, FEATURES)
+
+    def expected(self, activations=None):
+        return reference_predict(self.X[FEATURES], self.weights, self.biases, activations or self.activations,
+                                 self.mean, self.scale)
+
+    def test_predict_matches_reference(self):
+        """Las predicciones coinciden con la referencia de NumPy."""
+        np.testing.assert_allclose(self.network.predict(self.X), self.expected(), rtol=0, atol=NN_EXPORT_TOLERANCE)
+
+    def test_predict_reorders_columns(self):
+        """Un DataFrame con otro orden de columnas se reordena según feature_names."""
+        shuffled = self.X[FEATURES[::-1]]
+        np.testing.assert_allclose(self.network.predict(shuffled), self.expected(), rtol=0, atol=NN_EXPORT_TOLERANCE)
+
+    def test_sigmoid_output(self):
+        """Salida sigmoide (clasificador): probabilidades entre 0 y 1 iguales a la referencia."""
+        activations = ['relu', 'relu', 'sigmoid']
+        network = NumpyMLP(self.weights, self.biases, activations, self.mean, self.scale, FEATURES)
+        predictions = network.predict(self.X)
+        assert ((predictions >= 0) & (predictions <= 1)).all()
+        np.testing.assert_allclose(predictions, self.expected(activations), rtol=0, atol=NN_EXPORT_TOLERANCE)
+
+    def test_save_load_round_trip(self, tmp_path):
+        """La red guardada y cargada (con memoria mapeada) predice lo mismo."""
+        path = str(tmp_path / 'driver_pay_np')
+        self.network.save(path)
+        loaded = load_numpy_model(path)
+        assert isinstance(loaded, NumpyMLP)
+        assert loaded.activations == self.activations
+        assert list(loaded.feature_names_in_) == FEATURES
+        np.testing.assert_allclose(loaded.predict(self.X), self.network.predict(self.X), rtol=0,
+                                   atol=NN_EXPORT_TOLERANCE)
+        np.testing.assert_allclose(loaded.predict(self.X), self.expected(), rtol=0, atol=NN_EXPORT_TOLERANCE)
+
+
+class TestKerasExport:
+    """Tests de NumpyMLP.from_keras frente a la red de Keras (requiere TensorFlow)."""
+
+    def test_from_keras_matches_keras(self, tmp_path):
+        """La red extraída de Keras predice como Keras, también tras guardarla y cargarla."""
+        tf = pytest.importorskip("tensorflow")
+        from sklearn.preprocessing import StandardScaler
+
+        rng = np.random.default_rng(1)
+        X = pd.DataFrame(rng.uniform(0, 30, (300, len(FEATURES))), columns=FEATURES)
+        scaler = StandardScaler().fit(X)
+        tf.random.set_seed(0)
+        model = tf.keras.Sequential([
+            tf.keras.layers.Input(shape=(len(FEATURES),)),
+            tf.keras.layers.Dense(16, activation='relu'),
+            tf.keras.layers.Dropout(0.2),
+            tf.keras.layers.Dense(8, activation='relu'),
+            tf.keras.layers.Dense(1),
+        ])
+        keras_pred = model.predict(scaler.transform(X), verbose=0).ravel()
+
+        network = NumpyMLP.from_keras(model, scaler)
+        assert network.activations == ['relu', 'relu', 'linear']
+        np.testing.assert_allclose(network.predict(X), keras_pred, rtol=0, atol=NN_EXPORT_TOLERANCE)
+
+        path = str(tmp_path / 'driver_pay_np')
+        network.save(path)
+        np.testing.assert_allclose(load_numpy_model(path).predict(X), keras_pred, rtol=0, atol=NN_EXPORT_TOLERANCE)
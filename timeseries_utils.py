@@ -0,0 +1,127 @@
+"""
+Series temporales para los gráficos de línea: agregación por intervalo y reducción LTTB.
+
+Las tendencias se agregan primero al intervalo pedido (día, hora o 15 minutos) y después cada
+traza se reduce con Largest-Triangle-Three-Buckets (LTTB) a un presupuesto de puntos cercano al
+ancho del gráfico en píxeles. LTTB conserva los picos y valles que definen la forma de la curva,
+así que el navegador recibe cientos de puntos por operador en lugar de decenas de miles. Al
+acotar la ventana de tiempo (zoom) se vuelve a agregar solo esa ventana, con más detalle.
+"""
+
+import numpy as np
+import pandas as pd
+
+# Intervalos disponibles (frecuencias de pandas, de más grueso a más fino) y su etiqueta
+RESOLUTIONS = {'D': 'Día', 'h': 'Hora', '15min': '15 minutos'}
+
+# Puntos por traza enviados al navegador (≈ ancho del gráfico en píxeles)
+DEFAULT_MAX_POINTS = 1000
+
+
+def lttb(x, y, threshold):
+    """
+    Índices de los puntos que conserva Largest-Triangle-Three-Buckets.
+
+    Se conservan el primer y el último punto; el resto se divide en threshold - 2 cubetas y de
+    cada una se elige el punto que forma el triángulo de mayor área con el punto elegido en la
+    cubeta anterior y el promedio de la siguiente.
+
+    Args:
+        x: Valores del eje x ordenados (numéricos; fechas como enteros)
+        y: Valores del eje y
+        threshold: Puntos a conservar
+
+    Returns:
+        np.ndarray: Índices crecientes (todos si threshold >= len(x))
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+
+    # Límites de las cubetas interiores: [edges[i], edges[i + 1])
+    edges = (np.arange(threshold - 1) * ((n - 2) / (threshold - 2))).astype(int) + 1
+    edges[-1] = n - 1
+    # Promedio de cada cubeta (la última "siguiente" es el punto final)
+    counts = np.diff(edges)
+    avg_x = np.append(np.add.reduceat(x[:n - 1], edges[:-1]) / counts, x[-1])
+    avg_y = np.append(np.add.reduceat(y[:n - 1], edges[:-1]) / counts, y[-1])
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        area = np.abs((x[a] - avg_x[i + 1]) * (y[start:end] - y[a])
+                      - (x[a] - x[start:end]) * (avg_y[i + 1] - y[a]))
+        a = start + int(area.argmax())
+        selected[i + 1] = a
+    selected[-1] = n - 1
+    return selected
+
+
+def aggregate(df, time_col, freq, value_col=None, how='sum', group_col=None, window=None):
+    """
+    Agrega registros por intervalo de tiempo (y opcionalmente por grupo).
+
+    Args:
+        df: DataFrame con una columna datetime
+        time_col: Columna de tiempo
+        freq: Intervalo (clave de RESOLUTIONS u otra frecuencia de pandas)
+        value_col: Columna a agregar (None: contar registros)
+        how: Agregación de value_col ('sum', 'mean', ...)
+        group_col: Columna que define las trazas (p. ej. operador)
+        window: (inicio, fin) opcional; solo se agregan los registros de esa ventana
+
+    Returns:
+        DataFrame: time_col, group_col (si hay) y 'value', ordenado por grupo y tiempo
+    """
+    times = df[time_col]
+    if window is not None:
+        mask = (times >= window[0]) & (times <= window[1])
+        df, times = df[mask], times[mask]
+    keys = [times.dt.floor(freq).rename(time_col)]
+    if group_col is not None:
+        keys.append(df[group_col])
+    grouped = df.groupby(keys, observed=True, sort=True)
+    series = grouped.size() if value_col is None else grouped[value_col].agg(how)
+    return series.rename('value').reset_index()
+
+
+def downsample(series, time_col, max_points=DEFAULT_MAX_POINTS, group_col=None):
+    """
+    Reduce cada traza a max_points puntos con LTTB.
+
+    Args:
+        series: Resultado de aggregate
+        time_col: Columna de tiempo
+        max_points: Presupuesto de puntos por traza
+        group_col: Columna de las trazas
+
+    Returns:
+        DataFrame: Mismas columnas, con a lo sumo max_points filas por traza
+    """
+    groups = [series] if group_col is None else [part for _, part in series.groupby(group_col, observed=True, sort=False)]
+    parts = []
+    for part in groups:
+        part = part.sort_values(time_col)
+        keep = lttb(part[time_col].to_numpy().astype('datetime64[ns]').astype(np.int64), part['value'].to_numpy(), max_points)
+        parts.append(part.iloc[keep])
+    if not parts:
+        return series.iloc[:0]
+    return pd.concat(parts, ignore_index=True)
+
+
+def timeseries(df, time_col, freq, value_col=None, how='sum', group_col=None, window=None,
+               max_points=DEFAULT_MAX_POINTS):
+    """
+    Serie lista para graficar: agregada al intervalo pedido y reducida con LTTB.
+
+    Returns:
+        tuple: (DataFrame con time_col, group_col y 'value'; dict con aggregated_points y
+               shown_points)
+    """
+    series = aggregate(df, time_col, freq, value_col, how, group_col, window)
+    reduced = downsample(series, time_col, max_points, group_col)
+    return reduced, {'aggregated_points': len(series), 'shown_points': len(reduced)}
@@ -12,10 +12,16 @@ Utiliza tanto algoritmos tradicionales (RandomForest, XGBoost) como redes neuron
 
 import os
 import sys
+import argparse
+import glob
+import hashlib
+import multiprocessing
+import time
 import pandas as pd
 import numpy as np
 import joblib
 import json
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime
 import warnings
 warnings.filterwarnings('ignore')
@@ -26,36 +32,97 @@ from sklearn.ensemble import RandomForestRegressor, RandomForestClassifier
 from sklearn.preprocessing import StandardScaler, LabelEncoder
 from sklearn.metrics import mean_squared_error, r2_score, accuracy_score, classification_report
 import lightgbm as lgb
+import pyarrow.parquet as pq
 
-# Importaciones para TensorFlow (opcional)
-try:
-    import tensorflow as tf
-    from tensorflow import keras
-    from tensorflow.keras import layers
-    HAS_TENSORFLOW = True
-    print("✅ TensorFlow disponible - Se entrenarán modelos de redes neuronales")
-except ImportError:
-    HAS_TENSORFLOW = False
-    print("⚠️ TensorFlow no disponible - Solo se entrenarán modelos tradicionales")
+import analysis_utils
+import backend_utils
+import model_utils
+import quality_utils
+import surface_utils
+import tree_utils
+
+# TensorFlow (opcional) se importa solo en el proceso que entrena la red neuronal
+import importlib.util
+HAS_TENSORFLOW = importlib.util.find_spec("tensorflow") is not None
 
 # Configuración
 MODEL_DIR = 'models'
 DATA_FOLDER = 'data'
 SAMPLE_SIZE = 50000  # Muestra para entrenamiento rápido
+CACHE_DIR = os.path.join(MODEL_DIR, 'cache')              # Matriz de características (.npy)
+CHECKPOINT_DIR = os.path.join(MODEL_DIR, 'checkpoints')  # Modelos terminados (reanudación)
+ANALYSIS_DIR = os.path.join(MODEL_DIR, 'analysis')        # Importancias por versión de modelo
+TEST_SIZE = 0.2
+RANDOM_STATE = 42
+
+# Características de entrada de todos los modelos
+FEATURE_COLUMNS = [
+    'trip_miles', 'trip_time_minutes', 'hour', 'day_of_week',
+    'month', 'is_weekend', 'PULocationID', 'DOLocationID'
+]
+
+# Modo por lotes (--stream): columnas leídas de los Parquet, tamaño máximo de la prueba,
+# muestra para RandomForest y bytes estimados por fila de un lote en pandas
+STREAM_COLUMNS = ['pickup_datetime', 'dropoff_datetime', 'trip_miles',
+                  'PULocationID', 'DOLocationID', 'driver_pay']
+TEST_MAX_ROWS = 500_000
+STREAM_RF_ROWS = SAMPLE_SIZE
+BATCH_ROW_BYTES = 512
+DEFAULT_MEMORY_MB = 2048
+
+# Objetivos guardados junto a la matriz de características
+TARGET_COLUMNS = {'driver_pay': np.float32, 'airport_trip': np.int8}
+
+# Modelos a entrenar: nombre -> objetivo, tipo de tarea, familia e hiperparámetros
+MODEL_SPECS = {
+    'driver_pay_rf': {'target': 'driver_pay', 'task': 'regression', 'family': 'rf',
+                      'params': {'n_estimators': 100}},
+    'driver_pay_lgb': {'target': 'driver_pay', 'task': 'regression', 'family': 'lgb',
+                       'params': {'n_estimators': 100}},
+    'driver_pay_nn': {'target': 'driver_pay', 'task': 'regression', 'family': 'nn',
+                      'params': {'epochs': 50, 'batch_size': 32,
+                                 'stream_epochs': 5, 'stream_batch_size': 1024}},
+    'airport_rf': {'target': 'airport_trip', 'task': 'classification', 'family': 'rf',
+                   'params': {'n_estimators': 100}},
+    'airport_lgb': {'target': 'airport_trip', 'task': 'classification', 'family': 'lgb',
+                    'params': {'n_estimators': 100}},
+    # Variantes para predicción de una fila: árboles poco profundos y menos hojas
+    'driver_pay_rf_fast': {'target': 'driver_pay', 'task': 'regression', 'family': 'rf',
+                           'params': {'n_estimators': 30, 'max_depth': 12, 'min_samples_leaf': 5}},
+    'driver_pay_lgb_fast': {'target': 'driver_pay', 'task': 'regression', 'family': 'lgb',
+                            'params': {'n_estimators': 60, 'num_leaves': 15}},
+    'airport_rf_fast': {'target': 'airport_trip', 'task': 'classification', 'family': 'rf',
+                        'params': {'n_estimators': 30, 'max_depth': 10, 'min_samples_leaf': 5}},
+    'airport_lgb_fast': {'target': 'airport_trip', 'task': 'classification', 'family': 'lgb',
+                         'params': {'n_estimators': 60, 'num_leaves': 15}},
+}
+
+# Filas de prueba usadas para medir la latencia de una fila de cada modelo
+LATENCY_ROWS = 200
+
+# Diferencia máxima (en dólares) aceptada entre la red en NumPy y Keras al exportarla
+NN_EXPORT_TOLERANCE = 1e-3
+
+# Superficie de tarifas precalculada para el formulario del dashboard (ver surface_utils)
+SURFACE_NAME = 'fare_surface'
 
 def setup_directories():
     """Crear directorios necesarios."""
-    if not os.path.exists(MODEL_DIR):
-        os.makedirs(MODEL_DIR)
-        print(f"✅ Creado directorio: {MODEL_DIR}")
+    for directory in [MODEL_DIR, CACHE_DIR, CHECKPOINT_DIR, ANALYSIS_DIR]:
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+            print(f"✅ Creado directorio: {directory}")
+
+def find_data_files():
+    """Archivos de datos reducidos disponibles para entrenamiento."""
+    return sorted(glob.glob(f"{DATA_FOLDER}/*_reduced.parquet"))
 
 def load_data():
     """Cargar y preparar los datos para entrenamiento."""
     print("📊 Cargando datos...")
     
     # Buscar archivos de datos
-    import glob
-    data_files = glob.glob(f"{DATA_FOLDER}/*_reduced.parquet")
+    data_files = find_data_files()
     
     if not data_files:
         print("❌ No se encontraron archivos de datos. Ejecuta extract_data.py primero.")
@@ -64,7 +131,7 @@ def load_data():
     # Cargar todos los archivos
     dfs = []
     for file in data_files:
-        df = pd.read_parquet(file)
+        df = backend_utils.read_parquet(file)
         dfs.append(df)
         print(f"   Cargado: {file} ({len(df):,} registros)")
     
@@ -79,9 +146,16 @@ def load_data():
     
     return df
 
-def prepare_features(df):
-    """Preparar características para los modelos."""
-    print("🔧 Preparando características...")
+def prepare_features(df, verbose=True, validated=False):
+    """
+    Preparar características para los modelos.
+
+    Con validated=True (particiones que pasaron quality_utils en la ingesta) no se vuelven a
+    descartar filas: las reglas de calidad ya excluyen nulos, distancias, duraciones y pagos no
+    positivos.
+    """
+    if verbose:
+        print("🔧 Preparando características...")
     
     # Crear características temporales
     df['pickup_datetime'] = pd.to_datetime(df['pickup_datetime'])
@@ -96,18 +170,17 @@ def prepare_features(df):
     df['trip_time_minutes'] = (df['dropoff_datetime'] - df['pickup_datetime']).dt.total_seconds() / 60
     
     # Características básicas para modelos
-    feature_columns = [
-        'trip_miles', 'trip_time_minutes', 'hour', 'day_of_week', 
-        'month', 'is_weekend', 'PULocationID', 'DOLocationID'
-    ]
+    feature_columns = list(FEATURE_COLUMNS)
     
     # Limpiar datos
-    df = df.dropna(subset=feature_columns + ['driver_pay'])
-    df = df[df['trip_miles'] > 0]
-    df = df[df['trip_time_minutes'] > 0]
-    df = df[df['driver_pay'] > 0]
-    
-    print(f"✅ Datos limpios: {len(df):,} registros")
+    if not validated:
+        df = df.dropna(subset=feature_columns + ['driver_pay'])
+        df = df[df['trip_miles'] > 0]
+        df = df[df['trip_time_minutes'] > 0]
+        df = df[df['driver_pay'] > 0]
+    
+    if verbose:
+        print(f"✅ Datos limpios: {len(df):,} registros")
     return df, feature_columns
 
 def create_airport_labels(df):
@@ -121,138 +194,708 @@ def create_airport_labels(df):
     
     return df
 
-def train_fare_prediction_models(df, features):
-    """Entrenar modelos de predicción de tarifas."""
-    print("\n💰 Entrenando modelos de predicción de tarifas...")
-    
-    X = df[features]
-    y = df['driver_pay']
-    
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-    
-    models = {}
-    
-    # 1. Random Forest
-    print("   🌳 Entrenando Random Forest...")
-    rf_model = RandomForestRegressor(n_estimators=100, random_state=42, n_jobs=-1)
-    rf_model.fit(X_train, y_train)
-    
-    y_pred = rf_model.predict(X_test)
-    rmse = np.sqrt(mean_squared_error(y_test, y_pred))
-    r2 = r2_score(y_test, y_pred)
-    
-    models['driver_pay_rf'] = {
-        'model': rf_model,
-        'metrics': {'rmse': rmse, 'r2': r2},
-        'type': 'traditional'
+def data_fingerprint(data_files, features, stream=False):
+    """
+    Identificador de los datos de entrenamiento (archivos, tamaños, fechas y características).
+
+    Si cambia cualquier archivo, la matriz en caché y los checkpoints dejan de ser válidos.
+    """
+    digest = hashlib.sha1()
+    for path in data_files:
+        stat = os.stat(path)
+        digest.update(f"{os.path.basename(path)}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+    sample = TEST_MAX_ROWS if stream else SAMPLE_SIZE
+    digest.update(json.dumps([features, stream, sample, TEST_SIZE, RANDOM_STATE]).encode())
+    return digest.hexdigest()[:16]
+
+def matrix_paths(data_key, cache_dir=CACHE_DIR):
+    """Rutas de los arrays en caché de una versión de los datos (más 'meta', con los tamaños)."""
+    names = ['X'] + list(TARGET_COLUMNS)
+    paths = {f"{name}_{split}": os.path.join(cache_dir, f"{data_key}_{name}_{split}.npy")
+             for name in names for split in ['train', 'test']}
+    paths['meta'] = os.path.join(cache_dir, f"{data_key}_meta.json")
+    return paths
+
+def _write_meta(paths, rows, features):
+    tmp_path = paths['meta'] + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump({'rows': rows, 'features': features}, f, indent=2)
+    # El archivo meta se escribe al final: su existencia indica una caché completa
+    os.replace(tmp_path, paths['meta'])
+
+def build_feature_matrix(df, features, data_key, cache_dir=CACHE_DIR):
+    """
+    Construye una sola vez la matriz de características y los objetivos y los guarda en disco.
+
+    X es float32 contigua en memoria; los procesos de entrenamiento la abren con
+    np.load(mmap_mode='r') y comparten las páginas del sistema operativo en lugar de copiarla.
+    Las filas de entrenamiento y de prueba se guardan por separado, así todos los modelos
+    comparten la misma partición.
+
+    Args:
+        df: DataFrame preparado (prepare_features)
+        features: Columnas de entrada
+        data_key: Identificador de los datos (data_fingerprint)
+        cache_dir: Directorio de la caché
+
+    Returns:
+        dict: Nombre del array -> ruta .npy
+    """
+    paths = matrix_paths(data_key, cache_dir)
+    if os.path.exists(paths['meta']):
+        print(f"♻️ Matriz de características en caché ({data_key})")
+        return paths
+
+    df = create_airport_labels(df)
+    train_idx, test_idx = train_test_split(np.arange(len(df)), test_size=TEST_SIZE, random_state=RANDOM_STATE)
+    # Índices ordenados: lectura secuencial y mismo orden que en el modo por lotes
+    splits = {'train': np.sort(train_idx), 'test': np.sort(test_idx)}
+
+    X = np.ascontiguousarray(df[features].to_numpy(dtype=np.float32))
+    for split, idx in splits.items():
+        np.save(paths[f"X_{split}"], X[idx])
+        for target, dtype in TARGET_COLUMNS.items():
+            np.save(paths[f"{target}_{split}"], df[target].to_numpy(dtype=dtype)[idx])
+    rows = {split: len(idx) for split, idx in splits.items()}
+    _write_meta(paths, rows, features)
+    print(f"✅ Matriz de características: {X.shape[0]:,} x {X.shape[1]} "
+          f"({X.nbytes / 1024**2:.1f} MB) en {cache_dir}")
+    return paths
+
+def stream_batches(data_files, batch_rows, columns=None):
+    """
+    Itera los archivos Parquet por lotes de registros (memoria acotada por batch_rows).
+
+    Yields:
+        DataFrame: Un lote de viajes
+    """
+    for path in data_files:
+        parquet_file = pq.ParquetFile(path)
+        for batch in parquet_file.iter_batches(batch_size=batch_rows, columns=columns):
+            yield backend_utils.batch_to_pandas(batch)
+
+def build_feature_matrix_streaming(data_files, features, data_key, batch_rows, cache_dir=CACHE_DIR,
+                                   validated=False):
+    """
+    Construye la matriz de características leyendo los Parquet por lotes, sin cargarlos en memoria.
+
+    Cada lote se prepara con prepare_features y se escribe en memmaps .npy dimensionados con el
+    número de filas de los metadatos. Las filas válidas se cuentan y se guardan en 'meta'.
+    La prueba es una muestra aleatoria uniforme de todos los archivos, limitada a TEST_MAX_ROWS.
+
+    Args:
+        data_files: Archivos Parquet
+        features: Columnas de entrada
+        data_key: Identificador de los datos (data_fingerprint con stream=True)
+        batch_rows: Filas por lote de lectura
+        cache_dir: Directorio de la caché
+        validated: Todos los archivos pasaron la etapa de calidad (sin limpieza por lote)
+
+    Returns:
+        dict: Nombre del array -> ruta .npy
+    """
+    paths = matrix_paths(data_key, cache_dir)
+    if os.path.exists(paths['meta']):
+        print(f"♻️ Matriz de características en caché ({data_key})")
+        return paths
+
+    total_rows = sum(pq.ParquetFile(path).metadata.num_rows for path in data_files)
+    test_fraction = min(TEST_SIZE, TEST_MAX_ROWS / max(total_rows, 1))
+    print(f"📊 Leyendo {total_rows:,} registros en lotes de {batch_rows:,} "
+          f"({test_fraction:.1%} para prueba)...")
+
+    # Tamaño máximo por partición; se usa solo el prefijo escrito (ver 'meta')
+    capacity = {'train': total_rows, 'test': min(total_rows, int(total_rows * test_fraction * 1.1) + 1000)}
+    arrays = {}
+    for split, rows in capacity.items():
+        arrays[f"X_{split}"] = np.lib.format.open_memmap(
+            paths[f"X_{split}"], mode='w+', dtype=np.float32, shape=(rows, len(features)))
+        for target, dtype in TARGET_COLUMNS.items():
+            arrays[f"{target}_{split}"] = np.lib.format.open_memmap(
+                paths[f"{target}_{split}"], mode='w+', dtype=dtype, shape=(rows,))
+
+    rng = np.random.default_rng(RANDOM_STATE)
+    written = {'train': 0, 'test': 0}
+    for batch in stream_batches(data_files, batch_rows, columns=STREAM_COLUMNS):
+        batch, _ = prepare_features(batch, verbose=False, validated=validated)
+        batch = create_airport_labels(batch)
+        X = batch[features].to_numpy(dtype=np.float32)
+        is_test = rng.random(len(batch)) < test_fraction
+        for split, mask in [('train', ~is_test), ('test', is_test)]:
+            start = written[split]
+            n = min(int(mask.sum()), capacity[split] - start)
+            arrays[f"X_{split}"][start:start + n] = X[mask][:n]
+            for target, dtype in TARGET_COLUMNS.items():
+                arrays[f"{target}_{split}"][start:start + n] = batch[target].to_numpy(dtype=dtype)[mask][:n]
+            written[split] += n
+
+    for array in arrays.values():
+        array.flush()
+    del arrays
+    _write_meta(paths, written, features)
+    print(f"✅ Matriz de características: {written['train']:,} filas de entrenamiento y "
+          f"{written['test']:,} de prueba en {cache_dir}")
+    return paths
+
+def open_feature_matrix(paths):
+    """Abre los arrays de la caché como memmap de solo lectura (recortados a las filas escritas)."""
+    with open(paths['meta'], 'r') as f:
+        rows = json.load(f)['rows']
+    return {name: np.load(path, mmap_mode='r')[:rows[name.rsplit('_', 1)[1]]]
+            for name, path in paths.items() if name != 'meta'}
+
+def checkpoint_path(name):
+    return os.path.join(CHECKPOINT_DIR, f"{name}.json")
+
+def load_checkpoint(name, data_key):
+    """
+    Devuelve el checkpoint de un modelo si ya se entrenó con estos mismos datos.
+
+    Returns:
+        dict o None
+    """
+    path = checkpoint_path(name)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        checkpoint = json.load(f)
+    if checkpoint.get('data_key') != data_key:
+        return None
+    if not all(os.path.exists(artifact) for artifact in checkpoint.get('artifacts', [])):
+        return None
+    return checkpoint
+
+def write_checkpoint(name, data_key, metrics, artifacts, seconds):
+    """Marca un modelo como terminado (después de guardar sus artefactos)."""
+    checkpoint = {
+        'name': name,
+        'data_key': data_key,
+        'metrics': metrics,
+        'artifacts': artifacts,
+        'seconds': seconds,
+        'finished_at': datetime.now().isoformat(timespec='seconds'),
     }
-    print(f"      RMSE: {rmse:.4f}, R²: {r2:.4f}")
-    
-    # 2. LightGBM
-    print("   🚀 Entrenando LightGBM...")
-    lgb_model = lgb.LGBMRegressor(n_estimators=100, random_state=42, verbose=-1)
-    lgb_model.fit(X_train, y_train)
-    
-    y_pred = lgb_model.predict(X_test)
-    rmse = np.sqrt(mean_squared_error(y_test, y_pred))
-    r2 = r2_score(y_test, y_pred)
-    
-    models['driver_pay_lgb'] = {
-        'model': lgb_model,
-        'metrics': {'rmse': rmse, 'r2': r2},
-        'type': 'traditional'
+    tmp_path = checkpoint_path(name) + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(checkpoint, f, indent=2)
+    os.replace(tmp_path, checkpoint_path(name))
+
+def model_artifacts(name, model_type):
+    """Archivos que save_models escribe para un modelo."""
+    if model_type == 'neural_network':
+        files = [f"{name}_nn.keras", f"{name}_scaler.joblib"]
+    else:
+        files = [f"{name}.joblib"]
+    return [os.path.join(MODEL_DIR, f) for f in files + [f"{name}_metrics.json"]]
+
+def build_estimator(spec, n_jobs):
+    """Crea el estimador de árboles de una especificación de MODEL_SPECS."""
+    params = dict(spec['params'])
+    if spec['family'] == 'rf':
+        estimator = RandomForestRegressor if spec['task'] == 'regression' else RandomForestClassifier
+        return estimator(random_state=RANDOM_STATE, n_jobs=n_jobs, **params)
+    if spec['family'] == 'lgb':
+        estimator = lgb.LGBMRegressor if spec['task'] == 'regression' else lgb.LGBMClassifier
+        return estimator(random_state=RANDOM_STATE, n_jobs=n_jobs, verbose=-1, **params)
+    raise ValueError(f"Familia de modelo no soportada: {spec['family']}")
+
+def evaluate(spec, y_true, y_pred):
+    """Métricas de prueba según el tipo de tarea."""
+    if spec['task'] == 'regression':
+        return {'rmse': float(np.sqrt(mean_squared_error(y_true, y_pred))),
+                'r2': float(r2_score(y_true, y_pred))}
+    return {'accuracy': float(accuracy_score(y_true, y_pred))}
+
+class MemmapSequence(lgb.Sequence):
+    """Vista por lotes de un memmap para construir un lgb.Dataset sin cargarlo en memoria."""
+
+    def __init__(self, array, batch_size):
+        self.array = array
+        self.batch_size = batch_size
+
+    def __getitem__(self, index):
+        # LightGBM muestrea y empuja filas en float64; la conversión es solo del lote
+        return np.asarray(self.array[index], dtype=np.float64)
+
+    def __len__(self):
+        return len(self.array)
+
+def train_lightgbm_streaming(spec, X_train, y_train, features, n_jobs, batch_rows):
+    """
+    Entrena LightGBM construyendo el Dataset por lotes desde el memmap.
+
+    LightGBM muestrea filas para calcular los bins y luego lee la matriz por rangos, así la
+    memoria queda en el Dataset binarizado (un byte por característica y fila) en lugar de la
+    matriz completa.
+
+    Returns:
+        model_utils.BoosterModel: Adaptador con la interfaz predict/predict_proba de sklearn
+    """
+    params = {
+        'objective': 'regression' if spec['task'] == 'regression' else 'binary',
+        'num_threads': n_jobs,
+        'seed': RANDOM_STATE,
+        'verbose': -1,
     }
-    print(f"      RMSE: {rmse:.4f}, R²: {r2:.4f}")
-    
-    # 3. Red Neuronal (si TensorFlow está disponible)
-    if HAS_TENSORFLOW:
-        print("   🧠 Entrenando Red Neuronal...")
-        
+    params.update({key: value for key, value in spec['params'].items() if key != 'n_estimators'})
+    dataset = lgb.Dataset(MemmapSequence(X_train, batch_rows), label=np.asarray(y_train, dtype=np.float32),
+                          feature_name=features, free_raw_data=True)
+    booster = lgb.train(params, dataset, num_boost_round=spec['params'].get('n_estimators', 100))
+    return model_utils.BoosterModel(booster, spec['task'])
+
+def _scaled_batches(keras, X, y, scaler, batch_size):
+    """Keras PyDataset que normaliza el memmap por mini-lotes."""
+
+    class ScaledBatches(keras.utils.PyDataset):
+        def __len__(self):
+            return int(np.ceil(len(X) / batch_size))
+
+        def __getitem__(self, index):
+            rows = slice(index * batch_size, (index + 1) * batch_size)
+            batch = scaler.transform(np.asarray(X[rows])).astype(np.float32)
+            return batch if y is None else (batch, np.asarray(y[rows], dtype=np.float32))
+
+    return ScaledBatches()
+
+def train_neural_network(spec, X_train, y_train, X_test, n_jobs, stream=False, batch_rows=None):
+    """
+    Entrena la red neuronal de regresión; devuelve modelo, scaler y predicciones de prueba.
+
+    En modo por lotes el scaler se ajusta con partial_fit sobre bloques del memmap y la red se
+    entrena con mini-lotes leídos del disco (keras.utils.PyDataset).
+    """
+    import tensorflow as tf
+    from tensorflow import keras
+    from tensorflow.keras import layers
+
+    tf.config.threading.set_intra_op_parallelism_threads(n_jobs)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+
+    model = keras.Sequential([
+        layers.Dense(128, activation='relu', input_shape=(X_train.shape[1],)),
+        layers.Dropout(0.3),
+        layers.Dense(64, activation='relu'),
+        layers.Dropout(0.2),
+        layers.Dense(32, activation='relu'),
+        layers.Dense(1)
+    ])
+    model.compile(optimizer='adam', loss='mse', metrics=['mae'])
+
+    scaler = StandardScaler()
+    if not stream:
         # Normalizar datos
-        scaler = StandardScaler()
         X_train_scaled = scaler.fit_transform(X_train)
         X_test_scaled = scaler.transform(X_test)
-        
-        # Crear modelo
-        model = keras.Sequential([
-            layers.Dense(128, activation='relu', input_shape=(X_train.shape[1],)),
-            layers.Dropout(0.3),
-            layers.Dense(64, activation='relu'),
-            layers.Dropout(0.2),
-            layers.Dense(32, activation='relu'),
-            layers.Dense(1)
-        ])
-        
-        model.compile(optimizer='adam', loss='mse', metrics=['mae'])
-        
-        # Entrenar
-        history = model.fit(
+        model.fit(
             X_train_scaled, y_train,
-            epochs=50,
-            batch_size=32,
+            epochs=spec['params']['epochs'],
+            batch_size=spec['params']['batch_size'],
             validation_split=0.2,
             verbose=0
         )
-        
-        # Evaluar
-        y_pred = model.predict(X_test_scaled, verbose=0).flatten()
-        rmse = np.sqrt(mean_squared_error(y_test, y_pred))
-        r2 = r2_score(y_test, y_pred)
-        
-        models['driver_pay_nn'] = {
-            'model': model,
-            'scaler': scaler,
-            'metrics': {'rmse': rmse, 'r2': r2},
-            'type': 'neural_network'
-        }
-        print(f"      RMSE: {rmse:.4f}, R²: {r2:.4f}")
-    
-    return models
+        return model, scaler, model.predict(X_test_scaled, verbose=0).flatten()
 
-def train_airport_classification_models(df, features):
-    """Entrenar modelos de clasificación de aeropuertos."""
-    print("\n✈️ Entrenando modelos de clasificación de aeropuertos...")
-    
-    df = create_airport_labels(df)
-    
-    X = df[features]
-    y = df['airport_trip']
-    
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-    
-    models = {}
-    
-    # 1. Random Forest
-    print("   🌳 Entrenando Random Forest...")
-    rf_model = RandomForestClassifier(n_estimators=100, random_state=42, n_jobs=-1)
-    rf_model.fit(X_train, y_train)
-    
-    y_pred = rf_model.predict(X_test)
-    accuracy = accuracy_score(y_test, y_pred)
-    
-    models['airport_rf'] = {
-        'model': rf_model,
-        'metrics': {'accuracy': accuracy},
-        'type': 'traditional'
-    }
-    print(f"      Precisión: {accuracy:.4f}")
-    
-    # 2. LightGBM
-    print("   🚀 Entrenando LightGBM...")
-    lgb_model = lgb.LGBMClassifier(n_estimators=100, random_state=42, verbose=-1)
-    lgb_model.fit(X_train, y_train)
-    
-    y_pred = lgb_model.predict(X_test)
-    accuracy = accuracy_score(y_test, y_pred)
-    
-    models['airport_lgb'] = {
-        'model': lgb_model,
-        'metrics': {'accuracy': accuracy},
-        'type': 'traditional'
-    }
-    print(f"      Precisión: {accuracy:.4f}")
-    
-    return models
+    for start in range(0, len(X_train), batch_rows):
+        scaler.partial_fit(np.asarray(X_train[start:start + batch_rows]))
+    batch_size = spec['params'].get('stream_batch_size', 1024)
+    model.fit(
+        _scaled_batches(keras, X_train, y_train, scaler, batch_size),
+        epochs=spec['params'].get('stream_epochs', 5),
+        verbose=0
+    )
+    y_pred = model.predict(_scaled_batches(keras, X_test, None, scaler, batch_size), verbose=0).flatten()
+    return model, scaler, y_pred
+
+def train_task(name, spec, paths, features, data_key, n_jobs, stream=False, batch_rows=None):
+    """
+    Entrena, evalúa y guarda un modelo a partir de la matriz compartida.
+
+    Se ejecuta en un proceso del pool: abre la matriz como memmap, guarda los artefactos y
+    escribe el checkpoint al final, de modo que un fallo nunca deja un modelo marcado a medias.
+    Con stream=True LightGBM y la red neuronal leen el memmap por lotes y RandomForest (que no
+    admite entrenamiento incremental) usa una muestra uniforme de STREAM_RF_ROWS filas.
+
+    Args:
+        name: Nombre del modelo (clave de MODEL_SPECS)
+        spec: Especificación del modelo
+        paths: Rutas de la matriz (build_feature_matrix o build_feature_matrix_streaming)
+        features: Nombres de las columnas de X
+        data_key: Identificador de los datos
+        n_jobs: Hilos asignados a este modelo
+        stream: Entrenar sin cargar la matriz de entrenamiento en memoria
+        batch_rows: Filas por lote en modo stream
+
+    Returns:
+        tuple: (nombre, métricas, segundos)
+    """
+    start = time.perf_counter()
+    arrays = open_feature_matrix(paths)
+    X_train, y_train = arrays['X_train'], arrays[f"{spec['target']}_train"]
+    X_test = pd.DataFrame(np.asarray(arrays['X_test']), columns=features)
+    y_test = np.asarray(arrays[f"{spec['target']}_test"])
+
+    if spec['family'] == 'nn':
+        if not stream:
+            X_train = pd.DataFrame(np.asarray(X_train), columns=features)
+        model, scaler, y_pred = train_neural_network(spec, X_train, y_train, X_test, n_jobs, stream, batch_rows)
+        model_data = {'model': model, 'scaler': scaler, 'type': 'neural_network'}
+        network = model_utils.NumpyMLP.from_keras(model, scaler, features)
+    elif spec['family'] == 'lgb' and stream:
+        model = train_lightgbm_streaming(spec, X_train, y_train, features, n_jobs, batch_rows)
+        y_pred = model.predict(X_test)
+        model_data = {'model': model, 'type': 'traditional'}
+    else:
+        if stream and len(X_train) > STREAM_RF_ROWS:
+            rows = np.sort(np.random.default_rng(RANDOM_STATE).choice(len(X_train), STREAM_RF_ROWS, replace=False))
+            X_train, y_train = X_train[rows], y_train[rows]
+        model = build_estimator(spec, n_jobs)
+        model.fit(pd.DataFrame(np.asarray(X_train), columns=features), np.asarray(y_train))
+        y_pred = model.predict(X_test)
+        model_data = {'model': model, 'type': 'traditional'}
+
+    model_data['metrics'] = evaluate(spec, y_test, y_pred)
+    model_data['metrics']['train_rows'] = int(len(X_train))
+    if model_data['type'] == 'traditional':
+        # El dashboard predice fila a fila: sin hilos por llamada
+        if hasattr(model, 'set_params'):
+            model.set_params(n_jobs=1)
+    save_models({name: model_data})
+    artifacts = model_artifacts(name, model_data['type'])
+    if spec['family'] in ('rf', 'lgb'):
+        artifacts += export_numpy_model(name, spec, model, X_test, y_test)
+        write_analysis(name, spec, model, X_test, y_test, [os.path.join(MODEL_DIR, f"{name}.joblib")], n_jobs)
+    elif spec['family'] == 'nn':
+        exported = export_numpy_network(name, spec, network, X_test, y_test, y_pred)
+        artifacts += exported
+        if exported:
+            # La red se analiza en NumPy (mismas predicciones, sin el costo por llamada de Keras)
+            write_analysis(f"{name}_np", spec, network, X_test, y_test, [exported[0]], n_jobs)
+    seconds = time.perf_counter() - start
+    write_checkpoint(name, data_key, model_data['metrics'], artifacts, seconds)
+    return name, model_data['metrics'], seconds
+
+def measure_saved_latency(paths, features, names):
+    """
+    Mide la latencia p50/p99 de una fila de los modelos guardados y la añade a sus métricas.
+
+    Se ejecuta en serie cuando el pool ya terminó: dentro de un proceso del pool la medida
+    incluiría la contención con los demás entrenamientos. La red de Keras no se mide (el
+    dashboard la sirve como <nombre>_np).
+
+    Args:
+        paths: Rutas de la matriz (se usan las primeras LATENCY_ROWS filas de prueba)
+        features: Nombres de las columnas de X
+        names: Modelos de MODEL_SPECS recién guardados; también se mide su <nombre>_np
+    """
+    arrays = open_feature_matrix(paths)
+    X_test = pd.DataFrame(np.asarray(arrays['X_test'][:LATENCY_ROWS]), columns=features)
+    print("\n⏱️ Midiendo la latencia de una fila (en serie)...")
+    for name in names:
+        for saved_name in (name, f"{name}_np"):
+            metrics_path = os.path.join(MODEL_DIR, f"{saved_name}_metrics.json")
+            saved = (os.path.isdir(os.path.join(MODEL_DIR, saved_name))
+                     or os.path.exists(os.path.join(MODEL_DIR, f"{saved_name}.joblib")))
+            if not saved or not os.path.exists(metrics_path):
+                continue
+            model = load_saved_model(saved_name)
+            if hasattr(model, 'set_params'):
+                model.set_params(n_jobs=1)
+            latency = model_utils.measure_latency(model, X_test)
+            with open(metrics_path) as f:
+                metrics = json.load(f)
+            metrics.update({'predict_p50_ms': latency['p50_ms'], 'predict_p99_ms': latency['p99_ms']})
+            with open(metrics_path, 'w') as f:
+                json.dump(metrics, f, indent=2)
+            print(f"   ✅ {saved_name}: p50 {latency['p50_ms']:.2f} ms, p99 {latency['p99_ms']:.2f} ms")
+
+def save_numpy_artifact(name, model):
+    """
+    Guarda un modelo de NumPy como <nombre>_np/: un .npy por array, que el dashboard carga con
+    memoria mapeada y comparte entre procesos. Borra el .npz de versiones anteriores.
+
+    Returns:
+        str: Directorio escrito
+    """
+    path = os.path.join(MODEL_DIR, f"{name}_np")
+    model.save(path)
+    legacy_path = f"{path}.npz"
+    if os.path.exists(legacy_path):
+        os.remove(legacy_path)
+    return path
+
+def export_numpy_model(name, spec, model, X_test, y_test):
+    """
+    Exporta un modelo de árboles al evaluador de NumPy como un modelo más: <nombre>_np.
+
+    Las métricas del modelo exportado se calculan con sus propias predicciones e incluyen la
+    diferencia máxima con el modelo original.
+
+    Returns:
+        list: Archivos escritos
+    """
+    ensemble = tree_utils.export_model(model)
+    path = save_numpy_artifact(name, ensemble)
+
+    y_pred = ensemble.predict(X_test)
+    metrics = evaluate(spec, y_test, y_pred)
+    metrics['max_abs_diff'] = float(np.abs(y_pred - model.predict(X_test)).max())
+    metrics['source_model'] = name
+    metrics_path = os.path.join(MODEL_DIR, f"{name}_np_metrics.json")
+    with open(metrics_path, 'w') as f:
+        json.dump(metrics, f, indent=2)
+    print(f"   ✅ {name}_np: {path} ({ensemble.n_trees} árboles, {ensemble.n_nodes:,} nodos)")
+    return [path, metrics_path]
+
+def export_numpy_network(name, spec, network, X_test, y_test, keras_pred):
+    """
+    Guarda la red neuronal como NumpyMLP (<nombre>_np) para servirla sin TensorFlow.
+
+    Antes de escribir se comprueba la equivalencia con Keras en el conjunto de prueba: si la
+    diferencia máxima supera NN_EXPORT_TOLERANCE no se exporta.
+
+    Args:
+        network: model_utils.NumpyMLP extraído de la red entrenada
+        keras_pred: Predicciones de Keras sobre X_test
+
+    Returns:
+        list: Archivos escritos
+    """
+    y_pred = network.predict(X_test)
+    max_abs_diff = float(np.abs(y_pred - keras_pred).max())
+    if max_abs_diff > NN_EXPORT_TOLERANCE:
+        print(f"   ❌ {name}_np: difiere de Keras en {max_abs_diff:.2e} (> {NN_EXPORT_TOLERANCE}), no se exporta")
+        return []
+
+    path = save_numpy_artifact(name, network)
+    metrics = evaluate(spec, y_test, y_pred)
+    metrics['max_abs_diff'] = max_abs_diff
+    metrics['source_model'] = name
+    metrics_path = os.path.join(MODEL_DIR, f"{name}_np_metrics.json")
+    with open(metrics_path, 'w') as f:
+        json.dump(metrics, f, indent=2)
+    print(f"   ✅ {name}_np: {path} ({len(network.weights)} capas, {network.nbytes / 1024:.0f} KB, "
+          f"diferencia máx. {max_abs_diff:.1e})")
+    return [path, metrics_path]
+
+def export_saved_networks(paths, features):
+    """
+    Exporta a NumPy las redes ya guardadas (<nombre>_nn.keras + scaler) sin reentrenarlas.
+
+    Args:
+        paths: Rutas de la matriz en caché (se usa el conjunto de prueba)
+        features: Nombres de las columnas de X
+    """
+    keras = model_utils._load_keras()
+    arrays = open_feature_matrix(paths)
+    X_test = pd.DataFrame(np.asarray(arrays['X_test']), columns=features)
+    exported = []
+    for name, spec in MODEL_SPECS.items():
+        nn_path = os.path.join(MODEL_DIR, f"{name}_nn.keras")
+        if spec['family'] != 'nn' or not os.path.exists(nn_path):
+            continue
+        model = keras.models.load_model(nn_path)
+        scaler = joblib.load(os.path.join(MODEL_DIR, f"{name}_scaler.joblib"))
+        network = model_utils.NumpyMLP.from_keras(model, scaler, features)
+        keras_pred = model.predict(scaler.transform(X_test), verbose=0).flatten()
+        if export_numpy_network(name, spec, network, X_test, np.asarray(arrays[f"{spec['target']}_test"]), keras_pred):
+            exported.append(name)
+    measure_saved_latency(paths, features, exported)
+
+def write_analysis(name, spec, model, X_test, y_test, model_paths, n_jobs=1):
+    """
+    Calcula y guarda el análisis de características de un modelo (ver analysis_utils).
+
+    Args:
+        name: Nombre del modelo en el dashboard
+        model_paths: Archivos del modelo guardado (definen su versión)
+        n_jobs: Hilos para la importancia por permutación
+    """
+    analysis = analysis_utils.analyze_model(model, X_test, y_test, spec['task'], n_jobs, RANDOM_STATE)
+    version = analysis_utils.model_version(model_paths)
+    path = analysis_utils.save_analysis(ANALYSIS_DIR, name, version, analysis)
+    print(f"   🔍 {name}: análisis de características en {analysis['seconds']:.1f}s ({path})")
+
+def analyze_saved_models(paths, features, names, n_jobs=None):
+    """
+    Recalcula el análisis de características de los modelos ya guardados sin reentrenarlos.
+
+    Args:
+        paths: Rutas de la matriz en caché (se usa el conjunto de prueba)
+        features: Nombres de las columnas de X
+        names: Modelos de MODEL_SPECS a analizar
+        n_jobs: Hilos (por defecto todos los núcleos)
+    """
+    n_jobs = n_jobs or os.cpu_count() or 1
+    arrays = open_feature_matrix(paths)
+    X_test = pd.DataFrame(np.asarray(arrays['X_test']), columns=features)
+    for name in names:
+        spec = MODEL_SPECS[name]
+        # Las redes se analizan en su versión NumPy (el dashboard no carga Keras)
+        saved_name = f"{name}_np" if spec['family'] == 'nn' else name
+        model_path = os.path.join(MODEL_DIR, saved_name if spec['family'] == 'nn' else f"{name}.joblib")
+        if not os.path.exists(model_path):
+            print(f"   ⚠️ {saved_name}: no hay modelo guardado, se omite")
+            continue
+        y_test = np.asarray(arrays[f"{spec['target']}_test"])
+        write_analysis(saved_name, spec, load_saved_model(saved_name), X_test, y_test, [model_path], n_jobs)
+
+def load_saved_model(name):
+    """Carga un modelo guardado por este script (joblib o exportado a NumPy)."""
+    numpy_path = os.path.join(MODEL_DIR, name)
+    if os.path.isdir(numpy_path):
+        return model_utils.load_numpy_model(numpy_path)
+    return joblib.load(os.path.join(MODEL_DIR, f"{name}.joblib"))
+
+def best_fare_model():
+    """Modelo de tarifa con menor RMSE entre los que se pueden cargar sin TensorFlow."""
+    candidates = {}
+    for metrics_file in glob.glob(os.path.join(MODEL_DIR, 'driver_pay*_metrics.json')):
+        name = os.path.basename(metrics_file).replace('_metrics.json', '')
+        if os.path.isdir(os.path.join(MODEL_DIR, name)) or os.path.exists(os.path.join(MODEL_DIR, f"{name}.joblib")):
+            with open(metrics_file) as f:
+                candidates[name] = json.load(f).get('rmse', float('inf'))
+    return min(candidates, key=candidates.get) if candidates else None
+
+def pickup_zones_by_borough(X):
+    """
+    Zona de recogida más frecuente de cada borough (representa al borough en la superficie).
+
+    Returns:
+        dict: borough -> PULocationID, o None si falta taxi_zone_lookup.csv
+    """
+    lookup_path = os.path.join(DATA_FOLDER, 'taxi_zone_lookup.csv')
+    if not os.path.exists(lookup_path):
+        print(f"   ⚠️ No se encontró {lookup_path}: la superficie no distinguirá boroughs")
+        return None
+    zones = pd.read_csv(lookup_path, usecols=['LocationID', 'Borough'])
+    counts = X['PULocationID'].astype(int).value_counts().rename_axis('LocationID').reset_index(name='trips')
+    counts = counts.merge(zones, on='LocationID')
+    counts = counts[~counts['Borough'].isin(['Unknown', 'N/A']) & counts['Borough'].notna()]
+    top = counts.sort_values('trips', ascending=False).drop_duplicates('Borough')
+    return dict(sorted(zip(top['Borough'], top['LocationID'])))
+
+def build_fare_surface(paths, features, model_name=None, boroughs=False):
+    """
+    Precalcula la superficie de tarifas de un modelo y mide su error de interpolación.
+
+    Las características que el formulario no pide (mes y zonas) se fijan en sus valores más
+    frecuentes del conjunto de prueba; con boroughs=True hay una porción por borough de recogida.
+
+    Args:
+        paths: Rutas de la matriz en caché
+        features: Nombres de las columnas de X
+        model_name: Modelo de tarifa (por defecto el de menor RMSE)
+        boroughs: Añadir la dimensión de borough de recogida
+
+    Returns:
+        surface_utils.FareSurface o None si no hay modelo de tarifa
+    """
+    model_name = model_name or best_fare_model()
+    if model_name is None:
+        print("   ⚠️ No hay modelos de tarifa entrenados para precalcular la superficie")
+        return None
+    print(f"\n🗺️ Precalculando la superficie de tarifas con {model_name}...")
+    arrays = open_feature_matrix(paths)
+    X_test = pd.DataFrame(np.asarray(arrays['X_test']), columns=features)
+    model = load_saved_model(model_name)
+    names = getattr(model, 'feature_names_in_', None)
+    feature_names = list(names) if names is not None else features
+    fixed = {name: X_test[name].mode()[0] for name in ('month', 'PULocationID', 'DOLocationID') if name in X_test}
+    borough_zones = pickup_zones_by_borough(X_test) if boroughs else None
+
+    start = time.perf_counter()
+    surface = surface_utils.build_surface(model, model_name, feature_names, fixed, borough_zones)
+    surface.meta['build_seconds'] = time.perf_counter() - start
+    surface.meta['errors'] = surface_utils.interpolation_error(surface, model)
+    surface.meta['built_at'] = datetime.now().isoformat(timespec='seconds')
+    path = os.path.join(MODEL_DIR, SURFACE_NAME)
+    surface.save(path)
+    errors = surface.meta['errors']
+    print(f"   ✅ {path}: {surface.values.size:,} puntos ({surface.nbytes / 1024**2:.1f} MB) en "
+          f"{surface.meta['build_seconds']:.1f}s; error de interpolación máx. ${errors['max_abs_err']:.2f}, "
+          f"p99 ${errors['p99_abs_err']:.2f}, medio ${errors['mean_abs_err']:.3f}")
+    return surface
+
+def plan_resources(n_tasks, cpus=None, workers=None):
+    """
+    Reparte el presupuesto de CPU entre procesos y hilos por modelo.
+
+    Args:
+        n_tasks: Modelos pendientes
+        cpus: Núcleos disponibles para el entrenamiento (por defecto todos)
+        workers: Procesos concurrentes (por defecto uno por núcleo, hasta n_tasks)
+
+    Returns:
+        tuple: (procesos, hilos por modelo)
+    """
+    cpus = cpus or os.cpu_count() or 1
+    workers = max(1, min(workers or cpus, n_tasks, cpus))
+    return workers, max(1, cpus // workers)
+
+def run_training(specs, paths, features, data_key, cpus=None, workers=None, force=False,
+                 stream=False, batch_rows=None):
+    """
+    Orquesta el entrenamiento: omite los modelos con checkpoint y entrena el resto en paralelo.
+
+    Args:
+        specs: dict nombre -> especificación (subconjunto de MODEL_SPECS)
+        paths: Rutas de la matriz compartida
+        features: Nombres de las columnas de X
+        data_key: Identificador de los datos
+        cpus: Presupuesto de núcleos
+        workers: Procesos concurrentes
+        force: Reentrenar aunque exista checkpoint
+        stream: Entrenamiento por lotes (ver train_task)
+        batch_rows: Filas por lote en modo stream
+
+    Returns:
+        dict: nombre -> métricas (incluidos los reanudados)
+    """
+    results = {}
+    pending = {}
+    for name, spec in specs.items():
+        checkpoint = None if force else load_checkpoint(name, data_key)
+        if checkpoint:
+            print(f"   ⏭️ {name}: ya entrenado ({checkpoint['finished_at']}), se reutiliza")
+            results[name] = checkpoint['metrics']
+        elif spec['family'] == 'nn' and not HAS_TENSORFLOW:
+            print(f"   ⚠️ {name}: TensorFlow no disponible, se omite")
+        else:
+            pending[name] = spec
+
+    if not pending:
+        return results
+
+    workers, n_jobs = plan_resources(len(pending), cpus, workers)
+    print(f"\n🏋️ Entrenando {len(pending)} modelos: {workers} procesos x {n_jobs} hilos")
+
+    trained = []
+    if workers == 1:
+        for name, spec in pending.items():
+            name, metrics, seconds = train_task(name, spec, paths, features, data_key, n_jobs, stream, batch_rows)
+            print(f"   ✅ {name} ({seconds:.1f}s): {metrics}")
+            results[name] = metrics
+            trained.append(name)
+    else:
+        # 'spawn': procesos limpios (sin hilos heredados de BLAS/TensorFlow)
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            futures = {pool.submit(train_task, name, spec, paths, features, data_key, n_jobs, stream, batch_rows): name
+                       for name, spec in pending.items()}
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    name, metrics, seconds = future.result()
+                except Exception as e:
+                    print(f"   ❌ {name}: {e}")
+                    continue
+                print(f"   ✅ {name} ({seconds:.1f}s): {metrics}")
+                results[name] = metrics
+                trained.append(name)
+
+    # Con el pool cerrado: la latencia se mide sin otros entrenamientos compitiendo por la CPU
+    measure_saved_latency(paths, features, trained)
+    return results
 
 def save_models(models):
     """Guardar modelos entrenados."""
@@ -281,41 +924,97 @@ def save_models(models):
         with open(metrics_path, 'w') as f:
             json.dump(model_data['metrics'], f, indent=2)
 
+def prepare_matrix(stream=False, memory_mb=DEFAULT_MEMORY_MB):
+    """
+    Devuelve la matriz de características en caché, construyéndola si cambiaron los datos.
+
+    Args:
+        stream: Construirla por lotes con todos los registros
+        memory_mb: Presupuesto de memoria por proceso (define el tamaño del lote)
+
+    Returns:
+        tuple: (rutas, características, clave de datos, filas por lote)
+    """
+    data_files = find_data_files()
+    features = list(FEATURE_COLUMNS)
+    data_key = data_fingerprint(data_files, features, stream)
+    paths = matrix_paths(data_key)
+    # Un cuarto del presupuesto para el lote en lectura; el resto queda para el modelo
+    batch_rows = max(10_000, memory_mb * 1024**2 // (4 * BATCH_ROW_BYTES))
+    # Particiones validadas en la ingesta: no hace falta volver a limpiarlas
+    validated = bool(data_files) and all(quality_utils.is_validated(path) for path in data_files)
+    if os.path.exists(paths['meta']):
+        print(f"♻️ Matriz de características en caché ({data_key})")
+    elif stream:
+        if not data_files:
+            print("❌ No se encontraron archivos de datos. Ejecuta extract_data.py primero.")
+            sys.exit(1)
+        paths = build_feature_matrix_streaming(data_files, features, data_key, batch_rows, validated=validated)
+    else:
+        # Cargar datos
+        df = load_data()
+        
+        # Preparar características
+        df, features = prepare_features(df, validated=validated)
+        paths = build_feature_matrix(df, features, data_key)
+        del df
+    return paths, features, data_key, batch_rows
+
 def main():
     """Función principal."""
+    parser = argparse.ArgumentParser(description="Entrenamiento de modelos ML")
+    parser.add_argument("--cpus", type=int, default=None, help="Núcleos disponibles (por defecto todos)")
+    parser.add_argument("--workers", type=int, default=None, help="Modelos entrenados en paralelo")
+    parser.add_argument("--models", nargs="+", choices=list(MODEL_SPECS), default=list(MODEL_SPECS),
+                        help="Subconjunto de modelos a entrenar")
+    parser.add_argument("--force", action="store_true", help="Reentrenar ignorando los checkpoints")
+    parser.add_argument("--stream", action="store_true",
+                        help="Usar todos los registros leyendo los Parquet por lotes (sin SAMPLE_SIZE)")
+    parser.add_argument("--memory-mb", type=int, default=DEFAULT_MEMORY_MB,
+                        help="Presupuesto de memoria por proceso en modo --stream")
+    parser.add_argument("--export-nn", action="store_true",
+                        help="Solo exportar a NumPy las redes neuronales ya guardadas")
+    parser.add_argument("--fare-surface", nargs="?", const="", default=None, metavar="MODELO",
+                        help="Solo precalcular la superficie de tarifas (por defecto con el modelo de menor RMSE)")
+    parser.add_argument("--surface-boroughs", action="store_true",
+                        help="Añadir a la superficie una porción por borough de recogida")
+    parser.add_argument("--analyze", action="store_true",
+                        help="Solo recalcular el análisis de características de los modelos guardados")
+    args = parser.parse_args()
+
     print("🚀 Iniciando entrenamiento de modelos ML para NYC Ride-Hailing Analytics")
     print("=" * 70)
     
     # Configurar directorios
     setup_directories()
     
-    # Cargar datos
-    df = load_data()
-    
-    # Preparar características
-    df, features = prepare_features(df)
+    # La matriz de características solo se reconstruye si cambian los datos
+    paths, features, data_key, batch_rows = prepare_matrix(args.stream, args.memory_mb)
     
-    # Entrenar modelos
-    all_models = {}
+    if args.export_nn:
+        export_saved_networks(paths, features)
+        return
     
-    # Modelos de predicción de tarifas
-    fare_models = train_fare_prediction_models(df, features)
-    all_models.update(fare_models)
+    if args.analyze:
+        analyze_saved_models(paths, features, args.models, args.cpus)
+        return
     
-    # Modelos de clasificación de aeropuertos
-    airport_models = train_airport_classification_models(df, features)
-    all_models.update(airport_models)
+    if args.fare_surface is not None:
+        build_fare_surface(paths, features, args.fare_surface or None, args.surface_boroughs)
+        return
     
-    # Guardar modelos
-    save_models(all_models)
+    # Entrenar modelos (en paralelo, reanudando los terminados)
+    specs = {name: MODEL_SPECS[name] for name in args.models}
+    all_models = run_training(specs, paths, features, data_key, args.cpus, args.workers, args.force,
+                              args.stream, batch_rows)
     
     print("\n" + "=" * 70)
     print("🎉 ¡Entrenamiento completado exitosamente!")
     print(f"📁 Modelos guardados en: {MODEL_DIR}/")
-    print(f"🔢 Total de modelos entrenados: {len(all_models)}")
+    print(f"🔢 Total de modelos disponibles: {len(all_models)}")
     print("\n💡 Ahora puedes usar los modelos en el dashboard:")
     print("   streamlit run app.py")
     print("   Navega a la pestaña 'Modelos ML' para probar las predicciones")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
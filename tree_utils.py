@@ -0,0 +1,285 @@
+"""
+Evaluador de ensambles de árboles en NumPy puro.
+
+Los RandomForest de scikit-learn y los modelos de LightGBM se exportan a arrays planos (un nodo
+por posición: característica, umbral, hijos, valor) y se evalúan recorriendo todos los árboles a
+la vez, nivel por nivel. Predecir una fila cuesta tantas operaciones vectorizadas como la
+profundidad máxima, sin el costo por llamada de sklearn ni de LightGBM.
+
+Los modelos se guardan como un directorio con un .npy por array y un meta.json. Se cargan con
+memoria mapeada (mmap_mode='r'): no se deserializa nada y todos los procesos que sirven el mismo
+modelo comparten una sola copia física de los arrays (la caché de páginas del sistema).
+"""
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+# Arrays que describen los nodos (en el orden en que se guardan)
+NODE_ARRAYS = ['feature', 'threshold', 'left', 'right', 'value', 'default_left']
+
+
+class TreeEnsemble:
+    """
+    Ensamble de árboles exportado (bosque promediado o boosting sumado).
+
+    Atributos:
+        feature, threshold, left, right, default_left: arrays por nodo (feature = -1 en hojas)
+        value: valor de la hoja (regresión, probabilidad de clase 1 o margen de boosting)
+        roots: índice del nodo raíz de cada árbol
+        kind: 'forest' (promedio) o 'boosting' (suma + sigmoide en clasificación)
+        task: 'regression' o 'classification'
+    """
+
+    def __init__(self, arrays, roots, kind, task, max_depth, feature_names=None, input_dtype='float64'):
+        for name in NODE_ARRAYS:
+            setattr(self, name, arrays[name])
+        self.roots = roots
+        self.kind = kind
+        self.task = task
+        self.max_depth = int(max_depth)
+        self.feature_names_in_ = np.array(feature_names) if feature_names is not None else None
+        self.input_dtype = np.dtype(input_dtype)
+        if task == 'classification':
+            self.classes_ = np.array([0, 1])
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @property
+    def n_nodes(self):
+        return len(self.feature)
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name in NODE_ARRAYS) + self.roots.nbytes
+
+    def _matrix(self, X):
+        if isinstance(X, pd.DataFrame) and self.feature_names_in_ is not None:
+            X = X[list(self.feature_names_in_)]
+        X = np.asarray(X, dtype=self.input_dtype)
+        return X.reshape(1, -1) if X.ndim == 1 else X
+
+    def leaf_values(self, X):
+        """Valor de la hoja alcanzada en cada árbol: array (filas, árboles)."""
+        X = self._matrix(X)
+        rows = np.arange(len(X))[:, None]
+        node = np.broadcast_to(self.roots, (len(X), self.n_trees)).copy()
+        for _ in range(self.max_depth):
+            feature = self.feature[node]
+            internal = feature >= 0
+            if not internal.any():
+                break
+            x = X[rows, np.where(internal, feature, 0)]
+            go_left = np.where(np.isnan(x), self.default_left[node], x <= self.threshold[node])
+            node = np.where(internal, np.where(go_left, self.left[node], self.right[node]), node)
+        return self.value[node]
+
+    def decision_function(self, X):
+        """Salida cruda del ensamble (promedio del bosque o margen del boosting)."""
+        values = self.leaf_values(X)
+        return values.mean(axis=1) if self.kind == 'forest' else values.sum(axis=1)
+
+    def predict_proba(self, X):
+        raw = self.decision_function(X)
+        positive = raw if self.kind == 'forest' else 1 / (1 + np.exp(-raw))
+        return np.column_stack([1 - positive, positive])
+
+    def predict(self, X):
+        if self.task == 'classification':
+            return (self.predict_proba(X)[:, 1] > 0.5).astype(int)
+        return self.decision_function(X)
+
+    def save(self, path):
+        """Guarda el ensamble como directorio de arrays (ver save_arrays)."""
+        meta = {
+            'kind': self.kind,
+            'task': self.task,
+            'max_depth': self.max_depth,
+            'feature_names': None if self.feature_names_in_ is None else list(self.feature_names_in_),
+            'input_dtype': self.input_dtype.name,
+        }
+        arrays = {name: getattr(self, name) for name in NODE_ARRAYS}
+        save_arrays(path, {'roots': self.roots, **arrays}, meta)
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        """Carga un ensamble guardado con save() (con memoria mapeada por defecto)."""
+        arrays, meta = load_arrays(path, mmap_mode)
+        return cls(arrays, arrays['roots'], meta['kind'], meta['task'], meta['max_depth'],
+                   meta['feature_names'], meta['input_dtype'])
+
+
+def save_arrays(path, arrays, meta):
+    """
+    Guarda arrays como <path>/<nombre>.npy más <path>/meta.json.
+
+    Se escribe en un directorio temporal y se renombra al final, de modo que un proceso que esté
+    sirviendo la versión anterior nunca vea una mezcla de archivos.
+
+    Args:
+        path: Directorio destino
+        arrays: dict nombre -> np.ndarray
+        meta: dict serializable a JSON
+    """
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    os.makedirs(tmp_path, exist_ok=True)
+    for name, array in arrays.items():
+        np.save(os.path.join(tmp_path, f"{name}.npy"), np.ascontiguousarray(array))
+    with open(os.path.join(tmp_path, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+    if os.path.isdir(path):
+        # Los procesos que tengan mapeados los archivos anteriores los conservan hasta soltarlos
+        old_path = f"{path}.{os.getpid()}.old"
+        os.replace(path, old_path)
+        os.replace(tmp_path, path)
+        for name in os.listdir(old_path):
+            os.remove(os.path.join(old_path, name))
+        os.rmdir(old_path)
+    else:
+        os.replace(tmp_path, path)
+
+
+def load_arrays(path, mmap_mode='r'):
+    """
+    Carga arrays guardados con save_arrays (o un .npz de versiones anteriores).
+
+    Args:
+        path: Directorio (o archivo .npz)
+        mmap_mode: 'r' para mapear los .npy en memoria; None para leerlos completos
+
+    Returns:
+        tuple: (dict nombre -> array, meta)
+    """
+    if not os.path.isdir(path):
+        # Formato anterior: un .npz sin comprimir (se lee completo, no se puede mapear)
+        with np.load(path, allow_pickle=False) as data:
+            arrays = {name: data[name] for name in data.files if name != 'meta'}
+            return arrays, json.loads(str(data['meta']))
+    with open(os.path.join(path, 'meta.json')) as f:
+        meta = json.load(f)
+    arrays = {}
+    for file_name in os.listdir(path):
+        if file_name.endswith('.npy'):
+            arrays[file_name[:-4]] = np.load(os.path.join(path, file_name), mmap_mode=mmap_mode,
+                                             allow_pickle=False)
+    return arrays, meta
+
+
+def load_meta(path):
+    """Lee solo los metadatos de un modelo guardado con save_arrays (o un .npz anterior)."""
+    if not os.path.isdir(path):
+        with np.load(path, allow_pickle=False) as data:
+            return json.loads(str(data['meta']))
+    with open(os.path.join(path, 'meta.json')) as f:
+        return json.load(f)
+
+
+def _concatenate(trees):
+    """Une árboles con índices locales en arrays globales (desplazando los hijos)."""
+    offsets = np.cumsum([0] + [len(tree['feature']) for tree in trees[:-1]])
+    arrays = {}
+    for name in NODE_ARRAYS:
+        parts = []
+        for offset, tree in zip(offsets, trees):
+            part = tree[name]
+            if name in ('left', 'right'):
+                part = np.where(part >= 0, part + offset, -1)
+            parts.append(part)
+        arrays[name] = np.concatenate(parts)
+    arrays['feature'] = arrays['feature'].astype(np.int32)
+    arrays['left'] = arrays['left'].astype(np.int32)
+    arrays['right'] = arrays['right'].astype(np.int32)
+    arrays['threshold'] = arrays['threshold'].astype(np.float64)
+    arrays['value'] = arrays['value'].astype(np.float64)
+    arrays['default_left'] = arrays['default_left'].astype(bool)
+    return arrays, offsets.astype(np.int32)
+
+
+def _sklearn_tree(tree, task):
+    internal = tree.children_left >= 0
+    if task == 'classification':
+        counts = tree.value[:, 0, :]
+        value = counts[:, 1] / counts.sum(axis=1) if counts.shape[1] > 1 else np.zeros(len(counts))
+    else:
+        value = tree.value[:, 0, 0]
+    missing_left = getattr(tree, 'missing_go_to_left', None)
+    return {
+        'feature': np.where(internal, tree.feature, -1),
+        'threshold': tree.threshold,
+        'left': tree.children_left,
+        'right': tree.children_right,
+        'value': value,
+        'default_left': np.zeros(len(value), dtype=bool) if missing_left is None else missing_left.astype(bool),
+    }
+
+
+def _lightgbm_tree(structure):
+    """Aplana un árbol de Booster.dump_model() en recorrido en preorden."""
+    nodes = []
+    stack = [(structure, None, None)]
+    depth = {}
+    while stack:
+        node, parent, side = stack.pop()
+        index = len(nodes)
+        if parent is not None:
+            nodes[parent][side] = index
+            depth[index] = depth[parent] + 1
+        else:
+            depth[index] = 0
+        if 'leaf_value' in node:
+            nodes.append({'feature': -1, 'threshold': 0.0, 'left': -1, 'right': -1,
+                          'value': node['leaf_value'], 'default_left': False})
+            continue
+        if node.get('decision_type', '<=') != '<=':
+            raise ValueError("Solo se soportan divisiones numéricas (<=) de LightGBM")
+        nodes.append({'feature': node['split_feature'], 'threshold': node['threshold'], 'left': -1,
+                      'right': -1, 'value': 0.0, 'default_left': node.get('default_left', True)})
+        stack.append((node['right_child'], index, 'right'))
+        stack.append((node['left_child'], index, 'left'))
+    tree = {name: np.array([node[name] for node in nodes]) for name in NODE_ARRAYS}
+    return tree, max(depth.values())
+
+
+def export_model(model):
+    """
+    Exporta un modelo de árboles entrenado a TreeEnsemble.
+
+    Soporta RandomForestRegressor/Classifier (y árboles individuales) de scikit-learn,
+    LGBMRegressor/LGBMClassifier binario, lgb.Booster y model_utils.BoosterModel.
+
+    Args:
+        model: Modelo entrenado
+
+    Returns:
+        TreeEnsemble
+    """
+    feature_names = getattr(model, 'feature_names_in_', None)
+    is_classifier = hasattr(model, 'classes_')
+
+    if hasattr(model, 'estimators_') or hasattr(model, 'tree_'):
+        task = 'classification' if is_classifier else 'regression'
+        if is_classifier and len(model.classes_) != 2:
+            raise ValueError("Solo se soporta clasificación binaria")
+        estimators = model.estimators_ if hasattr(model, 'estimators_') else [model]
+        trees = [_sklearn_tree(estimator.tree_, task) for estimator in estimators]
+        arrays, roots = _concatenate(trees)
+        max_depth = max(estimator.tree_.max_depth for estimator in estimators)
+        # sklearn compara las características en float32
+        return TreeEnsemble(arrays, roots, 'forest', task, max_depth, feature_names, 'float32')
+
+    booster = getattr(model, 'booster', None) or getattr(model, 'booster_', None) or model
+    dump = booster.dump_model()
+    objective = dump.get('objective', 'regression').split()[0]
+    if objective not in ('regression', 'binary'):
+        raise ValueError(f"Objetivo de LightGBM no soportado: {objective}")
+    flattened = [_lightgbm_tree(tree['tree_structure']) for tree in dump['tree_info']]
+    arrays, roots = _concatenate([tree for tree, _ in flattened])
+    max_depth = max(depth for _, depth in flattened)
+    if feature_names is None:
+        feature_names = dump.get('feature_names')
+    task = 'classification' if objective == 'binary' else 'regression'
+    return TreeEnsemble(arrays, roots, 'boosting', task, max_depth, feature_names, 'float64')